@@ -5,8 +5,11 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_migrate import Migrate
 from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 import os
 import logging
+import sqlite3
 from pythonjsonlogger import jsonlogger
 
 # Charger les variables d'environnement
@@ -18,11 +21,22 @@ migrate = Migrate()
 login_manager = LoginManager()
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://"
+    default_limits=["200 per day", "50 per hour"]
 )
 
 
+@event.listens_for(Engine, 'connect')
+def configure_sqlite(dbapi_connection, connection_record):
+    """SQLite : WAL (lectures non bloquées par les écritures) et attente des verrous"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA busy_timeout=5000')
+    cursor.close()
+
+
 def setup_logging(app):
     """Configure le logging structuré JSON pour l'application"""
     log_level = logging.DEBUG if app.debug else logging.INFO
@@ -56,6 +70,35 @@ def setup_logging(app):
     })
 
 
+def setup_rate_limiting(app):
+    """
+    Configure le stockage des compteurs de Flask-Limiter
+
+    Redis (REDIS_URL ou RATELIMIT_STORAGE_URI) partage les compteurs entre
+    les workers gunicorn et survit aux redémarrages ; le pool de connexions
+    est celui de app/services/redis_client.py. Sans Redis, les compteurs
+    restent en mémoire : chaque worker a ses propres limites.
+    """
+    storage_uri = os.getenv('RATELIMIT_STORAGE_URI') or app.config.get('REDIS_URL') or 'memory://'
+
+    app.config.setdefault('RATELIMIT_STORAGE_URI', storage_uri)
+    app.config.setdefault('RATELIMIT_STRATEGY', os.getenv('RATELIMIT_STRATEGY', 'moving-window'))
+    app.config.setdefault('RATELIMIT_KEY_PREFIX', 'biblioruche')
+
+    if storage_uri.startswith(('redis://', 'rediss://')):
+        from app.services.redis_client import get_redis
+        client = get_redis(storage_uri)
+        if client is not None:
+            app.config.setdefault('RATELIMIT_STORAGE_OPTIONS', {'connection_pool': client.connection_pool})
+        # Redis indisponible : limites appliquées en mémoire le temps de la panne
+        app.config.setdefault('RATELIMIT_IN_MEMORY_FALLBACK_ENABLED', True)
+    elif storage_uri.startswith('memory://'):
+        app.logger.warning(
+            'Rate limits use in-process memory storage: counters are per worker '
+            'and reset on restart. Set REDIS_URL in production.'
+        )
+
+
 def setup_security_headers(app):
     """Configure les headers de sécurité HTTP"""
     @app.after_request
@@ -116,6 +159,22 @@ def create_app():
     app.config['TWITCH_CLIENT_SECRET'] = os.getenv('TWITCH_CLIENT_SECRET')
     app.config['TWITCH_REDIRECT_URI'] = os.getenv('TWITCH_REDIRECT_URI')
     
+    # Redis (cache partagé entre workers) - optionnel
+    app.config['REDIS_URL'] = os.getenv('REDIS_URL')
+    
+    # Flux temps réel /api/stream : chaque connexion ouverte occupe un thread avec
+    # les workers gthread, il n'est donc activé d'office qu'avec des workers asynchrones
+    async_workers = os.getenv('GUNICORN_WORKER_CLASS', 'gthread').lower() in ('gevent', 'eventlet')
+    app.config['STREAM_ENABLED'] = os.getenv('STREAM_ENABLED', str(async_workers)).lower() == 'true'
+    
+    # Taille maximale d'une requête (EPUB de 50 MB + couverture), refusée dès la lecture du corps
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 60 * 1024 * 1024))
+    
+    # Livraison des ebooks : 'app' (Flask), 'x-accel' (nginx) ou 'x-sendfile' (Apache/lighttpd)
+    app.config['EBOOK_DELIVERY'] = os.getenv('EBOOK_DELIVERY', 'app').lower()
+    app.config['EBOOK_ACCEL_LOCATION'] = os.getenv('EBOOK_ACCEL_LOCATION', '/protected-ebooks/')
+    app.config['USE_X_SENDFILE'] = app.config['EBOOK_DELIVERY'] == 'x-sendfile'
+    
     # Administrateurs par défaut
     app.config['ADMIN_USERNAMES'] = os.getenv('ADMIN_TWITCH_USERNAMES', 'lantredesilver,wenyn').split(',')
     
@@ -123,6 +182,7 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    setup_rate_limiting(app)
     limiter.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Veuillez vous connecter avec Twitch pour accéder à cette page.'
@@ -133,6 +193,14 @@ def create_app():
     # Configuration des headers de sécurité
     setup_security_headers(app)
     
+    # Comptage des requêtes SQL par requête HTTP (en-têtes en debug, N+1 dans les logs)
+    from app.services.query_stats import setup_query_stats
+    setup_query_stats(app)
+    
+    # Métriques Prometheus (/metrics) : latences, statuts, SQL, pool de connexions
+    from app.services.metrics import setup_metrics
+    setup_metrics(app, db)
+    
     # Enregistrer les blueprints
     from app.routes.main import main_bp
     from app.routes.auth import auth_bp
@@ -161,13 +229,22 @@ def create_app():
     def forbidden(e):
         return render_template('errors/403.html'), 403
     
+    @app.errorhandler(413)
+    def request_entity_too_large(e):
+        return render_template('errors/413.html'), 413
+    
     @app.errorhandler(429)
     def ratelimit_handler(e):
+        from app.services.metrics import record_rate_limited
+        record_rate_limited()
         return render_template('errors/429.html'), 429
     
     # Créer les tables de base de données
     with app.app_context():
         db.create_all()
+        # Index de recherche plein texte (FTS5 / tsvector), créé par migration
+        from app.services.search import search_index
+        search_index.detect()
     
     # Context processor pour les templates
     @app.context_processor
@@ -181,11 +258,15 @@ def create_app():
     def inject_notifications():
         """Injecte le compteur de notifications dans tous les templates"""
         def get_unread_notifications_count():
+            from flask import g
             from flask_login import current_user
-            if current_user.is_authenticated:
+            if not current_user.is_authenticated:
+                return 0
+            # Mémorisé pour la requête : une seule lecture par page rendue
+            if 'unread_notifications_count' not in g:
                 from app.models import Notification
-                return Notification.get_unread_count(current_user.id)
-            return 0
+                g.unread_notifications_count = Notification.get_unread_count(current_user.id)
+            return g.unread_notifications_count
         return dict(get_unread_notifications_count=get_unread_notifications_count)
     
     return app
@@ -2,231 +2,172 @@
 # -*- coding: utf-8 -*-
 """
 Système d'attribution automatique des badges
+
+Les badges sont attribués par un moteur de règles piloté par des événements
+métier ("vote_cast", "review_added", ...). Chaque événement ne réévalue que
+les compteurs d'activité qu'il peut faire évoluer, et les nouveaux badges
+sont insérés en une seule fois.
 """
 
-from app.models import (
-    User, Badge, UserBadge, ReadingParticipation, BookProposal, 
-    Vote, BookReview, Film, FilmVote, ViewingParticipation
-)
+from app.models import User, Badge, UserBadge, UserActivityStats
 from app import db
-from datetime import datetime
+
+
+# Règles : compteur de UserActivityStats -> [(seuil, nom du badge), ...]
+BADGE_RULES = {
+    'participations': [
+        (1, "Premier pas"),
+        (5, "Lecteur régulier"),
+        (10, "Lecteur assidu"),
+    ],
+    'reviews': [
+        (1, "Premier avis"),
+        (10, "Critique actif"),
+    ],
+    'votes': [
+        (1, "Premier vote"),
+        (5, "Voteur actif"),
+    ],
+    'proposals': [
+        (1, "Première proposition"),
+    ],
+    'accepted_proposals': [
+        (3, "Proposeur"),
+        (5, "Découvreur"),
+    ],
+    'viewings': [
+        (1, "Premier Film"),
+        (5, "Cinéphile"),
+        (15, "Cinéphile passionné"),
+    ],
+    'film_votes': [
+        (1, "Voteur de films"),
+        (10, "Critique de cinéma"),
+    ],
+    'approved_films': [
+        (1, "Réalisateur en herbe"),
+        (5, "Programmateur"),
+    ],
+}
+
+# Événements métier -> compteurs susceptibles d'évoluer
+BADGE_EVENTS = {
+    'proposal_created': ('proposals',),
+    'proposal_approved': ('accepted_proposals',),
+    'vote_cast': ('votes',),
+    'review_added': ('reviews',),
+    'reading_joined': ('participations',),
+    'film_vote_cast': ('film_votes',),
+    'viewing_joined': ('viewings',),
+    'film_approved': ('approved_films',),
+}
+
 
 class BadgeManager:
     """Gestionnaire des badges automatiques"""
-    
+
+    @staticmethod
+    def handle_event(user_id, event):
+        """
+        Évaluer uniquement les badges concernés par un événement métier
+
+        Args:
+            user_id: ID de l'utilisateur à l'origine de l'événement
+            event: Nom de l'événement (voir BADGE_EVENTS)
+
+        Returns:
+            Liste des badges nouvellement attribués
+        """
+        if event not in BADGE_EVENTS:
+            raise ValueError(f"Événement de badge inconnu : {event}")
+        return BadgeManager._evaluate(user_id, BADGE_EVENTS[event])
+
+    @staticmethod
+    def handle_event_async(user_id, event):
+        """
+        Évaluer les badges d'un événement après la requête (file de tâches)
+
+        Les badges obtenus sont signalés par une notification, la requête
+        d'origine ne pouvant plus afficher de message flash.
+
+        Returns:
+            Identifiant de la tâche
+        """
+        if event not in BADGE_EVENTS:
+            raise ValueError(f"Événement de badge inconnu : {event}")
+        from app.services.jobs import enqueue
+        return enqueue('badges.award', user_id, event)
+
+    @staticmethod
+    def _award_and_notify(user_id, event):
+        """Attribuer les badges d'un événement et notifier l'utilisateur"""
+        from app.services.notifications import notification_service
+        new_badges = BadgeManager.handle_event(user_id, event)
+        for badge in new_badges:
+            notification_service.notify_badge_awarded(user_id, badge.name, badge.description)
+        return new_badges
+
     @staticmethod
     def check_and_award_badges(user_id):
         """Vérifier et attribuer tous les badges possibles pour un utilisateur"""
-        user = User.query.get(user_id)
-        if not user:
+        if not db.session.get(User, user_id):
             return []
-        
-        awarded_badges = []
-        
-        # Vérifier tous les types de badges
-        awarded_badges.extend(BadgeManager._check_reading_badges(user))
-        awarded_badges.extend(BadgeManager._check_review_badges(user))
-        awarded_badges.extend(BadgeManager._check_vote_badges(user))
-        awarded_badges.extend(BadgeManager._check_proposal_badges(user))
-        awarded_badges.extend(BadgeManager._check_cineclub_badges(user))
-        
-        return awarded_badges
-    
+        return BadgeManager._evaluate(user_id, BADGE_RULES.keys())
+
     @staticmethod
-    def _award_badge(user, badge_name):
-        """Attribuer un badge à un utilisateur si pas déjà possédé"""
-        if user.has_badge(badge_name):
-            return None
-            
-        badge = Badge.query.filter_by(name=badge_name).first()
-        if not badge:
-            return None
-        
-        user_badge = UserBadge(
-            user_id=user.id,
-            badge_id=badge.id
+    def _load_counters(user_id, counter_names):
+        """Lire les compteurs d'activité demandés (une ligne de user_activity_stats)"""
+        stats = UserActivityStats.for_user(user_id)
+        return {name: getattr(stats, name) for name in counter_names}
+
+    @staticmethod
+    def _evaluate(user_id, counter_names):
+        """Attribuer en une seule insertion les badges dont le seuil est atteint"""
+        counters = BadgeManager._load_counters(user_id, counter_names)
+
+        eligible = [
+            badge_name
+            for name, value in counters.items()
+            for threshold, badge_name in BADGE_RULES[name]
+            if value >= threshold
+        ]
+        if not eligible:
+            return []
+
+        # Badges éligibles que l'utilisateur ne possède pas encore (une requête)
+        new_badges = Badge.query.outerjoin(
+            UserBadge,
+            db.and_(UserBadge.badge_id == Badge.id, UserBadge.user_id == user_id)
+        ).filter(
+            Badge.name.in_(eligible),
+            UserBadge.id.is_(None)
+        ).all()
+
+        if not new_badges:
+            return []
+
+        db.session.execute(
+            db.insert(UserBadge),
+            [{'user_id': user_id, 'badge_id': badge.id} for badge in new_badges]
         )
-        
-        db.session.add(user_badge)
         db.session.commit()
-        
-        return badge
-    
-    @staticmethod
-    def _check_reading_badges(user):
-        """Vérifier les badges de lecture"""
-        awarded = []
-        participation_count = len(user.get_reading_participations())
-        
-        # Premier pas
-        if participation_count >= 1:
-            badge = BadgeManager._award_badge(user, "Premier pas")
-            if badge:
-                awarded.append(badge)
-        
-        # Lecteur régulier
-        if participation_count >= 5:
-            badge = BadgeManager._award_badge(user, "Lecteur régulier")
-            if badge:
-                awarded.append(badge)
-        
-        # Lecteur assidu
-        if participation_count >= 10:
-            badge = BadgeManager._award_badge(user, "Lecteur assidu")
-            if badge:
-                awarded.append(badge)
-        
-        return awarded
-    
-    @staticmethod
-    def _check_review_badges(user):
-        """Vérifier les badges de notation et avis"""
-        awarded = []
-        review_count = BookReview.query.filter_by(user_id=user.id).count()
-        
-        # Premier avis
-        if review_count >= 1:
-            badge = BadgeManager._award_badge(user, "Premier avis")
-            if badge:
-                awarded.append(badge)
-        
-        # Critique actif
-        if review_count >= 10:
-            badge = BadgeManager._award_badge(user, "Critique actif")
-            if badge:
-                awarded.append(badge)
-        
-        return awarded
-    
-    @staticmethod
-    def _check_vote_badges(user):
-        """Vérifier les badges de vote"""
-        awarded = []
-        vote_count = len(user.votes)
-        
-        # Premier vote
-        if vote_count >= 1:
-            badge = BadgeManager._award_badge(user, "Premier vote")
-            if badge:
-                awarded.append(badge)
-        
-        # Voteur actif
-        if vote_count >= 5:
-            badge = BadgeManager._award_badge(user, "Voteur actif")
-            if badge:
-                awarded.append(badge)
-        
-        return awarded
-    
-    @staticmethod
-    def _check_proposal_badges(user):
-        """Vérifier les badges de proposition"""
-        awarded = []
-        proposal_count = len(user.book_proposals)
-        accepted_count = len(user.get_accepted_proposals())
-        
-        # Première proposition
-        if proposal_count >= 1:
-            badge = BadgeManager._award_badge(user, "Première proposition")
-            if badge:
-                awarded.append(badge)
-        
-        # Proposeur
-        if accepted_count >= 3:
-            badge = BadgeManager._award_badge(user, "Proposeur")
-            if badge:
-                awarded.append(badge)
-        
-        # Découvreur
-        if accepted_count >= 5:
-            badge = BadgeManager._award_badge(user, "Découvreur")
-            if badge:
-                awarded.append(badge)
-        
-        return awarded
-    
-    @staticmethod
-    def _check_cineclub_badges(user):
-        """Vérifier les badges CinéClub"""
-        awarded = []
-        
-        # Compter les votes films
-        film_vote_count = FilmVote.query.filter_by(user_id=user.id).count()
-        
-        # Compter les participations aux séances
-        viewing_count = ViewingParticipation.query.filter_by(user_id=user.id).count()
-        
-        # Compter les propositions de films
-        film_proposal_count = Film.query.filter_by(proposed_by=user.id).count()
-        film_approved_count = Film.query.filter_by(
-            proposed_by=user.id, 
-            status='approved'
-        ).count() + Film.query.filter_by(
-            proposed_by=user.id,
-            status='selected'
-        ).count() + Film.query.filter_by(
-            proposed_by=user.id,
-            status='viewed'
-        ).count()
-        
-        # Premier Film - Première participation à une séance
-        if viewing_count >= 1:
-            badge = BadgeManager._award_badge(user, "Premier Film")
-            if badge:
-                awarded.append(badge)
-        
-        # Cinéphile - 5 séances de visionnage
-        if viewing_count >= 5:
-            badge = BadgeManager._award_badge(user, "Cinéphile")
-            if badge:
-                awarded.append(badge)
-        
-        # Cinéphile passionné - 15 séances de visionnage
-        if viewing_count >= 15:
-            badge = BadgeManager._award_badge(user, "Cinéphile passionné")
-            if badge:
-                awarded.append(badge)
-        
-        # Voteur de films - Premier vote pour un film
-        if film_vote_count >= 1:
-            badge = BadgeManager._award_badge(user, "Voteur de films")
-            if badge:
-                awarded.append(badge)
-        
-        # Critique de cinéma - 10 votes films
-        if film_vote_count >= 10:
-            badge = BadgeManager._award_badge(user, "Critique de cinéma")
-            if badge:
-                awarded.append(badge)
-        
-        # Réalisateur en herbe - Première proposition de film acceptée
-        if film_approved_count >= 1:
-            badge = BadgeManager._award_badge(user, "Réalisateur en herbe")
-            if badge:
-                awarded.append(badge)
-        
-        # Programmateur - 5 propositions de films acceptées
-        if film_approved_count >= 5:
-            badge = BadgeManager._award_badge(user, "Programmateur")
-            if badge:
-                awarded.append(badge)
-        
-        return awarded
-    
+
+        return new_badges
+
     @staticmethod
     def award_badges_to_all_users():
         """Attribuer les badges à tous les utilisateurs existants"""
         users = User.query.all()
         total_badges_awarded = 0
-        
+
         print(f"🏆 Attribution des badges pour {len(users)} utilisateurs...")
-        
+
         for user in users:
             awarded = BadgeManager.check_and_award_badges(user.id)
             if awarded:
                 badge_names = [badge.name for badge in awarded]
                 print(f"   ✅ {user.display_name}: {', '.join(badge_names)}")
                 total_badges_awarded += len(awarded)
-        
+
         print(f"\n🎉 {total_badges_awarded} badges attribués au total!")
         return total_badges_awarded
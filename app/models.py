@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime, timezone
+from sqlalchemy import event, exists, func, select
 from app import db
 
 def utc_now():
@@ -15,7 +16,7 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120))
     avatar_url = db.Column(db.String(200))
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=utc_now)
+    created_at = db.Column(db.DateTime, default=utc_now, index=True)
     
     # Relations
     book_proposals = db.relationship('BookProposal', backref='proposer', lazy=True)
@@ -52,13 +53,14 @@ class User(UserMixin, db.Model):
     
     def get_stats(self):
         """Récupérer les statistiques de l'utilisateur pour les badges"""
+        stats = UserActivityStats.for_user(self.id)
         return {
-            'total_proposals': len(self.book_proposals),
-            'accepted_proposals': len(self.get_accepted_proposals()),
-            'total_votes': len(self.votes),
-            'total_participations': len(self.get_reading_participations()),
-            'total_reviews': BookReview.query.filter_by(user_id=self.id).count(),
-            'average_rating': db.session.query(db.func.avg(BookReview.rating)).filter_by(user_id=self.id).scalar() or 0
+            'total_proposals': stats.proposals,
+            'accepted_proposals': stats.accepted_proposals,
+            'total_votes': stats.votes,
+            'total_participations': stats.participations,
+            'total_reviews': stats.reviews,
+            'average_rating': stats.average_rating
         }
 
 class BookProposal(db.Model):
@@ -71,22 +73,52 @@ class BookProposal(db.Model):
     publication_year = db.Column(db.Integer)
     pages_count = db.Column(db.Integer)
     genre = db.Column(db.String(100))
-    proposed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    proposed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     status = db.Column(db.String(20), default='pending', nullable=False)  # pending, in_vote, selected, archived
-    created_at = db.Column(db.DateTime, default=utc_now)
+    created_at = db.Column(db.DateTime, default=utc_now, index=True)
+    
+    # Agrégats des avis visibles (maintenus par les événements BookReview)
+    rating_sum = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    avg_rating = db.Column(db.Float, default=0, server_default='0', nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_book_proposal_rating', 'avg_rating', 'rating_count'),
+        db.Index('ix_book_proposal_status_created', 'status', 'created_at'),
+    )
     
     def get_average_rating(self):
-        """Calculate average rating from all reviews"""
-        if not self.reviews:
-            return 0
-        visible_reviews = [r for r in self.reviews if r.is_visible]
-        if not visible_reviews:
-            return 0
-        return round(sum(r.rating for r in visible_reviews) / len(visible_reviews), 1)
+        """Average rating of visible reviews"""
+        return round(self.avg_rating or 0, 1)
     
     def get_review_count(self):
         """Get count of visible reviews"""
-        return len([r for r in self.reviews if r.is_visible])
+        return self.rating_count or 0
+    
+    @classmethod
+    def refresh_ratings(cls, connection, book_ids=None):
+        """
+        Recalcule les agrégats d'avis visibles en une requête UPDATE
+        
+        Args:
+            connection: connexion SQLAlchemy (transaction en cours)
+            book_ids: livres à recalculer (tous si None)
+        
+        Returns:
+            Nombre de livres mis à jour
+        """
+        table = cls.__table__
+        review = BookReview.__table__
+        visible = db.and_(review.c.book_id == table.c.id, review.c.is_visible == True)
+        
+        statement = table.update().values(
+            rating_sum=db.select(db.func.coalesce(db.func.sum(review.c.rating), 0)).where(visible).scalar_subquery(),
+            rating_count=db.select(db.func.count(review.c.id)).where(visible).scalar_subquery(),
+            avg_rating=db.select(db.func.coalesce(db.func.avg(review.c.rating), 0)).where(visible).scalar_subquery()
+        )
+        if book_ids is not None:
+            statement = statement.where(table.c.id.in_(book_ids))
+        return connection.execute(statement).rowcount
     
     def can_be_reviewed(self):
         """Check if book can be reviewed (completed or archived)"""
@@ -101,26 +133,72 @@ class BookProposal(db.Model):
 
 class ReadingSession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    book_id = db.Column(db.Integer, db.ForeignKey('book_proposal.id'), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('book_proposal.id'), nullable=False, index=True)
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
     debrief_date = db.Column(db.DateTime)
     status = db.Column(db.String(20), default='upcoming', nullable=False)  # upcoming, current, completed, archived
     description = db.Column(db.Text)
-    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=utc_now)
     
     # Relations
     book = db.relationship('BookProposal', backref='reading_sessions')
     creator = db.relationship('User', backref='created_sessions')
     
+    __table_args__ = (db.Index('ix_reading_session_status_start', 'status', 'start_date'),)
+    
     def get_participants_count(self):
-        """Get count of users registered for this reading session"""
-        return len(self.participants)
+        """Nombre d'inscrits (COUNT SQL, voir participants_count)"""
+        return self.participants_count
     
     def is_user_registered(self, user_id):
-        """Check if a user is registered for this reading session"""
-        return any(p.user_id == user_id for p in self.participants)
+        """Inscription d'un utilisateur (préchargée par load_registrations, sinon requête EXISTS)"""
+        known = getattr(self, '_registrations', {})
+        if user_id in known:
+            return known[user_id]
+        return _is_registered(ReadingParticipation, ReadingParticipation.reading_session_id, self.id, user_id)
+    
+    @classmethod
+    def load_registrations(cls, sessions, user_id):
+        """Précharge en une requête l'inscription de user_id à chaque lecture d'une liste"""
+        _load_registrations(ReadingParticipation, ReadingParticipation.reading_session_id, sessions, user_id)
+    
+    def update_status(self, today=None):
+        """Met à jour le statut selon la date du jour (sauf lecture terminée ou archivée)"""
+        from datetime import date
+        today = today or date.today()
+        
+        # Convertir les dates en objets date si ce sont des datetime
+        start_date = self.start_date.date() if hasattr(self.start_date, 'date') else self.start_date
+        end_date = self.end_date.date() if hasattr(self.end_date, 'date') else self.end_date
+        
+        # Ne pas changer le statut si la lecture est déjà terminée ou archivée
+        if self.status in ['completed', 'archived']:
+            return
+        
+        if start_date > today:
+            self.status = 'upcoming'
+        elif start_date <= today <= end_date:
+            self.status = 'current'
+        elif end_date < today:
+            self.status = 'completed'
+    
+    @classmethod
+    def update_all_statuses(cls, today=None):
+        """
+        Met à jour les statuts des lectures à venir et en cours
+        
+        Returns:
+            Nombre de sessions dont le statut a changé (non commité)
+        """
+        updated_count = 0
+        for reading in cls.query.filter(cls.status.in_(['upcoming', 'current'])).all():
+            old_status = reading.status
+            reading.update_status(today)
+            if reading.status != old_status:
+                updated_count += 1
+        return updated_count
     
     def __repr__(self):
         return f'<ReadingSession {self.book.title}>'
@@ -128,7 +206,7 @@ class ReadingSession(db.Model):
 class ReadingParticipation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    reading_session_id = db.Column(db.Integer, db.ForeignKey('reading_session.id'), nullable=False)
+    reading_session_id = db.Column(db.Integer, db.ForeignKey('reading_session.id'), nullable=False, index=True)
     joined_at = db.Column(db.DateTime, default=utc_now)
     
     # Relations
@@ -141,14 +219,55 @@ class ReadingParticipation(db.Model):
     def __repr__(self):
         return f'<ReadingParticipation {self.user.username} in {self.reading_session.book.title}>'
 
+
+def _participants_count(participation, foreign_key, session_model):
+    """
+    Nombre d'inscrits calculé par sous-requête COUNT, sans charger les participations
+    Différé : chargé à la lecture de l'attribut, ou dans la requête de la liste
+    avec undefer() (profils de app/services/loading.py)
+    """
+    return db.column_property(
+        select(func.count(participation.id))
+        .where(foreign_key == session_model.id)
+        .correlate_except(participation)
+        .scalar_subquery(),
+        deferred=True
+    )
+
+
+def _is_registered(participation, foreign_key, session_id, user_id):
+    return db.session.scalar(
+        select(exists().where(foreign_key == session_id, participation.user_id == user_id))
+    )
+
+
+def _load_registrations(participation, foreign_key, sessions, user_id):
+    """Mémorise sur chaque session l'inscription de user_id (une seule requête IN)"""
+    sessions = [session for session in sessions if session is not None]
+    if not sessions:
+        return
+    registered = set(db.session.scalars(
+        select(foreign_key).where(
+            participation.user_id == user_id,
+            foreign_key.in_([session.id for session in sessions])
+        )
+    ))
+    for session in sessions:
+        session._registrations = {**getattr(session, '_registrations', {}), user_id: session.id in registered}
+
+
+ReadingSession.participants_count = _participants_count(
+    ReadingParticipation, ReadingParticipation.reading_session_id, ReadingSession
+)
+
 class VotingSession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     start_date = db.Column(db.DateTime, default=utc_now)
     end_date = db.Column(db.DateTime, nullable=False)
-    status = db.Column(db.String(20), default='active', nullable=False)  # active, closed
-    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), default='active', nullable=False, index=True)  # active, closed
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     winner_book_id = db.Column(db.Integer, db.ForeignKey('book_proposal.id'))
     
     # Relations
@@ -157,13 +276,17 @@ class VotingSession(db.Model):
     books = db.relationship('VoteOption', backref='voting_session', lazy=True)
     votes = db.relationship('Vote', backref='voting_session', lazy=True)
     
+    # Compteurs calculés en SQL par le profil VOTE_COUNTS (app/services/loading.py)
+    options_count = db.query_expression()
+    votes_count = db.query_expression()
+    
     def __repr__(self):
         return f'<VotingSession {self.title}>'
 
 class VoteOption(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    voting_session_id = db.Column(db.Integer, db.ForeignKey('voting_session.id'), nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey('book_proposal.id'), nullable=False)
+    voting_session_id = db.Column(db.Integer, db.ForeignKey('voting_session.id'), nullable=False, index=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('book_proposal.id'), nullable=False, index=True)
     
     # Relations
     book = db.relationship('BookProposal')
@@ -175,11 +298,16 @@ class Vote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     voting_session_id = db.Column(db.Integer, db.ForeignKey('voting_session.id'), nullable=False)
-    vote_option_id = db.Column(db.Integer, db.ForeignKey('vote_option.id'), nullable=False)
+    vote_option_id = db.Column(db.Integer, db.ForeignKey('vote_option.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=utc_now)
     
     # Relations
     vote_option = db.relationship('VoteOption')
+    
+    __table_args__ = (
+        db.Index('ix_vote_user_session', 'user_id', 'voting_session_id'),
+        db.Index('ix_vote_session_option', 'voting_session_id', 'vote_option_id'),
+    )
 
 class BookReview(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -197,7 +325,10 @@ class BookReview(db.Model):
     book = db.relationship('BookProposal', backref='reviews')
     
     # Unique constraint to ensure one review per user per book
-    __table_args__ = (db.UniqueConstraint('user_id', 'book_id', name='unique_user_book_review'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'book_id', name='unique_user_book_review'),
+        db.Index('ix_book_review_book_visible', 'book_id', 'is_visible'),
+    )
     
     def __repr__(self):
         return f'<BookReview {self.book.title} by {self.user.username}: {self.rating}/5>'
@@ -216,7 +347,7 @@ class Badge(db.Model):
 class UserBadge(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    badge_id = db.Column(db.Integer, db.ForeignKey('badge.id'), nullable=False)
+    badge_id = db.Column(db.Integer, db.ForeignKey('badge.id'), nullable=False, index=True)
     earned_at = db.Column(db.DateTime, default=utc_now)
     
     # Relations
@@ -249,24 +380,32 @@ class Ebook(db.Model):
     filename = db.Column(db.String(255), nullable=False)  # Nom du fichier stocké
     original_filename = db.Column(db.String(255), nullable=False)  # Nom original
     file_size = db.Column(db.Integer)  # Taille en bytes
+    file_hash = db.Column(db.String(64))  # SHA-256 du fichier (dédoublonnage)
     
     # Image de couverture (optionnelle)
     cover_filename = db.Column(db.String(255))
+    cover_hash = db.Column(db.String(64))  # SHA-256 de l'image (noms des vignettes)
     
     # Métadonnées
     download_count = db.Column(db.Integer, default=0)
     is_visible = db.Column(db.Boolean, default=True, nullable=False)
-    uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=utc_now)
     updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
     
     # Lien optionnel vers une proposition de livre existante
-    book_proposal_id = db.Column(db.Integer, db.ForeignKey('book_proposal.id'))
+    book_proposal_id = db.Column(db.Integer, db.ForeignKey('book_proposal.id'), index=True)
     
     # Relations
     uploader = db.relationship('User', backref='uploaded_ebooks')
     book_proposal = db.relationship('BookProposal', backref=db.backref('ebook', uselist=False))
     
+    __table_args__ = (
+        db.Index('ix_ebook_visible_created', 'is_visible', 'created_at'),
+        db.Index('ix_ebook_file_hash', 'file_hash', unique=True),
+        db.Index('ix_ebook_cover_hash', 'cover_hash'),
+    )
+    
     def get_file_size_display(self):
         """Affiche la taille du fichier de manière lisible"""
         if not self.file_size:
@@ -324,7 +463,7 @@ class Film(db.Model):
     trailer_url = db.Column(db.String(500))  # URL YouTube/autre
     
     # Liaison avec le livre (CinéBookClub - adaptation)
-    book_proposal_id = db.Column(db.Integer, db.ForeignKey('book_proposal.id'), nullable=True)
+    book_proposal_id = db.Column(db.Integer, db.ForeignKey('book_proposal.id'), nullable=True, index=True)
     book = db.relationship('BookProposal', backref='film_adaptations')
     
     # Plateformes de streaming disponibles (stockées en JSON)
@@ -332,13 +471,15 @@ class Film(db.Model):
     platforms = db.Column(db.String(500), default='')
     
     # Métadonnées
-    proposed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    proposed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     status = db.Column(db.String(20), default='approved', nullable=False)  # approved, selected, viewed, archived
     created_at = db.Column(db.DateTime, default=utc_now)
     
     # Relations
     proposer = db.relationship('User', backref='proposed_films')
     
+    __table_args__ = (db.Index('ix_film_status_created', 'status', 'created_at'),)
+    
     # Liste des plateformes disponibles
     PLATFORMS = {
         'netflix': {'name': 'Netflix', 'icon': 'fab fa-netflix', 'color': '#E50914'},
@@ -385,8 +526,8 @@ class FilmVotingSession(db.Model):
     description = db.Column(db.Text)
     start_date = db.Column(db.DateTime, default=utc_now)
     end_date = db.Column(db.DateTime, nullable=False)
-    status = db.Column(db.String(20), default='active', nullable=False)  # active, closed
-    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), default='active', nullable=False, index=True)  # active, closed
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     winner_film_id = db.Column(db.Integer, db.ForeignKey('film.id'))
     
     # Relations
@@ -395,6 +536,10 @@ class FilmVotingSession(db.Model):
     options = db.relationship('FilmVoteOption', backref='voting_session', lazy=True)
     votes = db.relationship('FilmVote', backref='voting_session', lazy=True)
     
+    # Compteurs calculés en SQL par le profil FILM_VOTE_COUNTS (app/services/loading.py)
+    options_count = db.query_expression()
+    votes_count = db.query_expression()
+    
     def __repr__(self):
         return f'<FilmVotingSession {self.title}>'
 
@@ -402,8 +547,8 @@ class FilmVotingSession(db.Model):
 class FilmVoteOption(db.Model):
     """Options de vote (films candidats) dans une session"""
     id = db.Column(db.Integer, primary_key=True)
-    voting_session_id = db.Column(db.Integer, db.ForeignKey('film_voting_session.id'), nullable=False)
-    film_id = db.Column(db.Integer, db.ForeignKey('film.id'), nullable=False)
+    voting_session_id = db.Column(db.Integer, db.ForeignKey('film_voting_session.id'), nullable=False, index=True)
+    film_id = db.Column(db.Integer, db.ForeignKey('film.id'), nullable=False, index=True)
     
     # Relations
     film = db.relationship('Film')
@@ -417,7 +562,7 @@ class FilmVote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     voting_session_id = db.Column(db.Integer, db.ForeignKey('film_voting_session.id'), nullable=False)
-    vote_option_id = db.Column(db.Integer, db.ForeignKey('film_vote_option.id'), nullable=False)
+    vote_option_id = db.Column(db.Integer, db.ForeignKey('film_vote_option.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=utc_now)
     
     # Relations
@@ -425,29 +570,41 @@ class FilmVote(db.Model):
     vote_option = db.relationship('FilmVoteOption')
     
     # Unique constraint - un vote par utilisateur par session
-    __table_args__ = (db.UniqueConstraint('user_id', 'voting_session_id', name='unique_user_film_vote'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'voting_session_id', name='unique_user_film_vote'),
+        db.Index('ix_film_vote_session_option', 'voting_session_id', 'vote_option_id'),
+    )
 
 
 class ViewingSession(db.Model):
     """Session de visionnage planifiée"""
     id = db.Column(db.Integer, primary_key=True)
-    film_id = db.Column(db.Integer, db.ForeignKey('film.id'), nullable=False)
+    film_id = db.Column(db.Integer, db.ForeignKey('film.id'), nullable=False, index=True)
     scheduled_date = db.Column(db.DateTime, nullable=False)
     stream_url = db.Column(db.String(500))  # URL du stream Twitch/Discord
     status = db.Column(db.String(20), default='upcoming', nullable=False)  # upcoming, live, completed, cancelled
     description = db.Column(db.Text)
-    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=utc_now)
     
     # Relations
     film = db.relationship('Film', backref='viewing_sessions')
     creator = db.relationship('User', backref='created_viewing_sessions')
     
+    __table_args__ = (db.Index('ix_viewing_session_status_date', 'status', 'scheduled_date'),)
+    
     def get_participants_count(self):
-        return len(self.participants)
+        return self.participants_count
     
     def is_user_registered(self, user_id):
-        return any(p.user_id == user_id for p in self.participants)
+        known = getattr(self, '_registrations', {})
+        if user_id in known:
+            return known[user_id]
+        return _is_registered(ViewingParticipation, ViewingParticipation.viewing_session_id, self.id, user_id)
+    
+    @classmethod
+    def load_registrations(cls, sessions, user_id):
+        _load_registrations(ViewingParticipation, ViewingParticipation.viewing_session_id, sessions, user_id)
     
     def __repr__(self):
         return f'<ViewingSession {self.film.title}>'
@@ -457,7 +614,7 @@ class ViewingParticipation(db.Model):
     """Participation d'un utilisateur à une séance de visionnage"""
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    viewing_session_id = db.Column(db.Integer, db.ForeignKey('viewing_session.id'), nullable=False)
+    viewing_session_id = db.Column(db.Integer, db.ForeignKey('viewing_session.id'), nullable=False, index=True)
     joined_at = db.Column(db.DateTime, default=utc_now)
     
     # Relations
@@ -468,6 +625,11 @@ class ViewingParticipation(db.Model):
     __table_args__ = (db.UniqueConstraint('user_id', 'viewing_session_id', name='unique_user_viewing_participation'),)
 
 
+ViewingSession.participants_count = _participants_count(
+    ViewingParticipation, ViewingParticipation.viewing_session_id, ViewingSession
+)
+
+
 class Notification(db.Model):
     """Notification in-app pour les utilisateurs"""
     id = db.Column(db.Integer, primary_key=True)
@@ -484,6 +646,9 @@ class Notification(db.Model):
     # Relations
     user = db.relationship('User', backref='notifications')
     
+    # Liste et compteur des non lues : WHERE user_id [AND is_read] ORDER BY is_read, created_at
+    __table_args__ = (db.Index('ix_notification_user_read_created', 'user_id', 'is_read', 'created_at'),)
+    
     @classmethod
     def create_notification(cls, user_id, notification_type, title, message, link=None, icon=None):
         """Crée et enregistre une nouvelle notification"""
@@ -520,8 +685,8 @@ class Notification(db.Model):
     
     @classmethod
     def get_unread_count(cls, user_id):
-        """Retourne le nombre de notifications non lues"""
-        return cls.query.filter_by(user_id=user_id, is_read=False).count()
+        """Retourne le nombre de notifications non lues (compteur de UserActivityStats)"""
+        return UserActivityStats.for_user(user_id).unread_notifications
     
     @classmethod
     def get_recent(cls, user_id, limit=20):
@@ -534,3 +699,327 @@ class Notification(db.Model):
     def __repr__(self):
         return f'<Notification {self.type}: {self.title}>'
 
+
+
+
+class BackgroundJob(db.Model):
+    """Tâche de fond en attente d'un worker (file d'attente JOBS_BACKEND=database)"""
+    __tablename__ = 'background_job'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON {'args': [...], 'kwargs': {...}}
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, done, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    unique_key = db.Column(db.String(200), unique=True)  # Dédoublonnage des tâches planifiées
+    error = db.Column(db.Text)
+    run_at = db.Column(db.DateTime, default=utc_now, nullable=False)
+    created_at = db.Column(db.DateTime, default=utc_now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # Prochaine tâche : WHERE status = 'queued' AND run_at <= now ORDER BY run_at
+    __table_args__ = (db.Index('ix_background_job_status_run_at', 'status', 'run_at'),)
+    
+    def __repr__(self):
+        return f'<BackgroundJob {self.name} {self.status}>'
+
+
+class DownloadFlush(db.Model):
+    """Lot de téléchargements reporté en base (un lot rejoué n'est pas compté deux fois)"""
+    __tablename__ = 'download_flush'
+    
+    batch_id = db.Column(db.String(32), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=utc_now, nullable=False)
+    
+    def __repr__(self):
+        return f'<DownloadFlush {self.batch_id}>'
+
+
+# =============================================================================
+# COMPTEURS D'ACTIVITÉ DÉNORMALISÉS
+# =============================================================================
+
+# Statuts de film comptés comme "proposition acceptée" pour les badges
+FILM_APPROVED_STATUSES = ('approved', 'selected', 'viewed')
+
+
+class UserActivityStats(db.Model):
+    """
+    Compteurs d'activité par utilisateur (une ligne par utilisateur)
+    
+    Maintenus dans la même transaction que les écritures via les événements
+    SQLAlchemy définis plus bas. UserActivityStats.rebuild() recalcule tout
+    depuis les tables sources.
+    """
+    __tablename__ = 'user_activity_stats'
+    
+    COUNTERS = (
+        'proposals', 'accepted_proposals', 'votes', 'participations',
+        'reviews', 'rating_sum', 'film_votes', 'viewings', 'approved_films',
+        'unread_notifications'
+    )
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    proposals = db.Column(db.Integer, default=0, nullable=False)
+    accepted_proposals = db.Column(db.Integer, default=0, nullable=False)
+    votes = db.Column(db.Integer, default=0, nullable=False)
+    participations = db.Column(db.Integer, default=0, nullable=False)
+    reviews = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    film_votes = db.Column(db.Integer, default=0, nullable=False)
+    viewings = db.Column(db.Integer, default=0, nullable=False)
+    approved_films = db.Column(db.Integer, default=0, nullable=False)
+    unread_notifications = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
+    # Relations
+    user = db.relationship('User', backref=db.backref('activity_stats', uselist=False))
+    
+    @property
+    def average_rating(self):
+        """Note moyenne donnée par l'utilisateur"""
+        if not self.reviews:
+            return 0
+        return self.rating_sum / self.reviews
+    
+    @classmethod
+    def for_user(cls, user_id):
+        """
+        Retourne la ligne de compteurs d'un utilisateur
+        
+        Les lignes sont créées à l'inscription et par la migration 9e3b7c1d5a26 ;
+        si elle manque malgré tout, les valeurs sont calculées sans rien écrire
+        (lecture seule : la session de la requête n'est pas commitée).
+        """
+        stats = db.session.get(cls, user_id)
+        if stats is None:
+            rows = cls.compute_rows(db.session.connection(), [user_id])
+            stats = cls(**rows[0]) if rows else None
+        return stats
+    
+    @staticmethod
+    def _sources():
+        """Requêtes d'agrégation (user_id, valeurs...) pour chaque compteur"""
+        count = db.func.count
+        return [
+            (('proposals',), db.select(BookProposal.proposed_by, count())
+                .group_by(BookProposal.proposed_by)),
+            (('accepted_proposals',), db.select(BookProposal.proposed_by, count())
+                .where(BookProposal.status == 'approved')
+                .group_by(BookProposal.proposed_by)),
+            (('votes',), db.select(Vote.user_id, count()).group_by(Vote.user_id)),
+            (('participations',), db.select(ReadingParticipation.user_id, count())
+                .group_by(ReadingParticipation.user_id)),
+            (('reviews', 'rating_sum'), db.select(BookReview.user_id, count(), db.func.sum(BookReview.rating))
+                .group_by(BookReview.user_id)),
+            (('film_votes',), db.select(FilmVote.user_id, count()).group_by(FilmVote.user_id)),
+            (('viewings',), db.select(ViewingParticipation.user_id, count())
+                .group_by(ViewingParticipation.user_id)),
+            (('approved_films',), db.select(Film.proposed_by, count())
+                .where(Film.status.in_(FILM_APPROVED_STATUSES))
+                .group_by(Film.proposed_by)),
+            (('unread_notifications',), db.select(Notification.user_id, count())
+                .where(Notification.is_read == False)
+                .group_by(Notification.user_id)),
+        ]
+    
+    @classmethod
+    def compute_rows(cls, connection, user_ids=None):
+        """Calcule les compteurs depuis les tables sources (une requête groupée par compteur)"""
+        users_query = db.select(User.id)
+        if user_ids is not None:
+            users_query = users_query.where(User.id.in_(user_ids))
+        
+        rows = {
+            user_id: dict({name: 0 for name in cls.COUNTERS}, user_id=user_id)
+            for user_id in connection.execute(users_query).scalars()
+        }
+        
+        for names, query in cls._sources():
+            if user_ids is not None:
+                query = query.where(query.selected_columns[0].in_(user_ids))
+            for user_id, *values in connection.execute(query):
+                if user_id in rows:
+                    rows[user_id].update(zip(names, (value or 0 for value in values)))
+        
+        return list(rows.values())
+    
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        """
+        Recalcule entièrement les compteurs
+        
+        Args:
+            user_ids: Liste d'utilisateurs à recalculer (tous si None)
+        
+        Returns:
+            Nombre de lignes recalculées
+        """
+        connection = db.session.connection()
+        rows = cls.compute_rows(connection, user_ids)
+        
+        delete = db.delete(cls.__table__)
+        if user_ids is not None:
+            delete = delete.where(cls.__table__.c.user_id.in_(user_ids))
+        connection.execute(delete)
+        if rows:
+            connection.execute(db.insert(cls.__table__), rows)
+        
+        db.session.commit()
+        return len(rows)
+    
+    @classmethod
+    def bump(cls, connection, user_id, **deltas):
+        """
+        Applique des incréments atomiques (UPDATE ... SET col = col + n)
+        
+        Si l'utilisateur n'a pas encore de ligne, elle est calculée depuis
+        les tables sources dans la même transaction.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if user_id is None or not deltas:
+            return
+        
+        table = cls.__table__
+        result = connection.execute(
+            table.update()
+            .where(table.c.user_id == user_id)
+            .values({table.c[name]: table.c[name] + delta for name, delta in deltas.items()})
+        )
+        if result.rowcount == 0:
+            connection.execute(db.insert(table), cls.compute_rows(connection, [user_id]))
+    
+    def __repr__(self):
+        return f'<UserActivityStats user={self.user_id}>'
+
+
+def _track_counter(model, user_attr, counter):
+    """Incrémente/décrémente un compteur à l'insertion/suppression d'une ligne"""
+    @event.listens_for(model, 'after_insert')
+    def _on_insert(mapper, connection, target):
+        UserActivityStats.bump(connection, getattr(target, user_attr), **{counter: 1})
+    
+    @event.listens_for(model, 'after_delete')
+    def _on_delete(mapper, connection, target):
+        UserActivityStats.bump(connection, getattr(target, user_attr), **{counter: -1})
+
+
+_track_counter(Vote, 'user_id', 'votes')
+_track_counter(ReadingParticipation, 'user_id', 'participations')
+_track_counter(FilmVote, 'user_id', 'film_votes')
+_track_counter(ViewingParticipation, 'user_id', 'viewings')
+
+
+# Charger l'ancienne valeur avant modification pour que l'historique soit fiable
+for _attribute in (BookProposal.status, Film.status, BookReview.rating, Notification.is_read):
+    event.listen(_attribute, 'set', lambda target, value, oldvalue, initiator: value,
+                 active_history=True, retval=True)
+
+
+def _status_delta(target, statuses):
+    """+1/-1 si le statut entre/sort de l'ensemble donné lors de cette mise à jour"""
+    history = db.inspect(target).attrs.status.history
+    if not history.has_changes():
+        return 0
+    was_in = bool(history.deleted) and history.deleted[0] in statuses
+    return int(target.status in statuses) - int(was_in)
+
+
+@event.listens_for(User, 'after_insert')
+def _create_activity_stats(mapper, connection, target):
+    connection.execute(db.insert(UserActivityStats.__table__).values(
+        user_id=target.id, **{name: 0 for name in UserActivityStats.COUNTERS}
+    ))
+
+
+@event.listens_for(BookProposal, 'after_insert')
+def _proposal_inserted(mapper, connection, target):
+    UserActivityStats.bump(connection, target.proposed_by, proposals=1,
+                           accepted_proposals=int(target.status == 'approved'))
+
+
+@event.listens_for(BookProposal, 'after_update')
+def _proposal_updated(mapper, connection, target):
+    UserActivityStats.bump(connection, target.proposed_by,
+                           accepted_proposals=_status_delta(target, ('approved',)))
+
+
+@event.listens_for(BookProposal, 'after_delete')
+def _proposal_deleted(mapper, connection, target):
+    UserActivityStats.bump(connection, target.proposed_by, proposals=-1,
+                           accepted_proposals=-int(target.status == 'approved'))
+
+
+@event.listens_for(BookReview, 'after_insert')
+def _review_inserted(mapper, connection, target):
+    UserActivityStats.bump(connection, target.user_id, reviews=1, rating_sum=target.rating)
+
+
+@event.listens_for(BookReview, 'after_update')
+def _review_updated(mapper, connection, target):
+    history = db.inspect(target).attrs.rating.history
+    if history.has_changes() and history.deleted:
+        UserActivityStats.bump(connection, target.user_id,
+                               rating_sum=target.rating - history.deleted[0])
+
+
+@event.listens_for(BookReview, 'after_delete')
+def _review_deleted(mapper, connection, target):
+    UserActivityStats.bump(connection, target.user_id, reviews=-1, rating_sum=-target.rating)
+
+
+def _refresh_book_ratings(connection, target):
+    BookProposal.refresh_ratings(connection, [target.book_id])
+
+
+@event.listens_for(BookReview, 'after_insert')
+def _review_rating_inserted(mapper, connection, target):
+    _refresh_book_ratings(connection, target)
+
+
+@event.listens_for(BookReview, 'after_update')
+def _review_rating_updated(mapper, connection, target):
+    attrs = db.inspect(target).attrs
+    if any(attrs[name].history.has_changes() for name in ('rating', 'is_visible', 'book_id')):
+        _refresh_book_ratings(connection, target)
+
+
+@event.listens_for(BookReview, 'after_delete')
+def _review_rating_deleted(mapper, connection, target):
+    _refresh_book_ratings(connection, target)
+
+
+@event.listens_for(Film, 'after_insert')
+def _film_inserted(mapper, connection, target):
+    UserActivityStats.bump(connection, target.proposed_by,
+                           approved_films=int(target.status in FILM_APPROVED_STATUSES))
+
+
+@event.listens_for(Film, 'after_update')
+def _film_updated(mapper, connection, target):
+    UserActivityStats.bump(connection, target.proposed_by,
+                           approved_films=_status_delta(target, FILM_APPROVED_STATUSES))
+
+
+@event.listens_for(Film, 'after_delete')
+def _film_deleted(mapper, connection, target):
+    UserActivityStats.bump(connection, target.proposed_by,
+                           approved_films=-int(target.status in FILM_APPROVED_STATUSES))
+
+
+@event.listens_for(Notification, 'after_insert')
+def _notification_inserted(mapper, connection, target):
+    UserActivityStats.bump(connection, target.user_id, unread_notifications=int(not target.is_read))
+
+
+@event.listens_for(Notification, 'after_update')
+def _notification_updated(mapper, connection, target):
+    history = db.inspect(target).attrs.is_read.history
+    if history.has_changes() and history.deleted:
+        UserActivityStats.bump(connection, target.user_id,
+                               unread_notifications=int(history.deleted[0]) - int(target.is_read))
+
+
+@event.listens_for(Notification, 'after_delete')
+def _notification_deleted(mapper, connection, target):
+    UserActivityStats.bump(connection, target.user_id, unread_notifications=-int(not target.is_read))
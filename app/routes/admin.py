@@ -5,6 +5,9 @@ from functools import wraps
 from app import db
 from app.models import BookProposal, VotingSession, VoteOption, Vote, ReadingSession, User, BookReview
 from app.forms import ReadingSessionForm, VotingSessionForm, ModerateReviewForm
+from app.badge_manager import BadgeManager
+from app.services.loading import PROPOSAL_WITH_PROPOSER, READING_ADMIN, VOTE_COUNTS
+from app.services.votes import vote_tally_service
 from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__)
@@ -36,13 +39,13 @@ def dashboard():
     }
     
     # Propositions récentes
-    recent_proposals = BookProposal.query.filter_by(status='pending').order_by(BookProposal.created_at.desc()).limit(10).all()
+    recent_proposals = BookProposal.query.options(*PROPOSAL_WITH_PROPOSER).filter_by(status='pending').order_by(BookProposal.created_at.desc()).limit(10).all()
     
     # Votes actifs
-    active_votes = VotingSession.query.filter_by(status='active').all()
+    active_votes = VotingSession.query.options(*VOTE_COUNTS).filter_by(status='active').all()
     
     # Lectures en cours
-    current_readings = ReadingSession.query.filter_by(status='current').all()
+    current_readings = ReadingSession.query.options(*READING_ADMIN).filter_by(status='current').all()
     
     return render_template('admin/dashboard.html',
                          stats=stats,
@@ -66,6 +69,7 @@ def approve_proposal(proposal_id):
     proposal = BookProposal.query.get_or_404(proposal_id)
     proposal.status = 'approved'
     db.session.commit()
+    BadgeManager.handle_event(proposal.proposed_by, 'proposal_approved')
     flash(f'La proposition "{proposal.title}" a été approuvée.', 'success')
     return redirect(url_for('admin.proposals'))
 
@@ -122,6 +126,11 @@ def bulk_proposals():
     
     db.session.commit()
     
+    # Badges des proposeurs (une évaluation par proposeur)
+    if action == 'approve':
+        for proposer_id in {proposal.proposed_by for proposal in proposals}:
+            BadgeManager.handle_event(proposer_id, 'proposal_approved')
+    
     # Message de confirmation
     action_text = 'approuvées' if action == 'approve' else 'rejetées'
     if success_count > 0:
@@ -179,8 +188,9 @@ def create_vote():
 @login_required
 @admin_required
 def votes():
-    active_votes = VotingSession.query.filter_by(status='active').all()
-    closed_votes = VotingSession.query.filter_by(status='closed').order_by(VotingSession.end_date.desc()).all()
+    listing = VotingSession.query.options(*VOTE_COUNTS)
+    active_votes = listing.filter_by(status='active').all()
+    closed_votes = listing.filter_by(status='closed').order_by(VotingSession.end_date.desc()).all()
     csrf_form = CSRFForm()  # Formulaire pour le token CSRF
     
     return render_template('admin/votes.html', active_votes=active_votes, closed_votes=closed_votes, csrf_form=csrf_form)
@@ -225,27 +235,8 @@ def close_vote(vote_id):
         flash('Ce vote est déjà clos.', 'info')
         return redirect(url_for('admin.votes'))
     
-    voting_session.status = 'closed'
-      # Déterminer les livres gagnants (en cas d'égalité, tous les ex æquo)
-    vote_counts = {}
-    for option in voting_session.books:
-        vote_counts[option.id] = option.get_vote_count()
-    
-    if vote_counts:
-        max_votes = max(vote_counts.values())
-        winner_option_ids = [option_id for option_id, count in vote_counts.items() if count == max_votes]
-        
-        # Si un seul gagnant, définir le winner_book_id
-        if len(winner_option_ids) == 1:
-            winner_option = VoteOption.query.get(winner_option_ids[0])
-            voting_session.winner_book_id = winner_option.book_id
-        
-        # Marquer tous les livres gagnants comme sélectionnés
-        for option_id in winner_option_ids:
-            option = VoteOption.query.get(option_id)
-            winner_book = BookProposal.query.get(option.book_id)
-            winner_book.status = 'selected'
-    
+    # Déterminer les livres gagnants (en cas d'égalité, tous les ex æquo)
+    vote_tally_service.close_book_vote(voting_session)
     db.session.commit()
     flash('Le vote a été clos et le livre gagnant a été déterminé.', 'success')
     return redirect(url_for('admin.votes'))
@@ -313,10 +304,11 @@ def create_reading():
 @login_required
 @admin_required
 def readings():
-    current_readings = ReadingSession.query.filter_by(status='current').all()
-    upcoming_readings = ReadingSession.query.filter_by(status='upcoming').order_by(ReadingSession.start_date.asc()).all()
-    completed_readings = ReadingSession.query.filter_by(status='completed').order_by(ReadingSession.end_date.desc()).all()
-    archived_readings = ReadingSession.query.filter_by(status='archived').order_by(ReadingSession.end_date.desc()).all()
+    listing = ReadingSession.query.options(*READING_ADMIN)
+    current_readings = listing.filter_by(status='current').all()
+    upcoming_readings = listing.filter_by(status='upcoming').order_by(ReadingSession.start_date.asc()).all()
+    completed_readings = listing.filter_by(status='completed').order_by(ReadingSession.end_date.desc()).all()
+    archived_readings = listing.filter_by(status='archived').order_by(ReadingSession.end_date.desc()).all()
     csrf_form = CSRFForm()  # Formulaire pour le token CSRF
     
     return render_template('admin/readings.html',
@@ -396,7 +388,7 @@ def edit_reading(reading_id):
         reading_session.description = form.description.data
         
         # Mettre à jour automatiquement le statut basé sur les nouvelles dates
-        update_reading_status(reading_session)
+        reading_session.update_status()
         
         db.session.commit()
         flash('Session de lecture mise à jour avec succès!', 'success')
@@ -410,40 +402,12 @@ def edit_reading(reading_id):
     
     return render_template('admin/edit_reading.html', form=form, reading=reading_session)
 
-def update_reading_status(reading_session):
-    """Met à jour automatiquement le statut d'une session de lecture basé sur la date actuelle"""
-    from datetime import date
-    today = date.today()
-    
-    # Convertir les dates en objets date si ce sont des datetime
-    start_date = reading_session.start_date.date() if hasattr(reading_session.start_date, 'date') else reading_session.start_date
-    end_date = reading_session.end_date.date() if hasattr(reading_session.end_date, 'date') else reading_session.end_date
-    
-    # Ne pas changer le statut si la lecture est déjà terminée ou archivée
-    if reading_session.status in ['completed', 'archived']:
-        return
-    
-    if start_date > today:
-        reading_session.status = 'upcoming'
-    elif start_date <= today <= end_date:
-        reading_session.status = 'current'
-    elif end_date < today:
-        reading_session.status = 'completed'
-
 @admin_bp.route('/readings/update-statuses')
 @login_required
 @admin_required
 def update_all_reading_statuses():
     """Route pour mettre à jour manuellement tous les statuts des sessions de lecture"""
-    readings = ReadingSession.query.filter(ReadingSession.status.in_(['upcoming', 'current'])).all()
-    updated_count = 0
-    
-    for reading in readings:
-        old_status = reading.status
-        update_reading_status(reading)
-        if reading.status != old_status:
-            updated_count += 1
-    
+    updated_count = ReadingSession.update_all_statuses()
     db.session.commit()
     flash(f'{updated_count} session(s) de lecture mise(s) à jour.', 'success')
     return redirect(url_for('admin.readings'))
@@ -4,13 +4,24 @@ Routes API pour BiblioRuche
 Endpoints JSON pour les fonctionnalités AJAX
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request
 from flask_login import login_required, current_user
+from app import db, limiter
 from app.services.open_library import get_open_library_service
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Intervalle des commentaires keep-alive du flux SSE (sous le proxy_read_timeout nginx)
+STREAM_KEEPALIVE = 15  # secondes
+
+# Durée maximale d'une connexion SSE : le navigateur se reconnecte ensuite
+STREAM_MAX_DURATION = 300  # secondes
+
+# Délai de reconnexion suggéré au navigateur
+STREAM_RETRY_MS = 5000
+
 bp = Blueprint('api', __name__, url_prefix='/api')
 
 
@@ -138,31 +149,10 @@ def stats_overview():
     Returns:
         JSON avec statistiques globales
     """
-    from app.models import User, BookProposal, ReadingSession, Badge, UserBadge
-    from app import db
+    from app.services.statistics import statistics_service
     
     try:
-        stats = {
-            'users': {
-                'total': User.query.count(),
-                'active': User.query.count()  # Tous considérés actifs
-            },
-            'books': {
-                'total': BookProposal.query.count(),
-                'approved': BookProposal.query.filter_by(status='approved').count(),
-                'pending': BookProposal.query.filter_by(status='pending').count(),
-                'completed': BookProposal.query.filter_by(status='completed').count()
-            },
-            'readings': {
-                'total': ReadingSession.query.count(),
-                'in_progress': ReadingSession.query.filter_by(status='current').count(),
-                'completed': ReadingSession.query.filter_by(status='completed').count()
-            },
-            'badges': {
-                'total': Badge.query.count(),
-                'awarded': UserBadge.query.count()
-            }
-        }
+        stats = statistics_service.get_overview()
         
         return jsonify({
             'success': True,
@@ -235,6 +225,7 @@ def get_notifications():
         JSON avec liste de notifications
     """
     from app.models import Notification
+    from app.services.notifications import notification_service
     
     limit = request.args.get('limit', 20, type=int)
     unread_only = request.args.get('unread_only', 'false').lower() == 'true'
@@ -253,16 +244,7 @@ def get_notifications():
         return jsonify({
             'success': True,
             'unread_count': Notification.get_unread_count(current_user.id),
-            'notifications': [{
-                'id': n.id,
-                'type': n.type,
-                'title': n.title,
-                'message': n.message,
-                'link': n.link,
-                'icon': n.icon,
-                'is_read': n.is_read,
-                'created_at': n.created_at.isoformat()
-            } for n in notifications]
+            'notifications': [notification_service.serialize(n) for n in notifications]
         })
     except Exception as e:
         logger.error(f"Error fetching notifications: {e}")
@@ -335,3 +317,96 @@ def mark_all_notifications_read():
     except Exception as e:
         logger.error(f"Error marking all notifications as read: {e}")
         return jsonify({'success': False, 'error': 'Failed'}), 500
+
+
+# =====================================================
+# FLUX TEMPS RÉEL (Server-Sent Events)
+# =====================================================
+
+def _can_follow_vote(kind, session_id):
+    """Les résultats en direct suivent les règles d'affichage des pages de vote"""
+    from app.models import VotingSession, Vote, FilmVotingSession
+    
+    if kind == 'book':
+        session = db.session.get(VotingSession, session_id)
+        if session is None:
+            return False
+        if session.status == 'closed' or (current_user.is_authenticated and current_user.is_admin):
+            return True
+        return current_user.is_authenticated and db.session.query(
+            Vote.query.filter_by(user_id=current_user.id, voting_session_id=session_id).exists()
+        ).scalar()
+    if kind == 'film':
+        session = db.session.get(FilmVotingSession, session_id)
+        if session is None:
+            return False
+        return session.status == 'closed' or (current_user.is_authenticated and current_user.is_admin)
+    return False
+
+
+@bp.route('/stream')
+@limiter.exempt
+def stream():
+    """
+    Flux Server-Sent Events
+    
+    Événements :
+        notification: nouvelle notification et compteur de non lues (utilisateur connecté)
+        unread_count: compteur de non lues modifié
+        tally: résultats d'une session de vote
+    
+    Query params:
+        vote: session de vote suivie, 'book:<id>' ou 'film:<id>'
+    
+    Désactivé (404) sans STREAM_ENABLED : les pages se rabattent sur le
+    rafraîchissement périodique.
+    """
+    if not current_app.config.get('STREAM_ENABLED'):
+        return jsonify({'success': False, 'error': 'Stream disabled'}), 404
+    
+    from app.models import Notification
+    from app.services.events import format_sse, get_event_broker, user_channel, vote_channel
+    from app.services.votes import vote_tally_service
+    
+    channels = []
+    initial = []
+    
+    if current_user.is_authenticated:
+        channels.append(user_channel(current_user.id))
+        initial.append(('unread_count', {'unread_count': Notification.get_unread_count(current_user.id)}))
+    
+    vote = request.args.get('vote')
+    if vote:
+        kind, _, session_id = vote.partition(':')
+        if not session_id.isdigit() or not _can_follow_vote(kind, int(session_id)):
+            return jsonify({'success': False, 'error': 'Vote not available'}), 403
+        channels.append(vote_channel(kind, int(session_id)))
+        initial.append(('tally', vote_tally_service.tally_event(kind, int(session_id))))
+    
+    if not channels:
+        return jsonify({'success': False, 'error': 'Nothing to stream'}), 400
+    
+    # La connexion reste ouverte : rendre la connexion à la base tout de suite
+    db.session.remove()
+    subscription = get_event_broker().subscribe(channels)
+    
+    def generate():
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            for event, data in initial:
+                yield format_sse(event, data)
+            
+            deadline = time.monotonic() + STREAM_MAX_DURATION
+            while time.monotonic() < deadline:
+                message = subscription.get(timeout=STREAM_KEEPALIVE)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield format_sse(message['event'], message['data'])
+        finally:
+            subscription.close()
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
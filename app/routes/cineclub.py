@@ -9,10 +9,14 @@ from datetime import datetime, timezone
 from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
 from flask_login import login_required, current_user
 from app import db, limiter
+from app.badge_manager import BadgeManager
 from app.models import (
     CineClubSettings, Film, FilmVotingSession, FilmVoteOption, 
     FilmVote, ViewingSession, ViewingParticipation, BookProposal
 )
+from app.services.loading import FILM_VOTE_COUNTS, FILM_WITH_BOOK, VIEWING_CARD
+from app.services.search import search_index
+from app.services.votes import vote_tally_service
 
 cineclub_bp = Blueprint('cineclub', __name__, url_prefix='/cineclub')
 
@@ -56,17 +60,17 @@ def index():
     settings = CineClubSettings.get_settings()
     
     # Votes actifs
-    active_votes = FilmVotingSession.query.filter_by(status='active').order_by(
+    active_votes = FilmVotingSession.query.options(*FILM_VOTE_COUNTS).filter_by(status='active').order_by(
         FilmVotingSession.end_date
     ).all()
     
     # Séances de visionnage à venir
-    upcoming_viewings = ViewingSession.query.filter(
+    upcoming_viewings = ViewingSession.query.options(*VIEWING_CARD).filter(
         ViewingSession.status.in_(['upcoming', 'live'])
     ).order_by(ViewingSession.scheduled_date).limit(5).all()
     
     # Films récemment ajoutés
-    recent_films = Film.query.filter_by(status='approved').order_by(
+    recent_films = Film.query.options(*FILM_WITH_BOOK).filter_by(status='approved').order_by(
         Film.created_at.desc()
     ).limit(6).all()
     
@@ -98,18 +102,19 @@ def list_films():
     if genre:
         query = query.filter(Film.genre == genre)
     
+    # Recherche plein texte triée par pertinence (ILIKE en repli)
+    search_hits = None
     if search:
-        search_term = f'%{search}%'
-        query = query.filter(
-            db.or_(
-                Film.title.ilike(search_term),
-                Film.director.ilike(search_term)
-            )
-        )
+        query, search_hits = search_index.apply(query, 'film', search)
+    if search_hits is not None:
+        query = query.order_by(search_hits.c.score.desc())
     
     films = query.order_by(Film.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
+    snippets = {}
+    if search:
+        snippets = search_index.snippets('film', search, [item.id for item in films.items])
     
     # Genres uniques pour le filtre
     genres = db.session.query(Film.genre).filter(
@@ -122,7 +127,8 @@ def list_films():
                           genres=genres,
                           current_genre=genre,
                           current_status=status_filter,
-                          search=search)
+                          search=search,
+                          snippets=snippets)
 
 
 @cineclub_bp.route('/film/<int:film_id>')
@@ -202,11 +208,12 @@ def propose_film():
 @cineclub_enabled
 def list_votes():
     """Liste des sessions de vote"""
-    active_votes = FilmVotingSession.query.filter_by(status='active').order_by(
+    listing = FilmVotingSession.query.options(*FILM_VOTE_COUNTS)
+    active_votes = listing.filter_by(status='active').order_by(
         FilmVotingSession.end_date
     ).all()
     
-    closed_votes = FilmVotingSession.query.filter_by(status='closed').order_by(
+    closed_votes = listing.filter_by(status='closed').order_by(
         FilmVotingSession.end_date.desc()
     ).limit(10).all()
     
@@ -231,7 +238,8 @@ def vote_detail(vote_id):
     
     return render_template('cineclub/vote_detail.html',
                           vote_session=vote_session,
-                          user_vote=user_vote)
+                          user_vote=user_vote,
+                          tally=vote_tally_service.tally('film', vote_id))
 
 
 @cineclub_bp.route('/vote/<int:vote_id>/submit', methods=['POST'])
@@ -246,16 +254,6 @@ def submit_vote(vote_id):
         flash('Cette session de vote est fermée.', 'warning')
         return redirect(url_for('cineclub.vote_detail', vote_id=vote_id))
     
-    # Vérifier si déjà voté
-    existing_vote = FilmVote.query.filter_by(
-        user_id=current_user.id,
-        voting_session_id=vote_id
-    ).first()
-    
-    if existing_vote:
-        flash('Vous avez déjà voté pour cette session.', 'warning')
-        return redirect(url_for('cineclub.vote_detail', vote_id=vote_id))
-    
     option_id = request.form.get('vote_option_id', type=int)
     if not option_id:
         flash('Veuillez sélectionner un film.', 'danger')
@@ -271,15 +269,12 @@ def submit_vote(vote_id):
         flash('Option de vote invalide.', 'danger')
         return redirect(url_for('cineclub.vote_detail', vote_id=vote_id))
     
-    # Créer le vote
-    vote = FilmVote(
-        user_id=current_user.id,
-        voting_session_id=vote_id,
-        vote_option_id=option_id
-    )
+    # Vote unique par upsert : un second vote (même simultané) est ignoré
+    if not vote_tally_service.cast_film_vote(current_user.id, vote_id, option_id):
+        flash('Vous avez déjà voté pour cette session.', 'warning')
+        return redirect(url_for('cineclub.vote_detail', vote_id=vote_id))
     
-    db.session.add(vote)
-    db.session.commit()
+    BadgeManager.handle_event_async(current_user.id, 'film_vote_cast')
     
     flash('Votre vote a été enregistré !', 'success')
     return redirect(url_for('cineclub.vote_detail', vote_id=vote_id))
@@ -293,11 +288,12 @@ def submit_vote(vote_id):
 @cineclub_enabled
 def list_viewings():
     """Liste des séances de visionnage"""
-    upcoming = ViewingSession.query.filter(
+    listing = ViewingSession.query.options(*VIEWING_CARD)
+    upcoming = listing.filter(
         ViewingSession.status.in_(['upcoming', 'live'])
     ).order_by(ViewingSession.scheduled_date).all()
     
-    past = ViewingSession.query.filter_by(status='completed').order_by(
+    past = listing.filter_by(status='completed').order_by(
         ViewingSession.scheduled_date.desc()
     ).limit(10).all()
     
@@ -344,6 +340,8 @@ def register_viewing(viewing_id):
     db.session.add(participation)
     db.session.commit()
     
+    BadgeManager.handle_event(current_user.id, 'viewing_joined')
+    
     flash('Vous êtes inscrit à la séance !', 'success')
     return redirect(url_for('cineclub.viewing_detail', viewing_id=viewing_id))
 
@@ -419,6 +417,8 @@ def approve_film(film_id):
     film.status = 'approved'
     db.session.commit()
     
+    BadgeManager.handle_event(film.proposed_by, 'film_approved')
+    
     flash(f'Film "{film.title}" approuvé !', 'success')
     return redirect(url_for('cineclub.admin_dashboard'))
 
@@ -565,20 +565,8 @@ def close_vote(vote_id):
         flash('Cette session est déjà fermée.', 'warning')
         return redirect(url_for('cineclub.admin_dashboard'))
     
-    # Trouver le gagnant
-    winner_option = None
-    max_votes = 0
-    
-    for option in vote_session.options:
-        vote_count = option.get_vote_count()
-        if vote_count > max_votes:
-            max_votes = vote_count
-            winner_option = option
-    
-    vote_session.status = 'closed'
-    if winner_option:
-        vote_session.winner_film_id = winner_option.film_id
-        winner_option.film.status = 'selected'
+    # Trouver le gagnant (premier ex æquo, aucun s'il n'y a pas de vote)
+    vote_tally_service.close_film_vote(vote_session)
     
     db.session.commit()
     
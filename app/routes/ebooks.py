@@ -5,13 +5,21 @@ Upload EPUB par admin, téléchargement par utilisateurs connectés
 """
 
 import os
-import uuid
+import unicodedata
 from functools import wraps
+from urllib.parse import quote
 from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, current_app, abort
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
 from app import db, limiter
 from app.models import Ebook, BookProposal
+from app.services.covers import InvalidCoverError, cover_service
+from app.services.downloads import get_download_counter, record_download
+from app.services.ebook_import import read_epub_metadata
+from app.services.ebook_storage import EbookValidationError, ebook_storage
+from app.services.metrics import record_ebook_bytes
+from app.services.search import search_index
 
 ebooks_bp = Blueprint('ebooks', __name__, url_prefix='/ebooks')
 
@@ -21,8 +29,9 @@ ebooks_bp = Blueprint('ebooks', __name__, url_prefix='/ebooks')
 
 ALLOWED_EBOOK_EXTENSIONS = {'epub'}
 ALLOWED_COVER_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-MAX_EBOOK_SIZE = 50 * 1024 * 1024  # 50 MB
 MAX_COVER_SIZE = 5 * 1024 * 1024   # 5 MB
+EPUB_MIMETYPE = 'application/epub+zip'
+COVER_MAX_AGE = 365 * 24 * 3600  # Vignettes aux noms immuables : 1 an
 
 
 def allowed_ebook_file(filename):
@@ -35,33 +44,87 @@ def allowed_cover_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_COVER_EXTENSIONS
 
 
-def validate_epub_content(file_stream):
-    """
-    Valide le contenu du fichier EPUB (magic bytes)
-    Les fichiers EPUB sont des archives ZIP qui commencent par PK
-    """
-    header = file_stream.read(4)
-    file_stream.seek(0)  # Remettre au début
-    
-    # EPUB/ZIP magic bytes: PK\x03\x04
-    if header[:2] != b'PK':
-        return False
-    
-    return True
-
-
 def get_upload_folder():
     """Retourne le chemin du dossier d'upload des ebooks"""
-    upload_folder = os.path.join(current_app.instance_path, 'ebooks')
-    os.makedirs(upload_folder, exist_ok=True)
-    return upload_folder
+    return ebook_storage.folder()
 
 
 def get_covers_folder():
     """Retourne le chemin du dossier des couvertures"""
-    covers_folder = os.path.join(current_app.instance_path, 'covers')
-    os.makedirs(covers_folder, exist_ok=True)
-    return covers_folder
+    return cover_service.folder()
+
+
+def store_cover_file(cover_file):
+    """Enregistre une couverture envoyée, retourne (fichier, empreinte) ou (None, None)"""
+    if not cover_file or cover_file.filename == '' or not allowed_cover_file(cover_file.filename):
+        return None, None
+    try:
+        return cover_service.store(cover_file.stream, cover_file.filename.rsplit('.', 1)[1])
+    except InvalidCoverError as e:
+        flash(str(e), 'warning')
+        return None, None
+
+
+def redirect_to_duplicate(existing):
+    """Renvoie vers l'ebook qui contient déjà le fichier envoyé"""
+    flash(f'Ce fichier EPUB est déjà dans la bibliothèque : "{existing.title}".', 'warning')
+    return redirect(url_for('ebooks.edit_ebook', ebook_id=existing.id))
+
+
+@ebooks_bp.app_template_global()
+def cover_url(ebook, size='M', fmt='jpg'):
+    """URL de la couverture d'un ebook (vignette immuable si disponible)"""
+    if ebook.cover_hash and cover_service.available:
+        return url_for('ebooks.cover_thumbnail', name=cover_service.thumbnail_name(ebook.cover_hash, size, fmt))
+    return url_for('ebooks.get_cover', ebook_id=ebook.id)
+
+
+def content_disposition(download_name):
+    """Paramètres Content-Disposition (nom ASCII + nom UTF-8 RFC 5987)"""
+    try:
+        download_name.encode('ascii')
+        return {'filename': download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='')}"}
+
+
+def send_ebook_file(filepath, filename, download_name):
+    """
+    Envoie un fichier EPUB selon EBOOK_DELIVERY
+
+    - 'x-accel' : nginx sert le fichier depuis sa location interne
+      (EBOOK_ACCEL_LOCATION), le worker est libéré immédiatement ;
+    - 'x-sendfile' : Apache/lighttpd via USE_X_SENDFILE ;
+    - 'app' : Flask envoie le fichier (Range, ETag/If-None-Match).
+    """
+    if current_app.config.get('EBOOK_DELIVERY') == 'x-accel':
+        response = current_app.response_class(mimetype=EPUB_MIMETYPE)
+        response.headers['X-Accel-Redirect'] = current_app.config['EBOOK_ACCEL_LOCATION'] + quote(filename)
+        response.headers.set('Content-Disposition', 'attachment', **content_disposition(download_name))
+        response.headers['Cache-Control'] = 'private'
+        return response
+
+    response = send_file(
+        filepath,
+        mimetype=EPUB_MIMETYPE,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        max_age=0
+    )
+    # Annoncer les reprises possibles (werkzeug ne l'indique que sur les réponses 206)
+    response.accept_ranges = 'bytes'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def is_new_download(response):
+    """Vrai sauf pour un 304 ou la reprise d'un téléchargement (Range après le début)"""
+    if response.status_code == 304:
+        return False
+    byte_range = request.range
+    return byte_range is None or byte_range.ranges[0][0] in (0, None)
 
 
 def admin_required(f):
@@ -121,18 +184,19 @@ def list_ebooks():
     if genre:
         query = query.filter(Ebook.genre == genre)
     
+    # Recherche plein texte triée par pertinence (ILIKE en repli)
+    search_hits = None
     if search:
-        search_term = f'%{search}%'
-        query = query.filter(
-            db.or_(
-                Ebook.title.ilike(search_term),
-                Ebook.author.ilike(search_term)
-            )
-        )
+        query, search_hits = search_index.apply(query, 'ebook', search)
+    if search_hits is not None:
+        query = query.order_by(search_hits.c.score.desc())
     
     ebooks = query.order_by(Ebook.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
+    snippets = {}
+    if search:
+        snippets = search_index.snippets('ebook', search, [item.id for item in ebooks.items])
     
     # Récupérer tous les genres uniques pour le filtre
     genres = db.session.query(Ebook.genre).filter(
@@ -145,7 +209,8 @@ def list_ebooks():
                           ebooks=ebooks,
                           genres=genres,
                           current_genre=genre,
-                          search=search)
+                          search=search,
+                          snippets=snippets)
 
 
 @ebooks_bp.route('/<int:ebook_id>')
@@ -175,15 +240,17 @@ def download_ebook(ebook_id):
         flash('Fichier non trouvé.', 'danger')
         return redirect(url_for('ebooks.list_ebooks'))
     
-    # Incrémenter le compteur de téléchargements
-    ebook.download_count += 1
-    db.session.commit()
+    response = send_ebook_file(filepath, ebook.filename, ebook.original_filename)
     
-    return send_file(
-        filepath,
-        as_attachment=True,
-        download_name=ebook.original_filename
-    )
+    # Compter le téléchargement (reporté en base par lots)
+    if is_new_download(response):
+        record_download(ebook.id)
+    
+    # Octets servis (x-accel / x-sendfile : taille du fichier confié au serveur web)
+    if response.status_code != 304:
+        record_ebook_bytes(current_app.config['EBOOK_DELIVERY'], response.content_length or os.path.getsize(filepath))
+    
+    return response
 
 
 @ebooks_bp.route('/cover/<int:ebook_id>')
@@ -195,12 +262,42 @@ def get_cover(ebook_id):
         # Retourner une image par défaut
         return redirect(url_for('static', filename='img/default_cover.png'))
     
+    if ebook.cover_hash and cover_service.available:
+        return redirect(cover_url(ebook, 'L'))
+    
     filepath = os.path.join(get_covers_folder(), ebook.cover_filename)
     
     if not os.path.exists(filepath):
         return redirect(url_for('static', filename='img/default_cover.png'))
     
-    return send_file(filepath)
+    return send_file(filepath, max_age=3600)
+
+
+@ebooks_bp.route('/covers/<name>')
+def cover_thumbnail(name):
+    """Vignette de couverture <sha256>-<S|M|L>.<webp|jpg>, générée à la première demande"""
+    parsed = cover_service.parse_thumbnail_name(name)
+    if parsed is None:
+        abort(404)
+    cover_hash, size, fmt = parsed
+    
+    path = os.path.join(cover_service.thumbnails_folder(), name)
+    if not os.path.exists(path):
+        ebook = Ebook.query.filter_by(cover_hash=cover_hash).first()
+        path = cover_service.thumbnail_path(cover_hash, size, fmt, ebook.cover_filename if ebook else None)
+        if path is None:
+            abort(404)
+    
+    response = send_file(
+        path,
+        mimetype='image/webp' if fmt == 'webp' else 'image/jpeg',
+        etag=name,
+        max_age=COVER_MAX_AGE,
+        conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 # =============================================================================
@@ -221,7 +318,8 @@ def admin_ebooks():
     
     # Stats
     total_ebooks = Ebook.query.count()
-    total_downloads = db.session.query(db.func.sum(Ebook.download_count)).scalar() or 0
+    total_downloads = (db.session.query(db.func.sum(Ebook.download_count)).scalar() or 0) \
+        + get_download_counter().pending_total()
     
     return render_template('ebooks/admin/manage_ebooks.html',
                           ebooks=ebooks,
@@ -255,51 +353,55 @@ def upload_ebook():
             flash('Seuls les fichiers EPUB sont autorisés.', 'danger')
             return redirect(request.url)
         
-        # Valider le contenu du fichier
-        if not validate_epub_content(epub_file.stream):
-            flash('Le fichier ne semble pas être un EPUB valide.', 'danger')
+        # Recopier le fichier par blocs (taille, SHA-256) et vérifier le conteneur EPUB
+        try:
+            stored = ebook_storage.store(epub_file.stream)
+        except EbookValidationError as e:
+            flash(str(e), 'danger')
             return redirect(request.url)
         
-        # Vérifier la taille
-        epub_file.seek(0, 2)  # Aller à la fin
-        file_size = epub_file.tell()
-        epub_file.seek(0)  # Revenir au début
+        existing = Ebook.query.filter_by(file_hash=stored.sha256).first()
+        if existing:
+            return redirect_to_duplicate(existing)
         
-        if file_size > MAX_EBOOK_SIZE:
-            flash(f'Le fichier est trop volumineux (max {MAX_EBOOK_SIZE // (1024*1024)} MB).', 'danger')
-            return redirect(request.url)
-        
-        # Générer un nom de fichier unique
         original_filename = secure_filename(epub_file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{original_filename}"
         
-        # Sauvegarder le fichier
-        filepath = os.path.join(get_upload_folder(), unique_filename)
-        epub_file.save(filepath)
+        # Métadonnées de l'EPUB pour les champs laissés vides
+        try:
+            metadata = read_epub_metadata(ebook_storage.path(stored.filename), stored.package_path)
+            title = request.form.get('title', '').strip() or metadata.title
+            author = request.form.get('author', '').strip() or metadata.author
+            if not title or not author:
+                raise EbookValidationError("Titre et auteur introuvables dans l'EPUB : veuillez les saisir.")
+        except EbookValidationError as e:
+            if stored.created:
+                ebook_storage.delete(stored.filename)
+            flash(str(e), 'danger')
+            return redirect(request.url)
         
-        # Gérer la couverture (optionnelle)
-        cover_filename = None
-        if 'cover_file' in request.files:
-            cover_file = request.files['cover_file']
-            if cover_file.filename != '' and allowed_cover_file(cover_file.filename):
-                cover_original = secure_filename(cover_file.filename)
-                cover_filename = f"{uuid.uuid4().hex}_{cover_original}"
-                cover_path = os.path.join(get_covers_folder(), cover_filename)
-                cover_file.save(cover_path)
+        # Gérer la couverture (optionnelle, sinon celle intégrée à l'EPUB)
+        cover_filename, cover_hash = store_cover_file(request.files.get('cover_file'))
+        if cover_filename is None and metadata.cover_data:
+            try:
+                cover_filename, cover_hash = cover_service.store(metadata.cover_data, metadata.cover_extension)
+            except InvalidCoverError:
+                pass
         
         # Créer l'entrée en base
         ebook = Ebook(
-            title=request.form.get('title', '').strip(),
-            author=request.form.get('author', '').strip(),
-            description=request.form.get('description', '').strip() or None,
-            isbn=request.form.get('isbn', '').strip() or None,
-            genre=request.form.get('genre', '').strip() or None,
-            publication_year=request.form.get('publication_year', type=int) or None,
+            title=title,
+            author=author,
+            description=request.form.get('description', '').strip() or metadata.description,
+            isbn=request.form.get('isbn', '').strip() or metadata.isbn,
+            genre=request.form.get('genre', '').strip() or metadata.genre,
+            publication_year=request.form.get('publication_year', type=int) or metadata.publication_year,
             pages_count=request.form.get('pages_count', type=int) or None,
-            filename=unique_filename,
+            filename=stored.filename,
             original_filename=original_filename,
-            file_size=file_size,
+            file_size=stored.size,
+            file_hash=stored.sha256,
             cover_filename=cover_filename,
+            cover_hash=cover_hash,
             uploaded_by=current_user.id,
             is_visible=request.form.get('is_visible') == 'on'
         )
@@ -310,7 +412,17 @@ def upload_ebook():
             ebook.book_proposal_id = book_proposal_id
         
         db.session.add(ebook)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Même fichier envoyé en parallèle : l'autre envoi a été enregistré entre-temps
+            db.session.rollback()
+            ebook_storage.delete(stored.filename)
+            cover_service.delete(cover_filename, cover_hash)
+            existing = Ebook.query.filter_by(file_hash=stored.sha256).first()
+            if existing is None:
+                raise
+            return redirect_to_duplicate(existing)
         
         flash(f'Ebook "{ebook.title}" uploadé avec succès !', 'success')
         return redirect(url_for('ebooks.admin_ebooks'))
@@ -344,22 +456,17 @@ def edit_ebook(ebook_id):
         ebook.book_proposal_id = book_proposal_id if book_proposal_id else None
         
         # Nouvelle couverture (optionnelle)
-        if 'cover_file' in request.files:
-            cover_file = request.files['cover_file']
-            if cover_file.filename != '' and allowed_cover_file(cover_file.filename):
-                # Supprimer l'ancienne couverture
-                if ebook.cover_filename:
-                    old_cover = os.path.join(get_covers_folder(), ebook.cover_filename)
-                    if os.path.exists(old_cover):
-                        os.remove(old_cover)
-                
-                cover_original = secure_filename(cover_file.filename)
-                cover_filename = f"{uuid.uuid4().hex}_{cover_original}"
-                cover_path = os.path.join(get_covers_folder(), cover_filename)
-                cover_file.save(cover_path)
-                ebook.cover_filename = cover_filename
+        old_cover = (ebook.cover_filename, ebook.cover_hash)
+        cover_filename, cover_hash = store_cover_file(request.files.get('cover_file'))
+        if cover_filename:
+            ebook.cover_filename = cover_filename
+            ebook.cover_hash = cover_hash
         
         db.session.commit()
+        
+        # Supprimer l'ancienne couverture si elle n'est plus utilisée
+        if cover_filename and old_cover[0] != cover_filename:
+            cover_service.delete(*old_cover)
         flash(f'Ebook "{ebook.title}" modifié avec succès !', 'success')
         return redirect(url_for('ebooks.admin_ebooks'))
     
@@ -373,20 +480,16 @@ def delete_ebook(ebook_id):
     """Supprimer un ebook"""
     ebook = Ebook.query.get_or_404(ebook_id)
     
-    # Supprimer les fichiers
-    epub_path = os.path.join(get_upload_folder(), ebook.filename)
-    if os.path.exists(epub_path):
-        os.remove(epub_path)
-    
-    if ebook.cover_filename:
-        cover_path = os.path.join(get_covers_folder(), ebook.cover_filename)
-        if os.path.exists(cover_path):
-            os.remove(cover_path)
-    
     title = ebook.title
+    filename = ebook.filename
+    cover = (ebook.cover_filename, ebook.cover_hash)
     db.session.delete(ebook)
     db.session.commit()
     
+    # Fichiers stockés par empreinte : supprimés s'ils ne sont plus référencés
+    ebook_storage.delete(filename)
+    cover_service.delete(*cover)
+    
     flash(f'Ebook "{title}" supprimé avec succès.', 'success')
     return redirect(url_for('ebooks.admin_ebooks'))
 
@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, Response, abort, current_app, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from app import db, limiter
-from app.models import BookProposal, VotingSession, VoteOption, Vote, ReadingSession, User, BookReview, ReadingParticipation, Badge, UserBadge
+from app.models import BookProposal, VotingSession, VoteOption, Vote, ReadingSession, User, BookReview, ReadingParticipation
 from app.badge_manager import BadgeManager
+from app.services.loading import PROPOSAL_WITH_PROPOSER, READING_CARD, VOTE_WITH_BOOKS
+from app.services.search import search_index
+from app.services.votes import vote_tally_service
 from app.forms import BookProposalForm, VoteForm, BookReviewForm
 from datetime import datetime
 import bleach
@@ -27,14 +30,34 @@ def health_check():
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
 
 
+@main_bp.route('/metrics')
+@limiter.exempt
+def metrics():
+    """Métriques au format Prometheus (à réserver au réseau interne)"""
+    from app.services.metrics import render_metrics
+    
+    if not current_app.config.get('METRICS_ENABLED'):
+        abort(404)
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    
+    payload, content_type = render_metrics()
+    return Response(payload, content_type=content_type)
+
+
 @main_bp.route('/')
 def index():
     # Récupérer les informations pour la page d'accueil
-    current_reading = ReadingSession.query.filter_by(status='current').first()
-    upcoming_reading = ReadingSession.query.filter_by(status='upcoming').order_by(ReadingSession.start_date.asc()).first()
-    active_vote = VotingSession.query.filter_by(status='active').first()
+    listing = ReadingSession.query.options(*READING_CARD)
+    current_reading = listing.filter_by(status='current').first()
+    upcoming_reading = listing.filter_by(status='upcoming').order_by(ReadingSession.start_date.asc()).first()
+    active_vote = VotingSession.query.options(*VOTE_WITH_BOOKS).filter_by(status='active').first()
+    
+    recent_proposals = BookProposal.query.options(*PROPOSAL_WITH_PROPOSER).filter_by(status='pending').order_by(BookProposal.created_at.desc()).limit(5).all()
     
-    recent_proposals = BookProposal.query.filter_by(status='pending').order_by(BookProposal.created_at.desc()).limit(5).all()
+    if current_user.is_authenticated:
+        ReadingSession.load_registrations([current_reading, upcoming_reading], current_user.id)
     
     return render_template('index.html', 
                          current_reading=current_reading,
@@ -64,7 +87,7 @@ def propose_book():
         db.session.commit()
         
         # Vérifier et attribuer des badges automatiquement
-        awarded_badges = BadgeManager.check_and_award_badges(current_user.id)
+        awarded_badges = BadgeManager.handle_event(current_user.id, 'proposal_created')
         if awarded_badges:
             badge_names = [badge.name for badge in awarded_badges]
             flash(f'🏆 Félicitations ! Vous avez gagné le(s) badge(s) : {", ".join(badge_names)}', 'success')
@@ -84,7 +107,7 @@ def books():
     search_query = request.args.get('q', '').strip()
     genre_filter = request.args.get('genre', '').strip()
     year_filter = request.args.get('year', '', type=str).strip()
-    sort_by = request.args.get('sort', 'recent')
+    sort_by = request.args.get('sort', 'relevance' if search_query else 'recent')
     
     # Construire la requête de base
     query = BookProposal.query
@@ -100,16 +123,10 @@ def books():
     elif status_filter == 'archived':
         query = query.filter_by(status='archived')
     
-    # Appliquer la recherche textuelle
+    # Appliquer la recherche textuelle (index plein texte, ILIKE en repli)
+    search_hits = None
     if search_query:
-        search_pattern = f'%{search_query}%'
-        query = query.filter(
-            db.or_(
-                BookProposal.title.ilike(search_pattern),
-                BookProposal.author.ilike(search_pattern),
-                BookProposal.description.ilike(search_pattern)
-            )
-        )
+        query, search_hits = search_index.apply(query, 'book', search_query)
     
     # Filtrer par genre
     if genre_filter:
@@ -128,14 +145,24 @@ def books():
     elif sort_by == 'author':
         query = query.order_by(BookProposal.author.asc())
     elif sort_by == 'rating':
-        # On ne peut pas trier par rating calculé directement, on garde recent
-        query = query.order_by(BookProposal.created_at.desc())
+        query = query.order_by(
+            BookProposal.avg_rating.desc(),
+            BookProposal.rating_count.desc(),
+            BookProposal.created_at.desc()
+        )
+    elif sort_by == 'relevance' and search_hits is not None:
+        query = query.order_by(search_hits.c.score.desc(), BookProposal.created_at.desc())
     else:  # recent (default)
         query = query.order_by(BookProposal.created_at.desc())
     
     # Pagination
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
+    # Extraits surlignés pour les résultats affichés
+    snippets = {}
+    if search_query:
+        snippets = search_index.snippets('book', search_query, [book.id for book in pagination.items])
+    
     # Compter les livres par statut pour les badges
     counts = {
         'all': BookProposal.query.count(),
@@ -164,7 +191,8 @@ def books():
                          current_status=status_filter,
                          counts=counts,
                          genres=genres,
-                         years=years)
+                         years=years,
+                         snippets=snippets)
 
 @main_bp.route('/vote/<int:vote_id>')
 def vote_detail(vote_id):
@@ -192,24 +220,15 @@ def vote_detail(vote_id):
     results = []
     
     if show_results:
-        total_votes = Vote.query.filter_by(voting_session_id=vote_id).count()
+        # Comptage groupé (et votants pour les admins), mis en cache par session
+        with_voters = current_user.is_authenticated and current_user.is_admin
+        tally = vote_tally_service.tally('book', vote_id, with_voters=with_voters)
         for option in voting_session.books:
-            vote_count = option.get_vote_count()
-            percentage = (vote_count / total_votes * 100) if total_votes > 0 else 0
-              # Récupérer les votants pour les admins
-            voters = []
-            if current_user.is_authenticated and current_user.is_admin:
-                option_votes = Vote.query.filter_by(
-                    voting_session_id=vote_id,
-                    vote_option_id=option.id
-                ).all()
-                voters = [vote.voter for vote in option_votes]
-            
             results.append({
                 'option': option,
-                'count': vote_count,
-                'percentage': percentage,
-                'voters': voters
+                'count': tally.count(option.id),
+                'percentage': tally.percentage(option.id),
+                'voters': tally.voters_for(option.id)
             })
         results.sort(key=lambda x: x['count'], reverse=True)
     
@@ -233,37 +252,24 @@ def submit_vote(vote_id):
         flash('Ce vote a expiré.', 'error')
         return redirect(url_for('main.vote_detail', vote_id=vote_id))
     
+    # Choix du formulaire en une requête (pas de chargement livre par livre)
     form = VoteForm()
-    form.vote_option_ids.choices = [(option.id, f"{option.book.title} par {option.book.author}") 
-                                   for option in voting_session.books]
+    form.vote_option_ids.choices = [
+        (option_id, f"{title} par {author}")
+        for option_id, title, author in db.session.query(
+            VoteOption.id, BookProposal.title, BookProposal.author
+        ).join(BookProposal, BookProposal.id == VoteOption.book_id).filter(
+            VoteOption.voting_session_id == vote_id
+        ).all()
+    ]
     
     if form.validate_on_submit():
-        # Supprimer tous les votes existants de l'utilisateur pour cette session
-        existing_votes = Vote.query.filter_by(
-            user_id=current_user.id,
-            voting_session_id=vote_id
-        ).all()
+        # Remplacer les votes de l'utilisateur en une transaction (DELETE + INSERT en masse)
+        vote_count = vote_tally_service.cast_book_votes(current_user.id, vote_id, form.vote_option_ids.data)
         
-        for vote in existing_votes:
-            db.session.delete(vote)
-          # Créer les nouveaux votes
-        for option_id in form.vote_option_ids.data:
-            new_vote = Vote(
-                user_id=current_user.id,
-                voting_session_id=vote_id,
-                vote_option_id=option_id
-            )
-            db.session.add(new_vote)
-        
-        db.session.commit()
+        # Badges évalués en tâche de fond (notification si nouveau badge)
+        BadgeManager.handle_event_async(current_user.id, 'vote_cast')
         
-        # Vérifier et attribuer des badges pour les votes
-        awarded_badges = BadgeManager.check_and_award_badges(current_user.id)
-        if awarded_badges:
-            badge_names = [badge.name for badge in awarded_badges]
-            flash(f'🏆 Félicitations ! Vous avez gagné le(s) badge(s) : {", ".join(badge_names)}', 'success')
-        
-        vote_count = len(form.vote_option_ids.data)
         if vote_count == 1:
             flash('Votre vote a été enregistré!', 'success')
         else:
@@ -275,10 +281,14 @@ def submit_vote(vote_id):
 
 @main_bp.route('/readings')
 def readings():
-    current_readings = ReadingSession.query.filter_by(status='current').all()
-    upcoming_readings = ReadingSession.query.filter_by(status='upcoming').order_by(ReadingSession.start_date.asc()).all()
-    completed_readings = ReadingSession.query.filter_by(status='completed').order_by(ReadingSession.end_date.desc()).limit(10).all()
-    archived_readings = ReadingSession.query.filter_by(status='archived').order_by(ReadingSession.end_date.desc()).all()
+    listing = ReadingSession.query.options(*READING_CARD)
+    current_readings = listing.filter_by(status='current').all()
+    upcoming_readings = listing.filter_by(status='upcoming').order_by(ReadingSession.start_date.asc()).all()
+    completed_readings = listing.filter_by(status='completed').order_by(ReadingSession.end_date.desc()).limit(10).all()
+    archived_readings = listing.filter_by(status='archived').order_by(ReadingSession.end_date.desc()).all()
+    
+    if current_user.is_authenticated:
+        ReadingSession.load_registrations(current_readings + upcoming_readings, current_user.id)
     
     return render_template('readings.html',
                          current_readings=current_readings,
@@ -355,7 +365,8 @@ def add_review(book_id):
     
     if form.validate_on_submit():
         if existing_review:
-            # Update existing review            existing_review.rating = form.rating.data
+            # Update existing review
+            existing_review.rating = form.rating.data
             existing_review.comment = form.comment.data
             existing_review.updated_at = datetime.now()
             flash('Votre avis a été mis à jour avec succès!', 'success')
@@ -373,7 +384,7 @@ def add_review(book_id):
         db.session.commit()
         
         # Vérifier et attribuer des badges pour les avis
-        awarded_badges = BadgeManager.check_and_award_badges(current_user.id)
+        awarded_badges = BadgeManager.handle_event(current_user.id, 'review_added')
         if awarded_badges:
             badge_names = [badge.name for badge in awarded_badges]
             flash(f'🏆 Félicitations ! Vous avez gagné le(s) badge(s) : {", ".join(badge_names)}', 'success')
@@ -405,7 +416,7 @@ def register_for_reading(reading_id):
         db.session.commit()
         
         # Vérifier et attribuer des badges pour les lectures
-        awarded_badges = BadgeManager.check_and_award_badges(current_user.id)
+        awarded_badges = BadgeManager.handle_event(current_user.id, 'reading_joined')
         if awarded_badges:
             badge_names = [badge.name for badge in awarded_badges]
             flash(f'🏆 Félicitations ! Vous avez gagné le(s) badge(s) : {", ".join(badge_names)}', 'success')
@@ -495,139 +506,6 @@ def my_profile():
 @main_bp.route('/stats')
 def statistics():
     """Page des statistiques publiques"""
-    from sqlalchemy import func
-    from datetime import datetime, timedelta
-    
-    # Stats générales
-    stats = {
-        'users': {
-            'total': User.query.count(),
-            'active': User.query.filter(User.created_at >= datetime.utcnow() - timedelta(days=30)).count()
-        },
-        'books': {
-            'total': BookProposal.query.count(),
-            'approved': BookProposal.query.filter_by(status='approved').count(),
-            'pending': BookProposal.query.filter_by(status='pending').count(),
-            'completed': BookProposal.query.filter_by(status='completed').count()
-        },
-        'readings': {
-            'total': ReadingSession.query.count(),
-            'in_progress': ReadingSession.query.filter_by(status='current').count(),
-            'completed': ReadingSession.query.filter_by(status='completed').count()
-        },
-        'badges': {
-            'total': Badge.query.count(),
-            'awarded': UserBadge.query.count()
-        }
-    }
+    from app.services.statistics import statistics_service
     
-    # Stats des livres pour le graphique
-    book_stats = {
-        'approved': stats['books']['approved'],
-        'pending': stats['books']['pending'],
-        'reading': ReadingSession.query.filter_by(status='current').count(),
-        'completed': stats['books']['completed']
-    }
-    
-    # Activité mensuelle (6 derniers mois)
-    months = []
-    proposals_data = []
-    participations_data = []
-    
-    for i in range(5, -1, -1):
-        month_start = datetime.utcnow().replace(day=1) - timedelta(days=i*30)
-        month_end = month_start + timedelta(days=30)
-        
-        month_name = month_start.strftime('%b')
-        months.append(month_name)
-        
-        proposals_count = BookProposal.query.filter(
-            BookProposal.created_at >= month_start,
-            BookProposal.created_at < month_end
-        ).count()
-        proposals_data.append(proposals_count)
-        
-        participations_count = ReadingParticipation.query.filter(
-            ReadingParticipation.joined_at >= month_start,
-            ReadingParticipation.joined_at < month_end
-        ).count()
-        participations_data.append(participations_count)
-    
-    activity_data = {
-        'labels': months,
-        'proposals': proposals_data,
-        'participations': participations_data
-    }
-    
-    # Top contributeurs
-    top_contributors = db.session.query(
-        User,
-        (func.count(BookProposal.id) * 10 + 
-         func.count(Vote.id) * 2 +
-         func.count(ReadingParticipation.id) * 5).label('contribution_score')
-    ).outerjoin(
-        BookProposal, User.id == BookProposal.proposed_by
-    ).outerjoin(
-        Vote, User.id == Vote.user_id
-    ).outerjoin(
-        ReadingParticipation, User.id == ReadingParticipation.user_id
-    ).group_by(User.id).order_by(
-        db.desc('contribution_score')
-    ).limit(10).all()
-    
-    # Ajouter le score au user pour le template
-    top_contributors_with_scores = []
-    for user, score in top_contributors:
-        user.contribution_score = score
-        top_contributors_with_scores.append(user)
-    
-    # Genres populaires
-    genre_stats = db.session.query(
-        BookProposal.genre,
-        func.count(BookProposal.id).label('count')
-    ).filter(
-        BookProposal.genre != None,
-        BookProposal.genre != ''
-    ).group_by(BookProposal.genre).order_by(
-        db.desc('count')
-    ).limit(6).all()
-    
-    max_genre_count = genre_stats[0][1] if genre_stats else 1
-    popular_genres = [
-        {
-            'name': genre or 'Non classé',
-            'count': count,
-            'percentage': int((count / max_genre_count) * 100)
-        }
-        for genre, count in genre_stats
-    ]
-    
-    # Badges les plus rares
-    total_users = User.query.count() or 1
-    badge_stats = db.session.query(
-        Badge,
-        func.count(UserBadge.id).label('owners_count')
-    ).outerjoin(
-        UserBadge, Badge.id == UserBadge.badge_id
-    ).group_by(Badge.id).order_by(
-        'owners_count'
-    ).limit(6).all()
-    
-    rare_badges = [
-        {
-            'name': badge.name,
-            'icon': badge.icon,
-            'color': badge.color or '#FFD700',
-            'owners_count': count,
-            'rarity': round((count / total_users) * 100, 1)
-        }
-        for badge, count in badge_stats
-    ]
-    
-    return render_template('stats.html',
-                         stats=stats,
-                         book_stats=book_stats,
-                         activity_data=activity_data,
-                         top_contributors=top_contributors_with_scores,
-                         popular_genres=popular_genres,
-                         rare_badges=rare_badges)
+    return render_template('stats.html', **statistics_service.get_page_stats())
@@ -3,12 +3,27 @@
 Services BiblioRuche
 """
 
+from app.services.covers import CoverService, cover_service
+from app.services.ebook_storage import EbookStorage, ebook_storage
 from app.services.open_library import OpenLibraryService, get_open_library_service
 from app.services.notifications import NotificationService, notification_service
+from app.services.statistics import StatisticsService, statistics_service
+from app.services.search import SearchIndex, search_index
+from app.services.votes import VoteTallyService, vote_tally_service
 
 __all__ = [
+    'CoverService',
+    'cover_service',
+    'EbookStorage',
+    'ebook_storage',
     'OpenLibraryService', 
     'get_open_library_service',
     'NotificationService',
-    'notification_service'
+    'notification_service',
+    'StatisticsService',
+    'statistics_service',
+    'SearchIndex',
+    'search_index',
+    'VoteTallyService',
+    'vote_tally_service'
 ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Exécution de tâches en arrière-plan pour BiblioRuche
+Pool de threads du processus utilisé par la file de tâches sans worker
+(JOBS_BACKEND=memory, voir app/services/jobs.py) : chaque tâche a son
+propre contexte d'application et sa propre session SQLAlchemy.
+En test (TESTING) ou avec BACKGROUND_TASKS_EAGER, ils s'exécutent immédiatement.
+"""
+
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from flask import current_app
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Nombre de threads du pool par processus
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '4'))
+
+_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='biblioruche-bg')
+
+
+def _run_with_context(app, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Exécute fn dans un contexte d'application, avec une session dédiée"""
+    with app.app_context():
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            db.session.rollback()
+            logger.exception(f"Background task {getattr(fn, '__qualname__', fn)} failed")
+            return None
+        finally:
+            db.session.remove()
+
+
+def run_in_background(fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """
+    Planifie fn(*args, **kwargs) hors de la requête en cours
+
+    À appeler après db.session.commit() : la tâche lit les données committées.
+
+    Returns:
+        Future du résultat (déjà résolu en mode immédiat)
+    """
+    app = current_app._get_current_object()
+
+    if app.config.get('TESTING') or app.config.get('BACKGROUND_TASKS_EAGER'):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"Background task {getattr(fn, '__qualname__', fn)} failed")
+            future.set_exception(e)
+        return future
+
+    return _executor.submit(_run_with_context, app, fn, *args, **kwargs)
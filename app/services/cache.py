@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Couche de cache pour BiblioRuche
+Backends interchangeables : LRU en mémoire borné avec TTL (par processus)
+ou Redis (partagé entre les workers gunicorn), avec métriques hit/miss.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.services.metrics import record_cache
+from app.services.redis_client import get_redis
+
+try:
+    from redis import RedisError
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Valeurs par défaut
+DEFAULT_TTL = 3600  # 1 heure
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_VALUE_BYTES = 512 * 1024  # 512 KB par entrée Redis
+
+
+class CacheBackend:
+    """Interface commune des backends de cache"""
+
+    def __init__(self, namespace: str, default_ttl: int = DEFAULT_TTL):
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+
+    def _record(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache(self.namespace, hit)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Retourne la valeur associée à la clé ou None"""
+        raise NotImplementedError
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Comme get(), sans compter de hit ni de miss"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """Met en cache une valeur pour ttl secondes"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """Supprime une clé"""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Vide le namespace"""
+        raise NotImplementedError
+
+    def size(self) -> Optional[int]:
+        """Nombre d'entrées du namespace (None si inconnu sans parcourir les clés)"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Métriques du cache"""
+        total = self.hits + self.misses
+        return {
+            'backend': self.backend_name,
+            'namespace': self.namespace,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'size': self.size()
+        }
+
+
+class MemoryCache(CacheBackend):
+    """Cache LRU en mémoire, borné en nombre d'entrées, avec expiration"""
+
+    backend_name = 'memory'
+
+    def __init__(self, namespace: str, default_ttl: int = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(namespace, default_ttl)
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._lookup(key)
+        self._record(entry is not None)
+        return entry[1] if entry is not None else None
+
+    def peek(self, key: str) -> Optional[Any]:
+        entry = self._lookup(key)
+        return entry[1] if entry is not None else None
+
+    def _lookup(self, key: str) -> Optional[tuple]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._data[key]
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+        return entry
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_entries:
+                self._purge_expired()
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _purge_expired(self) -> None:
+        """Supprime les entrées expirées (appelé sous verrou)"""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+        for key in expired:
+            del self._data[key]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache partagé dans Redis (valeurs sérialisées en JSON)
+
+    L'éviction globale est déléguée à Redis : en production, une instance
+    dédiée (CACHE_REDIS_URL, maxmemory-policy allkeys-lru) pour que
+    l'éviction ne touche jamais la file de tâches, les compteurs de limites
+    ou les téléchargements en attente. Les valeurs plus grosses que max_value_bytes ne sont pas mises en cache.
+    Les erreurs Redis sont journalisées et traitées comme des miss.
+    """
+
+    backend_name = 'redis'
+
+    def __init__(self, client, namespace: str, default_ttl: int = DEFAULT_TTL,
+                 max_value_bytes: int = DEFAULT_MAX_VALUE_BYTES):
+        super().__init__(namespace, default_ttl)
+        self.client = client
+        self.max_value_bytes = max_value_bytes
+        self.prefix = f"biblioruche:cache:{namespace}:"
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._read(key)
+        self._record(raw is not None)
+        return json.loads(raw) if raw is not None else None
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Comme get(), sans compter de hit ni de miss (scrutation du single-flight)"""
+        raw = self._read(key)
+        return json.loads(raw) if raw is not None else None
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(self._key(key))
+        except RedisError as e:
+            logger.warning(f"Redis cache get failed for {key}: {e}")
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        raw = json.dumps(value)
+        if len(raw) > self.max_value_bytes:
+            logger.debug(f"Value too large to cache: {key}")
+            with self._stats_lock:
+                self.evictions += 1
+            return
+        try:
+            self.client.set(self._key(key), raw, ex=ttl or self.default_ttl)
+        except RedisError as e:
+            logger.warning(f"Redis cache set failed for {key}: {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self._key(key))
+        except RedisError as e:
+            logger.warning(f"Redis cache delete failed for {key}: {e}")
+
+    def clear(self) -> None:
+        try:
+            keys = list(self.client.scan_iter(match=self.prefix + '*', count=500))
+            if keys:
+                self.client.delete(*keys)
+        except RedisError as e:
+            logger.warning(f"Redis cache clear failed for {self.namespace}: {e}")
+
+    def size(self) -> Optional[int]:
+        # Compter imposerait un SCAN de tout le namespace à chaque stats() :
+        # taille non disponible (INFO keyspace donne le total de l'instance)
+        return None
+
+
+# Caches nommés partagés par le processus
+_caches: Dict[str, CacheBackend] = {}
+_caches_lock = threading.Lock()
+
+
+def create_cache(namespace: str, default_ttl: int = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES) -> CacheBackend:
+    """
+    Crée un cache selon CACHE_BACKEND ('redis' ou 'memory')
+
+    Par défaut Redis est utilisé dès que REDIS_URL est configurée,
+    sinon un LRU en mémoire. CACHE_REDIS_URL désigne une instance Redis
+    réservée au cache (défaut : REDIS_URL).
+    """
+    backend = os.getenv('CACHE_BACKEND', '').lower()
+    client = get_redis(os.getenv('CACHE_REDIS_URL') or None) if backend in ('', 'redis') else None
+
+    if client is not None:
+        return RedisCache(client, namespace, default_ttl=default_ttl)
+    if backend == 'redis':
+        logger.warning(f"CACHE_BACKEND=redis but Redis is unavailable, using memory for {namespace}")
+    return MemoryCache(namespace, default_ttl=default_ttl, max_entries=max_entries)
+
+
+def get_cache(namespace: str, default_ttl: int = DEFAULT_TTL,
+              max_entries: int = DEFAULT_MAX_ENTRIES) -> CacheBackend:
+    """Retourne le cache partagé d'un namespace (créé au premier appel)"""
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = create_cache(namespace, default_ttl, max_entries)
+            _caches[namespace] = cache
+    return cache
+
+
+def get_all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Métriques de tous les caches nommés"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.namespace: cache.stats() for cache in caches}
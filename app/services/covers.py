@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Couvertures des ebooks de BiblioRuche
+L'image d'origine est stockée sous son empreinte SHA-256, puis déclinée
+en vignettes S/M/L aux formats WebP et JPEG : <sha256>-<taille>.<format>
+dans instance/covers/thumbs. Un nom ne change jamais de contenu, les
+vignettes peuvent donc être servies avec Cache-Control: immutable (par
+l'application ou directement par nginx).
+Pillow est optionnel : sans lui, seule l'image d'origine est servie.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from typing import BinaryIO, Optional, Tuple, Union
+
+from flask import current_app
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Taille maximale d'une image de couverture envoyée
+MAX_COVER_SIZE = 5 * 1024 * 1024  # 5 MB
+
+# Vignettes : taille -> boîte englobante (largeur, hauteur)
+THUMBNAIL_SIZES = {
+    'S': (160, 240),   # Tableaux d'administration
+    'M': (320, 480),   # Grille des ebooks
+    'L': (640, 960),   # Page de détail
+}
+
+# Formats des vignettes : extension -> (format Pillow, options d'enregistrement)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+ORIGINAL_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+THUMBNAIL_NAME_RE = re.compile(r'^(?P<hash>[0-9a-f]{64})-(?P<size>[SML])\.(?P<fmt>webp|jpg)$')
+
+
+class InvalidCoverError(ValueError):
+    """Image refusée (message affichable à l'utilisateur)"""
+
+
+class CoverService:
+    """Stockage des couvertures et génération des vignettes"""
+
+    @property
+    def available(self) -> bool:
+        """Vrai si Pillow est installé (vignettes disponibles)"""
+        return Image is not None
+
+    def folder(self) -> str:
+        """Dossier des images d'origine (instance/covers)"""
+        folder = os.path.join(current_app.instance_path, 'covers')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def thumbnails_folder(self) -> str:
+        """Dossier des vignettes (instance/covers/thumbs)"""
+        folder = os.path.join(self.folder(), 'thumbs')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def thumbnail_name(cover_hash: str, size: str, fmt: str) -> str:
+        return f'{cover_hash}-{size}.{fmt}'
+
+    @staticmethod
+    def parse_thumbnail_name(name: str) -> Optional[Tuple[str, str, str]]:
+        """(empreinte, taille, format) d'un nom de vignette, ou None"""
+        match = THUMBNAIL_NAME_RE.match(name)
+        if match is None:
+            return None
+        return match.group('hash'), match.group('size'), match.group('fmt')
+
+    def store(self, source: Union[bytes, BinaryIO], extension: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Enregistre une image de couverture et génère ses vignettes
+
+        Args:
+            source: contenu de l'image ou flux à lire
+            extension: extension d'origine (déduite de l'image avec Pillow)
+
+        Returns:
+            (nom du fichier d'origine, empreinte SHA-256)
+
+        Raises:
+            InvalidCoverError: image trop volumineuse ou illisible
+        """
+        data = source if isinstance(source, bytes) else source.read(MAX_COVER_SIZE + 1)
+        if len(data) > MAX_COVER_SIZE:
+            raise InvalidCoverError(f'Image trop volumineuse (max {MAX_COVER_SIZE // (1024 * 1024)} MB).')
+
+        if self.available:
+            try:
+                with Image.open(io.BytesIO(data)) as image:
+                    image.verify()
+                    extension = ORIGINAL_EXTENSIONS.get(image.format)
+                # verify() ne décode pas les pixels : une image tronquée n'échoue qu'au décodage
+                with Image.open(io.BytesIO(data)) as image:
+                    image.load()
+            except Exception:
+                raise InvalidCoverError("Le fichier de couverture n'est pas une image valide.")
+            if extension is None:
+                raise InvalidCoverError('Formats de couverture acceptés : PNG, JPG, GIF, WEBP.')
+
+        cover_hash = hashlib.sha256(data).hexdigest()
+        filename = f'{cover_hash}.{(extension or "jpg").lower()}'
+        path = os.path.join(self.folder(), filename)
+        created = not os.path.exists(path)
+        if created:
+            self._write(path, data)
+
+        if self.available:
+            try:
+                self.generate_thumbnails(cover_hash, path)
+            except Exception as e:
+                logger.warning(f"Thumbnail generation failed for cover {cover_hash}: {e}")
+                if created:
+                    self._remove(cover_hash, path)
+                raise InvalidCoverError("Le fichier de couverture n'est pas une image valide.")
+        return filename, cover_hash
+
+    def generate_thumbnails(self, cover_hash: str, source_path: str, force: bool = False) -> int:
+        """
+        Génère toutes les vignettes d'une couverture
+
+        Returns:
+            Nombre de vignettes créées
+        """
+        created = 0
+        with Image.open(source_path) as image:
+            # JPEG : décodage directement à une résolution réduite
+            image.draft('RGB', THUMBNAIL_SIZES['L'])
+            image = ImageOps.exif_transpose(image)
+            for size in THUMBNAIL_SIZES:
+                for fmt in THUMBNAIL_FORMATS:
+                    path = os.path.join(self.thumbnails_folder(), self.thumbnail_name(cover_hash, size, fmt))
+                    if force or not os.path.exists(path):
+                        self._write(path, self._render(image, size, fmt))
+                        created += 1
+        return created
+
+    def thumbnail_path(self, cover_hash: str, size: str, fmt: str, source_filename: Optional[str]) -> Optional[str]:
+        """
+        Chemin d'une vignette, générée à la première demande si besoin
+
+        Returns:
+            Chemin du fichier, ou None si la couverture d'origine est introuvable
+        """
+        path = os.path.join(self.thumbnails_folder(), self.thumbnail_name(cover_hash, size, fmt))
+        if os.path.exists(path):
+            return path
+        if not self.available or not source_filename:
+            return None
+        source_path = os.path.join(self.folder(), source_filename)
+        if not os.path.exists(source_path):
+            return None
+        with Image.open(source_path) as image:
+            self._write(path, self._render(ImageOps.exif_transpose(image), size, fmt))
+        return path
+
+    def delete(self, filename: Optional[str], cover_hash: Optional[str]) -> None:
+        """Supprime une couverture et ses vignettes si aucun ebook ne l'utilise plus"""
+        from app.models import Ebook
+
+        if not filename:
+            return
+        if Ebook.query.filter_by(cover_filename=filename).count():
+            return
+        self._remove(cover_hash, os.path.join(self.folder(), filename))
+
+    def _remove(self, cover_hash: Optional[str], path: str) -> None:
+        """Supprime une image d'origine et ses vignettes"""
+        paths = [path]
+        if cover_hash:
+            paths += [
+                os.path.join(self.thumbnails_folder(), self.thumbnail_name(cover_hash, size, fmt))
+                for size in THUMBNAIL_SIZES for fmt in THUMBNAIL_FORMATS
+            ]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def _render(image, size: str, fmt: str) -> bytes:
+        """Redimensionne et encode une vignette"""
+        pillow_format, options = THUMBNAIL_FORMATS[fmt]
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        if pillow_format == 'JPEG' and image.mode == 'RGBA':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+
+        thumbnail = image.copy()
+        thumbnail.thumbnail(THUMBNAIL_SIZES[size], Image.LANCZOS)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, pillow_format, **options)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        """Écriture atomique (un fichier à moitié écrit n'est jamais servi)"""
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.cover-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+# Instance globale
+cover_service = CoverService()
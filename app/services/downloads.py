@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Compteur de téléchargements des ebooks en écriture différée
+Les téléchargements sont cumulés dans Redis (partagé entre les workers)
+ou dans le processus, puis reportés en base par lots : un seul
+UPDATE ebook SET download_count = download_count + n par ebook, sans
+transaction d'écriture sur le chemin du téléchargement et sans perte
+d'incréments entre requêtes concurrentes.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+
+from flask import current_app
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.services.redis_client import get_redis
+
+try:
+    from redis import RedisError
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Intervalle de report en base du compteur en mémoire (en secondes)
+FLUSH_INTERVAL = int(os.getenv('DOWNLOADS_FLUSH_INTERVAL', '60'))
+
+# Clés Redis : compteurs en attente, lot en cours de report et son identifiant,
+# verrou du report
+REDIS_PENDING_KEY = 'biblioruche:downloads:pending'
+REDIS_FLUSHING_KEY = 'biblioruche:downloads:flushing'
+REDIS_BATCH_KEY = 'biblioruche:downloads:flushing:batch'
+REDIS_FLUSH_LOCK_KEY = 'biblioruche:lock:downloads:flush'
+FLUSH_LOCK_TTL = 300  # 5 minutes
+
+# Conservation des identifiants de lots reportés (table download_flush)
+BATCH_RETENTION = timedelta(days=1)
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def apply_download_counts(counts: Dict[int, int], batch_id: Optional[str] = None) -> int:
+    """
+    Ajoute les téléchargements cumulés aux compteurs des ebooks
+
+    Avec batch_id, le lot est enregistré dans la même transaction : un
+    lot déjà reporté (report rejoué après une erreur Redis) est ignoré.
+
+    Returns:
+        Nombre d'ebooks mis à jour
+    """
+    from app.models import DownloadFlush, Ebook
+
+    counts = {ebook_id: n for ebook_id, n in counts.items() if n}
+    if not counts:
+        return 0
+
+    if batch_id is not None:
+        flushes = DownloadFlush.__table__
+        now = datetime.now(timezone.utc)
+        try:
+            db.session.execute(flushes.insert().values(batch_id=batch_id, applied_at=now))
+        except IntegrityError:
+            db.session.rollback()
+            logger.warning(f"Download batch {batch_id} already applied, skipping")
+            return 0
+        db.session.execute(flushes.delete().where(flushes.c.applied_at < now - BATCH_RETENTION))
+
+    table = Ebook.__table__
+    statement = table.update().where(
+        table.c.id == db.bindparam('ebook_id')
+    ).values(
+        download_count=db.func.coalesce(table.c.download_count, 0) + db.bindparam('n'),
+        updated_at=table.c.updated_at  # Un téléchargement ne modifie pas la fiche
+    )
+    db.session.execute(statement, [{'ebook_id': ebook_id, 'n': n} for ebook_id, n in counts.items()])
+    db.session.commit()
+    return len(counts)
+
+
+class DownloadCounter:
+    """Interface commune des compteurs de téléchargements"""
+
+    def increment(self, ebook_id: int) -> None:
+        """Enregistre un téléchargement"""
+        raise NotImplementedError
+
+    def pending(self, ebook_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        """Téléchargements pas encore reportés en base, par ebook"""
+        raise NotImplementedError
+
+    def flush(self) -> int:
+        """Reporte les téléchargements en base, retourne le nombre d'ebooks mis à jour"""
+        raise NotImplementedError
+
+    def pending_total(self) -> int:
+        return sum(self.pending().values())
+
+
+class MemoryDownloadCounter(DownloadCounter):
+    """
+    Compteur dans le processus
+
+    Reporté en base en arrière-plan au plus toutes les FLUSH_INTERVAL
+    secondes. La tâche planifiée ebooks.flush_downloads ne tourne que dans le
+    worker de tâches et ne voit pas ce compteur : start() lance le report
+    périodique dans le processus web et un dernier report à sa sortie
+    (worker gunicorn recyclé). Un arrêt brutal perd les téléchargements
+    en attente.
+    """
+
+    backend_name = 'memory'
+
+    def __init__(self, flush_interval: int = FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._counts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._app = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, app) -> None:
+        """Lance le report périodique et le report à la sortie du processus"""
+        self._app = app
+        self._thread = threading.Thread(target=self._flush_periodically, name='download-counter', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Arrête le report périodique et reporte les téléchargements en attente"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._flush_in_app()
+
+    def _flush_periodically(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            self._flush_in_app()
+
+    def _flush_in_app(self) -> None:
+        if self._app is None or not self.pending():
+            return
+        with self._app.app_context():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush download counts: {e}")
+            finally:
+                db.session.remove()
+
+    def increment(self, ebook_id: int) -> None:
+        with self._lock:
+            self._counts[ebook_id] = self._counts.get(ebook_id, 0) + 1
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+            if due:
+                self._last_flush = time.monotonic()
+        if due:
+            from app.services.background import run_in_background
+            run_in_background(self.flush)
+
+    def pending(self, ebook_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        with self._lock:
+            if ebook_ids is None:
+                return dict(self._counts)
+            return {ebook_id: self._counts[ebook_id] for ebook_id in ebook_ids if ebook_id in self._counts}
+
+    def flush(self) -> int:
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            self._last_flush = time.monotonic()
+        try:
+            return apply_download_counts(counts)
+        except Exception:
+            db.session.rollback()
+            # Remettre les compteurs pour le prochain report
+            with self._lock:
+                for ebook_id, n in counts.items():
+                    self._counts[ebook_id] = self._counts.get(ebook_id, 0) + n
+            raise
+
+
+class RedisDownloadCounter(DownloadCounter):
+    """
+    Compteur partagé dans un hash Redis (HINCRBY)
+
+    Le report renomme atomiquement le hash avant de le lire : les
+    téléchargements arrivés pendant le report vont dans un nouveau hash.
+    Si l'UPDATE échoue, le lot reste dans REDIS_FLUSHING_KEY et sera
+    repris au report suivant. Un seul report à la fois (verrou SET NX),
+    et le lot porte un identifiant enregistré en base avec l'UPDATE : si
+    sa suppression dans Redis échoue, le lot rejoué n'est pas recompté.
+    """
+
+    backend_name = 'redis'
+
+    def __init__(self, client):
+        self.client = client
+
+    def increment(self, ebook_id: int) -> None:
+        self.client.hincrby(REDIS_PENDING_KEY, str(ebook_id), 1)
+
+    def pending(self, ebook_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        counts: Dict[int, int] = {}
+        try:
+            for key in (REDIS_FLUSHING_KEY, REDIS_PENDING_KEY):
+                for ebook_id, n in self.client.hgetall(key).items():
+                    counts[int(ebook_id)] = counts.get(int(ebook_id), 0) + int(n)
+        except RedisError as e:
+            logger.warning(f"Could not read pending downloads: {e}")
+            return {}
+        if ebook_ids is not None:
+            ebook_ids = set(ebook_ids)
+            counts = {ebook_id: n for ebook_id, n in counts.items() if ebook_id in ebook_ids}
+        return counts
+
+    def flush(self) -> int:
+        token = uuid.uuid4().hex
+        if not self.client.set(REDIS_FLUSH_LOCK_KEY, token, nx=True, ex=FLUSH_LOCK_TTL):
+            logger.info("Download flush already running elsewhere")
+            return 0
+        try:
+            return self._flush_batch()
+        finally:
+            try:
+                self.client.eval(_RELEASE_SCRIPT, 1, REDIS_FLUSH_LOCK_KEY, token)
+            except RedisError as e:
+                logger.warning(f"Download flush lock release failed: {e}")
+
+    def _flush_batch(self) -> int:
+        if not self.client.exists(REDIS_FLUSHING_KEY):
+            if not self.client.exists(REDIS_PENDING_KEY):
+                return 0
+            pipe = self.client.pipeline(transaction=True)
+            pipe.rename(REDIS_PENDING_KEY, REDIS_FLUSHING_KEY)
+            pipe.set(REDIS_BATCH_KEY, uuid.uuid4().hex)
+            pipe.execute()
+
+        # Lot sans identifiant (laissé par une version précédente)
+        self.client.set(REDIS_BATCH_KEY, uuid.uuid4().hex, nx=True)
+        batch_id = self.client.get(REDIS_BATCH_KEY)
+        batch_id = batch_id.decode() if isinstance(batch_id, bytes) else batch_id
+
+        counts = {int(ebook_id): int(n) for ebook_id, n in self.client.hgetall(REDIS_FLUSHING_KEY).items()}
+        updated = apply_download_counts(counts, batch_id=batch_id)
+        self.client.delete(REDIS_FLUSHING_KEY, REDIS_BATCH_KEY)
+        return updated
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def create_download_counter() -> DownloadCounter:
+    """Redis dès que REDIS_URL est configurée, sinon en mémoire (reporté par le processus lui-même)"""
+    client = get_redis()
+    if client is not None:
+        return RedisDownloadCounter(client)
+    counter = MemoryDownloadCounter()
+    app = current_app._get_current_object()
+    if not app.config.get('TESTING'):
+        counter.start(app)
+    return counter
+
+
+def get_download_counter() -> DownloadCounter:
+    """Retourne le compteur partagé du processus (créé au premier appel)"""
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            _counter = create_download_counter()
+    return _counter
+
+
+def record_download(ebook_id: int) -> None:
+    """Enregistre un téléchargement sans écriture en base"""
+    counter = get_download_counter()
+    try:
+        counter.increment(ebook_id)
+    except RedisError as e:
+        # Redis indisponible : écriture directe plutôt que perdre le téléchargement
+        logger.warning(f"Download counter unavailable, writing directly: {e}")
+        apply_download_counts({ebook_id: 1})
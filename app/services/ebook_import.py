@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Extraction des métadonnées EPUB et import en masse pour BiblioRuche
+Les métadonnées (titre, auteur, ISBN, description...) et la couverture
+sont lues dans le fichier OPF de l'archive : seuls le répertoire central
+et les entrées nécessaires sont décompressés. L'import d'un dossier
+analyse les EPUB dans un pool de processus puis les enregistre en base
+en une transaction.
+"""
+
+import hashlib
+import html
+import logging
+import os
+import posixpath
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+from werkzeug.utils import secure_filename
+
+from app.services.covers import InvalidCoverError, cover_service
+from app.services.ebook_storage import CHUNK_SIZE, EbookValidationError, ebook_storage
+
+logger = logging.getLogger(__name__)
+
+OPF_NS = '{http://www.idpf.org/2007/opf}'
+DC_NS = '{http://purl.org/dc/elements/1.1/}'
+
+# Tailles maximales lues dans l'archive
+MAX_OPF_SIZE = 5 * 1024 * 1024      # 5 MB
+MAX_COVER_SIZE = 5 * 1024 * 1024    # 5 MB
+
+# Longueurs des colonnes de Ebook
+MAX_DESCRIPTION_LENGTH = 2000
+
+COVER_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+TAG_RE = re.compile(r'<[^>]+>')
+ISBN_RE = re.compile(r'(97[89]\d{10}|\d{9}[\dX])')
+
+
+@dataclass
+class EpubMetadata:
+    """Métadonnées lues dans le fichier OPF"""
+    title: Optional[str] = None
+    author: Optional[str] = None
+    description: Optional[str] = None
+    isbn: Optional[str] = None
+    genre: Optional[str] = None
+    publication_year: Optional[int] = None
+    cover_data: Optional[bytes] = field(default=None, repr=False)
+    cover_extension: Optional[str] = None
+
+
+@dataclass
+class InspectedEpub:
+    """Résultat de l'analyse d'un fichier (sérialisable entre processus)"""
+    path: str
+    sha256: Optional[str] = None
+    size: int = 0
+    metadata: Optional[EpubMetadata] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ImportReport:
+    """Bilan d'un import en masse"""
+    imported: List[str] = field(default_factory=list)
+    duplicates: List[str] = field(default_factory=list)
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def _text(element) -> Optional[str]:
+    """Texte d'un élément sans espaces superflus"""
+    if element is None or not element.text:
+        return None
+    return ' '.join(element.text.split()) or None
+
+
+def _clean_description(value: Optional[str]) -> Optional[str]:
+    """Description sans balises HTML, tronquée à la taille de la colonne"""
+    if not value:
+        return None
+    value = ' '.join(html.unescape(TAG_RE.sub(' ', value)).split())
+    return value[:MAX_DESCRIPTION_LENGTH] or None
+
+
+def _find_isbn(metadata) -> Optional[str]:
+    """ISBN parmi les dc:identifier (opf:scheme="ISBN", urn:isbn:... ou numéro seul)"""
+    for identifier in metadata.iter(f'{DC_NS}identifier'):
+        value = _text(identifier)
+        if not value:
+            continue
+        scheme = (identifier.get(f'{OPF_NS}scheme') or '').lower()
+        compact = value.lower().replace('urn:isbn:', '').replace('isbn:', '').replace('-', '').replace(' ', '')
+        match = ISBN_RE.fullmatch(compact.upper())
+        if match and (scheme == 'isbn' or 'isbn' in value.lower() or len(compact) == 13):
+            return match.group(0)
+    return None
+
+
+def _find_cover(package, opf_dir: str) -> Tuple[Optional[str], Optional[str]]:
+    """Chemin dans l'archive et type de l'image de couverture"""
+    manifest = package.find(f'{OPF_NS}manifest')
+    if manifest is None:
+        return None, None
+    items = [item for item in manifest.iter(f'{OPF_NS}item') if item.get('href')]
+
+    cover = None
+    # EPUB 3 : propriété cover-image
+    for item in items:
+        if 'cover-image' in (item.get('properties') or '').split():
+            cover = item
+            break
+    # EPUB 2 : <meta name="cover" content="id-de-l-item"/>
+    if cover is None:
+        metadata = package.find(f'{OPF_NS}metadata')
+        cover_id = None
+        if metadata is not None:
+            for meta in metadata.iter(f'{OPF_NS}meta'):
+                if meta.get('name') == 'cover':
+                    cover_id = meta.get('content')
+                    break
+        cover = next((item for item in items if cover_id and item.get('id') == cover_id), None)
+    # Dernier recours : image dont l'identifiant ou le nom évoque la couverture
+    if cover is None:
+        cover = next((
+            item for item in items
+            if (item.get('media-type') or '').startswith('image/')
+            and ('cover' in (item.get('id') or '').lower() or 'cover' in item.get('href').lower())
+        ), None)
+
+    if cover is None or cover.get('media-type') not in COVER_EXTENSIONS:
+        return None, None
+    href = posixpath.normpath(posixpath.join(opf_dir, unquote(cover.get('href'))))
+    return href, cover.get('media-type')
+
+
+def read_epub_metadata(path: str, package_path: Optional[str] = None) -> EpubMetadata:
+    """
+    Lit les métadonnées et la couverture d'un EPUB
+
+    Args:
+        path: chemin du fichier EPUB
+        package_path: chemin du fichier OPF (lu dans container.xml si absent)
+
+    Raises:
+        EbookValidationError: archive ou fichier OPF invalide
+    """
+    if package_path is None:
+        package_path = ebook_storage.validate(path)
+
+    try:
+        with zipfile.ZipFile(path) as archive:
+            info = archive.getinfo(package_path)
+            if info.file_size > MAX_OPF_SIZE:
+                raise EbookValidationError(f'Archive EPUB invalide : {package_path} trop volumineux.')
+            try:
+                package = ElementTree.fromstring(archive.read(info))
+            except ElementTree.ParseError:
+                raise EbookValidationError(f'Archive EPUB invalide : {package_path} illisible.')
+
+            result = EpubMetadata()
+            metadata = package.find(f'{OPF_NS}metadata')
+            if metadata is not None:
+                result.title = _text(metadata.find(f'{DC_NS}title'))
+                creators = [_text(creator) for creator in metadata.iter(f'{DC_NS}creator')
+                            if (creator.get(f'{OPF_NS}role') or 'aut') == 'aut']
+                result.author = ', '.join(creator for creator in creators if creator) or None
+                result.description = _clean_description(_text(metadata.find(f'{DC_NS}description')))
+                result.isbn = _find_isbn(metadata)
+                result.genre = _text(metadata.find(f'{DC_NS}subject'))
+                date = _text(metadata.find(f'{DC_NS}date')) or ''
+                if re.match(r'\d{4}', date):
+                    result.publication_year = int(date[:4])
+
+            cover_path, media_type = _find_cover(package, posixpath.dirname(package_path))
+            if cover_path:
+                try:
+                    cover_info = archive.getinfo(cover_path)
+                except KeyError:
+                    cover_info = None
+                if cover_info is not None and cover_info.file_size <= MAX_COVER_SIZE:
+                    result.cover_data = archive.read(cover_info)
+                    result.cover_extension = COVER_EXTENSIONS[media_type]
+    except (zipfile.BadZipFile, KeyError, EOFError):
+        raise EbookValidationError('Le fichier ne semble pas être un EPUB valide.')
+
+    # Longueurs des colonnes de Ebook
+    for name, length in (('title', 200), ('author', 200), ('genre', 100)):
+        value = getattr(result, name)
+        if value:
+            setattr(result, name, value[:length])
+    return result
+
+
+def inspect_epub(path: str) -> InspectedEpub:
+    """
+    Hache, vérifie et lit un EPUB (exécuté dans le pool de processus :
+    aucun accès à la base ni au contexte Flask)
+    """
+    result = InspectedEpub(path)
+    try:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                result.size += len(chunk)
+        if result.size > ebook_storage.max_size:
+            raise EbookValidationError(
+                f'Le fichier est trop volumineux (max {ebook_storage.max_size // (1024 * 1024)} MB).'
+            )
+        result.sha256 = digest.hexdigest()
+        result.metadata = read_epub_metadata(path)
+    except (EbookValidationError, OSError) as e:
+        result.error = str(e)
+    return result
+
+
+def import_ebooks(paths: Iterable[str], uploaded_by: int, workers: Optional[int] = None,
+                  is_visible: bool = True) -> ImportReport:
+    """
+    Importe une série d'EPUB
+
+    Les fichiers sont analysés en parallèle (workers processus, 0 pour
+    analyser dans le processus courant), puis copiés dans le stockage et
+    enregistrés en une seule transaction ; si elle échoue, les fichiers
+    copiés sont retirés. Les doublons (même SHA-256
+    qu'un ebook existant ou qu'un autre fichier du lot) sont ignorés.
+    """
+    from app import db
+    from app.models import Ebook
+
+    paths = list(paths)
+    report = ImportReport()
+
+    if workers == 0:
+        inspected = list(map(inspect_epub, paths))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            inspected = list(pool.map(inspect_epub, paths, chunksize=4))
+
+    hashes = [item.sha256 for item in inspected if item.sha256]
+    known = {
+        file_hash for (file_hash,) in
+        db.session.query(Ebook.file_hash).filter(Ebook.file_hash.in_(hashes))
+    } if hashes else set()
+
+    ebooks = []
+    stored_covers = []
+    try:
+        for item in inspected:
+            name = os.path.basename(item.path)
+            if item.error:
+                report.failed.append((name, item.error))
+                continue
+            if item.sha256 in known:
+                report.duplicates.append(name)
+                continue
+            known.add(item.sha256)
+
+            metadata = item.metadata
+            cover_filename = cover_hash = None
+            if metadata.cover_data:
+                try:
+                    cover_filename, cover_hash = cover_service.store(metadata.cover_data, metadata.cover_extension)
+                    stored_covers.append((cover_filename, cover_hash))
+                except InvalidCoverError as e:
+                    logger.warning(f"Ignoring embedded cover of {name}: {e}")
+
+            ebooks.append(Ebook(
+                title=metadata.title or os.path.splitext(name)[0][:200],
+                author=metadata.author or 'Auteur inconnu',
+                description=metadata.description,
+                isbn=metadata.isbn,
+                genre=metadata.genre,
+                publication_year=metadata.publication_year,
+                filename=ebook_storage.import_file(item.path, item.sha256),
+                original_filename=secure_filename(name),
+                file_size=item.size,
+                file_hash=item.sha256,
+                cover_filename=cover_filename,
+                cover_hash=cover_hash,
+                uploaded_by=uploaded_by,
+                is_visible=is_visible
+            ))
+            report.imported.append(name)
+
+        db.session.add_all(ebooks)
+        db.session.commit()
+    except Exception:
+        # Lot annulé : retirer les fichiers et couvertures qu'il a stockés
+        # (sauf ceux déjà utilisés par un ebook enregistré)
+        db.session.rollback()
+        for ebook in ebooks:
+            ebook_storage.delete(ebook.filename)
+        for cover_filename, cover_hash in stored_covers:
+            cover_service.delete(cover_filename, cover_hash)
+        raise
+
+    logger.info(f"Imported {len(report.imported)} ebook(s), "
+                f"{len(report.duplicates)} duplicate(s), {len(report.failed)} failure(s)")
+    return report
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Stockage des fichiers EPUB de BiblioRuche
+Les envois sont recopiés par blocs dans un fichier temporaire (taille
+maximale vérifiée au fil de l'eau, SHA-256 calculé au passage), le
+conteneur EPUB est vérifié sans charger l'archive en mémoire, puis le
+fichier est rangé sous son empreinte : <sha256>.epub. Un même EPUB
+envoyé deux fois n'est stocké qu'une fois.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+from xml.etree import ElementTree
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Taille maximale d'un EPUB
+MAX_EBOOK_SIZE = 50 * 1024 * 1024  # 50 MB
+
+# Taille des blocs de recopie
+CHUNK_SIZE = 64 * 1024
+
+EPUB_MIMETYPE = b'application/epub+zip'
+CONTAINER_PATH = 'META-INF/container.xml'
+CONTAINER_NS = '{urn:oasis:names:tc:opendocument:xmlns:container}'
+
+# Taille maximale lue pour container.xml
+MAX_CONTAINER_SIZE = 1024 * 1024
+
+
+class EbookValidationError(ValueError):
+    """Fichier refusé (message affichable à l'utilisateur)"""
+
+
+@dataclass
+class StoredEbook:
+    """Résultat d'un enregistrement"""
+    filename: str       # Nom du fichier stocké (<sha256>.epub)
+    sha256: str
+    size: int
+    package_path: str   # Chemin du fichier OPF dans l'archive
+    created: bool       # False si le fichier était déjà stocké
+
+
+class EbookStorage:
+    """Stockage adressé par contenu des fichiers EPUB"""
+
+    def __init__(self, max_size: int = MAX_EBOOK_SIZE):
+        self.max_size = max_size
+
+    def folder(self) -> str:
+        """Dossier des EPUB (instance/ebooks)"""
+        folder = os.path.join(current_app.instance_path, 'ebooks')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.folder(), filename)
+
+    def store(self, stream: BinaryIO) -> StoredEbook:
+        """
+        Enregistre un EPUB lu depuis un flux
+
+        Raises:
+            EbookValidationError: fichier trop volumineux ou EPUB invalide
+        """
+        folder = self.folder()
+        fd, temp_path = tempfile.mkstemp(dir=folder, prefix='.upload-', suffix='.epub')
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as temp_file:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise EbookValidationError(
+                            f'Le fichier est trop volumineux (max {self.max_size // (1024 * 1024)} MB).'
+                        )
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            package_path = self.validate(temp_path)
+
+            sha256 = digest.hexdigest()
+            filename = f'{sha256}.epub'
+            final_path = os.path.join(folder, filename)
+            created = not os.path.exists(final_path)
+            if created:
+                os.replace(temp_path, final_path)
+            return StoredEbook(filename, sha256, size, package_path, created)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def import_file(self, path: str, sha256: str) -> str:
+        """
+        Copie un EPUB déjà vérifié et haché (import en masse)
+
+        Returns:
+            Nom du fichier stocké
+        """
+        filename = f'{sha256}.epub'
+        final_path = self.path(filename)
+        if not os.path.exists(final_path):
+            fd, temp_path = tempfile.mkstemp(dir=self.folder(), prefix='.import-', suffix='.epub')
+            os.close(fd)
+            try:
+                shutil.copyfile(path, temp_path)
+                os.replace(temp_path, final_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        return filename
+
+    def validate(self, path: str) -> str:
+        """
+        Vérifie le conteneur EPUB (OCF) : entrée mimetype en tête et
+        META-INF/container.xml désignant un fichier OPF présent.
+        Seul le répertoire central et ces deux petites entrées sont lus.
+
+        Returns:
+            Chemin du fichier OPF dans l'archive
+        """
+        try:
+            with zipfile.ZipFile(path) as archive:
+                entries = archive.infolist()
+                if not entries or entries[0].filename != 'mimetype':
+                    raise EbookValidationError('Archive EPUB invalide : entrée "mimetype" absente en tête.')
+                with archive.open(entries[0]) as mimetype:
+                    if mimetype.read(len(EPUB_MIMETYPE) + 1).strip() != EPUB_MIMETYPE:
+                        raise EbookValidationError('Archive EPUB invalide : type "application/epub+zip" attendu.')
+
+                try:
+                    container_info = archive.getinfo(CONTAINER_PATH)
+                except KeyError:
+                    raise EbookValidationError(f'Archive EPUB invalide : {CONTAINER_PATH} absent.')
+                if container_info.file_size > MAX_CONTAINER_SIZE:
+                    raise EbookValidationError(f'Archive EPUB invalide : {CONTAINER_PATH} trop volumineux.')
+
+                package_path = self._package_path(archive.read(container_info))
+                try:
+                    archive.getinfo(package_path)
+                except KeyError:
+                    raise EbookValidationError(f'Archive EPUB invalide : {package_path} absent.')
+                return package_path
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, EOFError):
+            raise EbookValidationError('Le fichier ne semble pas être un EPUB valide.')
+
+    @staticmethod
+    def _package_path(container_xml: bytes) -> str:
+        """Chemin du premier rootfile OPF déclaré dans container.xml"""
+        try:
+            root = ElementTree.fromstring(container_xml)
+        except ElementTree.ParseError:
+            raise EbookValidationError(f'Archive EPUB invalide : {CONTAINER_PATH} illisible.')
+        rootfile = root.find(f'{CONTAINER_NS}rootfiles/{CONTAINER_NS}rootfile')
+        if rootfile is None or not rootfile.get('full-path'):
+            raise EbookValidationError(f'Archive EPUB invalide : aucun rootfile dans {CONTAINER_PATH}.')
+        return rootfile.get('full-path')
+
+    def delete(self, filename: Optional[str]) -> None:
+        """Supprime un fichier stocké s'il n'est plus référencé par aucun ebook"""
+        from app.models import Ebook
+
+        if not filename or Ebook.query.filter_by(filename=filename).count():
+            return
+        path = self.path(filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# Instance globale
+ebook_storage = EbookStorage()
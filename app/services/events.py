@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Diffusion d'événements temps réel pour BiblioRuche
+Publication/abonnement par canal ('user:<id>', 'votes:book:<id>'...) pour
+le flux Server-Sent Events /api/stream. En mémoire dans le processus, ou
+via Redis pub/sub pour partager les événements entre les workers
+gunicorn : chaque worker n'ouvre qu'une connexion d'écoute Redis et
+redistribue les messages à ses abonnés locaux.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.services.redis_client import get_redis
+
+try:
+    from redis import RedisError
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Messages en attente par abonné avant d'ignorer les suivants (client trop lent)
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Préfixe des canaux Redis
+REDIS_CHANNEL_PREFIX = 'biblioruche:events:'
+
+# Attente d'un message par le thread d'écoute Redis
+LISTEN_POLL_TIMEOUT = 1.0  # secondes
+
+
+def user_channel(user_id: int) -> str:
+    """Canal des événements d'un utilisateur (notifications, compteur de non lues)"""
+    return f"user:{user_id}"
+
+
+def vote_channel(kind: str, session_id: int) -> str:
+    """Canal des résultats d'une session de vote ('book' ou 'film')"""
+    return f"votes:{kind}:{session_id}"
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Sérialise un événement au format text/event-stream"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """Abonnement d'un client à un ensemble de canaux"""
+
+    def __init__(self, broker: 'MemoryBroker', channels: Iterable[str]):
+        self.channels = tuple(channels)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._broker = broker
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Prochain message {'event', 'data'} ou None après timeout secondes"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self._broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MemoryBroker:
+    """Pub/sub en mémoire, limité au processus courant"""
+
+    backend_name = 'memory'
+
+    def __init__(self):
+        self._subscribers = {}  # canal -> set(Subscription)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def subscriber_count(self) -> int:
+        """Nombre d'abonnements actifs dans ce processus"""
+        with self._lock:
+            return len({sub for subscribers in self._subscribers.values() for sub in subscribers})
+
+    def publish(self, channel: str, event: str, data: Any) -> None:
+        """Publie un événement sur un canal"""
+        self._dispatch(channel, {'event': event, 'data': data})
+
+    def publish_many(self, messages: Iterable[Tuple[str, str, Any]]) -> None:
+        """Publie une série de (canal, événement, données)"""
+        for channel, event, data in messages:
+            self.publish(channel, event, data)
+
+    def _dispatch(self, channel: str, message: Dict[str, Any]) -> None:
+        """Remet un message aux abonnés locaux du canal"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                self.dropped += 1
+                logger.warning(f"Event dropped for slow subscriber on {channel}")
+
+
+class RedisBroker(MemoryBroker):
+    """
+    Pub/sub partagé entre workers via Redis
+
+    Les événements sont publiés sur Redis ; un thread d'écoute par
+    processus (démarré au premier abonnement) les redistribue aux
+    abonnés locaux. En cas d'erreur Redis, la publication se rabat sur
+    les abonnés du processus courant.
+    """
+
+    backend_name = 'redis'
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, channels: Iterable[str]) -> Subscription:
+        self._ensure_listener()
+        return super().subscribe(channels)
+
+    def publish(self, channel: str, event: str, data: Any) -> None:
+        self.publish_many([(channel, event, data)])
+
+    def publish_many(self, messages: Iterable[Tuple[str, str, Any]]) -> None:
+        messages = [(channel, {'event': event, 'data': data}) for channel, event, data in messages]
+        if not messages:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for channel, message in messages:
+                pipe.publish(REDIS_CHANNEL_PREFIX + channel, json.dumps(message))
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Redis publish failed, delivering locally only: {e}")
+            for channel, message in messages:
+                self._dispatch(channel, message)
+
+    def _ensure_listener(self) -> None:
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name='biblioruche-events', daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self) -> None:
+        """Boucle d'écoute Redis (reconnexion automatique)"""
+        prefix_length = len(REDIS_CHANNEL_PREFIX)
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(REDIS_CHANNEL_PREFIX + '*')
+                while True:
+                    message = pubsub.get_message(timeout=LISTEN_POLL_TIMEOUT)
+                    if message is None or message['type'] != 'pmessage':
+                        continue
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    self._dispatch(channel[prefix_length:], json.loads(message['data']))
+            except (RedisError, ValueError) as e:
+                logger.warning(f"Redis event listener error, reconnecting: {e}")
+                time.sleep(1)
+            finally:
+                try:
+                    pubsub.close()
+                except RedisError:
+                    pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def create_event_broker() -> MemoryBroker:
+    """
+    Crée le broker selon EVENTS_BACKEND ('redis' ou 'memory')
+
+    Par défaut Redis est utilisé dès que REDIS_URL est configurée,
+    sinon le pub/sub en mémoire (un seul worker).
+    """
+    backend = os.getenv('EVENTS_BACKEND', '').lower()
+    client = get_redis() if backend in ('', 'redis') else None
+
+    if client is not None:
+        return RedisBroker(client)
+    if backend == 'redis':
+        logger.warning("EVENTS_BACKEND=redis but Redis is unavailable, using in-process events")
+    return MemoryBroker()
+
+
+def get_event_broker() -> MemoryBroker:
+    """Retourne le broker partagé du processus (créé au premier appel)"""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = create_event_broker()
+    return _broker
+
+
+def publish(channel: str, event: str, data: Any) -> None:
+    """Publie un événement sans jamais interrompre la requête appelante"""
+    publish_many([(channel, event, data)])
+
+
+def publish_many(messages: Iterable[Tuple[str, str, Any]]) -> None:
+    """Publie une série d'événements sans jamais interrompre la requête appelante"""
+    try:
+        get_event_broker().publish_many(messages)
+    except Exception as e:
+        logger.error(f"Event publish failed: {e}")
@@ -0,0 +1,524 @@
+# -*- coding: utf-8 -*-
+"""
+File de tâches de fond et planificateur pour BiblioRuche
+Les traitements lents (badges, diffusions de notifications) et les
+transitions programmées (clôture des votes expirés, statuts des lectures,
+purge des notifications) sont exécutés par un worker séparé :
+
+    python scripts/run_worker.py --scheduler
+
+Backends (JOBS_BACKEND) :
+- redis : liste Redis partagée entre le site et les workers (production)
+- database : table background_job, pour un worker local sans Redis (SQLite)
+- memory : pool de threads du processus courant, sans worker (par défaut
+  sans REDIS_URL ; exécution immédiate en test)
+"""
+
+import json
+import logging
+import os
+import signal
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app import db
+from app.services.redis_client import get_redis
+
+try:
+    from redis import RedisError
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal d'exécutions d'une tâche en échec
+MAX_ATTEMPTS = 3
+
+# Délai avant nouvel essai (multiplié par le numéro de tentative)
+RETRY_DELAY = 30  # secondes
+
+# Attente d'une tâche par le worker avant de vérifier le planificateur
+POLL_INTERVAL = 1.0  # secondes
+
+# Clés Redis
+REDIS_QUEUE_KEY = 'biblioruche:jobs:queue'
+REDIS_DELAYED_KEY = 'biblioruche:jobs:delayed'
+REDIS_UNIQUE_PREFIX = 'biblioruche:jobs:unique:'
+
+# Durée de vie des clés de dédoublonnage des tâches planifiées
+UNIQUE_TTL = 3600  # 1 heure
+
+# Conservation des tâches terminées ou en échec (table background_job)
+FINISHED_RETENTION_DAYS = 7
+
+_registry: Dict[str, Callable[..., Any]] = {}
+
+
+def job(name: str):
+    """Décorateur : enregistre une fonction comme tâche exécutable par le worker"""
+    def decorator(fn):
+        _registry[name] = fn
+        return fn
+    return decorator
+
+
+def get_job(name: str) -> Callable[..., Any]:
+    """Fonction associée à un nom de tâche"""
+    # Enregistrement des tâches au premier usage
+    import app.tasks  # noqa: F401
+    if name not in _registry:
+        raise ValueError(f"Tâche inconnue : {name}")
+    return _registry[name]
+
+
+class Job:
+    """Tâche en file d'attente"""
+
+    def __init__(self, name: str, args: Iterable = (), kwargs: Optional[dict] = None,
+                 attempts: int = 0, id: Any = None):
+        self.id = id
+        self.name = name
+        self.args = list(args)
+        self.kwargs = kwargs or {}
+        self.attempts = attempts
+
+    def to_json(self) -> str:
+        return json.dumps({'id': self.id, 'name': self.name, 'args': self.args,
+                           'kwargs': self.kwargs, 'attempts': self.attempts})
+
+    @classmethod
+    def from_json(cls, raw) -> 'Job':
+        data = json.loads(raw)
+        return cls(data['name'], data['args'], data['kwargs'], data['attempts'], data.get('id'))
+
+    def run(self) -> Any:
+        return get_job(self.name)(*self.args, **self.kwargs)
+
+    def __repr__(self):
+        return f'<Job {self.name} #{self.id}>'
+
+
+class JobQueue:
+    """Interface commune des files de tâches"""
+
+    backend_name = None
+
+    def enqueue(self, name: str, *args, unique_key: Optional[str] = None, **kwargs) -> Optional[Any]:
+        """
+        Ajoute une tâche à la file
+
+        Args:
+            name: nom de la tâche (voir app/tasks.py)
+            unique_key: ignorer la tâche si une autre a déjà été ajoutée avec cette clé
+
+        Returns:
+            Identifiant de la tâche, None si dédoublonnée
+        """
+        raise NotImplementedError
+
+    def dequeue(self, timeout: float = POLL_INTERVAL) -> Optional[Job]:
+        """Prochaine tâche à exécuter (None après timeout secondes)"""
+        raise NotImplementedError
+
+    def complete(self, job: Job) -> None:
+        """Marque une tâche comme terminée"""
+
+    def fail(self, job: Job, error: str) -> None:
+        """Marque une tâche en échec (nouvel essai jusqu'à MAX_ATTEMPTS)"""
+        raise NotImplementedError
+
+    def size(self) -> int:
+        """Nombre de tâches en attente"""
+        raise NotImplementedError
+
+    def purge_finished(self, days: int = FINISHED_RETENTION_DAYS) -> int:
+        """Supprime les tâches terminées depuis plus de days jours, retourne leur nombre"""
+        return 0
+
+
+class MemoryJobQueue(JobQueue):
+    """Exécution dans le pool de threads du processus (immédiate en test)"""
+
+    backend_name = 'memory'
+
+    def enqueue(self, name: str, *args, unique_key: Optional[str] = None, **kwargs) -> Optional[Any]:
+        from app.services.background import run_in_background
+
+        get_job(name)  # Nom invalide : erreur dans l'appelant plutôt que dans le thread
+        job = Job(name, args, kwargs, id=uuid.uuid4().hex)
+        run_in_background(job.run)
+        return job.id
+
+    def dequeue(self, timeout: float = POLL_INTERVAL) -> Optional[Job]:
+        time.sleep(timeout)
+        return None
+
+    def fail(self, job: Job, error: str) -> None:
+        pass
+
+    def size(self) -> int:
+        return 0
+
+
+class RedisJobQueue(JobQueue):
+    """
+    File partagée dans Redis
+
+    Tâches prêtes : liste (LPUSH / BRPOP). Nouveaux essais différés :
+    ensemble trié par date d'exécution, déplacés dans la liste par le worker.
+    """
+
+    backend_name = 'redis'
+
+    def __init__(self, client):
+        self.client = client
+
+    def enqueue(self, name: str, *args, unique_key: Optional[str] = None, **kwargs) -> Optional[Any]:
+        job = Job(name, args, kwargs, id=f"{time.time_ns():x}")
+        try:
+            if unique_key and not self.client.set(REDIS_UNIQUE_PREFIX + unique_key, 1, nx=True, ex=UNIQUE_TTL):
+                return None
+            self.client.lpush(REDIS_QUEUE_KEY, job.to_json())
+        except RedisError as e:
+            if unique_key:
+                raise  # Tâche planifiée : le planificateur réessaie à la minute suivante
+            # Appelé après le commit de la requête : la tâche ne doit pas la faire échouer
+            logger.error(f"Job queue unavailable, running {name} in-process: {e}")
+            return MemoryJobQueue().enqueue(name, *args, **kwargs)
+        return job.id
+
+    def dequeue(self, timeout: float = POLL_INTERVAL) -> Optional[Job]:
+        self._promote_delayed()
+        item = self.client.brpop(REDIS_QUEUE_KEY, timeout=max(1, int(timeout)))
+        if item is None:
+            return None
+        return Job.from_json(item[1])
+
+    def _promote_delayed(self) -> None:
+        """Remet dans la file les nouveaux essais arrivés à échéance"""
+        due = self.client.zrangebyscore(REDIS_DELAYED_KEY, 0, time.time())
+        for raw in due:
+            # ZREM garantit qu'un seul worker remet la tâche dans la file
+            if self.client.zrem(REDIS_DELAYED_KEY, raw):
+                self.client.lpush(REDIS_QUEUE_KEY, raw)
+
+    def fail(self, job: Job, error: str) -> None:
+        job.attempts += 1
+        if job.attempts >= MAX_ATTEMPTS:
+            logger.error(f"Job {job.name} failed permanently after {job.attempts} attempts: {error}")
+            return
+        self.client.zadd(REDIS_DELAYED_KEY, {job.to_json(): time.time() + RETRY_DELAY * job.attempts})
+
+    def size(self) -> int:
+        return self.client.llen(REDIS_QUEUE_KEY) + self.client.zcard(REDIS_DELAYED_KEY)
+
+
+class DatabaseJobQueue(JobQueue):
+    """
+    File dans la table background_job
+
+    L'ajout utilise sa propre connexion : la transaction de la requête en
+    cours n'est pas commitée. Un worker réserve une tâche par UPDATE
+    conditionnel sur son statut, plusieurs workers peuvent donc coexister.
+    """
+
+    backend_name = 'database'
+
+    @property
+    def table(self):
+        from app.models import BackgroundJob
+        return BackgroundJob.__table__
+
+    @staticmethod
+    def _now() -> datetime:
+        from app.models import utc_now
+        return utc_now()
+
+    def enqueue(self, name: str, *args, unique_key: Optional[str] = None, **kwargs) -> Optional[Any]:
+        table = self.table
+        now = self._now()
+        with db.engine.begin() as connection:
+            if unique_key and connection.execute(
+                db.select(table.c.id).where(table.c.unique_key == unique_key)
+            ).first():
+                return None
+            try:
+                result = connection.execute(table.insert().values(
+                    name=name,
+                    payload=json.dumps({'args': list(args), 'kwargs': kwargs}),
+                    status='queued',
+                    attempts=0,
+                    unique_key=unique_key,
+                    run_at=now,
+                    created_at=now
+                ))
+            except IntegrityError:
+                # Même tâche planifiée ajoutée au même moment par un autre processus
+                return None
+            return result.inserted_primary_key[0]
+
+    def dequeue(self, timeout: float = POLL_INTERVAL) -> Optional[Job]:
+        job = self._claim()
+        if job is None:
+            time.sleep(timeout)
+        return job
+
+    def _claim(self) -> Optional[Job]:
+        table = self.table
+        now = self._now()
+        with db.engine.begin() as connection:
+            candidates = connection.execute(
+                db.select(table.c.id, table.c.name, table.c.payload, table.c.attempts)
+                .where(table.c.status == 'queued', table.c.run_at <= now)
+                .order_by(table.c.run_at, table.c.id)
+                .limit(5)
+            ).all()
+            for job_id, name, payload, attempts in candidates:
+                claimed = connection.execute(
+                    table.update()
+                    .where(table.c.id == job_id, table.c.status == 'queued')
+                    .values(status='running', started_at=now)
+                ).rowcount
+                if claimed:
+                    data = json.loads(payload)
+                    return Job(name, data['args'], data['kwargs'], attempts, id=job_id)
+        return None
+
+    def complete(self, job: Job) -> None:
+        with db.engine.begin() as connection:
+            connection.execute(self.table.update().where(self.table.c.id == job.id).values(
+                status='done', attempts=job.attempts + 1, finished_at=self._now()
+            ))
+
+    def fail(self, job: Job, error: str) -> None:
+        job.attempts += 1
+        values = {'attempts': job.attempts, 'error': error}
+        if job.attempts >= MAX_ATTEMPTS:
+            logger.error(f"Job {job.name} failed permanently after {job.attempts} attempts")
+            values.update(status='failed', finished_at=self._now())
+        else:
+            values.update(status='queued', run_at=self._now() + timedelta(seconds=RETRY_DELAY * job.attempts))
+        with db.engine.begin() as connection:
+            connection.execute(self.table.update().where(self.table.c.id == job.id).values(**values))
+
+    def size(self) -> int:
+        with db.engine.connect() as connection:
+            return connection.execute(
+                db.select(db.func.count()).select_from(self.table).where(self.table.c.status == 'queued')
+            ).scalar()
+
+    def purge_finished(self, days: int = FINISHED_RETENTION_DAYS) -> int:
+        # Les lignes sont gardées quelques jours : leur unique_key dédoublonne
+        # les tâches planifiées, et les échecs restent consultables
+        table = self.table
+        with db.engine.begin() as connection:
+            return connection.execute(table.delete().where(
+                table.c.status.in_(('done', 'failed')),
+                table.c.finished_at < self._now() - timedelta(days=days)
+            )).rowcount
+
+
+def create_job_queue() -> JobQueue:
+    """
+    Crée la file selon JOBS_BACKEND ('redis', 'database' ou 'memory')
+
+    Par défaut Redis est utilisé dès que REDIS_URL est configurée, sinon
+    les tâches s'exécutent dans le processus (memory). En test, toujours memory.
+    """
+    try:
+        if current_app.config.get('TESTING'):
+            return MemoryJobQueue()
+    except RuntimeError:
+        pass
+
+    backend = os.getenv('JOBS_BACKEND', '').lower()
+    if backend == 'database':
+        return DatabaseJobQueue()
+    if backend == 'memory':
+        return MemoryJobQueue()
+
+    client = get_redis()
+    if client is not None:
+        return RedisJobQueue(client)
+    if backend == 'redis':
+        logger.warning("JOBS_BACKEND=redis but Redis is unavailable, running jobs in-process")
+    return MemoryJobQueue()
+
+
+_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    """Retourne la file de tâches du processus (créée au premier appel)"""
+    global _queue
+    if _queue is None:
+        _queue = create_job_queue()
+    return _queue
+
+
+def enqueue(name: str, *args, unique_key: Optional[str] = None, **kwargs) -> Optional[Any]:
+    """Ajoute une tâche à la file configurée (voir JobQueue.enqueue)"""
+    return get_job_queue().enqueue(name, *args, unique_key=unique_key, **kwargs)
+
+
+# =============================================================================
+# PLANIFICATEUR
+# =============================================================================
+
+class CronSchedule:
+    """
+    Expression cron à cinq champs : minute heure jour mois jour_semaine
+
+    Formes acceptées par champ : '*', '*/n', 'a', 'a-b', 'a-b/n' et listes 'a,b'.
+    Jour de la semaine : 0 = dimanche (7 accepté aussi).
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Expression cron invalide : {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        values = set()
+        for item in field.split(','):
+            item, _, step = item.partition('/')
+            if item == '*':
+                start, end = low, high
+            elif '-' in item:
+                start, end = (int(value) for value in item.split('-', 1))
+            else:
+                start = end = int(item)
+            if start < low or end > high or start > end:
+                raise ValueError(f"Valeur cron hors limites : {field}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def matches(self, moment: datetime) -> bool:
+        # isoweekday : lundi = 1 ... dimanche = 7
+        return (moment.minute in self.minutes and moment.hour in self.hours
+                and moment.day in self.days and moment.month in self.months
+                and moment.isoweekday() % 7 in self.weekdays)
+
+
+class Scheduler:
+    """Ajoute les tâches planifiées à la file à chaque minute correspondante"""
+
+    def __init__(self, queue: JobQueue, entries: Iterable[Tuple[str, str]]):
+        self.queue = queue
+        self.entries = [(CronSchedule(expression), name) for expression, name in entries]
+        self._last_minute = None
+
+    def tick(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Planifie les tâches de la minute courante (une seule fois par minute)
+
+        La clé de dédoublonnage nom + minute évite les doublons entre
+        plusieurs planificateurs partageant la même file (Redis ou base).
+
+        Returns:
+            Noms des tâches ajoutées
+        """
+        minute = (now or datetime.now()).replace(second=0, microsecond=0)
+        if minute == self._last_minute:
+            return []
+        self._last_minute = minute
+
+        queued = []
+        for schedule, name in self.entries:
+            if schedule.matches(minute):
+                unique_key = f"{name}:{minute:%Y%m%d%H%M}"
+                if self.queue.enqueue(name, unique_key=unique_key) is not None:
+                    queued.append(name)
+        return queued
+
+
+# =============================================================================
+# WORKER
+# =============================================================================
+
+class Worker:
+    """Exécute les tâches de la file (et le planificateur si fourni)"""
+
+    def __init__(self, app, queue: JobQueue, scheduler: Optional[Scheduler] = None,
+                 poll_interval: float = POLL_INTERVAL):
+        self.app = app
+        self.queue = queue
+        self.scheduler = scheduler
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self.failed = 0
+        self._stopping = False
+
+    def stop(self, *args) -> None:
+        """Arrêt propre après la tâche en cours"""
+        logger.info("Worker stopping")
+        self._stopping = True
+
+    def install_signal_handlers(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run(self, burst: bool = False) -> None:
+        """
+        Boucle principale
+
+        Args:
+            burst: s'arrêter dès que la file est vide
+        """
+        logger.info(f"Worker started ({self.queue.backend_name} queue, "
+                    f"scheduler {'on' if self.scheduler else 'off'})")
+        while not self._stopping:
+            with self.app.app_context():
+                if self.scheduler:
+                    for name in self.scheduler.tick():
+                        logger.info(f"Scheduled job {name}")
+                try:
+                    job = self.queue.dequeue(timeout=self.poll_interval)
+                except (RedisError, SQLAlchemyError) as e:
+                    logger.error(f"Job queue unavailable: {e}")
+                    time.sleep(self.poll_interval)
+                    continue
+            if job is None:
+                if burst:
+                    break
+                continue
+            self.execute(job)
+
+    def execute(self, job: Job) -> bool:
+        """
+        Exécute une tâche dans un contexte d'application et une session dédiée
+
+        Une tâche sans identifiant (lancée à la main) n'est pas suivie dans la file.
+        """
+        started = time.perf_counter()
+        with self.app.app_context():
+            try:
+                job.run()
+            except Exception as e:
+                db.session.rollback()
+                self.failed += 1
+                logger.exception(f"Job {job.name} failed")
+                if job.id is not None:
+                    self.queue.fail(job, f"{e}\n{traceback.format_exc()}")
+                return False
+            finally:
+                db.session.remove()
+            if job.id is not None:
+                self.queue.complete(job)
+        self.processed += 1
+        logger.info(f"Job {job.name} done in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return True
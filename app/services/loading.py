@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Profils de chargement des listes (lectures, séances, votes)
+Chaque profil regroupe les options SQLAlchemy nécessaires à un gabarit :
+relations chargées d'avance (joinedload pour les relations vers un seul
+objet, selectinload pour les collections) et compteurs calculés par
+sous-requête. Une page de liste coûte ainsi un nombre constant de
+requêtes, quelle que soit sa longueur.
+
+Exemple:
+    ReadingSession.query.options(*READING_CARD).filter_by(status='current').all()
+"""
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload, undefer, with_expression
+
+from app.models import (
+    BookProposal, Film, FilmVote, FilmVoteOption, FilmVotingSession, ReadingSession,
+    ViewingSession, Vote, VoteOption, VotingSession
+)
+
+# Les backrefs (BookProposal.proposer, ReadingSession.participants...) n'existent
+# qu'une fois les mappers configurés
+configure_mappers()
+
+
+def _count(model, foreign_key, parent):
+    """Sous-requête corrélée : nombre de lignes de model rattachées au parent"""
+    return (
+        select(func.count(model.id))
+        .where(foreign_key == parent.id)
+        .correlate(parent)
+        .scalar_subquery()
+    )
+
+
+# Propositions affichées avec leur proposeur (accueil, tableau de bord)
+PROPOSAL_WITH_PROPOSER = (
+    joinedload(BookProposal.proposer),
+)
+
+# Carte de lecture publique : livre et nombre d'inscrits
+# (inscription de l'utilisateur : ReadingSession.load_registrations)
+READING_CARD = (
+    joinedload(ReadingSession.book),
+    undefer(ReadingSession.participants_count),
+)
+
+# Lecture dans l'administration : livre, proposeur du livre et créateur
+READING_ADMIN = (
+    joinedload(ReadingSession.book).joinedload(BookProposal.proposer),
+    joinedload(ReadingSession.creator),
+)
+
+# Vote avec ses livres candidats (accueil)
+VOTE_WITH_BOOKS = (
+    selectinload(VotingSession.books).joinedload(VoteOption.book),
+)
+
+# Liste des votes : nombre d'options et de bulletins, sans charger les bulletins
+VOTE_COUNTS = (
+    with_expression(VotingSession.options_count, _count(VoteOption, VoteOption.voting_session_id, VotingSession)),
+    with_expression(VotingSession.votes_count, _count(Vote, Vote.voting_session_id, VotingSession)),
+)
+
+# Liste des votes du CinéClub : compteurs et film gagnant
+FILM_VOTE_COUNTS = (
+    with_expression(FilmVotingSession.options_count,
+                    _count(FilmVoteOption, FilmVoteOption.voting_session_id, FilmVotingSession)),
+    with_expression(FilmVotingSession.votes_count,
+                    _count(FilmVote, FilmVote.voting_session_id, FilmVotingSession)),
+    joinedload(FilmVotingSession.winner_film),
+)
+
+# Carte de séance : film, livre adapté et nombre d'inscrits
+VIEWING_CARD = (
+    joinedload(ViewingSession.film).joinedload(Film.book),
+    undefer(ViewingSession.participants_count),
+)
+
+# Film avec le livre dont il est adapté
+FILM_WITH_BOOK = (
+    joinedload(Film.book),
+)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Métriques Prometheus de BiblioRuche (exposées sur /metrics)
+Latence et nombre de requêtes HTTP par endpoint, requêtes SQL par
+requête, attente du pool de connexions, appels Open Library, caches,
+limites de requêtes et octets d'ebooks servis.
+
+Sous gunicorn, PROMETHEUS_MULTIPROC_DIR (défini dans gunicorn.conf.py)
+fait écrire chaque worker dans des fichiers partagés : /metrics agrège
+alors les valeurs de tous les workers, quel que soit celui qui répond.
+prometheus_client est optionnel : sans lui, les mesures sont ignorées.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+        generate_latest, multiprocess
+    )
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    Counter = None
+
+# Seaux des histogrammes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+POOL_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+metrics_available = Counter is not None
+
+if metrics_available:
+    HTTP_REQUESTS = Counter(
+        'biblioruche_http_requests_total', 'HTTP requests by endpoint and status',
+        ['endpoint', 'method', 'status']
+    )
+    HTTP_LATENCY = Histogram(
+        'biblioruche_http_request_duration_seconds', 'HTTP request latency by endpoint',
+        ['endpoint', 'method'], buckets=LATENCY_BUCKETS
+    )
+    SQL_QUERIES = Histogram(
+        'biblioruche_http_request_sql_queries', 'SQL statements executed per HTTP request',
+        ['endpoint'], buckets=QUERY_BUCKETS
+    )
+    SQL_TIME = Histogram(
+        'biblioruche_http_request_sql_seconds', 'Time spent in SQL per HTTP request',
+        ['endpoint'], buckets=LATENCY_BUCKETS
+    )
+    POOL_CHECKOUT = Histogram(
+        'biblioruche_db_pool_checkout_seconds', 'Wait for a database connection from the pool',
+        buckets=POOL_BUCKETS
+    )
+    POOL_IN_USE = Gauge(
+        'biblioruche_db_pool_connections_in_use', 'Database connections checked out of the pool',
+        multiprocess_mode='livesum'
+    )
+    UPSTREAM_LATENCY = Histogram(
+        'biblioruche_upstream_request_duration_seconds', 'Latency of calls to external services',
+        ['service', 'operation'], buckets=LATENCY_BUCKETS
+    )
+    UPSTREAM_ERRORS = Counter(
+        'biblioruche_upstream_errors_total', 'Failed calls to external services',
+        ['service', 'operation', 'reason']
+    )
+    CACHE_REQUESTS = Counter(
+        'biblioruche_cache_requests_total', 'Cache lookups by namespace and result (hit/miss)',
+        ['namespace', 'result']
+    )
+    RATE_LIMITED = Counter(
+        'biblioruche_rate_limit_rejections_total', 'Requests rejected by rate limits (HTTP 429)',
+        ['endpoint']
+    )
+    EBOOK_BYTES = Counter(
+        'biblioruche_ebook_bytes_served_total', 'Ebook bytes sent or handed to the web server',
+        ['delivery']
+    )
+
+
+def _endpoint() -> str:
+    """Nom de l'endpoint Flask (cardinalité bornée, contrairement au chemin)"""
+    from flask import request
+    return request.endpoint or 'unmatched'
+
+
+@contextmanager
+def track_upstream(service: str, operation: str) -> Iterator[None]:
+    """Mesure un appel à un service externe ; les exceptions sont comptées puis propagées"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        if metrics_available:
+            UPSTREAM_ERRORS.labels(service, operation, type(e).__name__).inc()
+        raise
+    finally:
+        if metrics_available:
+            UPSTREAM_LATENCY.labels(service, operation).observe(time.perf_counter() - started)
+
+
+def record_cache(namespace: str, hit: bool) -> None:
+    if metrics_available:
+        CACHE_REQUESTS.labels(namespace, 'hit' if hit else 'miss').inc()
+
+
+def record_rate_limited() -> None:
+    if metrics_available:
+        RATE_LIMITED.labels(_endpoint()).inc()
+
+
+def record_ebook_bytes(delivery: str, size: Optional[int]) -> None:
+    if metrics_available and size:
+        EBOOK_BYTES.labels(delivery).inc(size)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Texte d'exposition Prometheus (agrégé entre workers en mode multiprocess)"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def instrument_pool(engine) -> None:
+    """Connexions en cours d'utilisation et attente lors de l'emprunt au pool"""
+    from sqlalchemy import event
+
+    pool = engine.pool
+    if getattr(pool, '_biblioruche_metrics', False):
+        return
+
+    # Aucun événement SQLAlchemy ne précède l'attente : pool.connect est enveloppé
+    connect = pool.connect
+
+    def timed_connect(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return connect(*args, **kwargs)
+        finally:
+            POOL_CHECKOUT.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    pool._biblioruche_metrics = True
+    event.listen(pool, 'checkout', lambda *args: POOL_IN_USE.inc())
+    event.listen(pool, 'checkin', lambda *args: POOL_IN_USE.dec())
+
+
+def setup_metrics(app, db) -> None:
+    """
+    Mesure chaque requête HTTP (à appeler après setup_query_stats : les
+    after_request s'exécutent en ordre inverse, les requêtes SQL de la
+    requête sont donc encore disponibles)
+
+    - METRICS_ENABLED (défaut : vrai si prometheus_client est installé)
+    - METRICS_TOKEN : si défini, /metrics exige Authorization: Bearer <token>
+    """
+    from flask import g, request
+
+    app.config.setdefault('METRICS_ENABLED',
+                          metrics_available and os.getenv('METRICS_ENABLED', 'True').lower() == 'true')
+    app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    with app.app_context():
+        instrument_pool(db.engine)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        endpoint = _endpoint()
+        HTTP_REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        HTTP_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+
+        stats = g.get('query_stats')
+        if stats is not None:
+            SQL_QUERIES.labels(endpoint).observe(stats.count)
+            SQL_TIME.labels(endpoint).observe(stats.duration)
+        return response
@@ -2,19 +2,84 @@
 """
 Service de notifications pour BiblioRuche
 Gère l'envoi et la gestion des notifications in-app
+Les diffusions à plusieurs utilisateurs sont insérées en masse par lots
+(un commit par lot), éventuellement en tâche de fond avec suivi de progression.
+Les nouvelles notifications et compteurs de non lues sont publiés sur le
+canal de l'utilisateur (flux /api/stream) après chaque commit.
 """
 
 import logging
-from typing import List, Optional
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
 from app import db
-from app.models import Notification, User
+from app.services.cache import get_cache
+from app.services.events import publish_many, user_channel
+from app.models import Notification, User, UserActivityStats, utc_now
 
 logger = logging.getLogger(__name__)
 
+# Nombre d'utilisateurs notifiés par transaction lors d'une diffusion
+BROADCAST_CHUNK_SIZE = 1000
+
+# Durée de conservation de la progression d'une diffusion en tâche de fond
+BROADCAST_PROGRESS_TTL = 3600  # 1 heure
+
+_progress_cache = None
+
+
+def _broadcast_progress():
+    """Cache partagé de la progression des diffusions (créé au premier usage)"""
+    global _progress_cache
+    if _progress_cache is None:
+        _progress_cache = get_cache('broadcasts', default_ttl=BROADCAST_PROGRESS_TTL)
+    return _progress_cache
+
 
 class NotificationService:
     """Service pour gérer les notifications utilisateurs"""
     
+    @staticmethod
+    def serialize(notification) -> Dict[str, Any]:
+        """Représentation JSON d'une notification (API et flux temps réel)"""
+        return {
+            'id': notification.id,
+            'type': notification.type,
+            'title': notification.title,
+            'message': notification.message,
+            'link': notification.link,
+            'icon': notification.icon,
+            'is_read': notification.is_read,
+            'created_at': notification.created_at.isoformat()
+        }
+    
+    @staticmethod
+    def publish_events(unread_counts: Dict[int, int], created: Iterable[Dict[str, Any]] = ()) -> None:
+        """
+        Publie les nouvelles notifications et compteurs de non lues
+        
+        Args:
+            unread_counts: user_id -> nombre de notifications non lues
+            created: notifications sérialisées (avec 'user_id') créées dans la transaction
+        """
+        messages = []
+        notified = set()
+        for notification in created:
+            user_id = notification.pop('user_id')
+            notified.add(user_id)
+            messages.append((user_channel(user_id), 'notification', {
+                'notification': notification,
+                'unread_count': unread_counts.get(user_id, 0)
+            }))
+        messages.extend(
+            (user_channel(user_id), 'unread_count', {'unread_count': count})
+            for user_id, count in unread_counts.items() if user_id not in notified
+        )
+        publish_many(messages)
+    
     @staticmethod
     def notify_badge_awarded(user_id: int, badge_name: str, badge_description: str) -> Notification:
         """
@@ -35,10 +100,8 @@ class NotificationService:
         )
     
     @staticmethod
-    def notify_vote_started(user_id: int, vote_title: str, vote_id: int) -> Notification:
-        """Notifie un utilisateur qu'un nouveau vote a commencé"""
-        return Notification.create_notification(
-            user_id=user_id,
+    def _vote_started(vote_title: str, vote_id: int) -> Dict[str, Any]:
+        return dict(
             notification_type='vote',
             title=f"📊 Nouveau vote : {vote_title}",
             message=f"Un nouveau vote est ouvert ! Participez pour choisir le prochain livre à lire.",
@@ -47,10 +110,8 @@ class NotificationService:
         )
     
     @staticmethod
-    def notify_reading_started(user_id: int, book_title: str, reading_id: int) -> Notification:
-        """Notifie un utilisateur qu'une nouvelle lecture commence"""
-        return Notification.create_notification(
-            user_id=user_id,
+    def _reading_started(book_title: str, reading_id: int) -> Dict[str, Any]:
+        return dict(
             notification_type='reading',
             title=f"📖 Nouvelle lecture : {book_title}",
             message=f"La lecture de \"{book_title}\" commence ! Rejoignez-nous.",
@@ -58,6 +119,30 @@ class NotificationService:
             icon='fa-book-open'
         )
     
+    @staticmethod
+    def _viewing_reminder(film_title: str, session_id: int, date_str: str) -> Dict[str, Any]:
+        return dict(
+            notification_type='cineclub',
+            title=f"🎬 Rappel : {film_title}",
+            message=f"La séance de visionnage de \"{film_title}\" est prévue {date_str}. Ne manquez pas !",
+            link=f"/cineclub/viewing/{session_id}",
+            icon='fa-film'
+        )
+    
+    @staticmethod
+    def notify_vote_started(user_id: int, vote_title: str, vote_id: int) -> Notification:
+        """Notifie un utilisateur qu'un nouveau vote a commencé"""
+        return Notification.create_notification(
+            user_id=user_id, **NotificationService._vote_started(vote_title, vote_id)
+        )
+    
+    @staticmethod
+    def notify_reading_started(user_id: int, book_title: str, reading_id: int) -> Notification:
+        """Notifie un utilisateur qu'une nouvelle lecture commence"""
+        return Notification.create_notification(
+            user_id=user_id, **NotificationService._reading_started(book_title, reading_id)
+        )
+    
     @staticmethod
     def notify_book_approved(user_id: int, book_title: str, book_id: int) -> Notification:
         """Notifie un utilisateur que son livre a été approuvé"""
@@ -89,12 +174,7 @@ class NotificationService:
     def notify_viewing_reminder(user_id: int, film_title: str, session_id: int, date_str: str) -> Notification:
         """Rappel de séance de visionnage CinéClub"""
         return Notification.create_notification(
-            user_id=user_id,
-            notification_type='cineclub',
-            title=f"🎬 Rappel : {film_title}",
-            message=f"La séance de visionnage de \"{film_title}\" est prévue {date_str}. Ne manquez pas !",
-            link=f"/cineclub/viewing/{session_id}",
-            icon='fa-film'
+            user_id=user_id, **NotificationService._viewing_reminder(film_title, session_id, date_str)
         )
     
     @staticmethod
@@ -111,47 +191,164 @@ class NotificationService:
     
     @staticmethod
     def broadcast_notification(notification_type: str, title: str, message: str, 
-                               link: str = None, exclude_user_ids: List[int] = None) -> int:
+                               link: str = None, exclude_user_ids: List[int] = None,
+                               icon: str = None, user_ids: Iterable[int] = None,
+                               job_id: str = None) -> int:
         """
         Envoie une notification à tous les utilisateurs
         
+        Insertion en masse par lots de BROADCAST_CHUNK_SIZE utilisateurs, un
+        commit par lot. Les insertions en masse ne déclenchent pas les
+        événements ORM : les compteurs de non lues sont incrémentés
+        explicitement pour chaque lot.
+        
         Args:
             notification_type: Type de notification
             title: Titre
             message: Message
             link: Lien optionnel
             exclude_user_ids: Liste d'IDs à exclure
+            icon: Icône FontAwesome (par défaut selon le type)
+            user_ids: Restreindre la diffusion à ces utilisateurs
+            job_id: Identifiant de suivi de progression (diffusion en tâche de fond)
         
         Returns:
             Nombre de notifications envoyées
         """
-        users = User.query.all()
+        recipients = db.select(User.id)
+        if user_ids is not None:
+            recipients = recipients.where(User.id.in_(list(user_ids)))
+        if exclude_user_ids:
+            recipients = recipients.where(User.id.notin_(exclude_user_ids))
+        
+        total = db.session.execute(
+            db.select(db.func.count()).select_from(recipients.subquery())
+        ).scalar()
+        
+        values = {
+            'type': notification_type,
+            'title': title,
+            'message': message,
+            'link': link,
+            'icon': icon or Notification.get_default_icon(notification_type),
+            'is_read': False
+        }
+        stats = UserActivityStats.__table__
         count = 0
+        failed = 0
+        last_id = 0
         
-        for user in users:
-            if exclude_user_ids and user.id in exclude_user_ids:
-                continue
+        NotificationService._set_progress(job_id, 'running', count, total)
+        while True:
+            chunk = db.session.execute(
+                recipients.where(User.id > last_id).order_by(User.id).limit(BROADCAST_CHUNK_SIZE)
+            ).scalars().all()
+            if not chunk:
+                break
+            last_id = chunk[-1]
             
             try:
-                Notification.create_notification(
-                    user_id=user.id,
-                    notification_type=notification_type,
-                    title=title,
-                    message=message,
-                    link=link
-                )
-                count += 1
+                created_at = utc_now()
+                notifications = Notification.__table__
+                rows = db.session.execute(
+                    notifications.insert().returning(notifications.c.id, notifications.c.user_id),
+                    [dict(values, user_id=user_id, created_at=created_at) for user_id in chunk]
+                ).all()
+                unread_counts = dict(db.session.execute(
+                    stats.update()
+                    .where(stats.c.user_id.in_(chunk))
+                    .values(unread_notifications=stats.c.unread_notifications + 1)
+                    .returning(stats.c.user_id, stats.c.unread_notifications)
+                ).all())
+                db.session.commit()
+                count += len(chunk)
+                
+                NotificationService.publish_events(unread_counts, [
+                    dict(values, id=notification_id, user_id=user_id,
+                         created_at=created_at.isoformat())
+                    for notification_id, user_id in rows
+                ])
             except Exception as e:
-                logger.error(f"Failed to create notification for user {user.id}: {e}")
+                db.session.rollback()
+                failed += len(chunk)
+                logger.error(f"Failed to create notifications for users {chunk[0]}-{chunk[-1]}: {e}")
+            
+            NotificationService._set_progress(job_id, 'running', count, total, failed)
         
+        NotificationService._set_progress(job_id, 'done', count, total, failed)
         logger.info(f"Broadcast notification sent to {count} users")
         return count
     
+    @staticmethod
+    def broadcast_notification_async(notification_type: str, title: str, message: str, **kwargs) -> str:
+        """
+        Lance broadcast_notification dans la file de tâches
+        
+        Returns:
+            Identifiant de suivi à passer à get_broadcast_progress()
+        """
+        from app.services.jobs import enqueue
+        
+        job_id = uuid.uuid4().hex
+        NotificationService._set_progress(job_id, 'queued', 0, None)
+        enqueue('notifications.broadcast', notification_type, title, message, job_id=job_id, **kwargs)
+        return job_id
+    
+    @staticmethod
+    def get_broadcast_progress(job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Progression d'une diffusion en tâche de fond
+        
+        Returns:
+            {'status': queued|running|done, 'sent', 'failed', 'total'} ou None si inconnue
+        """
+        return _broadcast_progress().get(job_id)
+    
+    @staticmethod
+    def _set_progress(job_id: Optional[str], status: str, sent: int, total: Optional[int],
+                      failed: int = 0) -> None:
+        if job_id:
+            _broadcast_progress().set(job_id, {
+                'status': status, 'sent': sent, 'failed': failed, 'total': total
+            })
+    
+    @staticmethod
+    def broadcast_vote_started(vote_title: str, vote_id: int, background: bool = True, **kwargs):
+        """Annonce un nouveau vote à tous les utilisateurs (identifiant de suivi si background)"""
+        return NotificationService._broadcast(
+            NotificationService._vote_started(vote_title, vote_id), background, **kwargs
+        )
+    
+    @staticmethod
+    def broadcast_reading_started(book_title: str, reading_id: int, background: bool = True, **kwargs):
+        """Annonce une nouvelle lecture à tous les utilisateurs (identifiant de suivi si background)"""
+        return NotificationService._broadcast(
+            NotificationService._reading_started(book_title, reading_id), background, **kwargs
+        )
+    
+    @staticmethod
+    def broadcast_viewing_reminder(film_title: str, session_id: int, date_str: str,
+                                   user_ids: Iterable[int], background: bool = True, **kwargs):
+        """Rappel de séance CinéClub pour une liste de participants"""
+        return NotificationService._broadcast(
+            NotificationService._viewing_reminder(film_title, session_id, date_str),
+            background, user_ids=list(user_ids), **kwargs
+        )
+    
+    @staticmethod
+    def _broadcast(content: Dict[str, Any], background: bool, **kwargs):
+        if background:
+            return NotificationService.broadcast_notification_async(**content, **kwargs)
+        return NotificationService.broadcast_notification(**content, **kwargs)
+    
     @staticmethod
     def mark_all_as_read(user_id: int) -> int:
         """
         Marque toutes les notifications d'un utilisateur comme lues
         
+        La mise à jour en masse ne déclenche pas les événements ORM : le
+        compteur de non lues est remis à zéro explicitement.
+        
         Returns:
             Nombre de notifications marquées
         """
@@ -165,7 +362,12 @@ class NotificationService:
             'read_at': utc_now()
         })
         
+        stats = UserActivityStats.__table__
+        db.session.execute(
+            stats.update().where(stats.c.user_id == user_id).values(unread_notifications=0)
+        )
         db.session.commit()
+        NotificationService.publish_events({user_id: 0})
         return result
     
     @staticmethod
@@ -196,3 +398,43 @@ class NotificationService:
 
 # Instance singleton
 notification_service = NotificationService()
+
+
+# =============================================================================
+# PUBLICATION TEMPS RÉEL APRÈS COMMIT
+# =============================================================================
+
+@event.listens_for(Session, 'after_flush')
+def _collect_notification_events(session, flush_context):
+    created = [obj for obj in session.new if isinstance(obj, Notification)]
+    user_ids = {obj.user_id for obj in created}
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, Notification):
+            user_ids.add(obj.user_id)
+    user_ids.discard(None)
+    if not user_ids:
+        return
+    
+    # Compteurs mis à jour par les événements du flush, lus dans la même transaction
+    stats = UserActivityStats.__table__
+    counts = session.info.setdefault('notification_unread_counts', {})
+    counts.update(session.connection().execute(
+        db.select(stats.c.user_id, stats.c.unread_notifications).where(stats.c.user_id.in_(user_ids))
+    ).all())
+    session.info.setdefault('notification_created', []).extend(
+        dict(NotificationService.serialize(obj), user_id=obj.user_id) for obj in created
+    )
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_notification_events(session):
+    counts = session.info.pop('notification_unread_counts', None)
+    created = session.info.pop('notification_created', [])
+    if counts:
+        NotificationService.publish_events(counts, created)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _reset_notification_events(session):
+    session.info.pop('notification_unread_counts', None)
+    session.info.pop('notification_created', None)
@@ -8,7 +8,9 @@ import requests
 import logging
 from typing import Optional, List, Dict, Any
 from functools import lru_cache
-import time
+from app.services.cache import CacheBackend, get_cache
+from app.services.metrics import track_upstream
+from app.services.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -19,33 +21,40 @@ OPEN_LIBRARY_COVERS_URL = "https://covers.openlibrary.org/b"
 # Cache timeout en secondes
 CACHE_TIMEOUT = 3600  # 1 heure
 
+# Nombre maximal d'entrées du cache en mémoire
+CACHE_MAX_ENTRIES = 2048
+
 
 class OpenLibraryService:
     """Service pour interagir avec l'API Open Library"""
     
-    def __init__(self, timeout: int = 10):
+    def __init__(self, timeout: int = 10, cache: Optional[CacheBackend] = None):
         self.timeout = timeout
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'BiblioRuche/1.0 (Book Club App)'
         })
-        self._cache = {}
-        self._cache_times = {}
+        # Cache partagé (Redis si configuré, sinon LRU en mémoire)
+        self.cache = cache or get_cache(
+            'openlibrary', default_ttl=CACHE_TIMEOUT, max_entries=CACHE_MAX_ENTRIES
+        )
+        # Une seule requête amont par clé pour les appels concurrents
+        self._flight = SingleFlight(self.cache)
     
     def _get_cached(self, key: str) -> Optional[Any]:
         """Récupère une valeur du cache si non expirée"""
-        if key in self._cache:
-            if time.time() - self._cache_times.get(key, 0) < CACHE_TIMEOUT:
-                return self._cache[key]
-            else:
-                del self._cache[key]
-                del self._cache_times[key]
-        return None
+        return self.cache.get(key)
     
     def _set_cached(self, key: str, value: Any) -> None:
         """Met en cache une valeur"""
-        self._cache[key] = value
-        self._cache_times[key] = time.time()
+        self.cache.set(key, value, ttl=CACHE_TIMEOUT)
+    
+    def _get(self, operation: str, url: str, params: Dict[str, Any]) -> requests.Response:
+        """Appel à l'API (latence et erreurs exportées dans /metrics)"""
+        with track_upstream('openlibrary', operation):
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+        return response
     
     def search_books(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """
@@ -60,10 +69,18 @@ class OpenLibraryService:
         """
         cache_key = f"search:{query}:{limit}"
         cached = self._get_cached(cache_key)
-        if cached:
+        if cached is not None:
             logger.debug(f"Cache hit for search: {query}")
             return cached
         
+        return self._flight.do(cache_key, lambda: self._fetch_search(query, limit, cache_key))
+    
+    def _fetch_search(self, query: str, limit: int, cache_key: str) -> List[Dict[str, Any]]:
+        """Interroge l'API de recherche et met le résultat en cache"""
+        cached = self.cache.peek(cache_key)  # Miss déjà compté par l'appelant
+        if cached is not None:
+            return cached
+        
         try:
             params = {
                 'q': query,
@@ -71,12 +88,7 @@ class OpenLibraryService:
                 'fields': 'key,title,author_name,first_publish_year,isbn,cover_i,number_of_pages_median,subject'
             }
             
-            response = self.session.get(
-                OPEN_LIBRARY_SEARCH_URL,
-                params=params,
-                timeout=self.timeout
-            )
-            response.raise_for_status()
+            response = self._get('search', OPEN_LIBRARY_SEARCH_URL, params)
             
             data = response.json()
             books = []
@@ -128,7 +140,15 @@ class OpenLibraryService:
         """
         cache_key = f"isbn:{isbn}"
         cached = self._get_cached(cache_key)
-        if cached:
+        if cached is not None:
+            return cached
+        
+        return self._flight.do(cache_key, lambda: self._fetch_isbn(isbn, cache_key))
+    
+    def _fetch_isbn(self, isbn: str, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Interroge l'API des livres par ISBN et met le résultat en cache"""
+        cached = self.cache.peek(cache_key)  # Miss déjà compté par l'appelant
+        if cached is not None:
             return cached
         
         try:
@@ -141,12 +161,7 @@ class OpenLibraryService:
                 'jscmd': 'data'
             }
             
-            response = self.session.get(
-                OPEN_LIBRARY_BOOK_URL,
-                params=params,
-                timeout=self.timeout
-            )
-            response.raise_for_status()
+            response = self._get('isbn', OPEN_LIBRARY_BOOK_URL, params)
             
             data = response.json()
             key = f'ISBN:{clean_isbn}'
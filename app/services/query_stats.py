@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Comptage des requêtes SQL par requête HTTP et détection des N+1
+Des événements SQLAlchemy mesurent chaque instruction exécutée : nombre,
+temps passé en base et instructions identiques répétées (même SQL, seuls
+les paramètres changent), signe d'un chargement paresseux dans une boucle.
+Les chiffres sont exposés dans les en-têtes de réponse (mode debug), dans
+les logs JSON et aux tests (fixture query_budget de tests/conftest.py).
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Une instruction exécutée au moins N fois dans une requête est signalée (N+1)
+REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', '5'))
+
+# Longueur maximale du SQL recopié dans les logs
+MAX_STATEMENT_LENGTH = 300
+
+
+class QueryStats:
+    """Requêtes SQL d'une requête HTTP (ou d'un bloc capture_queries)"""
+
+    def __init__(self, repeat_threshold: int = REPEAT_THRESHOLD):
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            self.statements[statement] += 1
+
+    @property
+    def duration_ms(self) -> float:
+        return round(self.duration * 1000, 2)
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Instructions exécutées au moins threshold fois, les plus fréquentes d'abord"""
+        threshold = threshold or self.repeat_threshold
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+    def summary(self) -> dict:
+        """Champs des logs JSON"""
+        return {
+            'sql_queries': self.count,
+            'sql_time_ms': self.duration_ms,
+            'sql_repeated': [
+                {'statement': ' '.join(statement.split())[:MAX_STATEMENT_LENGTH], 'count': n}
+                for statement, n in self.repeated()
+            ],
+        }
+
+
+# Blocs capture_queries actifs (tous threads confondus)
+_captures: List[QueryStats] = []
+_captures_lock = threading.Lock()
+_listening = False
+
+
+def _current_stats() -> Optional[QueryStats]:
+    if has_request_context():
+        return g.get('query_stats')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    duration = time.perf_counter() - started.pop()
+    stats = _current_stats()
+    if stats is not None:
+        stats.record(statement, duration)
+    for capture in list(_captures):
+        capture.record(statement, duration)
+
+
+def install_query_hooks() -> None:
+    """Branche les événements sur tous les moteurs (une seule fois par processus)"""
+    global _listening
+    if _listening:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _listening = True
+
+
+@contextmanager
+def capture_queries(repeat_threshold: int = REPEAT_THRESHOLD) -> Iterator[QueryStats]:
+    """
+    Compte les requêtes SQL exécutées dans le bloc (tests, scripts)
+
+    Exemple:
+        with capture_queries() as stats:
+            client.get('/books')
+        assert stats.count <= 12
+    """
+    install_query_hooks()
+    stats = QueryStats(repeat_threshold)
+    with _captures_lock:
+        _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        with _captures_lock:
+            _captures.remove(stats)
+
+
+def setup_query_stats(app) -> None:
+    """
+    Compte les requêtes SQL de chaque requête HTTP
+
+    - QUERY_STATS_HEADERS (défaut : mode debug) : en-têtes X-Query-Count,
+      X-Query-Time-Ms et Server-Timing (onglet Réseau du navigateur)
+    - QUERY_STATS_LOG (défaut : mode debug) : une ligne de log par requête
+    - Les instructions répétées (N+1) sont toujours journalisées en WARNING
+    """
+    app.config.setdefault('QUERY_STATS_ENABLED', os.getenv('QUERY_STATS_ENABLED', 'True').lower() == 'true')
+    app.config.setdefault('QUERY_STATS_HEADERS', app.debug)
+    app.config.setdefault('QUERY_STATS_LOG', app.debug)
+    app.config.setdefault('QUERY_REPEAT_THRESHOLD', REPEAT_THRESHOLD)
+
+    if not app.config['QUERY_STATS_ENABLED']:
+        return
+    install_query_hooks()
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats(app.config['QUERY_REPEAT_THRESHOLD'])
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+
+        if app.config['QUERY_STATS_HEADERS']:
+            response.headers['X-Query-Count'] = str(stats.count)
+            response.headers['X-Query-Time-Ms'] = str(stats.duration_ms)
+            response.headers.add('Server-Timing', f'db;dur={stats.duration_ms};desc="{stats.count} queries"')
+
+        fields = dict(stats.summary(), method=request.method, path=request.path, status=response.status_code)
+        if fields['sql_repeated']:
+            app.logger.warning('Repeated SQL statements (possible N+1)', extra=fields)
+        elif app.config['QUERY_STATS_LOG']:
+            app.logger.info('Request SQL stats', extra=fields)
+        return response
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Client Redis partagé pour BiblioRuche
+Un pool de connexions par URL, réutilisé par le cache, les verrous
+et les autres services. Redis reste optionnel : sans REDIS_URL (ou sans
+la librairie redis), get_redis() retourne None et les services se
+rabattent sur leurs implémentations en mémoire.
+"""
+
+import logging
+import os
+import threading
+from typing import Optional
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Taille maximale du pool de connexions par processus
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '20'))
+
+# Timeout des opérations Redis en secondes
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '2'))
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_redis_url() -> Optional[str]:
+    """Retourne l'URL Redis configurée (config Flask puis variable d'environnement)"""
+    try:
+        from flask import current_app
+        url = current_app.config.get('REDIS_URL')
+    except RuntimeError:
+        url = None
+    return url or os.getenv('REDIS_URL') or None
+
+
+def get_redis(url: Optional[str] = None):
+    """
+    Retourne un client Redis partagé
+
+    Args:
+        url: URL Redis (défaut: REDIS_URL)
+
+    Returns:
+        Client redis.Redis ou None si Redis n'est pas configuré
+    """
+    url = url or get_redis_url()
+    if not url:
+        return None
+    if redis is None:
+        logger.warning("REDIS_URL is set but the redis package is not installed")
+        return None
+
+    with _lock:
+        client = _clients.get(url)
+        if client is None:
+            client = redis.Redis.from_url(
+                url,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                health_check_interval=30
+            )
+            _clients[url] = client
+    return client
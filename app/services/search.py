@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+Index de recherche plein texte pour BiblioRuche
+Un index unique (livres, ebooks, films) tenu à jour par les événements
+SQLAlchemy :
+- PostgreSQL : table search_document avec colonne tsvector (configuration
+  'french', unaccent si l'extension est disponible) et index GIN
+- SQLite : table virtuelle FTS5 (suppression des accents, recherche par
+  préfixe en l'absence de racinisation française)
+Sans moteur plein texte disponible, les routes retombent sur ILIKE.
+
+Le schéma de l'index est créé par une migration (flask db upgrade) ; au
+démarrage, chaque processus vérifie seulement sa présence.
+"""
+
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from markupsafe import Markup, escape
+from sqlalchemy import event
+from sqlalchemy.orm import load_only
+
+from app import db
+from app.models import BookProposal, Ebook, Film
+
+logger = logging.getLogger(__name__)
+
+# Intervalle entre deux vérifications d'un index absent (en secondes)
+DETECT_RETRY_INTERVAL = 60
+
+# Marqueurs de surlignage insérés par le moteur puis convertis en <mark>
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+# Documents indexés : type -> (modèle, champs (titre, auteur, corps), colonnes ILIKE de repli)
+SEARCH_DOCUMENTS = {
+    'book': (
+        BookProposal,
+        lambda book: (book.title, book.author, book.description),
+        lambda: (BookProposal.title, BookProposal.author, BookProposal.description),
+    ),
+    'ebook': (
+        Ebook,
+        lambda ebook: (ebook.title, ebook.author, ebook.description),
+        lambda: (Ebook.title, Ebook.author),
+    ),
+    'film': (
+        Film,
+        lambda film: (
+            ' '.join(filter(None, [film.title, film.original_title])),
+            film.director,
+            film.synopsis
+        ),
+        lambda: (Film.title, Film.director),
+    ),
+}
+
+# Attributs dont la modification nécessite une réindexation
+INDEXED_ATTRIBUTES = {
+    BookProposal: ('title', 'author', 'description'),
+    Ebook: ('title', 'author', 'description'),
+    Film: ('title', 'original_title', 'director', 'synopsis'),
+}
+
+
+class SqliteFtsBackend:
+    """Index FTS5 pour SQLite (développement)"""
+
+    def detect(self, connection) -> bool:
+        return connection.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'search_index'"
+        )).first() is not None
+
+    def create_schema(self, connection) -> bool:
+        if self.detect(connection):
+            return False
+        connection.execute(db.text(
+            "CREATE VIRTUAL TABLE search_index USING fts5("
+            "doc_type UNINDEXED, doc_id UNINDEXED, title, author, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        return True
+
+    def upsert(self, connection, doc_type, doc_id, title, author, body):
+        self.delete(connection, doc_type, doc_id)
+        connection.execute(db.text(
+            "INSERT INTO search_index (doc_type, doc_id, title, author, body) "
+            "VALUES (:doc_type, :doc_id, :title, :author, :body)"
+        ), dict(doc_type=doc_type, doc_id=doc_id, title=title or '', author=author or '', body=body or ''))
+
+    def delete(self, connection, doc_type, doc_id):
+        connection.execute(db.text(
+            "DELETE FROM search_index WHERE doc_type = :doc_type AND doc_id = :doc_id"
+        ), dict(doc_type=doc_type, doc_id=doc_id))
+
+    def clear(self, connection, doc_type=None):
+        if doc_type is None:
+            connection.execute(db.text("DELETE FROM search_index"))
+        else:
+            connection.execute(db.text(
+                "DELETE FROM search_index WHERE doc_type = :doc_type"
+            ), dict(doc_type=doc_type))
+
+    @staticmethod
+    def _match_expression(text: str) -> Optional[str]:
+        """Convertit la saisie utilisateur en requête FTS5 sûre (termes préfixés)"""
+        terms = re.findall(r'\w+', text, re.UNICODE)
+        if not terms:
+            return None
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def hits(self, doc_type: str, text: str):
+        match = self._match_expression(text)
+        if match is None:
+            return None
+        # bm25 : plus petit = plus pertinent ; poids titre > auteur > corps
+        return db.text(
+            "SELECT CAST(doc_id AS INTEGER) AS doc_id, "
+            "-bm25(search_index, 0, 0, 10.0, 5.0, 1.0) AS score "
+            "FROM search_index WHERE search_index MATCH :match AND doc_type = :doc_type"
+        ).bindparams(match=match, doc_type=doc_type).columns(
+            doc_id=db.Integer, score=db.Float
+        ).subquery('search_hits')
+
+    def snippets(self, doc_type: str, text: str, doc_ids: List[int]) -> Dict[int, str]:
+        match = self._match_expression(text)
+        if match is None or not doc_ids:
+            return {}
+        # Extraits calculés seulement pour les résultats de la page affichée
+        rows = db.session.execute(db.text(
+            "SELECT CAST(doc_id AS INTEGER), "
+            "snippet(search_index, -1, :start, :end, '…', 16) "
+            "FROM search_index WHERE search_index MATCH :match AND doc_type = :doc_type "
+            "AND doc_id IN :doc_ids"
+        ).bindparams(db.bindparam('doc_ids', expanding=True)), dict(
+            match=match, doc_type=doc_type, doc_ids=list(doc_ids), start=HIGHLIGHT_START, end=HIGHLIGHT_END
+        ))
+        return {doc_id: snippet for doc_id, snippet in rows}
+
+
+class PostgresSearchBackend:
+    """Index tsvector + GIN pour PostgreSQL (production)"""
+
+    def __init__(self):
+        self.unaccent = False
+
+    def _normalize(self, expression: str) -> str:
+        return f"unaccent({expression})" if self.unaccent else expression
+
+    def detect(self, connection) -> bool:
+        self.unaccent = connection.execute(db.text(
+            "SELECT 1 FROM pg_extension WHERE extname = 'unaccent'"
+        )).first() is not None
+        return connection.execute(db.text("SELECT to_regclass('search_document')")).scalar() is not None
+
+    def create_schema(self, connection) -> bool:
+        try:
+            with connection.begin_nested():
+                connection.execute(db.text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+            self.unaccent = True
+        except Exception as e:
+            logger.warning(f"unaccent extension unavailable, accents will be significant: {e}")
+            self.unaccent = False
+
+        exists = connection.execute(db.text("SELECT to_regclass('search_document')")).scalar()
+        if exists:
+            return False
+        connection.execute(db.text(
+            "CREATE TABLE search_document ("
+            "doc_type VARCHAR(20) NOT NULL, doc_id INTEGER NOT NULL, "
+            "title TEXT, author TEXT, body TEXT, document TSVECTOR NOT NULL, "
+            "PRIMARY KEY (doc_type, doc_id))"
+        ))
+        connection.execute(db.text(
+            "CREATE INDEX ix_search_document_document ON search_document USING GIN (document)"
+        ))
+        return True
+
+    def upsert(self, connection, doc_type, doc_id, title, author, body):
+        document = (
+            f"setweight(to_tsvector('french', {self._normalize(':title')}), 'A') || "
+            f"setweight(to_tsvector('french', {self._normalize(':author')}), 'B') || "
+            f"setweight(to_tsvector('french', {self._normalize(':body')}), 'C')"
+        )
+        connection.execute(db.text(
+            "INSERT INTO search_document (doc_type, doc_id, title, author, body, document) "
+            f"VALUES (:doc_type, :doc_id, :title, :author, :body, {document}) "
+            "ON CONFLICT (doc_type, doc_id) DO UPDATE SET "
+            "title = EXCLUDED.title, author = EXCLUDED.author, "
+            "body = EXCLUDED.body, document = EXCLUDED.document"
+        ), dict(doc_type=doc_type, doc_id=doc_id, title=title or '', author=author or '', body=body or ''))
+
+    def delete(self, connection, doc_type, doc_id):
+        connection.execute(db.text(
+            "DELETE FROM search_document WHERE doc_type = :doc_type AND doc_id = :doc_id"
+        ), dict(doc_type=doc_type, doc_id=doc_id))
+
+    def clear(self, connection, doc_type=None):
+        if doc_type is None:
+            connection.execute(db.text("DELETE FROM search_document"))
+        else:
+            connection.execute(db.text(
+                "DELETE FROM search_document WHERE doc_type = :doc_type"
+            ), dict(doc_type=doc_type))
+
+    def _tsquery(self) -> str:
+        return f"websearch_to_tsquery('french', {self._normalize(':text')})"
+
+    def hits(self, doc_type: str, text: str):
+        if not text.strip():
+            return None
+        return db.text(
+            f"SELECT doc_id, ts_rank_cd(document, {self._tsquery()}) AS score "
+            f"FROM search_document WHERE doc_type = :doc_type AND document @@ {self._tsquery()}"
+        ).bindparams(text=text, doc_type=doc_type).columns(
+            doc_id=db.Integer, score=db.Float
+        ).subquery('search_hits')
+
+    def snippets(self, doc_type: str, text: str, doc_ids: List[int]) -> Dict[int, str]:
+        if not doc_ids or not text.strip():
+            return {}
+        options = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=30, MinWords=12"
+        rows = db.session.execute(db.text(
+            "SELECT doc_id, ts_headline('french', coalesce(nullif(body, ''), title), "
+            f"{self._tsquery()}, :options) "
+            "FROM search_document WHERE doc_type = :doc_type AND doc_id = ANY(:doc_ids)"
+        ), dict(text=text, doc_type=doc_type, doc_ids=list(doc_ids), options=options))
+        return dict(rows.all())
+
+
+class SearchIndex:
+    """Point d'entrée de l'index plein texte (backend choisi selon le moteur SQL)"""
+
+    BACKENDS = {
+        'sqlite': SqliteFtsBackend,
+        'postgresql': PostgresSearchBackend,
+    }
+
+    def __init__(self):
+        self._backends = {}
+        self._last_detection = {}
+
+    def _backend(self, connection=None):
+        """Backend actif pour la connexion (None si indisponible)"""
+        dialect = (connection or db.session.get_bind()).dialect.name
+        backend = self._backends.get(dialect)
+        if backend is None and dialect in self.BACKENDS:
+            # Index absent au démarrage : nouvelle vérification (migration appliquée depuis)
+            last = self._last_detection.get(dialect)
+            if last is None or time.monotonic() - last >= DETECT_RETRY_INTERVAL:
+                backend = self.detect(connection or db.session.connection())
+        return backend
+
+    def detect(self, connection=None):
+        """
+        Active le backend du moteur SQL si l'index existe (sans rien créer)
+
+        Returns:
+            Le backend, ou None (recherche ILIKE, nouvelle vérification
+            au plus tard dans DETECT_RETRY_INTERVAL secondes)
+        """
+        dialect = (connection or db.engine).dialect.name
+        backend_class = self.BACKENDS.get(dialect)
+        if backend_class is None:
+            logger.info(f"No full-text backend for {dialect}, using ILIKE search")
+            return None
+
+        self._last_detection[dialect] = time.monotonic()
+        backend = backend_class()
+        try:
+            if connection is None:
+                with db.engine.connect() as connection:
+                    found = backend.detect(connection)
+            else:
+                found = backend.detect(connection)
+        except Exception:
+            logger.exception(f"Full-text index check failed, using ILIKE search "
+                             f"and retrying in {DETECT_RETRY_INTERVAL} s")
+            return None
+
+        if not found:
+            logger.error("Full-text index missing: run 'flask db upgrade'. Until then searches use ILIKE "
+                         "and writes are not indexed (scripts/rebuild_search_index.py after the upgrade)")
+            return None
+
+        self._backends[dialect] = backend
+        return backend
+
+    def create_schema(self) -> bool:
+        """
+        Crée l'index s'il n'existe pas et le remplit lors de sa création
+
+        Réservé aux bases sans migrations (tests, jeu de charge) : en
+        production, l'index est créé par la migration c5f2e8a1d374.
+
+        Returns:
+            True si l'index plein texte est disponible
+        """
+        dialect = db.engine.dialect.name
+        backend_class = self.BACKENDS.get(dialect)
+        if backend_class is None:
+            return False
+
+        backend = backend_class()
+        with db.engine.begin() as connection:
+            created = backend.create_schema(connection)
+        self._backends[dialect] = backend
+        if created:
+            self.rebuild()
+        return True
+
+    @property
+    def available(self) -> bool:
+        return self._backend() is not None
+
+    # -------------------------------------------------------------------------
+    # Synchronisation
+    # -------------------------------------------------------------------------
+
+    def index_object(self, connection, doc_type: str, obj) -> None:
+        backend = self._backend(connection)
+        if backend is not None:
+            _, fields, _ = SEARCH_DOCUMENTS[doc_type]
+            backend.upsert(connection, doc_type, obj.id, *fields(obj))
+
+    def remove_object(self, connection, doc_type: str, obj) -> None:
+        backend = self._backend(connection)
+        if backend is not None:
+            backend.delete(connection, doc_type, obj.id)
+
+    def rebuild(self, doc_types: Optional[Iterable[str]] = None) -> int:
+        """
+        Reconstruit l'index depuis les tables sources
+
+        Returns:
+            Nombre de documents indexés
+        """
+        connection = db.session.connection()
+        backend = self._backend(connection)
+        if backend is None:
+            return 0
+
+        doc_types = list(doc_types or SEARCH_DOCUMENTS)
+        for doc_type in doc_types:
+            backend.clear(connection, doc_type)
+
+        count = 0
+        for doc_type in doc_types:
+            model, fields, _ = SEARCH_DOCUMENTS[doc_type]
+            columns = [getattr(model, name) for name in ('id', *INDEXED_ATTRIBUTES[model])]
+            for obj in model.query.options(load_only(*columns)).yield_per(500):
+                backend.upsert(connection, doc_type, obj.id, *fields(obj))
+                count += 1
+
+        db.session.commit()
+        logger.info(f"Search index rebuilt with {count} documents")
+        return count
+
+    # -------------------------------------------------------------------------
+    # Recherche
+    # -------------------------------------------------------------------------
+
+    def apply(self, query, doc_type: str, text: str) -> Tuple[object, Optional[object]]:
+        """
+        Restreint une requête ORM aux documents correspondant à la recherche
+
+        Returns:
+            (requête filtrée, sous-requête des résultats avec colonne score
+            ou None si la recherche retombe sur ILIKE)
+        """
+        model, _, fallback_columns = SEARCH_DOCUMENTS[doc_type]
+        backend = self._backend()
+        hits = backend.hits(doc_type, text) if backend is not None else None
+
+        if hits is None:
+            pattern = f'%{text}%'
+            return query.filter(db.or_(*(column.ilike(pattern) for column in fallback_columns()))), None
+
+        return query.join(hits, hits.c.doc_id == model.id), hits
+
+    def snippets(self, doc_type: str, text: str, doc_ids: List[int]) -> Dict[int, Markup]:
+        """Extraits surlignés (<mark>) pour les documents affichés"""
+        backend = self._backend()
+        if backend is None:
+            return {}
+        return {
+            doc_id: self._highlight(snippet)
+            for doc_id, snippet in backend.snippets(doc_type, text, doc_ids).items()
+            if snippet
+        }
+
+    @staticmethod
+    def _highlight(snippet: str) -> Markup:
+        """Échappe l'extrait puis convertit les marqueurs en <mark>"""
+        escaped = str(escape(snippet))
+        return Markup(escaped.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+
+# Instance singleton
+search_index = SearchIndex()
+
+
+# =============================================================================
+# SYNCHRONISATION SUR ÉCRITURE
+# =============================================================================
+
+def _register_sync(doc_type: str, model) -> None:
+    attributes = INDEXED_ATTRIBUTES[model]
+
+    @event.listens_for(model, 'after_insert')
+    def _on_insert(mapper, connection, target):
+        search_index.index_object(connection, doc_type, target)
+
+    @event.listens_for(model, 'after_update')
+    def _on_update(mapper, connection, target):
+        state = db.inspect(target)
+        if any(state.attrs[name].history.has_changes() for name in attributes):
+            search_index.index_object(connection, doc_type, target)
+
+    @event.listens_for(model, 'after_delete')
+    def _on_delete(mapper, connection, target):
+        search_index.remove_object(connection, doc_type, target)
+
+
+for _doc_type, (_model, _, _) in SEARCH_DOCUMENTS.items():
+    _register_sync(_doc_type, _model)
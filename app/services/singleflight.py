@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Coalescence des requêtes concurrentes (single-flight)
+Les appels simultanés pour une même clé de cache attendent une seule
+requête amont : entre threads d'un worker via un Event, et entre workers
+via un verrou Redis (SET NX) lorsque le cache partagé est utilisé.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+from app.services.cache import CacheBackend, RedisCache
+
+try:
+    from redis import RedisError
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Durée de vie du verrou distribué (doit couvrir le timeout HTTP amont)
+LOCK_TTL = 15  # secondes
+
+# Attente maximale d'un appel en cours avant de calculer soi-même
+WAIT_TIMEOUT = 15  # secondes
+
+# Intervalle de scrutation du cache partagé
+POLL_INTERVAL = 0.05  # secondes
+
+# Suppression du verrou uniquement par son propriétaire
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _Call:
+    """Appel en cours partagé par les threads en attente"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Exécute une seule fois les appels concurrents portant sur la même clé"""
+
+    def __init__(self, cache: CacheBackend, lock_ttl: int = LOCK_TTL,
+                 wait_timeout: float = WAIT_TIMEOUT):
+        self.cache = cache
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._redis = cache.client if isinstance(cache, RedisCache) else None
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Exécute fn() pour la clé, ou attend le résultat d'un appel en cours
+
+        fn est responsable de la mise en cache de son résultat : les autres
+        workers le récupèrent depuis le cache partagé.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            if not call.event.wait(self.wait_timeout):
+                logger.warning(f"Single-flight wait timed out for {key}")
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_across_workers(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _run_across_workers(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Coordonne les workers via un verrou Redis si disponible"""
+        if self._redis is None:
+            return fn()
+
+        lock_key = f"biblioruche:lock:{self.cache.namespace}:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = self._redis.set(lock_key, token, nx=True, ex=self.lock_ttl)
+        except RedisError as e:
+            logger.warning(f"Single-flight lock unavailable for {key}: {e}")
+            return fn()
+
+        if acquired:
+            try:
+                return fn()
+            finally:
+                self._release(lock_key, token)
+
+        cached = self._wait_for_other_worker(key, lock_key)
+        if cached is not None:
+            return cached
+        # Le worker propriétaire n'a rien mis en cache (erreur amont) : réessayer soi-même
+        return fn()
+
+    def _wait_for_other_worker(self, key: str, lock_key: str) -> Optional[Any]:
+        """
+        Attend que le worker propriétaire du verrou remplisse le cache
+
+        La scrutation utilise peek() : l'appelant a déjà compté son miss,
+        chaque tour de boucle n'en ajoute pas un dans les statistiques.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            value = self.cache.peek(key)
+            if value is not None:
+                return value
+            try:
+                if not self._redis.exists(lock_key):
+                    return self.cache.peek(key)
+            except RedisError:
+                return None
+            time.sleep(POLL_INTERVAL)
+        return None
+
+    def _release(self, lock_key: str, token: str) -> None:
+        try:
+            self._redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+        except RedisError as e:
+            logger.warning(f"Single-flight lock release failed for {lock_key}: {e}")
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Service de statistiques pour BiblioRuche
+Calcule les statistiques publiques en quelques requêtes groupées,
+partagées par /stats et /api/stats/overview, avec un cache à TTL court
+invalidé à chaque écriture sur les tables concernées.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.services.cache import get_cache
+from app.models import (
+    User, BookProposal, ReadingSession, ReadingParticipation,
+    Badge, UserBadge, Vote, UserActivityStats
+)
+
+logger = logging.getLogger(__name__)
+
+# Durée de vie du cache en secondes
+STATS_CACHE_TTL = 60
+
+# Nombre de mois affichés dans le graphique d'activité
+ACTIVITY_MONTHS = 6
+
+# Modèles dont l'écriture invalide le cache
+TRACKED_MODELS = (
+    User, BookProposal, ReadingSession, ReadingParticipation,
+    Badge, UserBadge, Vote
+)
+TRACKED_TABLES = frozenset(model.__table__ for model in TRACKED_MODELS)
+
+
+class StatisticsService:
+    """Service de calcul des statistiques globales"""
+
+    CACHE_KEYS = ('overview', 'page')
+
+    def __init__(self, ttl: int = STATS_CACHE_TTL):
+        self.ttl = ttl
+        self._cache = None
+
+    @property
+    def cache(self):
+        """Cache partagé (créé au premier usage, une fois la config chargée)"""
+        if self._cache is None:
+            self._cache = get_cache('statistics', default_ttl=self.ttl)
+        return self._cache
+
+    # -------------------------------------------------------------------------
+    # Cache
+    # -------------------------------------------------------------------------
+
+    def _cached(self, key: str, compute):
+        """Retourne la valeur en cache ou la calcule"""
+        value = self.cache.get(key)
+        if value is None:
+            value = compute()
+            self.cache.set(key, value, ttl=self.ttl)
+        return value
+
+    def invalidate(self) -> None:
+        """Vide le cache des statistiques (pour tous les workers si Redis)"""
+        for key in self.CACHE_KEYS:
+            self.cache.delete(key)
+
+    # -------------------------------------------------------------------------
+    # API publique
+    # -------------------------------------------------------------------------
+
+    def get_overview(self) -> Dict[str, Dict[str, int]]:
+        """Compteurs globaux (utilisateurs, livres, lectures, badges)"""
+        return self._cached('overview', self._compute_overview)
+
+    def get_page_stats(self) -> Dict[str, Any]:
+        """Toutes les données de la page /stats"""
+        return self._cached('page', self._compute_page_stats)
+
+    # -------------------------------------------------------------------------
+    # Calculs
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _count_by_status(model) -> Dict[str, int]:
+        """Compte les lignes d'un modèle par statut (GROUP BY status)"""
+        rows = db.session.query(model.status, db.func.count()).group_by(model.status).all()
+        return dict(rows)
+
+    def _compute_overview(self) -> Dict[str, Dict[str, int]]:
+        cutoff = datetime.utcnow() - timedelta(days=30)
+
+        users_total, users_active = db.session.query(
+            db.func.count(User.id),
+            db.func.count(User.id).filter(User.created_at >= cutoff)
+        ).one()
+
+        badges_total, badges_awarded = db.session.query(
+            db.select(db.func.count(Badge.id)).scalar_subquery(),
+            db.select(db.func.count(UserBadge.id)).scalar_subquery()
+        ).one()
+
+        books = self._count_by_status(BookProposal)
+        readings = self._count_by_status(ReadingSession)
+
+        return {
+            'users': {
+                'total': users_total,
+                'active': users_active
+            },
+            'books': {
+                'total': sum(books.values()),
+                'approved': books.get('approved', 0),
+                'pending': books.get('pending', 0),
+                'completed': books.get('completed', 0)
+            },
+            'readings': {
+                'total': sum(readings.values()),
+                'in_progress': readings.get('current', 0),
+                'completed': readings.get('completed', 0)
+            },
+            'badges': {
+                'total': badges_total,
+                'awarded': badges_awarded
+            }
+        }
+
+    @staticmethod
+    def _month_key(column):
+        """Expression SQL 'YYYY-MM' adaptée au moteur de base de données"""
+        if db.session.get_bind().dialect.name == 'postgresql':
+            return db.func.to_char(db.func.date_trunc('month', column), 'YYYY-MM')
+        return db.func.strftime('%Y-%m', column)
+
+    def _monthly_counts(self, column, since) -> Dict[str, int]:
+        """Nombre de lignes par mois calendaire depuis une date"""
+        month = self._month_key(column)
+        rows = db.session.query(month, db.func.count()).filter(
+            column >= since
+        ).group_by(month).all()
+        return dict(rows)
+
+    def _compute_activity(self) -> Dict[str, List]:
+        """Activité mensuelle (propositions et inscriptions) sur les derniers mois"""
+        month_starts = []
+        cursor = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        for _ in range(ACTIVITY_MONTHS):
+            month_starts.insert(0, cursor)
+            cursor = (cursor - timedelta(days=1)).replace(day=1)
+
+        since = month_starts[0]
+        proposals = self._monthly_counts(BookProposal.created_at, since)
+        participations = self._monthly_counts(ReadingParticipation.joined_at, since)
+
+        keys = [month.strftime('%Y-%m') for month in month_starts]
+        return {
+            'labels': [month.strftime('%b') for month in month_starts],
+            'proposals': [proposals.get(key, 0) for key in keys],
+            'participations': [participations.get(key, 0) for key in keys]
+        }
+
+    @staticmethod
+    def _compute_top_contributors(limit: int = 10) -> List[Dict[str, Any]]:
+        """Top contributeurs calculé sur les compteurs pré-agrégés"""
+        score = (
+            UserActivityStats.proposals * 10 +
+            UserActivityStats.votes * 2 +
+            UserActivityStats.participations * 5
+        ).label('contribution_score')
+
+        rows = db.session.query(
+            User.id, User.username, User.display_name, User.avatar_url, score
+        ).join(
+            UserActivityStats, UserActivityStats.user_id == User.id
+        ).order_by(score.desc(), User.id).limit(limit).all()
+
+        return [
+            {
+                'id': row.id,
+                'username': row.username,
+                'display_name': row.display_name,
+                'avatar_url': row.avatar_url,
+                'contribution_score': row.contribution_score
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def _compute_popular_genres(limit: int = 6) -> List[Dict[str, Any]]:
+        genre_stats = db.session.query(
+            BookProposal.genre,
+            db.func.count(BookProposal.id).label('count')
+        ).filter(
+            BookProposal.genre != None,
+            BookProposal.genre != ''
+        ).group_by(BookProposal.genre).order_by(
+            db.desc('count')
+        ).limit(limit).all()
+
+        max_genre_count = genre_stats[0][1] if genre_stats else 1
+        return [
+            {
+                'name': genre or 'Non classé',
+                'count': count,
+                'percentage': int((count / max_genre_count) * 100)
+            }
+            for genre, count in genre_stats
+        ]
+
+    @staticmethod
+    def _compute_rare_badges(total_users: int, limit: int = 6) -> List[Dict[str, Any]]:
+        badge_stats = db.session.query(
+            Badge.name, Badge.icon, Badge.color,
+            db.func.count(UserBadge.id).label('owners_count')
+        ).outerjoin(
+            UserBadge, Badge.id == UserBadge.badge_id
+        ).group_by(Badge.id, Badge.name, Badge.icon, Badge.color).order_by(
+            'owners_count'
+        ).limit(limit).all()
+
+        total_users = total_users or 1
+        return [
+            {
+                'name': name,
+                'icon': icon,
+                'color': color or '#FFD700',
+                'owners_count': count,
+                'rarity': round((count / total_users) * 100, 1)
+            }
+            for name, icon, color, count in badge_stats
+        ]
+
+    def _compute_page_stats(self) -> Dict[str, Any]:
+        stats = self.get_overview()
+
+        book_stats = {
+            'approved': stats['books']['approved'],
+            'pending': stats['books']['pending'],
+            'reading': stats['readings']['in_progress'],
+            'completed': stats['books']['completed']
+        }
+
+        return {
+            'stats': stats,
+            'book_stats': book_stats,
+            'activity_data': self._compute_activity(),
+            'top_contributors': self._compute_top_contributors(),
+            'popular_genres': self._compute_popular_genres(),
+            'rare_badges': self._compute_rare_badges(stats['users']['total'])
+        }
+
+
+# Instance singleton
+statistics_service = StatisticsService()
+
+
+# =============================================================================
+# INVALIDATION DU CACHE SUR ÉCRITURE
+# =============================================================================
+
+def _mark_dirty(session):
+    session.info['statistics_dirty'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, TRACKED_MODELS):
+            _mark_dirty(session)
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_statement(orm_execute_state):
+    # INSERT/UPDATE/DELETE en masse exécutés via session.execute()
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if getattr(orm_execute_state.statement, 'table', None) in TRACKED_TABLES:
+            _mark_dirty(orm_execute_state.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('statistics_dirty', False):
+        statistics_service.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _reset_after_rollback(session):
+    session.info.pop('statistics_dirty', None)
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+Service de vote pour BiblioRuche
+- Écriture : remplacement des votes en une transaction (DELETE + INSERT
+  ... SELECT en masse), vote CinéClub unique par upsert
+- Dépouillement : toutes les options d'une session en une requête groupée
+  (et les votants en une jointure), avec un cache par session invalidé à
+  chaque vote soumis (génération incrémentée dans le Redis sans éviction)
+- Temps réel : les nouveaux résultats sont publiés sur le canal de la
+  session (flux /api/stream) après chaque vote
+"""
+
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.services.cache import get_cache
+from app.services.events import publish, vote_channel
+from app.services.redis_client import get_redis
+from app.models import (
+    User, Vote, VoteOption, VotingSession, FilmVote, FilmVoteOption, FilmVotingSession,
+    UserActivityStats, utc_now
+)
+
+try:
+    from redis import RedisError
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Durée de vie des résultats en cache (filet de sécurité, l'invalidation est explicite)
+TALLY_CACHE_TTL = 300  # 5 minutes
+
+# Durée de vie de la génération d'une session : bien plus longue que celle des
+# résultats, pour qu'un résultat périmé ne redevienne jamais lisible
+GENERATION_TTL = 86400  # 24 heures
+
+# Générations dans le Redis principal (REDIS_URL, noeviction) : dans le cache
+# (allkeys-lru), une génération évincée repartirait de 0 et rendrait lisible
+# un ancien résultat encore en cache
+REDIS_GENERATION_PREFIX = 'biblioruche:votes:generation:'
+
+# Type de vote -> (modèle de vote, modèle d'option)
+VOTE_MODELS = {
+    'book': (Vote, VoteOption),
+    'film': (FilmVote, FilmVoteOption),
+}
+
+
+class VoteTally:
+    """Résultats d'une session de vote"""
+
+    def __init__(self, counts: Dict[int, int], voters: Optional[Dict[int, List[dict]]] = None):
+        self.counts = counts
+        self.total = sum(counts.values())
+        self.voters = voters
+
+    def count(self, option_id: int) -> int:
+        """Nombre de votes pour une option"""
+        return self.counts.get(option_id, 0)
+
+    def percentage(self, option_id: int) -> float:
+        """Part des votes d'une option (0-100)"""
+        return (self.count(option_id) / self.total * 100) if self.total > 0 else 0
+
+    def voters_for(self, option_id: int) -> List[dict]:
+        """Votants d'une option (id, display_name)"""
+        return (self.voters or {}).get(option_id, [])
+
+    def winners(self, option_ids: List[int]) -> List[int]:
+        """Options ayant le plus de votes (toutes les ex æquo, aucune si pas de vote)"""
+        if not option_ids or self.total == 0:
+            return []
+        max_votes = max(self.count(option_id) for option_id in option_ids)
+        return [option_id for option_id in option_ids if self.count(option_id) == max_votes]
+
+
+class VoteTallyService:
+    """Service d'écriture et de comptage des votes par session"""
+
+    def __init__(self, ttl: int = TALLY_CACHE_TTL):
+        self.ttl = ttl
+        self._cache = None
+        # Générations du processus quand Redis n'est pas configuré
+        self._generations: Dict[str, int] = {}
+        self._generations_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        """Cache partagé (créé au premier usage, une fois la config chargée)"""
+        if self._cache is None:
+            self._cache = get_cache('votes', default_ttl=self.ttl)
+        return self._cache
+
+    @staticmethod
+    def _key(kind: str, session_id: int, suffix: str) -> str:
+        return f"{kind}:{session_id}:{suffix}"
+
+    def _generation(self, kind: str, session_id: int) -> Optional[str]:
+        """
+        Génération courante des résultats d'une session ('0' avant la première invalidation)
+
+        None si Redis est indisponible : les résultats sont alors recalculés
+        sans passer par le cache.
+        """
+        key = self._key(kind, session_id, 'generation')
+        client = get_redis()
+        if client is None:
+            with self._generations_lock:
+                return str(self._generations.get(key, 0))
+        try:
+            generation = client.get(REDIS_GENERATION_PREFIX + key)
+        except RedisError as e:
+            logger.warning(f"Vote generation unavailable for {key}: {e}")
+            return None
+        return generation.decode() if generation is not None else '0'
+
+    def tally(self, kind: str, session_id: int, with_voters: bool = False) -> VoteTally:
+        """
+        Résultats d'une session de vote
+
+        Args:
+            kind: 'book' ou 'film'
+            session_id: identifiant de la session de vote
+            with_voters: charger aussi la liste des votants par option
+
+        Returns:
+            VoteTally
+        """
+        if kind not in VOTE_MODELS:
+            raise ValueError(f"Type de vote inconnu : {kind}")
+
+        # Génération lue avant le calcul : un calcul concurrent d'une invalidation
+        # est rangé sous l'ancienne génération, que plus personne ne lit
+        generation = self._generation(kind, session_id)
+        counts = self._cached(kind, session_id, 'counts', generation, self._compute_counts)
+        voters = None
+        if with_voters:
+            voters = self._cached(kind, session_id, 'voters', generation, self._compute_voters)
+
+        # Les clés JSON (cache Redis) sont des chaînes
+        return VoteTally(
+            {int(option_id): count for option_id, count in counts.items()},
+            {int(option_id): names for option_id, names in voters.items()} if voters is not None else None
+        )
+
+    # -------------------------------------------------------------------------
+    # Écriture
+    # -------------------------------------------------------------------------
+
+    def cast_book_votes(self, user_id: int, session_id: int, option_ids: Iterable[int]) -> int:
+        """
+        Remplace les votes d'un utilisateur pour une session de vote de livres
+
+        Une seule transaction : DELETE des anciens votes puis INSERT ... SELECT
+        des options demandées appartenant à la session. Les insertions en
+        masse ne déclenchent pas les événements ORM : le compteur de votes
+        de UserActivityStats est ajusté explicitement.
+
+        Returns:
+            Nombre de votes enregistrés
+        """
+        option_ids = list(option_ids)
+        try:
+            deleted = db.session.execute(
+                db.delete(Vote).where(
+                    Vote.user_id == user_id,
+                    Vote.voting_session_id == session_id
+                ).execution_options(synchronize_session=False)
+            ).rowcount
+
+            inserted = 0
+            if option_ids:
+                selected_options = db.select(
+                    db.literal(user_id, db.Integer),
+                    db.literal(session_id, db.Integer),
+                    VoteOption.id,
+                    db.literal(utc_now(), db.DateTime)
+                ).where(
+                    VoteOption.voting_session_id == session_id,
+                    VoteOption.id.in_(option_ids)
+                )
+                inserted = db.session.execute(
+                    db.insert(Vote).from_select(
+                        ['user_id', 'voting_session_id', 'vote_option_id', 'created_at'],
+                        selected_options
+                    )
+                ).rowcount
+
+            UserActivityStats.bump(db.session.connection(), user_id, votes=inserted - deleted)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        self.invalidate('book', session_id)
+        self.publish('book', session_id)
+        return inserted
+
+    def cast_film_vote(self, user_id: int, session_id: int, option_id: int) -> bool:
+        """
+        Enregistre le vote unique d'un utilisateur pour une session CinéClub
+
+        INSERT ... ON CONFLICT DO NOTHING sur la contrainte (user_id,
+        voting_session_id) : pas de lecture préalable ni de course entre
+        deux soumissions simultanées.
+
+        Returns:
+            False si l'utilisateur avait déjà voté
+        """
+        values = {
+            'user_id': user_id,
+            'voting_session_id': session_id,
+            'vote_option_id': option_id,
+            'created_at': utc_now()
+        }
+        dialect = db.session.get_bind().dialect.name
+        try:
+            if dialect in ('postgresql', 'sqlite'):
+                insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+                statement = insert(FilmVote.__table__).values(**values).on_conflict_do_nothing(
+                    index_elements=['user_id', 'voting_session_id']
+                )
+                inserted = db.session.execute(statement).rowcount == 1
+            else:
+                exists = db.session.query(FilmVote.id).filter_by(
+                    user_id=user_id, voting_session_id=session_id
+                ).first()
+                inserted = exists is None
+                if inserted:
+                    db.session.execute(db.insert(FilmVote.__table__).values(**values))
+
+            if inserted:
+                UserActivityStats.bump(db.session.connection(), user_id, film_votes=1)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if inserted:
+            self.invalidate('film', session_id)
+            self.publish('film', session_id)
+        return inserted
+
+    # -------------------------------------------------------------------------
+    # Clôture
+    # -------------------------------------------------------------------------
+
+    def close_book_vote(self, voting_session) -> List[int]:
+        """
+        Clôt une session de vote de livres (sans commit)
+
+        Tous les livres ex æquo passent en 'selected' ; winner_book_id n'est
+        renseigné que s'il y a un seul gagnant.
+
+        Returns:
+            Identifiants des livres gagnants
+        """
+        voting_session.status = 'closed'
+        options = {option.id: option for option in voting_session.books}
+        tally = self.tally('book', voting_session.id)
+
+        winner_book_ids = []
+        if options:
+            max_votes = max(tally.count(option_id) for option_id in options)
+            winner_option_ids = [option_id for option_id in options if tally.count(option_id) == max_votes]
+
+            # Si un seul gagnant, définir le winner_book_id
+            if len(winner_option_ids) == 1:
+                voting_session.winner_book_id = options[winner_option_ids[0]].book_id
+
+            # Marquer tous les livres gagnants comme sélectionnés
+            for option_id in winner_option_ids:
+                options[option_id].book.status = 'selected'
+                winner_book_ids.append(options[option_id].book_id)
+        return winner_book_ids
+
+    def close_film_vote(self, vote_session) -> Optional[int]:
+        """
+        Clôt une session de vote CinéClub (sans commit)
+
+        Returns:
+            Identifiant du film gagnant (premier ex æquo, aucun s'il n'y a pas de vote)
+        """
+        options = {option.id: option for option in vote_session.options}
+        winner_ids = self.tally('film', vote_session.id).winners(list(options))
+        winner_option = options[winner_ids[0]] if winner_ids else None
+
+        vote_session.status = 'closed'
+        if winner_option:
+            vote_session.winner_film_id = winner_option.film_id
+            winner_option.film.status = 'selected'
+            return winner_option.film_id
+        return None
+
+    def close_expired(self, now=None) -> int:
+        """
+        Clôt les sessions de vote (livres et CinéClub) dont la date de fin est passée
+
+        Returns:
+            Nombre de sessions clôturées
+        """
+        now = now or datetime.now()
+        closed = 0
+        for model, close in ((VotingSession, self.close_book_vote),
+                             (FilmVotingSession, self.close_film_vote)):
+            expired = model.query.filter(model.status == 'active', model.end_date <= now).all()
+            for session in expired:
+                close(session)
+                db.session.commit()
+                logger.info(f"Closed expired {model.__tablename__} {session.id}")
+                closed += 1
+        return closed
+
+    # -------------------------------------------------------------------------
+    # Temps réel
+    # -------------------------------------------------------------------------
+
+    def tally_event(self, kind: str, session_id: int) -> dict:
+        """Résultats d'une session sous forme d'événement 'tally' (sans les votants)"""
+        tally = self.tally(kind, session_id)
+        return {
+            'kind': kind,
+            'session_id': session_id,
+            'counts': {str(option_id): count for option_id, count in tally.counts.items()},
+            'total': tally.total
+        }
+
+    def publish(self, kind: str, session_id: int) -> None:
+        """Publie les résultats à jour aux clients qui suivent la session"""
+        try:
+            publish(vote_channel(kind, session_id), 'tally', self.tally_event(kind, session_id))
+        except Exception as e:
+            logger.error(f"Failed to publish tally for {kind} session {session_id}: {e}")
+
+    # -------------------------------------------------------------------------
+    # Cache
+    # -------------------------------------------------------------------------
+
+    def _cached(self, kind: str, session_id: int, name: str, generation: Optional[str], compute):
+        """Résultat name de la génération courante, calculé puis mis en cache au besoin"""
+        if generation is None:
+            return compute(kind, session_id)
+        key = self._key(kind, session_id, f'{name}:{generation}')
+        value = self.cache.get(key)
+        if value is None:
+            value = compute(kind, session_id)
+            self.cache.set(key, value, ttl=self.ttl)
+        return value
+
+    def invalidate(self, kind: str, session_id: int) -> None:
+        """
+        Rend obsolètes les résultats en cache d'une session
+
+        La génération est incrémentée plutôt que de supprimer les clés : un
+        dépouillement commencé avant le vote et rangé après l'invalidation
+        l'est sous l'ancienne génération et n'est plus jamais relu. Elle
+        n'est pas gardée dans le cache, dont l'éviction la remettrait à 0.
+        """
+        key = self._key(kind, session_id, 'generation')
+        client = get_redis()
+        if client is None:
+            with self._generations_lock:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.incr(REDIS_GENERATION_PREFIX + key)
+            pipe.expire(REDIS_GENERATION_PREFIX + key, GENERATION_TTL)
+            pipe.execute()
+        except RedisError as e:
+            # Résultats périmés au plus TALLY_CACHE_TTL secondes
+            logger.warning(f"Could not invalidate vote results for {key}: {e}")
+
+    @staticmethod
+    def _compute_counts(kind: str, session_id: int) -> Dict[str, int]:
+        vote_model, _ = VOTE_MODELS[kind]
+        rows = db.session.query(
+            vote_model.vote_option_id, db.func.count(vote_model.id)
+        ).filter(
+            vote_model.voting_session_id == session_id
+        ).group_by(vote_model.vote_option_id).all()
+        return {str(option_id): count for option_id, count in rows}
+
+    @staticmethod
+    def _compute_voters(kind: str, session_id: int) -> Dict[str, List[dict]]:
+        vote_model, _ = VOTE_MODELS[kind]
+        rows = db.session.query(
+            vote_model.vote_option_id, User.id, User.display_name
+        ).join(
+            User, User.id == vote_model.user_id
+        ).filter(
+            vote_model.voting_session_id == session_id
+        ).order_by(vote_model.created_at, vote_model.id).all()
+
+        voters = {}
+        for option_id, user_id, display_name in rows:
+            voters.setdefault(str(option_id), []).append({'id': user_id, 'display_name': display_name})
+        return voters
+
+
+# Instance singleton
+vote_tally_service = VoteTallyService()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Tâches de fond de BiblioRuche
+Fonctions exécutées par le worker (voir app/services/jobs.py) et
+planification cron des transitions programmées.
+"""
+
+import logging
+
+from app import db
+from app.services.jobs import job
+
+logger = logging.getLogger(__name__)
+
+# Planification : (expression cron, nom de la tâche)
+SCHEDULE = [
+    ('* * * * *', 'votes.close_expired'),          # Votes dont la date de fin est passée
+    ('5 * * * *', 'readings.update_statuses'),     # Lectures à venir -> en cours -> terminées
+    ('30 3 * * *', 'notifications.cleanup'),       # Notifications lues de plus de 30 jours
+    ('* * * * *', 'ebooks.flush_downloads'),       # Compteurs de téléchargements en attente
+    ('45 3 * * *', 'jobs.purge_finished'),         # Tâches terminées de plus de 7 jours (file en base)
+]
+
+
+@job('badges.award')
+def award_badges(user_id, event):
+    """Évaluer les badges d'un événement et notifier les nouveaux badges"""
+    from app.badge_manager import BadgeManager
+    return [badge.name for badge in BadgeManager._award_and_notify(user_id, event)]
+
+
+@job('notifications.broadcast')
+def broadcast_notification(*args, **kwargs):
+    """Diffusion en masse d'une notification (progression suivie par job_id)"""
+    from app.services.notifications import notification_service
+    return notification_service.broadcast_notification(*args, **kwargs)
+
+
+@job('notifications.cleanup')
+def cleanup_notifications(days=30):
+    """Supprimer les notifications lues anciennes"""
+    from app.services.notifications import notification_service
+    return notification_service.delete_old_notifications(days)
+
+
+@job('jobs.purge_finished')
+def purge_finished_jobs():
+    """Supprimer les tâches terminées anciennes de la file en base"""
+    from app.services.jobs import get_job_queue
+    return get_job_queue().purge_finished()
+
+
+@job('ebooks.flush_downloads')
+def flush_downloads():
+    """Reporter en base les téléchargements cumulés dans Redis"""
+    from app.services.downloads import get_download_counter
+    return get_download_counter().flush()
+
+
+@job('votes.close_expired')
+def close_expired_votes():
+    """Clore les sessions de vote (livres et CinéClub) arrivées à échéance"""
+    from app.services.votes import vote_tally_service
+    return vote_tally_service.close_expired()
+
+
+@job('readings.update_statuses')
+def update_reading_statuses():
+    """Faire passer les lectures en cours ou terminées selon leurs dates"""
+    from app.models import ReadingSession
+    updated_count = ReadingSession.update_all_statuses()
+    db.session.commit()
+    if updated_count:
+        logger.info(f"Updated {updated_count} reading session status(es)")
+    return updated_count
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Configuration gunicorn pour BiblioRuche
+
+Par défaut : workers gthread (4 workers x 2 threads). Chaque connexion au
+flux temps réel /api/stream y occuperait un thread tant qu'elle est ouverte :
+le flux n'est donc activé (STREAM_ENABLED) qu'avec
+GUNICORN_WORKER_CLASS=gevent (pip install gevent), où les connexions
+inactives ne bloquent plus de thread : chaque worker en accepte jusqu'à
+GUNICORN_WORKER_CONNECTIONS.
+
+Les métriques Prometheus de chaque worker sont écrites dans
+PROMETHEUS_MULTIPROC_DIR et agrégées par /metrics.
+"""
+
+import os
+import shutil
+import tempfile
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '2'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+
+# Métriques Prometheus agrégées entre les workers (fichiers partagés, voir app/services/metrics.py)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'biblioruche-metrics'))
+
+
+def on_starting(server):
+    """Repart de compteurs vides à chaque démarrage du master"""
+    folder = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Retire des gauges les valeurs d'un worker arrêté"""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
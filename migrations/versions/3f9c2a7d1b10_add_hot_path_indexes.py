@@ -0,0 +1,83 @@
+"""Index secondaires sur les clés étrangères et colonnes de filtre
+
+Index dérivés des requêtes des pages : listes filtrées par statut et
+triées par date, comptages de votes par session, notifications non lues,
+avis visibles d'un livre, participants d'une séance...
+Les bases créées par db.create_all() les possèdent déjà : chaque index
+est créé seulement s'il n'existe pas.
+
+Revision ID: 3f9c2a7d1b10
+Revises: a2b6d4f8c017
+Create Date: 2026-10-17 20:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d1b10'
+down_revision = 'a2b6d4f8c017'
+branch_labels = None
+depends_on = None
+
+
+# (nom, table, colonnes)
+INDEXES = [
+    ('ix_user_created_at', 'user', ['created_at']),
+    ('ix_book_proposal_proposed_by', 'book_proposal', ['proposed_by']),
+    ('ix_book_proposal_created_at', 'book_proposal', ['created_at']),
+    ('ix_book_proposal_status_created', 'book_proposal', ['status', 'created_at']),
+    ('ix_book_proposal_rating', 'book_proposal', ['avg_rating', 'rating_count']),
+    ('ix_reading_session_book_id', 'reading_session', ['book_id']),
+    ('ix_reading_session_created_by', 'reading_session', ['created_by']),
+    ('ix_reading_session_status_start', 'reading_session', ['status', 'start_date']),
+    ('ix_reading_participation_reading_session_id', 'reading_participation', ['reading_session_id']),
+    ('ix_voting_session_status', 'voting_session', ['status']),
+    ('ix_voting_session_created_by', 'voting_session', ['created_by']),
+    ('ix_vote_option_voting_session_id', 'vote_option', ['voting_session_id']),
+    ('ix_vote_option_book_id', 'vote_option', ['book_id']),
+    ('ix_vote_vote_option_id', 'vote', ['vote_option_id']),
+    ('ix_vote_user_session', 'vote', ['user_id', 'voting_session_id']),
+    ('ix_vote_session_option', 'vote', ['voting_session_id', 'vote_option_id']),
+    ('ix_book_review_book_visible', 'book_review', ['book_id', 'is_visible']),
+    ('ix_user_badge_badge_id', 'user_badge', ['badge_id']),
+    ('ix_ebook_uploaded_by', 'ebook', ['uploaded_by']),
+    ('ix_ebook_book_proposal_id', 'ebook', ['book_proposal_id']),
+    ('ix_ebook_visible_created', 'ebook', ['is_visible', 'created_at']),
+    ('ix_film_book_proposal_id', 'film', ['book_proposal_id']),
+    ('ix_film_proposed_by', 'film', ['proposed_by']),
+    ('ix_film_status_created', 'film', ['status', 'created_at']),
+    ('ix_film_voting_session_status', 'film_voting_session', ['status']),
+    ('ix_film_voting_session_created_by', 'film_voting_session', ['created_by']),
+    ('ix_film_vote_option_voting_session_id', 'film_vote_option', ['voting_session_id']),
+    ('ix_film_vote_option_film_id', 'film_vote_option', ['film_id']),
+    ('ix_film_vote_vote_option_id', 'film_vote', ['vote_option_id']),
+    ('ix_film_vote_session_option', 'film_vote', ['voting_session_id', 'vote_option_id']),
+    ('ix_viewing_session_film_id', 'viewing_session', ['film_id']),
+    ('ix_viewing_session_created_by', 'viewing_session', ['created_by']),
+    ('ix_viewing_session_status_date', 'viewing_session', ['status', 'scheduled_date']),
+    ('ix_viewing_participation_viewing_session_id', 'viewing_participation', ['viewing_session_id']),
+    ('ix_notification_user_read_created', 'notification', ['user_id', 'is_read', 'created_at']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing_tables = set(inspector.get_table_names())
+    for name, table, columns in INDEXES:
+        if table not in existing_tables:
+            continue
+        table_columns = {column['name'] for column in inspector.get_columns(table)}
+        if not set(columns) <= table_columns:
+            # Colonnes ajoutées par une migration pas encore appliquée
+            print(f"Index {name} ignoré : colonnes manquantes sur {table}")
+            continue
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    existing_tables = set(sa.inspect(op.get_bind()).get_table_names())
+    for name, table, _ in reversed(INDEXES):
+        if table in existing_tables:
+            op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,37 @@
+"""Empreinte SHA-256 des fichiers EPUB (stockage dédoublonné)
+
+Les nouveaux EPUB sont stockés sous <sha256>.epub et l'empreinte est
+conservée dans ebook.file_hash (index unique) pour refuser les doublons.
+Les fichiers existants sont renommés par scripts/hash_ebooks.py.
+
+Revision ID: 5d8a0c3e7b91
+Revises: b71d3e5c2f48
+Create Date: 2026-10-17 23:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8a0c3e7b91'
+down_revision = 'b71d3e5c2f48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'ebook' not in inspector.get_table_names():
+        return
+    columns = {column['name'] for column in inspector.get_columns('ebook')}
+    if 'file_hash' not in columns:
+        with op.batch_alter_table('ebook') as batch_op:
+            batch_op.add_column(sa.Column('file_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_ebook_file_hash', 'ebook', ['file_hash'], unique=True, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_ebook_file_hash', table_name='ebook', if_exists=True)
+    with op.batch_alter_table('ebook') as batch_op:
+        batch_op.drop_column('file_hash')
@@ -0,0 +1,43 @@
+"""Compteur de notifications non lues dans user_activity_stats
+
+Le nombre de notifications non lues affiché sur chaque page est lu dans
+user_activity_stats au lieu d'un COUNT sur la table notification.
+La colonne est ajoutée puis initialisée depuis les notifications existantes.
+
+Revision ID: 8c4e1f2a9d37
+Revises: 3f9c2a7d1b10
+Create Date: 2026-10-17 21:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e1f2a9d37'
+down_revision = '3f9c2a7d1b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'user_activity_stats' not in inspector.get_table_names():
+        return
+    columns = {column['name'] for column in inspector.get_columns('user_activity_stats')}
+    if 'unread_notifications' not in columns:
+        with op.batch_alter_table('user_activity_stats') as batch_op:
+            batch_op.add_column(sa.Column('unread_notifications', sa.Integer(),
+                                          server_default='0', nullable=False))
+
+    op.execute(
+        "UPDATE user_activity_stats SET unread_notifications = ("
+        " SELECT COUNT(*) FROM notification"
+        " WHERE notification.user_id = user_activity_stats.user_id"
+        " AND notification.is_read = false)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user_activity_stats') as batch_op:
+        batch_op.drop_column('unread_notifications')
@@ -0,0 +1,62 @@
+"""Lignes user_activity_stats des utilisateurs existants
+
+Les nouveaux utilisateurs reçoivent leur ligne de compteurs à
+l'inscription ; cette migration crée celles des utilisateurs inscrits
+avant l'ajout de la table, calculées depuis les tables sources. Les
+pages n'ont ainsi jamais à écrire de ligne en lisant les compteurs.
+
+Revision ID: 9e3b7c1d5a26
+Revises: e4f6a9b2c813
+Create Date: 2026-10-17 23:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3b7c1d5a26'
+down_revision = 'e4f6a9b2c813'
+branch_labels = None
+depends_on = None
+
+
+# Même calcul que UserActivityStats.compute_rows (colonne, sous-requête)
+COUNTERS = [
+    ('proposals', "SELECT COUNT(*) FROM book_proposal WHERE book_proposal.proposed_by = u.id"),
+    ('accepted_proposals', "SELECT COUNT(*) FROM book_proposal"
+                           " WHERE book_proposal.proposed_by = u.id AND book_proposal.status = 'approved'"),
+    ('votes', "SELECT COUNT(*) FROM vote WHERE vote.user_id = u.id"),
+    ('participations', "SELECT COUNT(*) FROM reading_participation WHERE reading_participation.user_id = u.id"),
+    ('reviews', "SELECT COUNT(*) FROM book_review WHERE book_review.user_id = u.id"),
+    ('rating_sum', "SELECT COALESCE(SUM(rating), 0) FROM book_review WHERE book_review.user_id = u.id"),
+    ('film_votes', "SELECT COUNT(*) FROM film_vote WHERE film_vote.user_id = u.id"),
+    ('viewings', "SELECT COUNT(*) FROM viewing_participation WHERE viewing_participation.user_id = u.id"),
+    ('approved_films', "SELECT COUNT(*) FROM film"
+                       " WHERE film.proposed_by = u.id AND film.status IN ('approved', 'selected', 'viewed')"),
+    ('unread_notifications', "SELECT COUNT(*) FROM notification"
+                             " WHERE notification.user_id = u.id AND notification.is_read = false"),
+]
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'user_activity_stats' not in tables:
+        op.create_table(
+            'user_activity_stats',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), primary_key=True),
+            *[sa.Column(name, sa.Integer(), server_default='0', nullable=False) for name, _ in COUNTERS]
+        )
+
+    columns = ', '.join(name for name, _ in COUNTERS)
+    values = ', '.join(f'({query})' for _, query in COUNTERS)
+    op.execute(
+        f'INSERT INTO user_activity_stats (user_id, {columns})'
+        f' SELECT u.id, {values} FROM "user" u'
+        ' WHERE NOT EXISTS (SELECT 1 FROM user_activity_stats s WHERE s.user_id = u.id)'
+    )
+
+
+def downgrade():
+    # Les lignes restent valides (maintenues par les événements) : rien à retirer
+    pass
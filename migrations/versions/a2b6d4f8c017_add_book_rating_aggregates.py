@@ -0,0 +1,65 @@
+"""Agrégats des avis sur book_proposal
+
+rating_sum, rating_count et avg_rating pré-agrègent les avis visibles de
+chaque livre (tri « Mieux notés », affichage des notes sans COUNT/AVG).
+Les colonnes et l'index sont ajoutés s'ils manquent, puis remplis depuis
+la table book_review.
+
+Revision ID: a2b6d4f8c017
+Revises:
+Create Date: 2026-10-17 19:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2b6d4f8c017'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    ('rating_sum', sa.Integer()),
+    ('rating_count', sa.Integer()),
+    ('avg_rating', sa.Float()),
+]
+
+# Même calcul que BookProposal.refresh_ratings
+REFRESH_RATINGS = (
+    "UPDATE book_proposal SET"
+    " rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM book_review"
+    "  WHERE book_review.book_id = book_proposal.id AND book_review.is_visible = true),"
+    " rating_count = (SELECT COUNT(id) FROM book_review"
+    "  WHERE book_review.book_id = book_proposal.id AND book_review.is_visible = true),"
+    " avg_rating = (SELECT COALESCE(AVG(rating), 0) FROM book_review"
+    "  WHERE book_review.book_id = book_proposal.id AND book_review.is_visible = true)"
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    if 'book_proposal' not in tables:
+        return
+    existing = {column['name'] for column in inspector.get_columns('book_proposal')}
+    missing = [(name, type_) for name, type_ in COLUMNS if name not in existing]
+    if missing:
+        with op.batch_alter_table('book_proposal') as batch_op:
+            for name, type_ in missing:
+                batch_op.add_column(sa.Column(name, type_, server_default='0', nullable=False))
+
+    op.create_index('ix_book_proposal_rating', 'book_proposal', ['avg_rating', 'rating_count'],
+                    if_not_exists=True)
+
+    if 'book_review' in tables:
+        op.execute(REFRESH_RATINGS)
+
+
+def downgrade():
+    op.drop_index('ix_book_proposal_rating', table_name='book_proposal', if_exists=True)
+    with op.batch_alter_table('book_proposal') as batch_op:
+        for name, _ in reversed(COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,43 @@
+"""Table background_job de la file de tâches (JOBS_BACKEND=database)
+
+Revision ID: b71d3e5c2f48
+Revises: 8c4e1f2a9d37
+Create Date: 2026-10-17 22:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71d3e5c2f48'
+down_revision = '8c4e1f2a9d37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'background_job' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'background_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('unique_key', sa.String(length=200), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('unique_key')
+    )
+    op.create_index('ix_background_job_status_run_at', 'background_job', ['status', 'run_at'])
+
+
+def downgrade():
+    op.drop_index('ix_background_job_status_run_at', table_name='background_job')
+    op.drop_table('background_job')
@@ -0,0 +1,100 @@
+"""Index de recherche plein texte (livres, ebooks, films)
+
+Crée l'index une seule fois, ici plutôt qu'au démarrage de chaque
+processus, puis le remplit depuis les tables sources :
+- PostgreSQL : table search_document (tsvector pondéré, index GIN),
+  extension unaccent si le serveur la propose
+- SQLite : table virtuelle FTS5
+
+Même contenu que SearchIndex.rebuild (app/services/search.py).
+
+Revision ID: c5f2e8a1d374
+Revises: 9e3b7c1d5a26
+Create Date: 2026-10-18 10:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f2e8a1d374'
+down_revision = '9e3b7c1d5a26'
+branch_labels = None
+depends_on = None
+
+
+# Documents indexés : (type, table, titre, auteur, corps)
+DOCUMENTS = [
+    ('book', 'book_proposal', "title", "author", "description"),
+    ('ebook', 'ebook', "title", "author", "description"),
+    ('film', 'film', "trim(coalesce(title, '') || ' ' || coalesce(original_title, ''))", "director", "synopsis"),
+]
+
+
+def _upgrade_sqlite(bind):
+    exists = bind.execute(sa.text("SELECT 1 FROM sqlite_master WHERE name = 'search_index'")).first()
+    if exists:
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE search_index USING fts5("
+        "doc_type UNINDEXED, doc_id UNINDEXED, title, author, body, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    for doc_type, table, title, author, body in DOCUMENTS:
+        op.execute(
+            "INSERT INTO search_index (doc_type, doc_id, title, author, body) "
+            f"SELECT '{doc_type}', id, coalesce({title}, ''), coalesce({author}, ''), coalesce({body}, '') "
+            f"FROM {table}"
+        )
+
+
+def _upgrade_postgresql(bind):
+    available = bind.execute(sa.text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'unaccent'"
+    )).first()
+    if available:
+        try:
+            with bind.begin_nested():
+                bind.execute(sa.text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+        except sa.exc.DBAPIError:
+            pass  # Droits insuffisants : accents significatifs
+    unaccent = bind.execute(sa.text("SELECT 1 FROM pg_extension WHERE extname = 'unaccent'")).first()
+
+    if bind.execute(sa.text("SELECT to_regclass('search_document')")).scalar():
+        return
+    op.execute(
+        "CREATE TABLE search_document ("
+        "doc_type VARCHAR(20) NOT NULL, doc_id INTEGER NOT NULL, "
+        "title TEXT, author TEXT, body TEXT, document TSVECTOR NOT NULL, "
+        "PRIMARY KEY (doc_type, doc_id))"
+    )
+    op.execute("CREATE INDEX ix_search_document_document ON search_document USING GIN (document)")
+
+    def vector(column, weight):
+        value = f"unaccent({column})" if unaccent else column
+        return f"setweight(to_tsvector('french', {value}), '{weight}')"
+
+    for doc_type, table, title, author, body in DOCUMENTS:
+        op.execute(
+            "INSERT INTO search_document (doc_type, doc_id, title, author, body, document) "
+            f"SELECT '{doc_type}', id, t, a, b, {vector('t', 'A')} || {vector('a', 'B')} || {vector('b', 'C')} "
+            f"FROM (SELECT id, coalesce({title}, '') AS t, coalesce({author}, '') AS a, "
+            f"coalesce({body}, '') AS b FROM {table}) AS source"
+        )
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        _upgrade_sqlite(bind)
+    elif bind.dialect.name == 'postgresql':
+        _upgrade_postgresql(bind)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS search_index")
+    elif bind.dialect.name == 'postgresql':
+        op.execute("DROP TABLE IF EXISTS search_document")
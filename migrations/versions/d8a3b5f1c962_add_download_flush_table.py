@@ -0,0 +1,31 @@
+"""Table download_flush des lots de téléchargements reportés
+
+Revision ID: d8a3b5f1c962
+Revises: c5f2e8a1d374
+Create Date: 2026-10-18 14:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a3b5f1c962'
+down_revision = 'c5f2e8a1d374'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'download_flush' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'download_flush',
+        sa.Column('batch_id', sa.String(length=32), nullable=False),
+        sa.Column('applied_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('batch_id')
+    )
+
+
+def downgrade():
+    op.drop_table('download_flush')
@@ -0,0 +1,37 @@
+"""Empreinte des couvertures d'ebooks (vignettes aux noms immuables)
+
+Les vignettes S/M/L sont nommées d'après l'empreinte SHA-256 de l'image
+d'origine, conservée dans ebook.cover_hash. Les couvertures existantes
+sont traitées par scripts/build_cover_thumbnails.py.
+
+Revision ID: e4f6a9b2c813
+Revises: 5d8a0c3e7b91
+Create Date: 2026-10-18 00:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4f6a9b2c813'
+down_revision = '5d8a0c3e7b91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'ebook' not in inspector.get_table_names():
+        return
+    columns = {column['name'] for column in inspector.get_columns('ebook')}
+    if 'cover_hash' not in columns:
+        with op.batch_alter_table('ebook') as batch_op:
+            batch_op.add_column(sa.Column('cover_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_ebook_cover_hash', 'ebook', ['cover_hash'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_ebook_cover_hash', table_name='ebook', if_exists=True)
+    with op.batch_alter_table('ebook') as batch_op:
+        batch_op.drop_column('cover_hash')
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark des pages les plus consultées
+
+Mesure, route par route, les latences p50/p95/p99, le débit et le nombre
+de requêtes SQL par requête HTTP, soit dans le processus (client de test
+Flask, requêtes SQL comptées), soit contre un serveur lancé à part
+(gunicorn local, --url ; requêtes SQL lues dans l'en-tête X-Query-Count).
+Les résultats sont enregistrés en JSON dans benchmarks/ et peuvent être
+comparés à un résultat précédent pour repérer les régressions d'un commit
+à l'autre.
+
+La base est celle de scripts/generate_load_data.py (instance/loadtest.db,
+ou --database-url ; DATABASE_URL est ignorée). Avec --url, la session de
+l'utilisateur de test est signée avec SECRET_KEY : le serveur doit utiliser
+la même clé, et servir create_server_app() de ce script, sans limites de
+requêtes (une réponse 429 interrompt la mesure).
+
+Usage:
+    python scripts/generate_load_data.py --reset --scale 0.1
+    python scripts/benchmark.py                                  # client de test, 100 requêtes par route
+    python scripts/benchmark.py --requests 500 --concurrency 4
+    # serveur mesuré (autre terminal) : même base, limites de requêtes désactivées
+    DATABASE_URL=sqlite:///loadtest.db gunicorn -c gunicorn.conf.py -b 127.0.0.1:4001 'scripts.benchmark:create_server_app()'
+    python scripts/benchmark.py --url http://127.0.0.1:4001 --concurrency 16
+    python scripts/benchmark.py --compare latest                 # comparer au dernier résultat
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Ajouter le répertoire parent au PYTHONPATH
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scripts.generate_load_data import LOADTEST_DATABASE_URL
+
+# Routes mesurées : (chemin, connexion requise)
+ROUTES = [
+    ('/', False),
+    ('/books', False),
+    ('/vote/{vote_id}', False),
+    ('/stats', False),
+    ('/user/{user_id}', False),
+    ('/api/notifications', True),
+]
+
+RESULTS_FOLDER = os.path.join(ROOT, 'benchmarks')
+
+# Hausse relative de p95 ou des requêtes SQL signalée comme régression
+DEFAULT_THRESHOLD = 0.2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark des routes principales")
+    parser.add_argument('--requests', type=int, default=100, help="requêtes mesurées par route")
+    parser.add_argument('--warmup', type=int, default=10, help="requêtes d'échauffement par route")
+    parser.add_argument('--concurrency', type=int, default=1, help="requêtes simultanées")
+    parser.add_argument('--database-url', default=LOADTEST_DATABASE_URL,
+                        help=f"base mesurée (défaut : {LOADTEST_DATABASE_URL}, DATABASE_URL ignorée)")
+    parser.add_argument('--url', help="serveur à mesurer (par défaut : client de test dans le processus)")
+    parser.add_argument('--anonymous', action='store_true', help="sans session (routes publiques seulement)")
+    parser.add_argument('--routes', nargs='+', help="sous-ensemble des routes (ex. /books /stats)")
+    parser.add_argument('--output', help="fichier JSON de résultats (par défaut : benchmarks/<date>-<commit>.json)")
+    parser.add_argument('--compare', help="résultat de référence (fichier JSON ou 'latest')")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="hausse relative signalée comme régression (0.2 = +20 %%)")
+    return parser.parse_args()
+
+
+def percentile(sorted_values, fraction):
+    """Percentile par rang (valeurs triées)"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def git_commit():
+    """Commit courant (suffixe -dirty si l'arbre est modifié)"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return f'{commit}-dirty' if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def dataset_summary(db):
+    """Nombre de lignes des tables principales (les résultats ne se comparent qu'à jeu égal)"""
+    from app.models import User, BookProposal, Vote, BookReview, Notification
+
+    return {
+        model.__tablename__: db.session.execute(db.select(db.func.count()).select_from(model)).scalar()
+        for model in (User, BookProposal, Vote, BookReview, Notification)
+    }
+
+
+def pick_targets(db):
+    """Session de vote active et utilisateur le plus actif (le plus de notifications)"""
+    from app.models import Notification, User, VotingSession
+
+    vote_id = db.session.execute(
+        db.select(VotingSession.id).order_by((VotingSession.status == 'active').desc(), VotingSession.id.desc())
+    ).scalar()
+    user_id = db.session.execute(
+        db.select(Notification.user_id).group_by(Notification.user_id)
+        .order_by(db.func.count().desc()).limit(1)
+    ).scalar() or db.session.execute(db.select(User.id).order_by(User.id)).scalar()
+    if vote_id is None or user_id is None:
+        raise SystemExit("❌ Base vide : lancer d'abord scripts/generate_load_data.py")
+    return {'vote_id': vote_id, 'user_id': user_id}
+
+
+class InProcessTarget:
+    """Requêtes via le client de test Flask ; requêtes SQL comptées sur le moteur"""
+
+    mode = 'test-client'
+
+    def __init__(self, app, user_id):
+        from app import db
+
+        self.app = app
+        self.user_id = user_id
+        self.statements = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with app.app_context():
+            self.engine = db.engine
+        db.event.listen(self.engine, 'before_cursor_execute', self._count_statement)
+
+    def _count_statement(self, *args):
+        with self._lock:
+            self.statements += 1
+
+    def _client(self, logged_in):
+        key = 'user' if logged_in else 'anonymous'
+        client = getattr(self._local, key, None)
+        if client is None:
+            client = self.app.test_client()
+            if logged_in:
+                with client.session_transaction() as sess:
+                    sess['_user_id'] = str(self.user_id)
+            setattr(self._local, key, client)
+        return client
+
+    def get(self, path, logged_in):
+        response = self._client(logged_in).get(path)
+        response.close()
+        return response.status_code
+
+    def reset_statements(self):
+        with self._lock:
+            self.statements = 0
+
+    def close(self):
+        from app import db
+        db.event.remove(self.engine, 'before_cursor_execute', self._count_statement)
+
+
+class RateLimitedError(RuntimeError):
+    """Le serveur mesuré applique ses limites de requêtes (réponse 429)"""
+
+
+class HttpTarget:
+    """
+    Requêtes HTTP vers un serveur lancé à part
+
+    Les requêtes SQL sont lues dans l'en-tête X-Query-Count, envoyé quand
+    le serveur a QUERY_STATS_HEADERS (mode debug) ; sinon non mesurées.
+    """
+
+    mode = 'http'
+
+    def __init__(self, app, base_url, user_id):
+        self.statements = None
+        self._lock = threading.Lock()
+        self.base_url = base_url.rstrip('/')
+        serializer = app.session_interface.get_signing_serializer(app)
+        self.session_cookie = f"{app.config.get('SESSION_COOKIE_NAME', 'session')}=" \
+                              f"{serializer.dumps({'_user_id': str(user_id), '_fresh': False})}"
+
+    def get(self, path, logged_in):
+        request = urllib.request.Request(self.base_url + path)
+        if logged_in:
+            request.add_header('Cookie', self.session_cookie)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                self._count_statements(response.headers.get('X-Query-Count'))
+                return response.status
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise RateLimitedError(path)
+            return e.code
+
+    def _count_statements(self, header):
+        if header is None:
+            return
+        with self._lock:
+            self.statements = (self.statements or 0) + int(header)
+
+    def reset_statements(self):
+        with self._lock:
+            self.statements = None
+
+    def close(self):
+        pass
+
+
+def measure(target, path, logged_in, requests, warmup, concurrency):
+    """Mesure une route ; retourne les statistiques de latence et de débit"""
+    for _ in range(warmup):
+        target.get(path, logged_in)
+
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def timed_request(_):
+        started = time.perf_counter()
+        status = target.get(path, logged_in)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses.append(status)
+
+    target.reset_statements()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed_request, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': sum(1 for status in statuses if status >= 400),
+        'throughput': round(requests / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries_per_request': round(target.statements / requests, 2) if target.statements is not None else None,
+    }
+
+
+def load_reference(compare):
+    """Résultat de référence : fichier donné ou dernier de benchmarks/"""
+    if compare == 'latest':
+        files = sorted(glob.glob(os.path.join(RESULTS_FOLDER, '*.json')), key=os.path.getmtime)
+        if not files:
+            print("⚠️ Aucun résultat précédent dans benchmarks/")
+            return None
+        compare = files[-1]
+    with open(compare, encoding='utf-8') as f:
+        reference = json.load(f)
+    reference['file'] = compare
+    return reference
+
+
+def compare_results(reference, results, threshold):
+    """Affiche les écarts avec la référence ; retourne les régressions"""
+    print(f"\n📊 Comparaison avec {os.path.basename(reference['file'])} (commit {reference.get('commit')})")
+    if reference.get('dataset') != results.get('dataset') or reference.get('mode') != results.get('mode'):
+        print("⚠️ Jeux de données ou modes de mesure différents : comparaison indicative")
+
+    regressions = []
+    for route, current in results['routes'].items():
+        previous = reference.get('routes', {}).get(route)
+        if not previous:
+            continue
+        deltas = []
+        for key in ('p95_ms', 'queries_per_request'):
+            before, after = previous.get(key), current.get(key)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else (1.0 if after else 0.0)
+            deltas.append(f"{key} {before} → {after} ({change:+.0%})")
+            if change > threshold:
+                regressions.append(f"{route} {key}")
+        print(f"   {route:<24}" + ', '.join(deltas))
+
+    if regressions:
+        print(f"❌ Régression(s) au-delà de +{threshold:.0%} : {', '.join(regressions)}")
+    else:
+        print("✅ Pas de régression")
+    return regressions
+
+
+def create_server_app():
+    """
+    Application mesurée, limites de requêtes désactivées
+
+    Réservée au benchmark : l'application de production (run:app) ne
+    peut pas désactiver ses limites par la configuration.
+    """
+    from app import create_app, limiter
+    app = create_app()
+    limiter.enabled = False
+    return app
+
+
+def main():
+    args = parse_args()
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('FLASK_DEBUG', 'False')
+
+    from app import db
+    app = create_server_app()
+
+    with app.app_context():
+        dataset = dataset_summary(db)
+        targets = pick_targets(db)
+        dialect = db.engine.dialect.name
+        db.session.remove()
+
+    if args.url:
+        target = HttpTarget(app, args.url, targets['user_id'])
+    else:
+        target = InProcessTarget(app, targets['user_id'])
+
+    # --routes /vote désigne /vote/{vote_id}
+    wanted = {route.split('/{')[0] for route in args.routes or []}
+    routes = [(pattern, login) for pattern, login in ROUTES if not wanted or pattern.split('/{')[0] in wanted]
+
+    print(f"🏁 Benchmark ({target.mode}) : {args.requests} requêtes par route, "
+          f"{args.concurrency} en parallèle, {args.warmup} d'échauffement")
+    print(f"📦 Base : {app.config['SQLALCHEMY_DATABASE_URI']} "
+          + ', '.join(f"{table}={count}" for table, count in dataset.items()))
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'mode': target.mode,
+        'url': args.url,
+        'database': dialect,
+        'dataset': dataset,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'routes': {},
+    }
+
+    print(f"\n{'Route':<24}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'SQL/req':>9}{'erreurs':>9}")
+    for pattern, login in routes:
+        if login and args.anonymous:
+            continue
+        path = pattern.format(**targets)
+        try:
+            stats = measure(target, path, not args.anonymous, args.requests, args.warmup, args.concurrency)
+        except RateLimitedError:
+            print(f"❌ {path} : réponse 429, le serveur limite les requêtes. "
+                  f"Servez scripts.benchmark:create_server_app() pour mesurer.")
+            sys.exit(2)
+        results['routes'][pattern] = stats
+        queries = stats['queries_per_request']
+        print(f"{pattern:<24}{stats['throughput']:>9.1f}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{'-' if queries is None else f'{queries:.1f}':>9}{stats['errors']:>9}")
+    target.close()
+
+    reference = load_reference(args.compare) if args.compare else None
+
+    output = args.output or os.path.join(
+        RESULTS_FOLDER, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Résultats enregistrés dans {os.path.relpath(output, ROOT)}")
+
+    if reference and compare_results(reference, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Génère les vignettes S/M/L (WebP et JPEG) des couvertures d'ebooks
+existantes dans instance/covers et les renomme sous leur empreinte
+
+Usage:
+    python scripts/build_cover_thumbnails.py           # couvertures sans vignettes
+    python scripts/build_cover_thumbnails.py --force   # regénérer toutes les vignettes
+"""
+
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models import Ebook
+from app.services.covers import InvalidCoverError, cover_service
+
+
+def build_cover_thumbnails(force=False):
+    """Calcule cover_hash et génère les vignettes des couvertures existantes"""
+    app = create_app()
+    
+    with app.app_context():
+        if not cover_service.available:
+            print("❌ Pillow n'est pas installé : pip install Pillow")
+            return 0
+        
+        ebooks = Ebook.query.filter(Ebook.cover_filename.isnot(None)).order_by(Ebook.id).all()
+        print(f"🔄 {len(ebooks)} couverture(s) à traiter...")
+        
+        created = 0
+        for ebook in ebooks:
+            path = os.path.join(cover_service.folder(), ebook.cover_filename)
+            if not os.path.exists(path):
+                print(f"⚠️ Couverture manquante pour \"{ebook.title}\" : {ebook.cover_filename}")
+                continue
+            
+            if ebook.cover_hash and not force:
+                created += cover_service.generate_thumbnails(ebook.cover_hash, path)
+                continue
+            
+            old_filename = ebook.cover_filename
+            try:
+                with open(path, 'rb') as f:
+                    ebook.cover_filename, ebook.cover_hash = cover_service.store(f)
+            except InvalidCoverError as e:
+                print(f"⚠️ \"{ebook.title}\" : {e}")
+                continue
+            if force:
+                created += cover_service.generate_thumbnails(
+                    ebook.cover_hash, os.path.join(cover_service.folder(), ebook.cover_filename), force=True
+                )
+            db.session.commit()
+            
+            # Ancien nom (uuid_nom.ext) : fichier désormais stocké sous son empreinte
+            if old_filename != ebook.cover_filename:
+                cover_service.delete(old_filename, None)
+        
+        print(f"✅ Couvertures traitées ({created} vignette(s) regénérée(s))")
+        return created
+
+
+if __name__ == '__main__':
+    build_cover_thumbnails(force='--force' in sys.argv[1:])
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Génère un jeu de données volumineux et reproductible pour les tests de charge
+
+Les lignes sont insérées en masse (INSERT multi-lignes par lots, sans
+passer par les objets ORM), puis les agrégats dénormalisés (notes des
+livres, compteurs d'activité, index de recherche) sont recalculés.
+La même graine produit toujours les mêmes données.
+
+La base est instance/loadtest.db, ou celle de --database-url (par exemple
+PostgreSQL) ; DATABASE_URL est ignorée pour ne jamais viser la base de
+l'application par erreur. --reset vide la base : sur une autre base que
+instance/loadtest.db, il faut le confirmer avec --yes-really.
+
+Usage:
+    python scripts/generate_load_data.py --reset                  # 50k utilisateurs, 1M votes...
+    python scripts/generate_load_data.py --reset --scale 0.01     # jeu réduit (1 %)
+    python scripts/generate_load_data.py --users 1000 --votes 20000 --seed 7
+    python scripts/generate_load_data.py --reset --database-url postgresql://localhost/loadtest --yes-really
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Base dédiée aux tests de charge (relative au dossier instance)
+LOADTEST_DATABASE_URL = 'sqlite:///loadtest.db'
+
+# Lignes par INSERT
+BATCH_SIZE = 5000
+
+# Cardinalités par défaut (--scale les multiplie)
+DEFAULTS = {
+    'users': 50000,
+    'proposals': 20000,
+    'voting_sessions': 200,
+    'options_per_vote': 5,
+    'votes': 1000000,
+    'reviews': 100000,
+    'readings': 100,
+    'participations': 50000,
+    'notifications': 500000,
+}
+
+# Date de référence des données générées (indépendante du jour du lancement)
+EPOCH = datetime(2024, 1, 1)
+
+GENRES = ['Fantasy', 'Science-fiction', 'Policier', 'Thriller', 'Roman', 'Historique',
+          'Biographie', 'Essai', 'Horreur', 'Romance', 'Aventure', 'Poésie']
+PROPOSAL_STATUSES = ['pending'] * 8 + ['approved'] * 6 + ['selected'] + ['completed'] * 3 + ['archived'] * 2
+WORDS = ['vent', 'nuit', 'ombre', 'royaume', 'mer', 'étoile', 'forêt', 'cendre', 'mémoire', 'dragon',
+         'silence', 'horloge', 'frontière', 'jardin', 'tempête', 'lumière', 'exil', 'secret', 'miroir',
+         'loup', 'océan', 'ville', 'voyage', 'hiver', 'couronne', 'prophétie', 'rivière', 'masque']
+ADJECTIVES = ['perdu', 'éternel', 'dernier', 'oublié', 'brisé', 'sauvage', 'invisible', 'ancien',
+              'sombre', 'premier', 'lointain', 'interdit']
+FIRST_NAMES = ['Camille', 'Louis', 'Jeanne', 'Hugo', 'Léa', 'Arthur', 'Chloé', 'Jules', 'Inès', 'Victor']
+LAST_NAMES = ['Martin', 'Bernard', 'Dubois', 'Lefèvre', 'Moreau', 'Laurent', 'Garnier', 'Rousseau']
+NOTIFICATION_TYPES = {
+    'badge': ('Nouveau badge !', 'fas fa-trophy'),
+    'vote': ('Nouveau vote ouvert', 'fas fa-vote-yea'),
+    'reading': ('Lecture commune', 'fas fa-book-reader'),
+    'review': ('Nouvel avis', 'fas fa-star'),
+    'system': ('Information', 'fas fa-info-circle'),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Génère des données de test de charge")
+    parser.add_argument('--seed', type=int, default=42, help="graine du générateur aléatoire")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiplie toutes les cardinalités")
+    parser.add_argument('--database-url', default=LOADTEST_DATABASE_URL,
+                        help=f"base à remplir (défaut : {LOADTEST_DATABASE_URL}, DATABASE_URL ignorée)")
+    parser.add_argument('--reset', action='store_true', help="vide la base avant de générer")
+    parser.add_argument('--yes-really', action='store_true',
+                        help="confirme --reset sur une autre base que celle des tests de charge")
+    for name, default in DEFAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=None,
+                            help=f"nombre de lignes (défaut : {default})")
+    args = parser.parse_args()
+    if args.reset and args.database_url != LOADTEST_DATABASE_URL and not args.yes_really:
+        parser.error(f"--reset viderait {args.database_url} : ajoutez --yes-really pour confirmer")
+    return args
+
+
+def cardinalities(args):
+    """Cardinalités demandées (options explicites prioritaires sur --scale)"""
+    counts = {}
+    for name, default in DEFAULTS.items():
+        value = getattr(args, name)
+        if value is None:
+            value = default if name == 'options_per_vote' else max(1, int(default * args.scale))
+        counts[name] = value
+    return counts
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS + ADJECTIVES) for _ in range(words)).capitalize() + '.'
+
+
+def moment(rng, days=365):
+    """Date aléatoire dans l'année suivant EPOCH"""
+    return EPOCH + timedelta(seconds=rng.randrange(days * 24 * 3600))
+
+
+class BulkWriter:
+    """Insertion par lots de BATCH_SIZE lignes, une transaction par lot"""
+
+    def __init__(self, db):
+        self.db = db
+        self.inserted = {}
+
+    def insert(self, model, rows):
+        table = model.__table__
+        batch = []
+        count = 0
+        started = time.perf_counter()
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                count += self._flush(table, batch)
+        count += self._flush(table, batch)
+        self.inserted[table.name] = count
+        print(f"   {table.name:<22}{count:>10} ligne(s) en {time.perf_counter() - started:.1f} s")
+        return count
+
+    def _flush(self, table, batch):
+        if not batch:
+            return 0
+        self.db.session.execute(self.db.insert(table), batch)
+        self.db.session.commit()
+        count = len(batch)
+        batch.clear()
+        return count
+
+    def ids_after(self, model, start_id):
+        """Identifiants des lignes insérées après start_id"""
+        return self.db.session.execute(
+            self.db.select(model.id).where(model.id > start_id).order_by(model.id)
+        ).scalars().all()
+
+    def max_id(self, model):
+        return self.db.session.execute(self.db.select(self.db.func.coalesce(self.db.func.max(model.id), 0))).scalar()
+
+
+def generate(db, rng, counts):
+    """Insère toutes les tables ; retourne le nombre de lignes par table"""
+    from app.models import (
+        User, BookProposal, VotingSession, VoteOption, Vote, BookReview,
+        ReadingSession, ReadingParticipation, Notification
+    )
+
+    writer = BulkWriter(db)
+    now = datetime.now()
+
+    # Utilisateurs (noms préfixés par le dernier id : plusieurs jeux peuvent coexister)
+    start = writer.max_id(User)
+    writer.insert(User, (
+        {
+            'twitch_id': f'load-{start}-{i}',
+            'username': f'load_{start}_{i}',
+            'display_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}',
+            'email': f'load{i}@example.com',
+            'avatar_url': '',
+            'is_admin': i == 0,
+            'created_at': moment(rng),
+        }
+        for i in range(counts['users'])
+    ))
+    user_ids = writer.ids_after(User, start)
+
+    # Propositions de livres
+    start = writer.max_id(BookProposal)
+    writer.insert(BookProposal, (
+        {
+            'title': f'{rng.choice(WORDS).capitalize()} {rng.choice(ADJECTIVES)} {i}',
+            'author': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'description': ' '.join(sentence(rng) for _ in range(3)),
+            'isbn': f'978{rng.randrange(10 ** 10):010d}',
+            'publication_year': rng.randint(1850, 2024),
+            'pages_count': rng.randint(80, 1200),
+            'genre': rng.choice(GENRES),
+            'proposed_by': rng.choice(user_ids),
+            'status': rng.choice(PROPOSAL_STATUSES),
+            'created_at': moment(rng),
+        }
+        for i in range(counts['proposals'])
+    ))
+    book_ids = writer.ids_after(BookProposal, start)
+
+    # Sessions de vote (la dernière est active) et livres en lice
+    start = writer.max_id(VotingSession)
+    sessions = counts['voting_sessions']
+    writer.insert(VotingSession, (
+        {
+            'title': f'Vote #{i + 1}',
+            'description': sentence(rng),
+            'start_date': EPOCH + timedelta(days=i),
+            'end_date': now + timedelta(days=7) if i == sessions - 1 else EPOCH + timedelta(days=i + 7),
+            'status': 'active' if i == sessions - 1 else 'closed',
+            'created_by': user_ids[0],
+        }
+        for i in range(sessions)
+    ))
+    session_ids = writer.ids_after(VotingSession, start)
+
+    start = writer.max_id(VoteOption)
+    writer.insert(VoteOption, (
+        {'voting_session_id': session_id, 'book_id': book_id}
+        for session_id in session_ids
+        for book_id in rng.sample(book_ids, min(counts['options_per_vote'], len(book_ids)))
+    ))
+    options = {}
+    for option_id, session_id in db.session.execute(
+        db.select(VoteOption.id, VoteOption.voting_session_id).where(VoteOption.id > start)
+    ):
+        options.setdefault(session_id, []).append(option_id)
+
+    # Votes : répartis entre les sessions, plusieurs livres par votant si besoin
+    def votes():
+        per_session, remainder = divmod(counts['votes'], len(session_ids))
+        for index, session_id in enumerate(session_ids):
+            wanted = per_session + (index < remainder)
+            choices = min(-(-wanted // len(user_ids)), len(options[session_id]))
+            voters = min(-(-wanted // choices), len(user_ids))
+            for user_id in rng.sample(user_ids, voters):
+                created_at = EPOCH + timedelta(days=index, seconds=rng.randrange(7 * 24 * 3600))
+                for option_id in rng.sample(options[session_id], min(choices, wanted)):
+                    yield {
+                        'user_id': user_id,
+                        'voting_session_id': session_id,
+                        'vote_option_id': option_id,
+                        'created_at': created_at,
+                    }
+                wanted -= choices
+                if wanted <= 0:
+                    break
+    writer.insert(Vote, votes())
+
+    # Avis (un seul par utilisateur et par livre)
+    def reviews():
+        seen = set()
+        total = min(counts['reviews'], len(user_ids) * len(book_ids))
+        while len(seen) < total:
+            pair = (rng.choice(user_ids), rng.choice(book_ids))
+            if pair in seen:
+                continue
+            seen.add(pair)
+            created_at = moment(rng)
+            yield {
+                'user_id': pair[0],
+                'book_id': pair[1],
+                'rating': rng.choices([1, 2, 3, 4, 5], weights=[1, 2, 4, 6, 4])[0],
+                'comment': sentence(rng, 20) if rng.random() < 0.6 else None,
+                'is_moderated': False,
+                'is_visible': rng.random() < 0.97,
+                'created_at': created_at,
+                'updated_at': created_at,
+            }
+    writer.insert(BookReview, reviews())
+
+    # Lectures communes (une en cours, une à venir) et participations
+    start = writer.max_id(ReadingSession)
+    readings = counts['readings']
+
+    def reading_status(i):
+        if i == readings - 1:
+            return 'upcoming'
+        return 'current' if i == readings - 2 else 'completed'
+    writer.insert(ReadingSession, (
+        {
+            'book_id': rng.choice(book_ids),
+            'start_date': EPOCH + timedelta(days=3 * i),
+            'end_date': EPOCH + timedelta(days=3 * i + 30),
+            'status': reading_status(i),
+            'description': sentence(rng),
+            'created_by': user_ids[0],
+            'created_at': EPOCH + timedelta(days=3 * i),
+        }
+        for i in range(readings)
+    ))
+    reading_ids = writer.ids_after(ReadingSession, start)
+
+    def participations():
+        per_reading, remainder = divmod(counts['participations'], len(reading_ids))
+        for index, reading_id in enumerate(reading_ids):
+            for user_id in rng.sample(user_ids, min(per_reading + (index < remainder), len(user_ids))):
+                yield {'user_id': user_id, 'reading_session_id': reading_id, 'joined_at': moment(rng)}
+    writer.insert(ReadingParticipation, participations())
+
+    # Notifications (70 % lues)
+    def notifications():
+        for _ in range(counts['notifications']):
+            notification_type = rng.choice(list(NOTIFICATION_TYPES))
+            title, icon = NOTIFICATION_TYPES[notification_type]
+            created_at = moment(rng)
+            is_read = rng.random() < 0.7
+            yield {
+                'user_id': rng.choice(user_ids),
+                'type': notification_type,
+                'title': title,
+                'message': sentence(rng),
+                'link': None,
+                'icon': icon,
+                'is_read': is_read,
+                'created_at': created_at,
+                'read_at': created_at + timedelta(hours=rng.randint(1, 72)) if is_read else None,
+            }
+    writer.insert(Notification, notifications())
+
+    return writer.inserted
+
+
+def refresh_aggregates(db):
+    """Recalcule les données dénormalisées ignorées par les insertions en masse"""
+    from app.models import BookProposal, UserActivityStats
+    from app.services.search import search_index
+
+    started = time.perf_counter()
+    BookProposal.refresh_ratings(db.session.connection())
+    db.session.commit()
+    UserActivityStats.rebuild()
+    if search_index.available:
+        search_index.rebuild()
+    print(f"   agrégats, compteurs et index recalculés en {time.perf_counter() - started:.1f} s")
+
+
+def main():
+    args = parse_args()
+    counts = cardinalities(args)
+    os.environ['DATABASE_URL'] = args.database_url
+
+    from app import create_app, db
+    app = create_app()
+
+    with app.app_context():
+        print(f"📦 Base : {app.config['SQLALCHEMY_DATABASE_URI']}")
+        if args.reset:
+            db.drop_all()
+            db.create_all()
+            print("🗑️ Base vidée")
+        # Base sans migrations : l'index de recherche est créé ici
+        from app.services.search import search_index
+        search_index.create_schema()
+
+        print(f"🎲 Graine {args.seed} : " + ', '.join(f"{name}={value}" for name, value in counts.items()))
+        started = time.perf_counter()
+        inserted = generate(db, random.Random(args.seed), counts)
+        refresh_aggregates(db)
+        print(f"✅ {sum(inserted.values())} ligne(s) générée(s) en {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Calcule l'empreinte SHA-256 des EPUB existants et les range sous
+<sha256>.epub (stockage dédoublonné des nouveaux envois)
+
+Usage:
+    python scripts/hash_ebooks.py
+"""
+
+import hashlib
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models import Ebook
+from app.services.ebook_storage import CHUNK_SIZE, ebook_storage
+
+
+def file_sha256(path):
+    """Empreinte SHA-256 d'un fichier lu par blocs"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_ebooks():
+    """Renseigne file_hash et renomme les fichiers des ebooks existants"""
+    app = create_app()
+    
+    with app.app_context():
+        ebooks = Ebook.query.filter(Ebook.file_hash.is_(None)).order_by(Ebook.id).all()
+        print(f"🔄 {len(ebooks)} ebook(s) sans empreinte...")
+        
+        updated = 0
+        for ebook in ebooks:
+            path = ebook_storage.path(ebook.filename)
+            if not os.path.exists(path):
+                print(f"⚠️ Fichier manquant pour \"{ebook.title}\" : {ebook.filename}")
+                continue
+            
+            sha256 = file_sha256(path)
+            duplicate = Ebook.query.filter_by(file_hash=sha256).first()
+            if duplicate:
+                print(f"⚠️ \"{ebook.title}\" (#{ebook.id}) est un doublon de \"{duplicate.title}\" (#{duplicate.id})")
+                continue
+            
+            filename = f'{sha256}.epub'
+            os.replace(path, ebook_storage.path(filename))
+            ebook.filename = filename
+            ebook.file_hash = sha256
+            db.session.commit()
+            updated += 1
+        
+        print(f"✅ {updated} ebook(s) mis à jour")
+        return updated
+
+
+if __name__ == '__main__':
+    hash_ebooks()
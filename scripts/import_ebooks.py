@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Importe en masse les EPUB d'un dossier (métadonnées et couverture lues
+dans chaque fichier, analyse en parallèle)
+
+Usage:
+    python scripts/import_ebooks.py DOSSIER --uploader PSEUDO
+    python scripts/import_ebooks.py DOSSIER --uploader PSEUDO --hidden --workers 4
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import User
+from app.services.ebook_import import import_ebooks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import en masse d'EPUB")
+    parser.add_argument('folder', help='Dossier contenant les fichiers .epub (sous-dossiers inclus)')
+    parser.add_argument('--uploader', required=True, help="Pseudo Twitch de l'administrateur importateur")
+    parser.add_argument('--hidden', action='store_true', help='Importer les ebooks masqués')
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processus d'analyse (défaut : nombre de CPU, 0 pour aucun)")
+    args = parser.parse_args()
+    
+    paths = sorted(glob.glob(os.path.join(args.folder, '**', '*.epub'), recursive=True))
+    if not paths:
+        print(f"❌ Aucun fichier .epub dans {args.folder}")
+        sys.exit(1)
+    
+    app = create_app()
+    
+    with app.app_context():
+        uploader = User.query.filter_by(username=args.uploader).first()
+        if uploader is None:
+            print(f"❌ Utilisateur inconnu : {args.uploader}")
+            sys.exit(1)
+        
+        print(f"🔄 Import de {len(paths)} fichier(s)...")
+        report = import_ebooks(paths, uploader.id, workers=args.workers, is_visible=not args.hidden)
+        
+        for name, error in report.failed:
+            print(f"⚠️ {name} : {error}")
+        if report.duplicates:
+            print(f"📚 {len(report.duplicates)} doublon(s) ignoré(s)")
+        print(f"✅ {len(report.imported)} ebook(s) importé(s)")
+
+
+if __name__ == '__main__':
+    main()
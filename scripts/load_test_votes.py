@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test de charge du chemin d'écriture des votes
+
+Compare, sur une base SQLite temporaire (ou DATABASE_URL), l'ancien
+chemin de main.submit_vote (lecture puis suppression vote par vote via
+l'ORM, puis vérification complète des badges dans la requête) et le
+nouveau (DELETE + INSERT ... SELECT en une transaction, badges en
+tâche de fond), avec des votants concurrents qui votent puis changent
+d'avis.
+
+Usage:
+    python scripts/load_test_votes.py                       # 200 votants, 16 threads
+    python scripts/load_test_votes.py --voters 500 --threads 32
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Test de charge des votes")
+    parser.add_argument('--voters', type=int, default=200, help="nombre de votants")
+    parser.add_argument('--threads', type=int, default=16, help="requêtes simultanées")
+    parser.add_argument('--options', type=int, default=5, help="livres en lice")
+    parser.add_argument('--choices', type=int, default=2, help="livres choisis par votant")
+    return parser.parse_args()
+
+
+def legacy_submit(user_id, session_id, option_ids):
+    """Ancien chemin : votes supprimés un par un puis vérification complète des badges"""
+    from app import db
+    from app.models import Vote
+    from app.badge_manager import BadgeManager
+
+    existing_votes = Vote.query.filter_by(user_id=user_id, voting_session_id=session_id).all()
+    for vote in existing_votes:
+        db.session.delete(vote)
+    for option_id in option_ids:
+        db.session.add(Vote(user_id=user_id, voting_session_id=session_id, vote_option_id=option_id))
+    db.session.commit()
+    BadgeManager.check_and_award_badges(user_id)
+
+
+def bulk_submit(user_id, session_id, option_ids):
+    """Nouveau chemin : remplacement en masse, badges en tâche de fond"""
+    from app.services.votes import vote_tally_service
+    from app.badge_manager import BadgeManager
+
+    vote_tally_service.cast_book_votes(user_id, session_id, option_ids)
+    BadgeManager.handle_event_async(user_id, 'vote_cast')
+
+
+def seed(app, voters, options, prefix):
+    """Crée les votants, les livres et la session de vote (un jeu par chemin testé)"""
+    from app import db
+    from app.models import User, BookProposal, VotingSession, VoteOption
+
+    with app.app_context():
+        admin = User(twitch_id=f'{prefix}-admin', username=f'{prefix}_admin', display_name='Load Admin')
+        db.session.add(admin)
+        db.session.flush()
+
+        session = VotingSession(title='Test de charge', created_by=admin.id,
+                                end_date=datetime.now() + timedelta(days=1))
+        db.session.add(session)
+        db.session.flush()
+
+        option_ids = []
+        for index in range(options):
+            book = BookProposal(title=f'Livre {index}', author='Auteur',
+                                proposed_by=admin.id, status='approved')
+            db.session.add(book)
+            db.session.flush()
+            option = VoteOption(voting_session_id=session.id, book_id=book.id)
+            db.session.add(option)
+            db.session.flush()
+            option_ids.append(option.id)
+
+        users = [User(twitch_id=f'{prefix}-{i}', username=f'{prefix}_{i}', display_name=f'Votant {i}')
+                 for i in range(voters)]
+        db.session.add_all(users)
+        db.session.commit()
+        return session.id, option_ids, [user.id for user in users]
+
+
+def run(app, label, submit, session_id, option_ids, user_ids, threads, choices):
+    """Chaque votant vote puis change d'avis ; mesure latences et requêtes SQL"""
+    from app import db
+
+    statements = 0
+    lock = threading.Lock()
+
+    def count_statement(*args):
+        nonlocal statements
+        with lock:
+            statements += 1
+
+    latencies, errors = [], []
+
+    def submit_as(user_id):
+        with app.app_context():
+            for _ in range(2):
+                picks = random.sample(option_ids, choices)
+                started = time.perf_counter()
+                try:
+                    submit(user_id, session_id, picks)
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(str(e))
+                finally:
+                    latencies.append(time.perf_counter() - started)
+            db.session.remove()
+
+    with app.app_context():
+        engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', count_statement)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(submit_as, user_ids))
+    elapsed = time.perf_counter() - started
+    db.event.remove(engine, 'before_cursor_execute', count_statement)
+
+    submissions = len(latencies)
+    latencies.sort()
+    return {
+        'label': label,
+        'submissions': submissions,
+        'throughput': submissions / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'statements': statements / submissions,
+        'errors': len(errors),
+    }
+
+
+def main():
+    args = parse_args()
+
+    tmpdir = None
+    if not os.getenv('DATABASE_URL'):
+        tmpdir = tempfile.TemporaryDirectory()
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir.name, 'load_test.db')}"
+
+    from app import create_app
+    app = create_app()
+
+    print(f"🗳️ Test de charge : {args.voters} votants, {args.threads} threads, "
+          f"{args.choices}/{args.options} livres, 2 votes par votant")
+    print(f"📦 Base : {app.config['SQLALCHEMY_DATABASE_URI']}")
+
+    results = []
+    for prefix, label, submit in (('legacy', 'ORM (ancien)', legacy_submit),
+                                  ('bulk', 'Bulk (nouveau)', bulk_submit)):
+        session_id, option_ids, user_ids = seed(app, args.voters, args.options, prefix)
+        results.append(run(app, label, submit, session_id, option_ids, user_ids,
+                           args.threads, args.choices))
+
+    print(f"\n{'Chemin':<16}{'votes/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'SQL/vote':>10}{'erreurs':>10}")
+    for r in results:
+        print(f"{r['label']:<16}{r['throughput']:>10.1f}{r['p50']:>10.1f}{r['p95']:>10.1f}"
+              f"{r['statements']:>10.1f}{r['errors']:>10}")
+
+    legacy, bulk = results
+    print(f"\n✅ Débit x{bulk['throughput'] / legacy['throughput']:.1f}, "
+          f"{legacy['statements'] - bulk['statements']:.1f} requête(s) SQL de moins par vote")
+
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
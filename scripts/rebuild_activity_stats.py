@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recalcule entièrement la table user_activity_stats depuis les tables sources
+
+Usage:
+    python scripts/rebuild_activity_stats.py            # tous les utilisateurs
+    python scripts/rebuild_activity_stats.py 12 42      # utilisateurs ciblés
+"""
+
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.models import UserActivityStats
+
+
+def rebuild_activity_stats(user_ids=None):
+    """Reconstruit les compteurs d'activité"""
+    app = create_app()
+    
+    with app.app_context():
+        print("🔄 Recalcul des compteurs d'activité...")
+        count = UserActivityStats.rebuild(user_ids)
+        print(f"✅ {count} utilisateur(s) recalculé(s)")
+        return count
+
+
+if __name__ == '__main__':
+    ids = [int(arg) for arg in sys.argv[1:]] or None
+    rebuild_activity_stats(ids)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recalcule les agrégats d'avis (rating_sum, rating_count, avg_rating) des livres
+
+Usage:
+    python scripts/rebuild_book_ratings.py            # tous les livres
+    python scripts/rebuild_book_ratings.py 3 17       # livres ciblés
+"""
+
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.models import BookProposal
+
+
+def rebuild_book_ratings(book_ids=None):
+    """Recalcule les agrégats depuis les avis visibles"""
+    app = create_app()
+    
+    with app.app_context():
+        print("🔄 Recalcul des agrégats d'avis...")
+        count = BookProposal.refresh_ratings(db.session.connection(), book_ids)
+        db.session.commit()
+        print(f"✅ {count} livre(s) recalculé(s)")
+        return count
+
+
+if __name__ == '__main__':
+    ids = [int(arg) for arg in sys.argv[1:]] or None
+    rebuild_book_ratings(ids)
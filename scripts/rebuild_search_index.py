@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reconstruit l'index de recherche plein texte (livres, ebooks, films)
+
+Usage:
+    python scripts/rebuild_search_index.py              # tous les documents
+    python scripts/rebuild_search_index.py book film    # types ciblés
+"""
+
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.search import search_index, SEARCH_DOCUMENTS
+
+
+def rebuild_search_index(doc_types=None):
+    """Réindexe les documents depuis les tables sources"""
+    app = create_app()
+    
+    with app.app_context():
+        if not search_index.available:
+            print("⚠️ Index plein texte absent (flask db upgrade) ou moteur sans plein texte : la recherche utilise ILIKE")
+            return 0
+        
+        print("🔄 Reconstruction de l'index de recherche...")
+        count = search_index.rebuild(doc_types)
+        print(f"✅ {count} document(s) indexé(s)")
+        return count
+
+
+if __name__ == '__main__':
+    types = sys.argv[1:] or None
+    unknown = [t for t in (types or []) if t not in SEARCH_DOCUMENTS]
+    if unknown:
+        print(f"❌ Type(s) inconnu(s) : {', '.join(unknown)} (attendus : {', '.join(SEARCH_DOCUMENTS)})")
+        sys.exit(1)
+    rebuild_search_index(types)
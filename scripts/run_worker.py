@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker de la file de tâches de fond (badges, diffusions, tâches planifiées)
+
+Usage:
+    python scripts/run_worker.py                # exécute les tâches de la file
+    python scripts/run_worker.py --scheduler    # + planification cron (app/tasks.py)
+    python scripts/run_worker.py --burst        # s'arrête quand la file est vide
+    python scripts/run_worker.py --run votes.close_expired   # exécute une tâche et quitte
+
+File utilisée : JOBS_BACKEND (redis par défaut si REDIS_URL, sinon database
+conseillé pour un worker local : JOBS_BACKEND=database).
+"""
+
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.jobs import Job, Scheduler, Worker, get_job_queue
+from app.tasks import SCHEDULE
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Worker des tâches de fond")
+    parser.add_argument('--scheduler', action='store_true', help="planifier les tâches cron")
+    parser.add_argument('--burst', action='store_true', help="s'arrêter quand la file est vide")
+    parser.add_argument('--run', metavar='TACHE', help="exécuter une tâche immédiatement et quitter")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    app = create_app()
+
+    with app.app_context():
+        queue = get_job_queue()
+
+    if args.run:
+        worker = Worker(app, queue)
+        print(f"▶️ Exécution de {args.run}...")
+        ok = worker.execute(Job(args.run))
+        print("✅ Terminé" if ok else "❌ Échec (voir les logs)")
+        sys.exit(0 if ok else 1)
+
+    if queue.backend_name == 'memory':
+        print("⚠️ File en mémoire : les tâches ajoutées par le site ne sont pas visibles "
+              "par ce worker (configurez REDIS_URL ou JOBS_BACKEND=database)")
+
+    scheduler = Scheduler(queue, SCHEDULE) if args.scheduler else None
+    worker = Worker(app, queue, scheduler)
+    worker.install_signal_handlers()
+
+    print(f"👷 Worker démarré (file {queue.backend_name}"
+          f"{', planificateur actif' if scheduler else ''})")
+    worker.run(burst=args.burst)
+    print(f"👋 Worker arrêté : {worker.processed} tâche(s) exécutée(s), {worker.failed} en échec")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app, db
 from app.models import User, BookProposal, Badge
+from app.services.search import search_index
 
 
 @pytest.fixture(scope='session')
@@ -32,6 +33,7 @@ def app():
     # Créer les tables
     with app.app_context():
         db.create_all()
+        search_index.create_schema()
         yield app
         db.drop_all()
 
@@ -54,6 +56,9 @@ def db_session(app):
             db.session.execute(table.delete())
         db.session.commit()
         
+        # Vider l'index de recherche (hors métadonnées SQLAlchemy)
+        search_index.rebuild()
+        
         yield db.session
         
         # Nettoyer après chaque test
@@ -105,3 +110,32 @@ def test_book(db_session, test_user):
     db_session.add(book)
     db_session.commit()
     return book
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Vérifie le nombre de requêtes SQL d'un bloc (et l'absence de N+1)
+    
+    La session est expirée avant le bloc : les requêtes du client de test
+    partagent la session des fixtures, dont les objets déjà chargés
+    masqueraient les chargements paresseux.
+    
+    Exemple:
+        with query_budget(12):
+            client.get('/books')
+    """
+    from contextlib import contextmanager
+    from app.services.query_stats import capture_queries
+    
+    @contextmanager
+    def budget(max_queries, allow_repeated=False):
+        db.session.expire_all()
+        with capture_queries() as stats:
+            yield stats
+        repeated = stats.repeated()
+        details = '\n'.join(f'  {n}x {" ".join(statement.split())[:200]}' for statement, n in stats.statements.most_common(10))
+        assert stats.count <= max_queries, f'{stats.count} requêtes SQL (budget : {max_queries})\n{details}'
+        assert allow_repeated or not repeated, f'Requêtes répétées (N+1 probable) :\n{details}'
+    
+    return budget
@@ -171,3 +171,56 @@ class TestBadgeDisplay:
         
         badges = Badge.query.filter_by(category='test').all()
         assert len(badges) == len(valid_colors)
+
+
+class TestBadgeEventEngine:
+    """Tests pour le moteur de règles piloté par événements"""
+    
+    @pytest.fixture
+    def engine_badges(self, db_session):
+        """Badges utilisés par les règles du moteur"""
+        for name, category in [('Première proposition', 'proposition'),
+                               ('Premier vote', 'vote'),
+                               ('Premier avis', 'notation')]:
+            db_session.add(Badge(name=name, description=name, icon='fa-star', category=category))
+        db_session.commit()
+    
+    def test_event_awards_matching_badge(self, db_session, test_user, engine_badges):
+        """Un événement attribue le badge dont le seuil est atteint"""
+        db_session.add(BookProposal(title='Livre', author='Auteur', proposed_by=test_user.id))
+        db_session.commit()
+        
+        awarded = BadgeManager.handle_event(test_user.id, 'proposal_created')
+        
+        assert [badge.name for badge in awarded] == ['Première proposition']
+        assert UserBadge.query.filter_by(user_id=test_user.id).count() == 1
+    
+    def test_event_only_evaluates_its_counters(self, db_session, test_user, engine_badges):
+        """Un événement n'évalue pas les règles des autres compteurs"""
+        db_session.add(BookProposal(title='Livre', author='Auteur', proposed_by=test_user.id))
+        db_session.commit()
+        
+        assert BadgeManager.handle_event(test_user.id, 'vote_cast') == []
+        assert UserBadge.query.filter_by(user_id=test_user.id).count() == 0
+    
+    def test_event_is_idempotent(self, db_session, test_user, engine_badges):
+        """Un badge déjà possédé n'est pas réattribué"""
+        db_session.add(BookProposal(title='Livre', author='Auteur', proposed_by=test_user.id))
+        db_session.commit()
+        
+        BadgeManager.handle_event(test_user.id, 'proposal_created')
+        assert BadgeManager.handle_event(test_user.id, 'proposal_created') == []
+        assert UserBadge.query.filter_by(user_id=test_user.id).count() == 1
+    
+    def test_full_rescan(self, db_session, test_user, engine_badges):
+        """check_and_award_badges évalue toutes les règles"""
+        db_session.add(BookProposal(title='Livre', author='Auteur', proposed_by=test_user.id))
+        db_session.commit()
+        
+        awarded = BadgeManager.check_and_award_badges(test_user.id)
+        assert [badge.name for badge in awarded] == ['Première proposition']
+    
+    def test_unknown_event(self, db_session, test_user):
+        """Un événement inconnu lève une erreur"""
+        with pytest.raises(ValueError):
+            BadgeManager.handle_event(test_user.id, 'unknown_event')
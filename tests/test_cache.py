@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Tests pour la couche de cache (LRU mémoire et Redis)
+"""
+
+import threading
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+import app.services.cache as cache_module
+from app.services.cache import MemoryCache, RedisCache, create_cache
+from app.services.open_library import OpenLibraryService
+from app.services.singleflight import SingleFlight
+
+
+class TestMemoryCache:
+    """Tests pour le cache LRU en mémoire"""
+    
+    def test_get_set(self):
+        """Test lecture/écriture et métriques"""
+        cache = MemoryCache('test')
+        assert cache.get('a') is None
+        cache.set('a', [1, 2])
+        assert cache.get('a') == [1, 2]
+        
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['size'] == 1
+    
+    def test_size_cap_evicts_least_recently_used(self):
+        """Test éviction LRU au-delà de la taille maximale"""
+        cache = MemoryCache('test', max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')  # 'a' devient le plus récent
+        cache.set('c', 3)
+        
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert cache.stats()['evictions'] == 1
+    
+    def test_expiration(self, monkeypatch):
+        """Test expiration après le TTL"""
+        now = [1000.0]
+        monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+        
+        cache = MemoryCache('test', default_ttl=10)
+        cache.set('a', 1)
+        now[0] += 11
+        assert cache.get('a') is None
+        assert cache.size() == 0
+
+
+class TestRedisCache:
+    """Tests pour le cache Redis (fakeredis)"""
+    
+    @pytest.fixture
+    def redis_client(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        return fakeredis.FakeRedis()
+    
+    def test_shared_between_instances(self, redis_client):
+        """Deux workers partagent les mêmes entrées"""
+        worker1 = RedisCache(redis_client, 'test')
+        worker2 = RedisCache(redis_client, 'test')
+        
+        worker1.set('search:dune', [{'title': 'Dune'}])
+        assert worker2.get('search:dune') == [{'title': 'Dune'}]
+        assert redis_client.ttl('biblioruche:cache:test:search:dune') > 0
+    
+    def test_value_size_cap(self, redis_client):
+        """Les valeurs trop volumineuses ne sont pas mises en cache"""
+        cache = RedisCache(redis_client, 'test', max_value_bytes=10)
+        cache.set('big', 'x' * 100)
+        assert cache.get('big') is None
+    
+    def test_clear_namespace(self, redis_client):
+        """clear() ne vide que son namespace"""
+        cache = RedisCache(redis_client, 'a')
+        other = RedisCache(redis_client, 'b')
+        cache.set('k', 1)
+        other.set('k', 2)
+        
+        cache.clear()
+        assert cache.get('k') is None
+        assert other.get('k') == 2
+    
+    def test_stats_without_scan(self, redis_client, monkeypatch):
+        """stats() ne parcourt pas les clés du namespace"""
+        cache = RedisCache(redis_client, 'test')
+        cache.set('k', 1)
+        cache.get('k')
+        monkeypatch.setattr(redis_client, 'scan_iter', lambda *args, **kwargs: pytest.fail('SCAN'))
+        
+        stats = cache.stats()
+        assert (stats['hits'], stats['size']) == (1, None)
+    
+    def test_dedicated_cache_instance(self, monkeypatch, redis_client):
+        """CACHE_REDIS_URL sépare le cache (éviction LRU) des données à conserver"""
+        urls = []
+        monkeypatch.setenv('CACHE_REDIS_URL', 'redis://redis-cache:6379/0')
+        monkeypatch.setattr(cache_module, 'get_redis', lambda url=None: urls.append(url) or redis_client)
+        
+        cache = create_cache('dedicated')
+        
+        assert isinstance(cache, RedisCache)
+        assert urls == ['redis://redis-cache:6379/0']
+
+
+class TestOpenLibraryCache:
+    """Tests pour l'utilisation du cache par OpenLibraryService"""
+    
+    def test_search_uses_cache(self):
+        """Une recherche répétée ne refait pas d'appel HTTP"""
+        service = OpenLibraryService(cache=MemoryCache('test'))
+        response = MagicMock()
+        response.json.return_value = {'docs': [{'title': 'Dune', 'author_name': ['Frank Herbert']}]}
+        service.session.get = MagicMock(return_value=response)
+        
+        first = service.search_books('dune')
+        second = service.search_books('dune')
+        
+        assert first == second
+        assert service.session.get.call_count == 1
+    
+    def test_single_flight_recheck_not_counted(self):
+        """La vérification du cache dans le single-flight ne compte pas de miss supplémentaire"""
+        service = OpenLibraryService(cache=MemoryCache('test'))
+        response = MagicMock()
+        response.json.return_value = {'docs': []}
+        service.session.get = MagicMock(return_value=response)
+        
+        service.search_books('dune')
+        service.get_book_by_isbn('9782070360024')
+        
+        assert (service.cache.hits, service.cache.misses) == (0, 2)
+
+
+class TestSingleFlight:
+    """Tests pour la coalescence des requêtes concurrentes"""
+    
+    @staticmethod
+    def _run_concurrently(target, count):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+    
+    def test_concurrent_searches_share_one_request(self):
+        """Les recherches simultanées d'un même titre font un seul appel amont"""
+        service = OpenLibraryService(cache=MemoryCache('test'))
+        response = MagicMock()
+        response.json.return_value = {'docs': [{'title': 'Dune', 'author_name': ['Frank Herbert']}]}
+        
+        def slow_get(*args, **kwargs):
+            time.sleep(0.1)
+            return response
+        service.session.get = MagicMock(side_effect=slow_get)
+        
+        results = self._run_concurrently(lambda: service.search_books('dune'), 10)
+        
+        assert service.session.get.call_count == 1
+        assert all(result == results[0] for result in results)
+    
+    def test_error_propagates_to_waiters(self):
+        """Une erreur du calcul est remontée à tous les appelants"""
+        flight = SingleFlight(MemoryCache('test'))
+        
+        def failing():
+            time.sleep(0.05)
+            raise RuntimeError('boom')
+        
+        errors = []
+        def call():
+            try:
+                flight.do('key', failing)
+            except RuntimeError as e:
+                errors.append(e)
+        
+        self._run_concurrently(call, 5)
+        assert len(errors) == 5
+    
+    def test_workers_share_one_request(self):
+        """Deux workers partageant Redis ne font qu'un appel amont"""
+        fakeredis = pytest.importorskip('fakeredis')
+        client = fakeredis.FakeRedis()
+        calls = []
+        
+        caches = []
+        
+        def make_worker():
+            cache = RedisCache(client, 'test')
+            caches.append(cache)
+            flight = SingleFlight(cache)
+            
+            def fetch():
+                calls.append(1)
+                time.sleep(0.2)
+                cache.set('key', 'value')
+                return 'value'
+            return lambda: flight.do('key', fetch)
+        
+        workers = [make_worker(), make_worker()]
+        results = []
+        threads = [threading.Thread(target=lambda w=w: results.append(w())) for w in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert results == ['value', 'value']
+        assert len(calls) == 1
+        # La scrutation du worker en attente ne compte pas de miss
+        assert sum(cache.misses for cache in caches) == 0
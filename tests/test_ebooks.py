@@ -0,0 +1,689 @@
+# -*- coding: utf-8 -*-
+"""
+Tests du téléchargement des ebooks
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+import zipfile
+
+import fakeredis
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db, limiter
+from app.models import Ebook
+from app.routes import ebooks as ebooks_routes
+from app.services import downloads
+from app.services.covers import THUMBNAIL_FORMATS, THUMBNAIL_SIZES, InvalidCoverError, cover_service
+from app.services.downloads import (
+    REDIS_FLUSH_LOCK_KEY, REDIS_FLUSHING_KEY, REDIS_PENDING_KEY, MemoryDownloadCounter,
+    RedisDownloadCounter, get_download_counter
+)
+from app.services.ebook_import import import_ebooks, read_epub_metadata
+from app.services.ebook_storage import CHUNK_SIZE, EbookStorage, EbookValidationError, ebook_storage
+
+
+EPUB_CONTENT = b'PK\x03\x04' + b'0123456789' * 100
+
+CONTAINER_XML = (
+    '<?xml version="1.0"?>'
+    '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+    '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+    '</rootfiles></container>'
+)
+
+
+OPF_EPUB2 = """<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="2.0">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+    <dc:title>Germinal</dc:title>
+    <dc:creator opf:role="aut">Émile Zola</dc:creator>
+    <dc:creator opf:role="ill">Un Illustrateur</dc:creator>
+    <dc:description>&lt;p&gt;La grève des mineurs &amp;amp; le &lt;b&gt;Voreux&lt;/b&gt;.&lt;/p&gt;</dc:description>
+    <dc:identifier opf:scheme="ISBN">978-2-07-036024-5</dc:identifier>
+    <dc:subject>Roman</dc:subject>
+    <dc:date>1885-03-02</dc:date>
+    <meta name="cover" content="cover-img"/>
+  </metadata>
+  <manifest>
+    <item id="cover-img" href="images/couverture%20zola.jpg" media-type="image/jpeg"/>
+    <item id="ch1" href="chapter1.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+</package>"""
+
+OPF_EPUB3 = """<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:title>Dune</dc:title>
+    <dc:creator>Frank Herbert</dc:creator>
+    <dc:identifier>urn:isbn:9782266320481</dc:identifier>
+  </metadata>
+  <manifest>
+    <item id="img" href="../cover.png" media-type="image/png" properties="cover-image"/>
+  </manifest>
+</package>"""
+
+
+def make_image(fmt='JPEG', size=(600, 900), color=(180, 40, 40)):
+    """Image de couverture générée avec Pillow"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+COVER_JPEG = make_image()
+COVER_PNG = make_image('PNG', color=(40, 40, 180))
+
+
+def make_epub(text='Contenu', mimetype=True, container=True, opf='<package/>', files=None):
+    """Archive EPUB minimale en mémoire"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        if mimetype:
+            archive.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        if container:
+            archive.writestr('META-INF/container.xml', CONTAINER_XML)
+        archive.writestr('OEBPS/content.opf', opf)
+        archive.writestr('OEBPS/chapter1.xhtml', f'<html><body>{text}</body></html>')
+        for name, data in (files or {}).items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def ebook(app, db_session, test_user):
+    """Ebook de test avec son fichier EPUB"""
+    folder = os.path.join(app.instance_path, 'ebooks')
+    os.makedirs(folder, exist_ok=True)
+    filepath = os.path.join(folder, 'test-download.epub')
+    with open(filepath, 'wb') as f:
+        f.write(EPUB_CONTENT)
+
+    ebook = Ebook(
+        title='Germinal',
+        author='Émile Zola',
+        filename='test-download.epub',
+        original_filename='Germinal - Émile Zola.epub',
+        file_size=len(EPUB_CONTENT),
+        download_count=0,
+        uploaded_by=test_user.id
+    )
+    db_session.add(ebook)
+    db_session.commit()
+    limiter.reset()
+
+    yield ebook
+
+    get_download_counter().flush()
+    os.remove(filepath)
+
+
+@pytest.fixture
+def logged_client(client, test_user):
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(test_user.id)
+    return client
+
+
+def download_count(ebook_id):
+    get_download_counter().flush()
+    db.session.expire_all()
+    return db.session.get(Ebook, ebook_id).download_count
+
+
+class TestEbookDownload:
+    """Envoi des fichiers EPUB"""
+
+    def test_full_download(self, logged_client, ebook):
+        """Test du téléchargement complet"""
+        response = logged_client.get(f'/ebooks/{ebook.id}/download')
+
+        assert response.status_code == 200
+        assert response.data == EPUB_CONTENT
+        assert response.mimetype == 'application/epub+zip'
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        assert response.headers['ETag']
+        assert "filename*=UTF-8''Germinal%20-%20%C3%89mile%20Zola.epub" in response.headers['Content-Disposition']
+        assert download_count(ebook.id) == 1
+
+    def test_resumed_download(self, logged_client, ebook):
+        """Test de la reprise d'un téléchargement (Range)"""
+        response = logged_client.get(f'/ebooks/{ebook.id}/download', headers={'Range': 'bytes=500-'})
+
+        assert response.status_code == 206
+        assert response.data == EPUB_CONTENT[500:]
+        assert response.headers['Content-Range'] == f'bytes 500-{len(EPUB_CONTENT) - 1}/{len(EPUB_CONTENT)}'
+        assert download_count(ebook.id) == 0
+
+    def test_not_modified(self, logged_client, ebook):
+        """Test de If-None-Match"""
+        etag = logged_client.get(f'/ebooks/{ebook.id}/download').headers['ETag']
+
+        response = logged_client.get(f'/ebooks/{ebook.id}/download', headers={'If-None-Match': etag})
+
+        assert response.status_code == 304
+        assert download_count(ebook.id) == 1
+
+    def test_x_accel_redirect(self, app, logged_client, ebook, monkeypatch):
+        """Test de la délégation à nginx"""
+        monkeypatch.setitem(app.config, 'EBOOK_DELIVERY', 'x-accel')
+
+        response = logged_client.get(f'/ebooks/{ebook.id}/download')
+
+        assert response.status_code == 200
+        assert response.data == b''
+        assert response.headers['X-Accel-Redirect'] == '/protected-ebooks/test-download.epub'
+        assert response.headers['Content-Disposition'].startswith('attachment;')
+        assert download_count(ebook.id) == 1
+
+    def test_x_sendfile(self, app, logged_client, ebook, monkeypatch):
+        """Test de X-Sendfile"""
+        monkeypatch.setitem(app.config, 'USE_X_SENDFILE', True)
+
+        response = logged_client.get(f'/ebooks/{ebook.id}/download')
+
+        assert response.headers['X-Sendfile'].endswith(os.path.join('ebooks', 'test-download.epub'))
+        assert response.data == b''
+
+    def test_download_requires_login(self, client, ebook):
+        """Test que l'auth est vérifiée avant toute livraison"""
+        response = client.get(f'/ebooks/{ebook.id}/download')
+
+        assert response.status_code == 302
+        assert 'X-Accel-Redirect' not in response.headers
+        assert download_count(ebook.id) == 0
+
+
+class TestDownloadCounter:
+    """Compteur de téléchargements en écriture différée"""
+
+    def test_memory_counter_batches_updates(self, app, ebook):
+        """Test du report en base : un UPDATE pour l'ensemble des téléchargements"""
+        counter = MemoryDownloadCounter()
+        ebook_id = ebook.id
+        threads = [threading.Thread(target=lambda: [counter.increment(ebook_id) for _ in range(50)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert counter.pending() == {ebook.id: 200}
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            assert counter.flush() == 1
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert [s for s in statements if s.startswith('UPDATE')] == [
+            'UPDATE ebook SET download_count=(coalesce(ebook.download_count, ?) + ?), '
+            'updated_at=ebook.updated_at WHERE ebook.id = ?'
+        ]
+        assert counter.pending() == {}
+        assert download_count(ebook.id) == 200
+
+    def test_memory_counter_flushes_without_downloads(self, app, ebook, monkeypatch):
+        """Test du report périodique dans le processus et du dernier report à l'arrêt"""
+        exit_handlers = []
+        monkeypatch.setattr(downloads.atexit, 'register', exit_handlers.append)
+        ebook_id = ebook.id
+        counter = MemoryDownloadCounter(flush_interval=0.2)
+        counter.increment(ebook_id)
+        counter.start(app)
+        assert exit_handlers == [counter.stop]
+        assert counter.pending() == {ebook_id: 1}
+
+        deadline = time.monotonic() + 2
+        while counter.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert counter.pending() == {}
+        assert download_count(ebook_id) == 1
+
+        # Arrêt du processus : le reste est reporté sans attendre l'intervalle
+        counter.flush_interval = 3600
+        counter.increment(ebook_id)
+        counter.stop()
+        assert counter.pending() == {}
+        assert download_count(ebook_id) == 2
+
+    def test_redis_counter(self, app, ebook):
+        """Test du compteur Redis partagé"""
+        counter = RedisDownloadCounter(fakeredis.FakeRedis())
+        for _ in range(3):
+            counter.increment(ebook.id)
+
+        assert counter.pending([ebook.id]) == {ebook.id: 3}
+        assert counter.flush() == 1
+        assert counter.flush() == 0
+        assert counter.pending() == {}
+        assert not counter.client.exists(REDIS_PENDING_KEY)
+        assert download_count(ebook.id) == 3
+
+    def test_redis_counter_keeps_batch_on_failure(self, app, ebook, monkeypatch):
+        """Test qu'un report échoué est repris au suivant"""
+        counter = RedisDownloadCounter(fakeredis.FakeRedis())
+        counter.increment(ebook.id)
+
+        def fail(counts, batch_id=None):
+            raise RuntimeError('database unavailable')
+        monkeypatch.setattr('app.services.downloads.apply_download_counts', fail)
+        with pytest.raises(RuntimeError):
+            counter.flush()
+        counter.increment(ebook.id)
+        monkeypatch.undo()
+
+        assert counter.pending() == {ebook.id: 2}
+        assert counter.flush() == 1
+        assert counter.flush() == 1
+        assert download_count(ebook.id) == 2
+
+    def test_redis_counter_replayed_batch_counted_once(self, app, ebook, monkeypatch):
+        """Test qu'un lot reporté mais resté dans Redis n'est pas recompté"""
+        counter = RedisDownloadCounter(fakeredis.FakeRedis())
+        for _ in range(3):
+            counter.increment(ebook.id)
+
+        def unavailable(*keys):
+            raise downloads.RedisError('connection lost')
+        monkeypatch.setattr(counter.client, 'delete', unavailable)
+        with pytest.raises(downloads.RedisError):
+            counter.flush()
+        monkeypatch.undo()
+        assert counter.client.exists(REDIS_FLUSHING_KEY)
+
+        assert counter.flush() == 0
+        assert counter.pending() == {}
+        assert download_count(ebook.id) == 3
+
+    def test_redis_counter_single_flush_at_a_time(self, app, ebook):
+        """Test qu'un report en cours dans un autre processus n'est pas doublé"""
+        counter = RedisDownloadCounter(fakeredis.FakeRedis())
+        counter.increment(ebook.id)
+        counter.client.set(REDIS_FLUSH_LOCK_KEY, 'other-worker')
+
+        assert counter.flush() == 0
+        assert counter.pending() == {ebook.id: 1}
+
+        counter.client.delete(REDIS_FLUSH_LOCK_KEY)
+        assert counter.flush() == 1
+        assert not counter.client.exists(REDIS_FLUSH_LOCK_KEY)
+        assert download_count(ebook.id) == 1
+
+    def test_admin_total_includes_pending(self, client, admin_user, ebook):
+        """Test que le total de l'admin compte les téléchargements en attente"""
+        ebook.download_count = 5
+        db.session.commit()
+        get_download_counter().increment(ebook.id)
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin_user.id)
+
+        response = client.get('/ebooks/admin')
+
+        assert response.status_code == 200
+        assert get_download_counter().pending_total() == 1
+        assert b'<h3 class="mb-0">6</h3>' in response.data
+
+
+@pytest.fixture
+def admin_client(client, admin_user):
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(admin_user.id)
+    return client
+
+
+def upload(client, content, filename='livre.epub', title='Livre', author='Auteur'):
+    return client.post('/ebooks/admin/upload', data={
+        'epub_file': (io.BytesIO(content), filename),
+        'title': title,
+        'author': author,
+    }, content_type='multipart/form-data')
+
+
+def stored_files():
+    """Fichiers du dossier des EPUB (y compris temporaires)"""
+    return sorted(os.listdir(ebook_storage.folder()))
+
+
+class TestEbookUpload:
+    """Envoi des EPUB : recopie par blocs, empreinte et dédoublonnage"""
+
+    def test_upload_content_addressed(self, admin_client):
+        """Test que le fichier est stocké sous son empreinte SHA-256"""
+        content = make_epub()
+        sha256 = hashlib.sha256(content).hexdigest()
+
+        response = upload(admin_client, content)
+
+        assert response.status_code == 302
+        ebook = Ebook.query.one()
+        assert ebook.filename == f'{sha256}.epub'
+        assert ebook.file_hash == sha256
+        assert ebook.file_size == len(content)
+        with open(ebook_storage.path(ebook.filename), 'rb') as f:
+            assert f.read() == content
+
+        admin_client.post(f'/ebooks/admin/delete/{ebook.id}')
+        assert ebook.filename not in stored_files()
+
+    def test_duplicate_upload_refused(self, admin_client):
+        """Test qu'un même EPUB n'est enregistré qu'une fois"""
+        content = make_epub('Doublon')
+        upload(admin_client, content, title='Premier')
+        before = stored_files()
+
+        response = upload(admin_client, content, filename='copie.epub', title='Second')
+
+        assert response.status_code == 302
+        assert '/ebooks/admin/edit/' in response.headers['Location']
+        assert [ebook.title for ebook in Ebook.query.all()] == ['Premier']
+        assert stored_files() == before
+
+        admin_client.post(f'/ebooks/admin/delete/{Ebook.query.one().id}')
+        assert f'{hashlib.sha256(content).hexdigest()}.epub' not in stored_files()
+
+    def test_concurrent_duplicate_upload(self, admin_client, admin_user, monkeypatch):
+        """Test du même EPUB enregistré par un autre envoi entre la vérification et le commit"""
+        content = make_epub('Course')
+        sha256 = hashlib.sha256(content).hexdigest()
+        admin_id = admin_user.id
+        read_metadata = ebooks_routes.read_epub_metadata
+
+        def concurrent_upload(*args):
+            db.session.add(Ebook(title='Premier', author='Auteur', filename=f'{sha256}.epub',
+                                 original_filename='livre.epub', file_size=len(content),
+                                 file_hash=sha256, uploaded_by=admin_id))
+            db.session.commit()
+            return read_metadata(*args)
+
+        monkeypatch.setattr(ebooks_routes, 'read_epub_metadata', concurrent_upload)
+        response = upload(admin_client, content, title='Second')
+
+        existing = Ebook.query.one()
+        assert existing.title == 'Premier'
+        assert response.status_code == 302
+        assert response.headers['Location'].endswith(f'/ebooks/admin/edit/{existing.id}')
+        with admin_client.session_transaction() as sess:
+            assert sess['_flashes'] == [
+                ('warning', 'Ce fichier EPUB est déjà dans la bibliothèque : "Premier".')
+            ]
+        # Le fichier reste : il est celui de l'ebook déjà enregistré
+        assert f'{sha256}.epub' in stored_files()
+
+        admin_client.post(f'/ebooks/admin/delete/{existing.id}')
+        assert f'{sha256}.epub' not in stored_files()
+
+    @pytest.mark.parametrize('content', [
+        b'PK\x03\x04 pas une archive',
+        make_epub(mimetype=False),
+        make_epub(container=False),
+    ])
+    def test_invalid_epub_refused(self, admin_client, content):
+        """Test du refus des archives qui ne sont pas des EPUB"""
+        before = stored_files()
+
+        response = upload(admin_client, content)
+
+        assert response.status_code == 302
+        assert Ebook.query.count() == 0
+        assert stored_files() == before
+
+    def test_size_limit_while_streaming(self, app):
+        """Test que la taille maximale est vérifiée pendant la recopie"""
+        storage = EbookStorage(max_size=1024)
+        stream = io.BytesIO(make_epub('x' * 200000))
+        before = stored_files()
+
+        with pytest.raises(EbookValidationError, match='trop volumineux'):
+            storage.store(stream)
+
+        assert stream.tell() == CHUNK_SIZE  # Lecture interrompue au premier bloc
+        assert stored_files() == before
+
+    def test_container_rootfile(self, app):
+        """Test que le chemin du fichier OPF est retourné"""
+        content = make_epub('OPF')
+        stored = ebook_storage.store(io.BytesIO(content))
+
+        assert stored.package_path == 'OEBPS/content.opf'
+        assert stored.created
+        assert not ebook_storage.store(io.BytesIO(content)).created
+        ebook_storage.delete(stored.filename)
+
+
+class TestEpubMetadata:
+    """Extraction des métadonnées et de la couverture"""
+
+    def write(self, tmp_path, name, content):
+        path = tmp_path / name
+        path.write_bytes(content)
+        return str(path)
+
+    def test_epub2_metadata(self, tmp_path):
+        """Test des métadonnées OPF 2 (meta cover, opf:scheme)"""
+        path = self.write(tmp_path, 'germinal.epub', make_epub(
+            opf=OPF_EPUB2, files={'OEBPS/images/couverture zola.jpg': COVER_JPEG}
+        ))
+
+        metadata = read_epub_metadata(path)
+
+        assert metadata.title == 'Germinal'
+        assert metadata.author == 'Émile Zola'
+        assert metadata.description == 'La grève des mineurs & le Voreux .'
+        assert metadata.isbn == '9782070360245'
+        assert metadata.genre == 'Roman'
+        assert metadata.publication_year == 1885
+        assert metadata.cover_data == COVER_JPEG
+        assert metadata.cover_extension == 'jpg'
+
+    def test_epub3_cover_image(self, tmp_path):
+        """Test de la couverture EPUB 3 (properties="cover-image")"""
+        path = self.write(tmp_path, 'dune.epub', make_epub(opf=OPF_EPUB3, files={'cover.png': COVER_PNG}))
+
+        metadata = read_epub_metadata(path)
+
+        assert (metadata.title, metadata.author, metadata.isbn) == ('Dune', 'Frank Herbert', '9782266320481')
+        assert metadata.cover_data == COVER_PNG
+        assert metadata.cover_extension == 'png'
+
+    def test_upload_prefills_from_metadata(self, admin_client):
+        """Test que les champs vides et la couverture viennent de l'EPUB"""
+        content = make_epub(opf=OPF_EPUB2, files={'OEBPS/images/couverture zola.jpg': COVER_JPEG})
+
+        response = upload(admin_client, content, title='', author='')
+
+        assert response.status_code == 302
+        ebook = Ebook.query.one()
+        assert (ebook.title, ebook.author, ebook.isbn) == ('Germinal', 'Émile Zola', '9782070360245')
+        assert ebook.cover_hash == hashlib.sha256(COVER_JPEG).hexdigest()
+        assert ebook.cover_filename == f'{ebook.cover_hash}.jpg'
+        assert os.path.exists(os.path.join(cover_service.folder(), ebook.cover_filename))
+
+        admin_client.post(f'/ebooks/admin/delete/{ebook.id}')
+
+    def test_upload_without_title_refused(self, admin_client):
+        """Test du refus quand ni le formulaire ni l'EPUB ne donnent de titre"""
+        before = stored_files()
+
+        upload(admin_client, make_epub('Sans titre'), title='', author='')
+
+        assert Ebook.query.count() == 0
+        assert stored_files() == before
+
+    def test_bulk_import(self, app, admin_user, tmp_path):
+        """Test de l'import en masse (pool de processus)"""
+        germinal = make_epub(opf=OPF_EPUB2, files={'OEBPS/images/couverture zola.jpg': COVER_JPEG})
+        paths = [
+            self.write(tmp_path, 'germinal.epub', germinal),
+            self.write(tmp_path, 'germinal-copie.epub', germinal),
+            self.write(tmp_path, 'dune.epub', make_epub(opf=OPF_EPUB3)),
+            self.write(tmp_path, 'casse.epub', b'PK pas une archive'),
+        ]
+
+        report = import_ebooks(paths, admin_user.id, workers=2)
+
+        assert report.imported == ['germinal.epub', 'dune.epub']
+        assert report.duplicates == ['germinal-copie.epub']
+        assert [name for name, _ in report.failed] == ['casse.epub']
+        assert sorted(ebook.title for ebook in Ebook.query.all()) == ['Dune', 'Germinal']
+
+        # Un second import ne crée pas de doublon
+        assert import_ebooks(paths[:1], admin_user.id, workers=0).duplicates == ['germinal.epub']
+
+        for ebook in Ebook.query.all():
+            db.session.delete(ebook)
+            db.session.commit()
+            ebook_storage.delete(ebook.filename)
+
+    def test_bulk_import_failed_commit(self, app, admin_user, tmp_path, monkeypatch):
+        """Test qu'un lot dont le commit échoue ne laisse ni ebook ni fichier"""
+        germinal = make_epub(opf=OPF_EPUB2, files={'OEBPS/images/couverture zola.jpg': COVER_JPEG})
+        paths = [self.write(tmp_path, 'germinal.epub', germinal)]
+        before = stored_files()
+
+        def failing_commit():
+            raise SQLAlchemyError('base indisponible')
+
+        monkeypatch.setattr(db.session, 'commit', failing_commit)
+        with pytest.raises(SQLAlchemyError):
+            import_ebooks(paths, admin_user.id, workers=0)
+        monkeypatch.undo()
+
+        assert Ebook.query.count() == 0
+        assert stored_files() == before
+        cover_filename = f'{hashlib.sha256(COVER_JPEG).hexdigest()}.jpg'
+        assert not os.path.exists(os.path.join(cover_service.folder(), cover_filename))
+
+
+@pytest.fixture
+def cover_ebook(app, db_session, admin_user):
+    """Ebook avec une couverture et ses vignettes"""
+    cover_filename, cover_hash = cover_service.store(COVER_PNG)
+    ebook = Ebook(
+        title='Dune',
+        author='Frank Herbert',
+        filename='dune.epub',
+        original_filename='dune.epub',
+        cover_filename=cover_filename,
+        cover_hash=cover_hash,
+        uploaded_by=admin_user.id
+    )
+    db_session.add(ebook)
+    db_session.commit()
+
+    yield ebook
+
+    db_session.delete(ebook)
+    db_session.commit()
+    cover_service.delete(cover_filename, cover_hash)
+
+
+class TestCoverThumbnails:
+    """Vignettes de couverture S/M/L en WebP et JPEG"""
+
+    def test_store_generates_thumbnails(self, cover_ebook):
+        """Test de la génération des vignettes à l'enregistrement"""
+        from PIL import Image
+
+        assert cover_ebook.cover_filename == f'{cover_ebook.cover_hash}.png'
+        for size, box in THUMBNAIL_SIZES.items():
+            for fmt in THUMBNAIL_FORMATS:
+                path = os.path.join(
+                    cover_service.thumbnails_folder(), cover_service.thumbnail_name(cover_ebook.cover_hash, size, fmt)
+                )
+                with Image.open(path) as image:
+                    assert image.format == THUMBNAIL_FORMATS[fmt][0]
+                    assert image.width <= box[0] and image.height <= box[1]
+
+    def test_invalid_image_refused(self, app):
+        """Test du refus d'un fichier qui n'est pas une image"""
+        with pytest.raises(InvalidCoverError):
+            cover_service.store(b'\xff\xd8 pas une image')
+
+    def test_truncated_image_refused(self, app):
+        """Test du refus d'une image tronquée (en-tête valide, pixels manquants), sans fichier laissé"""
+        truncated = COVER_JPEG[:len(COVER_JPEG) // 2]
+        before = sorted(os.listdir(cover_service.folder()))
+
+        with pytest.raises(InvalidCoverError):
+            cover_service.store(truncated)
+
+        assert sorted(os.listdir(cover_service.folder())) == before
+
+    def test_upload_with_truncated_embedded_cover(self, admin_client):
+        """Test qu'une couverture intégrée tronquée est ignorée à l'envoi"""
+        truncated = COVER_JPEG[:len(COVER_JPEG) // 2]
+        content = make_epub(opf=OPF_EPUB2, files={'OEBPS/images/couverture zola.jpg': truncated})
+
+        response = upload(admin_client, content, title='', author='')
+
+        assert response.status_code == 302
+        ebook = Ebook.query.one()
+        assert (ebook.title, ebook.cover_filename) == ('Germinal', None)
+        assert not os.path.exists(
+            os.path.join(cover_service.folder(), f'{hashlib.sha256(truncated).hexdigest()}.jpg')
+        )
+
+        admin_client.post(f'/ebooks/admin/delete/{ebook.id}')
+        assert ebook.filename not in stored_files()
+
+    def test_immutable_cache_headers(self, client, cover_ebook):
+        """Test des en-têtes de cache et de la revalidation par ETag"""
+        name = cover_service.thumbnail_name(cover_ebook.cover_hash, 'M', 'webp')
+
+        response = client.get(f'/ebooks/covers/{name}')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'image/webp'
+        assert response.cache_control.public
+        assert response.cache_control.immutable
+        assert response.cache_control.max_age == 365 * 24 * 3600
+        assert response.headers['ETag'] == f'"{name}"'
+
+        response = client.get(f'/ebooks/covers/{name}', headers={'If-None-Match': f'"{name}"'})
+        assert response.status_code == 304
+
+    def test_lazy_generation(self, client, cover_ebook):
+        """Test qu'une vignette manquante est regénérée à la première demande"""
+        name = cover_service.thumbnail_name(cover_ebook.cover_hash, 'L', 'jpg')
+        path = os.path.join(cover_service.thumbnails_folder(), name)
+        os.remove(path)
+
+        response = client.get(f'/ebooks/covers/{name}')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'image/jpeg'
+        assert os.path.exists(path)
+
+    @pytest.mark.parametrize('name', [
+        '0' * 64 + '-M.jpg',            # Empreinte inconnue
+        'abc-M.jpg',                    # Nom invalide
+        '0' * 64 + '-XL.webp',          # Taille inconnue
+    ])
+    def test_unknown_thumbnail(self, client, name):
+        """Test des noms de vignettes inconnus ou invalides"""
+        assert client.get(f'/ebooks/covers/{name}').status_code == 404
+
+    def test_pages_use_thumbnails(self, client, test_user, cover_ebook):
+        """Test que la grille et la fiche utilisent les vignettes adaptées"""
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(test_user.id)
+
+        grid = client.get('/ebooks/').get_data(as_text=True)
+        detail = client.get(f'/ebooks/{cover_ebook.id}').get_data(as_text=True)
+
+        assert f'/ebooks/covers/{cover_ebook.cover_hash}-M.webp' in grid
+        assert f'/ebooks/covers/{cover_ebook.cover_hash}-M.jpg' in grid
+        assert f'/ebooks/covers/{cover_ebook.cover_hash}-L.webp' in detail
+
+        response = client.get(f'/ebooks/cover/{cover_ebook.id}')
+        assert response.status_code == 302
+        assert response.headers['Location'].endswith(f'/ebooks/covers/{cover_ebook.cover_hash}-L.jpg')
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Tests du flux temps réel (pub/sub et /api/stream)
+"""
+
+import json
+import pytest
+from datetime import datetime, timedelta
+from app.models import BookProposal, Notification, VotingSession, VoteOption
+from app.routes import api
+from app.services.events import (
+    MemoryBroker, RedisBroker, format_sse, get_event_broker, user_channel, vote_channel
+)
+from app.services.notifications import notification_service
+from app.services.votes import vote_tally_service
+
+
+def read_events(response, count):
+    """Lit les count prochains événements SSE d'une réponse en streaming"""
+    events = []
+    chunks = iter(response.response)
+    while len(events) < count:
+        chunk = next(chunks)
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith('event: '):
+            name, data = chunk.strip().split('\n')
+            events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+class TestBrokers:
+    """Tests pour les backends pub/sub"""
+    
+    def test_memory_broker(self):
+        """Les abonnés reçoivent les messages de leurs canaux uniquement"""
+        broker = MemoryBroker()
+        with broker.subscribe(['user:1', 'votes:book:2']) as subscription:
+            broker.publish('user:1', 'unread_count', {'unread_count': 3})
+            broker.publish('user:2', 'unread_count', {'unread_count': 9})
+            
+            assert subscription.get(timeout=0.1) == {'event': 'unread_count', 'data': {'unread_count': 3}}
+            assert subscription.get(timeout=0.01) is None
+            assert broker.subscriber_count() == 1
+        
+        assert broker.subscriber_count() == 0
+    
+    def test_redis_broker(self):
+        """Les messages publiés dans Redis sont redistribués aux abonnés locaux"""
+        fakeredis = pytest.importorskip('fakeredis')
+        broker = RedisBroker(fakeredis.FakeRedis())
+        
+        with broker.subscribe(['user:1']) as subscription:
+            # Attendre que le thread d'écoute soit abonné
+            for _ in range(50):
+                broker.publish('user:1', 'ping', {})
+                if subscription.get(timeout=0.1) is not None:
+                    break
+            else:
+                pytest.fail("listener never subscribed")
+            
+            broker.publish_many([('user:1', 'unread_count', {'unread_count': 1}),
+                                 ('user:3', 'unread_count', {'unread_count': 5})])
+            message = subscription.get(timeout=2)
+            while message['event'] == 'ping':
+                message = subscription.get(timeout=2)
+            assert message == {'event': 'unread_count', 'data': {'unread_count': 1}}
+    
+    def test_format_sse(self):
+        """Format text/event-stream"""
+        assert format_sse('tally', {'total': 2}) == 'event: tally\ndata: {"total":2}\n\n'
+
+
+class TestPublishedEvents:
+    """Tests des événements publiés par les services"""
+    
+    def test_notification_events(self, db_session, test_user):
+        """Création, lecture et diffusion publient sur le canal de l'utilisateur"""
+        with get_event_broker().subscribe([user_channel(test_user.id)]) as subscription:
+            notification = Notification.create_notification(test_user.id, 'system', 'Titre', 'Message')
+            message = subscription.get(timeout=1)
+            assert message['event'] == 'notification'
+            assert message['data']['unread_count'] == 1
+            assert message['data']['notification']['id'] == notification.id
+            
+            notification.mark_as_read()
+            db_session.commit()
+            assert subscription.get(timeout=1)['data'] == {'unread_count': 0}
+            
+            notification_service.broadcast_notification('system', 'Annonce', 'Message')
+            message = subscription.get(timeout=1)
+            assert message['event'] == 'notification'
+            assert message['data']['notification']['title'] == 'Annonce'
+            assert message['data']['unread_count'] == 1
+            
+            notification_service.mark_all_as_read(test_user.id)
+            assert subscription.get(timeout=1)['data'] == {'unread_count': 0}
+
+
+class TestStreamEndpoint:
+    """Tests pour /api/stream"""
+    
+    @pytest.fixture(autouse=True)
+    def stream_enabled(self, app):
+        app.config['STREAM_ENABLED'] = True
+        yield
+        app.config['STREAM_ENABLED'] = False
+    
+    @pytest.fixture
+    def voting_session(self, db_session, admin_user):
+        session = VotingSession(title='Vote', end_date=datetime.now() + timedelta(days=7),
+                                created_by=admin_user.id)
+        db_session.add(session)
+        db_session.flush()
+        book = BookProposal(title='Livre', author='Auteur', proposed_by=admin_user.id, status='approved')
+        db_session.add(book)
+        db_session.flush()
+        option = VoteOption(voting_session_id=session.id, book_id=book.id)
+        db_session.add(option)
+        db_session.commit()
+        vote_tally_service.invalidate('book', session.id)
+        return session, option
+    
+    def test_stream_requires_channel(self, client, db_session):
+        """Sans utilisateur ni vote suivi, rien à diffuser"""
+        assert client.get('/api/stream').status_code == 400
+    
+    def test_vote_results_hidden_before_voting(self, client, db_session, test_user, voting_session):
+        """Les résultats en direct suivent les règles d'affichage du vote"""
+        session, _ = voting_session
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(test_user.id)
+        
+        response = client.get(f'/api/stream?vote=book:{session.id}')
+        assert response.status_code == 403
+    
+    def test_stream_pushes_events(self, client, db_session, test_user, voting_session, monkeypatch):
+        """Le flux envoie l'état initial puis les mises à jour"""
+        monkeypatch.setattr(api, 'STREAM_KEEPALIVE', 0.05)
+        session_id, option_id = voting_session[0].id, voting_session[1].id
+        vote_tally_service.cast_book_votes(test_user.id, session_id, [option_id])
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(test_user.id)
+        
+        # Le flux libère la session SQLAlchemy dès l'ouverture
+        response = client.get(f'/api/stream?vote=book:{session_id}')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert read_events(response, 2) == [
+            ('unread_count', {'unread_count': 0}),
+            ('tally', {'kind': 'book', 'session_id': session_id, 'counts': {str(option_id): 1}, 'total': 1}),
+        ]
+        
+        get_event_broker().publish(vote_channel('book', session_id), 'tally', {'total': 2})
+        assert read_events(response, 1) == [('tally', {'total': 2})]
+        
+        response.close()
+        assert get_event_broker().subscriber_count() == 0
+    
+    def test_stream_disabled(self, app, client, db_session, test_user):
+        """Sans workers asynchrones : pas de flux, les pages gardent le rafraîchissement périodique"""
+        app.config['STREAM_ENABLED'] = False
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(test_user.id)
+        
+        assert client.get('/api/stream').status_code == 404
+        page = client.get('/').get_data(as_text=True)
+        assert "new EventSource('/api/stream'" not in page
+        assert '/api/notifications/count' in page
+        
+        app.config['STREAM_ENABLED'] = True
+        assert "new EventSource('/api/stream'" in client.get('/').get_data(as_text=True)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Tests des plans d'exécution des requêtes fréquentes
+Chaque requête doit passer par un index (EXPLAIN QUERY PLAN SQLite) :
+aucun parcours complet de table.
+"""
+
+import pytest
+from app import db
+from app.models import (
+    BookProposal, BookReview, Ebook, Film, FilmVote, Notification,
+    ReadingParticipation, ReadingSession, ViewingParticipation, Vote, VoteOption
+)
+
+
+HOT_QUERIES = {
+    'notifications_unread': lambda: Notification.query.filter_by(user_id=1, is_read=False),
+    'notifications_recent': lambda: Notification.query.filter_by(user_id=1).order_by(
+        Notification.is_read.asc(), Notification.created_at.desc()
+    ).limit(20),
+    'books_by_status': lambda: BookProposal.query.filter_by(status='approved').order_by(
+        BookProposal.created_at.desc()
+    ).limit(12),
+    'books_recent': lambda: BookProposal.query.order_by(BookProposal.created_at.desc()).limit(12),
+    'books_by_rating': lambda: BookProposal.query.order_by(
+        BookProposal.avg_rating.desc(), BookProposal.rating_count.desc()
+    ).limit(12),
+    'books_by_proposer': lambda: BookProposal.query.filter_by(proposed_by=1),
+    'vote_tally': lambda: db.session.query(
+        Vote.vote_option_id, db.func.count(Vote.id)
+    ).filter(Vote.voting_session_id == 1).group_by(Vote.vote_option_id),
+    'user_votes': lambda: Vote.query.filter_by(user_id=1, voting_session_id=1),
+    'vote_options': lambda: VoteOption.query.filter_by(voting_session_id=1),
+    'film_vote_tally': lambda: db.session.query(
+        FilmVote.vote_option_id, db.func.count(FilmVote.id)
+    ).filter(FilmVote.voting_session_id == 1).group_by(FilmVote.vote_option_id),
+    'visible_reviews': lambda: BookReview.query.filter_by(book_id=1, is_visible=True),
+    'reading_participants': lambda: ReadingParticipation.query.filter_by(reading_session_id=1),
+    'viewing_participants': lambda: ViewingParticipation.query.filter_by(viewing_session_id=1),
+    'readings_by_status': lambda: ReadingSession.query.filter_by(status='upcoming').order_by(
+        ReadingSession.start_date.asc()
+    ),
+    'ebooks_visible': lambda: Ebook.query.filter_by(is_visible=True).order_by(Ebook.created_at.desc()),
+    'films_visible': lambda: Film.query.filter(
+        Film.status.in_(['approved', 'selected', 'viewed'])
+    ).order_by(Film.created_at.desc()),
+}
+
+
+def query_plan(query):
+    """Lignes 'detail' de EXPLAIN QUERY PLAN pour une requête ORM"""
+    compiled = query.statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+    return [row[-1] for row in rows]
+
+
+class TestQueryPlans:
+    """Les requêtes des pages principales utilisent les index"""
+
+    @pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+    def test_no_full_table_scan(self, db_session, name):
+        """Test qu'aucune table n'est parcourue sans index"""
+        plan = query_plan(HOT_QUERIES[name]())
+
+        full_scans = [detail for detail in plan if detail.startswith('SCAN') and 'INDEX' not in detail]
+        assert not full_scans, f"{name}: {plan}"
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la file de tâches, du planificateur et des tâches programmées
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from app import db
+from app.models import (
+    BackgroundJob, BookProposal, ReadingSession, VotingSession, VoteOption,
+    FilmVotingSession, FilmVoteOption, Film
+)
+from app.services import jobs
+from app.services.jobs import (
+    CronSchedule, DatabaseJobQueue, MemoryJobQueue, RedisJobQueue, Scheduler, Worker, get_job
+)
+from app.services.votes import vote_tally_service
+
+
+@pytest.fixture
+def database_queue(db_session):
+    """File de tâches en base (table background_job vide)"""
+    db_session.commit()
+    yield DatabaseJobQueue()
+    db_session.query(BackgroundJob).delete()
+    db_session.commit()
+
+
+class TestCronSchedule:
+    """Tests pour les expressions cron"""
+    
+    def test_matches(self):
+        """Minutes, heures, intervalles et jours de la semaine"""
+        schedule = CronSchedule('*/15 8-18 * * 1-5')
+        assert schedule.matches(datetime(2026, 10, 16, 9, 30))       # vendredi
+        assert not schedule.matches(datetime(2026, 10, 16, 9, 31))
+        assert not schedule.matches(datetime(2026, 10, 16, 19, 0))
+        assert not schedule.matches(datetime(2026, 10, 18, 9, 30))   # dimanche
+        
+        assert CronSchedule('30 3 * * 0,7').matches(datetime(2026, 10, 18, 3, 30))
+    
+    @pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '5-1 * * * *'])
+    def test_invalid(self, expression):
+        """Expressions invalides refusées"""
+        with pytest.raises(ValueError):
+            CronSchedule(expression)
+
+
+class TestQueues:
+    """Tests pour les backends de file"""
+    
+    def test_unknown_job(self, app):
+        """Un nom de tâche inconnu est refusé dès l'ajout"""
+        with pytest.raises(ValueError):
+            MemoryJobQueue().enqueue('inconnue')
+        assert get_job('votes.close_expired') is not None
+    
+    def test_database_queue(self, database_queue, monkeypatch):
+        """Ajout, réservation, dédoublonnage et nouveaux essais"""
+        monkeypatch.setattr(jobs, 'RETRY_DELAY', 0)
+        job_id = database_queue.enqueue('notifications.cleanup', 7, unique_key='cleanup')
+        assert database_queue.enqueue('notifications.cleanup', unique_key='cleanup') is None
+        assert database_queue.size() == 1
+        
+        job = database_queue.dequeue(timeout=0)
+        assert (job.id, job.name, job.args) == (job_id, 'notifications.cleanup', [7])
+        assert database_queue.dequeue(timeout=0) is None
+        
+        for attempt in range(jobs.MAX_ATTEMPTS - 1):
+            database_queue.fail(job, 'boom')
+            job = database_queue.dequeue(timeout=0)
+            assert job.attempts == attempt + 1
+        database_queue.fail(job, 'boom')
+        
+        row = db.session.get(BackgroundJob, job_id)
+        assert (row.status, row.attempts, row.error) == ('failed', jobs.MAX_ATTEMPTS, 'boom')
+        assert database_queue.dequeue(timeout=0) is None
+    
+    def test_database_queue_purge(self, database_queue):
+        """Les tâches terminées ou en échec depuis plus de 7 jours sont supprimées"""
+        old, recent, queued = (database_queue.enqueue('notifications.cleanup') for _ in range(3))
+        for job_id in (old, recent):
+            database_queue.complete(database_queue.dequeue(timeout=0))
+        db.session.get(BackgroundJob, old).finished_at -= timedelta(days=jobs.FINISHED_RETENTION_DAYS + 1)
+        db.session.commit()
+        
+        assert database_queue.purge_finished() == 1
+        db.session.expire_all()
+        assert db.session.get(BackgroundJob, old) is None
+        assert db.session.get(BackgroundJob, recent).status == 'done'
+        assert db.session.get(BackgroundJob, queued).status == 'queued'
+    
+    def test_redis_queue(self, monkeypatch):
+        """Liste Redis, dédoublonnage et nouvel essai différé"""
+        fakeredis = pytest.importorskip('fakeredis')
+        monkeypatch.setattr(jobs, 'RETRY_DELAY', 0)
+        queue = RedisJobQueue(fakeredis.FakeRedis())
+        
+        assert queue.enqueue('badges.award', 1, 'vote_cast', unique_key='k') is not None
+        assert queue.enqueue('badges.award', 1, 'vote_cast', unique_key='k') is None
+        
+        job = queue.dequeue()
+        assert (job.name, job.args) == ('badges.award', [1, 'vote_cast'])
+        
+        queue.fail(job, 'boom')
+        assert queue.size() == 1
+        retried = queue.dequeue()
+        assert (retried.name, retried.attempts) == ('badges.award', 1)
+    
+    def test_redis_queue_unavailable_runs_in_process(self, monkeypatch):
+        """Redis indisponible : la tâche est exécutée dans le processus, sans erreur pour l'appelant"""
+        fakeredis = pytest.importorskip('fakeredis')
+        client = fakeredis.FakeRedis()
+        
+        def unavailable(*args, **kwargs):
+            raise jobs.RedisError('connection refused')
+        
+        monkeypatch.setattr(client, 'lpush', unavailable)
+        ran = []
+        monkeypatch.setitem(jobs._registry, 'badges.award', lambda *args: ran.append(args))
+        
+        assert RedisJobQueue(client).enqueue('badges.award', 1, 'vote_cast') is not None
+        assert ran == [(1, 'vote_cast')]
+
+
+class TestScheduler:
+    """Tests pour le planificateur"""
+    
+    def test_tick_once_per_minute(self, database_queue):
+        """Chaque tâche est planifiée une fois par minute, même avec deux planificateurs"""
+        entries = [('* * * * *', 'votes.close_expired'), ('30 3 * * *', 'notifications.cleanup')]
+        first, second = Scheduler(database_queue, entries), Scheduler(database_queue, entries)
+        now = datetime(2026, 10, 17, 3, 30, 12)
+        
+        assert first.tick(now) == ['votes.close_expired', 'notifications.cleanup']
+        assert first.tick(now + timedelta(seconds=30)) == []
+        assert second.tick(now) == []
+        assert first.tick(now + timedelta(minutes=1)) == ['votes.close_expired']
+        assert database_queue.size() == 3
+
+
+class TestScheduledTasks:
+    """Tests des transitions programmées exécutées par le worker"""
+    
+    def test_worker_closes_expired_votes(self, app, database_queue, admin_user):
+        """Les votes expirés sont clos et le gagnant sélectionné"""
+        expired = VotingSession(title='Expiré', end_date=datetime.now() - timedelta(minutes=1),
+                                created_by=admin_user.id)
+        running = VotingSession(title='En cours', end_date=datetime.now() + timedelta(days=1),
+                                created_by=admin_user.id)
+        book = BookProposal(title='Livre', author='Auteur', proposed_by=admin_user.id, status='approved')
+        film = Film(title='Film', director='Réalisateur', proposed_by=admin_user.id, status='approved')
+        film_session = FilmVotingSession(title='Films', end_date=datetime.now() - timedelta(hours=1),
+                                         created_by=admin_user.id)
+        db.session.add_all([expired, running, book, film, film_session])
+        db.session.flush()
+        db.session.add(VoteOption(voting_session_id=expired.id, book_id=book.id))
+        db.session.add(FilmVoteOption(voting_session_id=film_session.id, film_id=film.id))
+        db.session.commit()
+        ids = (expired.id, running.id, book.id, film_session.id)
+        for session_id in ids[:2]:
+            vote_tally_service.invalidate('book', session_id)
+        vote_tally_service.invalidate('film', film_session.id)
+        
+        database_queue.enqueue('votes.close_expired')
+        worker = Worker(app, database_queue, poll_interval=0)
+        worker.run(burst=True)
+        
+        assert (worker.processed, worker.failed) == (1, 0)
+        db.session.expire_all()
+        assert db.session.get(VotingSession, ids[0]).status == 'closed'
+        assert db.session.get(VotingSession, ids[1]).status == 'active'
+        assert db.session.get(BookProposal, ids[2]).status == 'selected'
+        assert db.session.get(FilmVotingSession, ids[3]).status == 'closed'
+    
+    def test_reading_statuses_task(self, db_session, test_book, admin_user):
+        """Une lecture dont la date de début est passée devient 'current'"""
+        reading = ReadingSession(book_id=test_book.id, created_by=admin_user.id, status='upcoming',
+                                 start_date=datetime.now() - timedelta(days=1),
+                                 end_date=datetime.now() + timedelta(days=20))
+        db_session.add(reading)
+        db_session.commit()
+        
+        assert get_job('readings.update_statuses')() == 1
+        assert db_session.get(ReadingSession, reading.id).status == 'current'
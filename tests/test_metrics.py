@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Tests des métriques Prometheus exposées sur /metrics
+"""
+
+import os
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+from prometheus_client.parser import text_string_to_metric_families
+
+from app import limiter
+from app.models import Ebook
+from app.services.cache import MemoryCache
+from app.services.open_library import OpenLibraryService
+
+EPUB_CONTENT = b'PK\x03\x04' + b'metrics' * 200
+
+
+@pytest.fixture(autouse=True)
+def metrics_app(app):
+    """Métriques activées, sans jeton, compteurs de limites remis à zéro"""
+    app.config.update(METRICS_ENABLED=True, METRICS_TOKEN=None)
+    limiter.reset()
+    yield app
+    app.config['METRICS_TOKEN'] = None
+
+
+@pytest.fixture
+def ebook(app, db_session, test_user):
+    """Ebook de test avec son fichier EPUB"""
+    folder = os.path.join(app.instance_path, 'ebooks')
+    os.makedirs(folder, exist_ok=True)
+    filepath = os.path.join(folder, 'test-metrics.epub')
+    with open(filepath, 'wb') as f:
+        f.write(EPUB_CONTENT)
+
+    ebook = Ebook(title='Nana', author='Émile Zola', filename='test-metrics.epub',
+                  original_filename='Nana.epub', file_size=len(EPUB_CONTENT), uploaded_by=test_user.id)
+    db_session.add(ebook)
+    db_session.commit()
+
+    yield ebook
+
+    os.remove(filepath)
+
+
+@pytest.fixture
+def logged_client(client, test_user):
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(test_user.id)
+    return client
+
+
+def scrape(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def sample(client, name, **labels):
+    """Valeur d'un échantillon (0 s'il n'existe pas encore)"""
+    for family in text_string_to_metric_families(scrape(client)):
+        for s in family.samples:
+            if s.name == name and all(s.labels.get(k) == v for k, v in labels.items()):
+                return s.value
+    return 0.0
+
+
+class TestMetricsEndpoint:
+    """Exposition et protection de /metrics"""
+
+    def test_exposition_format(self, client, db_session):
+        """Test du format texte Prometheus"""
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        assert 'biblioruche_http_requests_total' in response.get_data(as_text=True)
+
+    def test_token_required(self, app, client, db_session):
+        """Test du jeton Bearer quand METRICS_TOKEN est défini"""
+        app.config['METRICS_TOKEN'] = 'secret'
+
+        assert client.get('/metrics').status_code == 403
+        assert client.get('/metrics', headers={'Authorization': 'Bearer faux'}).status_code == 403
+        assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+    def test_disabled(self, app, client, db_session):
+        """Test que /metrics n'existe pas quand les métriques sont désactivées"""
+        app.config['METRICS_ENABLED'] = False
+
+        assert client.get('/metrics').status_code == 404
+
+
+class TestRequestMetrics:
+    """Mesures par requête HTTP"""
+
+    def test_requests_and_latency(self, client, db_session):
+        """Test du compteur par statut et de l'histogramme de latence par endpoint"""
+        before = sample(client, 'biblioruche_http_requests_total', endpoint='main.health_check', status='200')
+        observed = sample(client, 'biblioruche_http_request_duration_seconds_count', endpoint='main.health_check')
+
+        client.get('/health')
+        client.get('/health')
+
+        assert sample(client, 'biblioruche_http_requests_total',
+                      endpoint='main.health_check', method='GET', status='200') == before + 2
+        assert sample(client, 'biblioruche_http_request_duration_seconds_count',
+                      endpoint='main.health_check') == observed + 2
+
+    def test_unmatched_endpoint(self, client, db_session):
+        """Test que les 404 partagent un seul libellé (cardinalité bornée)"""
+        before = sample(client, 'biblioruche_http_requests_total', endpoint='unmatched', status='404')
+
+        client.get('/nexiste/pas/1')
+        client.get('/nexiste/pas/2')
+
+        assert sample(client, 'biblioruche_http_requests_total', endpoint='unmatched', status='404') == before + 2
+
+    def test_sql_queries_per_request(self, client, db_session):
+        """Test de l'histogramme des requêtes SQL par requête"""
+        before = sample(client, 'biblioruche_http_request_sql_queries_sum', endpoint='main.health_check')
+
+        client.get('/health')
+
+        assert sample(client, 'biblioruche_http_request_sql_queries_sum', endpoint='main.health_check') == before + 1
+
+    def test_pool_checkout(self, client, db_session):
+        """Test de la mesure d'attente du pool de connexions"""
+        assert sample(client, 'biblioruche_db_pool_checkout_seconds_count') > 0
+
+
+class TestServiceMetrics:
+    """Caches, Open Library, limites de requêtes et ebooks"""
+
+    def test_cache_hits_and_misses(self, client, db_session):
+        """Test du comptage des hits et miss par cache"""
+        cache = MemoryCache('metrics-test')
+        cache.get('livre')
+        cache.set('livre', 'Germinal')
+        cache.get('livre')
+        cache.get('livre')
+
+        assert sample(client, 'biblioruche_cache_requests_total', namespace='metrics-test', result='hit') == 2
+        assert sample(client, 'biblioruche_cache_requests_total', namespace='metrics-test', result='miss') == 1
+
+    def test_upstream_errors(self, client, db_session):
+        """Test de la latence et des erreurs des appels Open Library"""
+        errors = sample(client, 'biblioruche_upstream_errors_total',
+                        service='openlibrary', operation='search', reason='Timeout')
+        calls = sample(client, 'biblioruche_upstream_request_duration_seconds_count',
+                       service='openlibrary', operation='search')
+        service = OpenLibraryService(cache=MemoryCache('metrics-openlibrary'))
+        service.session.get = MagicMock(side_effect=requests.exceptions.Timeout())
+
+        assert service.search_books('Germinal') == []
+
+        assert sample(client, 'biblioruche_upstream_errors_total',
+                      service='openlibrary', operation='search', reason='Timeout') == errors + 1
+        assert sample(client, 'biblioruche_upstream_request_duration_seconds_count',
+                      service='openlibrary', operation='search') == calls + 1
+
+    def test_ebook_bytes(self, logged_client, ebook):
+        """Test des octets d'ebooks servis"""
+        before = sample(logged_client, 'biblioruche_ebook_bytes_served_total', delivery='app')
+
+        logged_client.get(f'/ebooks/{ebook.id}/download')
+
+        assert sample(logged_client, 'biblioruche_ebook_bytes_served_total',
+                      delivery='app') == before + len(EPUB_CONTENT)
+
+    def test_rate_limit_rejections(self, logged_client, ebook):
+        """Test du comptage des requêtes refusées (429) par endpoint"""
+        endpoint = 'ebooks.download_ebook'
+        before = sample(logged_client, 'biblioruche_rate_limit_rejections_total', endpoint=endpoint)
+
+        statuses = [logged_client.get(f'/ebooks/{ebook.id}/download').status_code for _ in range(11)]
+
+        assert statuses[-1] == 429
+        assert sample(logged_client, 'biblioruche_rate_limit_rejections_total', endpoint=endpoint) == before + 1
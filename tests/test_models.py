@@ -5,7 +5,14 @@ Tests pour les modèles BiblioRuche
 
 import pytest
 from datetime import datetime
-from app.models import User, BookProposal, Badge, ReadingSession
+from app import db
+from app.models import (
+    User, BookProposal, Badge, ReadingSession, BookReview, UserActivityStats, Notification,
+    ReadingParticipation, Film, ViewingSession, ViewingParticipation
+)
+from app.services.loading import READING_CARD
+from app.services.notifications import notification_service
+from app.services.query_stats import capture_queries
 
 
 class TestUserModel:
@@ -101,6 +108,29 @@ class TestBookProposalModel:
         statuses = [b.status for b in books]
         assert 'pending' in statuses
         assert 'approved' in statuses
+    
+    def test_rating_aggregates(self, db_session, test_user, admin_user, test_book):
+        """Test que les agrégats d'avis suivent ajouts, modifications et modération"""
+        first = BookReview(user_id=test_user.id, book_id=test_book.id, rating=4)
+        second = BookReview(user_id=admin_user.id, book_id=test_book.id, rating=1)
+        db_session.add_all([first, second])
+        db_session.commit()
+        
+        assert (test_book.rating_sum, test_book.rating_count) == (5, 2)
+        assert test_book.get_average_rating() == 2.5
+        
+        second.is_visible = False
+        db_session.commit()
+        assert test_book.get_review_count() == 1
+        assert test_book.get_average_rating() == 4.0
+        
+        first.rating = 5
+        db_session.commit()
+        assert test_book.rating_sum == 5
+        
+        db_session.delete(first)
+        db_session.commit()
+        assert (test_book.rating_count, test_book.avg_rating) == (0, 0)
 
 
 class TestBadgeModel:
@@ -140,6 +170,127 @@ class TestBadgeModel:
         assert len(cineclub_badges) == 1
 
 
+class TestUserActivityStatsModel:
+    """Tests pour les compteurs d'activité dénormalisés"""
+    
+    def test_row_created_with_user(self, db_session, test_user):
+        """Une ligne de compteurs est créée avec l'utilisateur"""
+        stats = db_session.get(UserActivityStats, test_user.id)
+        assert stats is not None
+        assert stats.proposals == 0
+    
+    def test_counters_follow_writes(self, db_session, test_user):
+        """Les compteurs suivent les insertions, mises à jour et suppressions"""
+        book = BookProposal(title='Livre', author='Auteur', proposed_by=test_user.id)
+        db_session.add(book)
+        db_session.commit()
+        
+        book.status = 'approved'
+        review = BookReview(user_id=test_user.id, book_id=book.id, rating=4)
+        db_session.add(review)
+        db_session.commit()
+        
+        review.rating = 2
+        db_session.commit()
+        
+        stats = test_user.get_stats()
+        assert stats['total_proposals'] == 1
+        assert stats['accepted_proposals'] == 1
+        assert stats['total_reviews'] == 1
+        assert stats['average_rating'] == 2
+        
+        db_session.delete(review)
+        book.status = 'selected'
+        db_session.commit()
+        
+        stats = test_user.get_stats()
+        assert stats['accepted_proposals'] == 0
+        assert stats['total_reviews'] == 0
+    
+    def test_rebuild_matches_counters(self, db_session, test_user):
+        """rebuild() recalcule les mêmes valeurs depuis les tables sources"""
+        for status in ['pending', 'approved', 'approved']:
+            db_session.add(BookProposal(title='Livre', author='Auteur',
+                                        proposed_by=test_user.id, status=status))
+        db_session.commit()
+        
+        # Simuler une dérive puis reconstruire
+        db_session.get(UserActivityStats, test_user.id).proposals = 42
+        db_session.commit()
+        
+        assert UserActivityStats.rebuild() == 1
+        stats = db_session.get(UserActivityStats, test_user.id)
+        assert stats.proposals == 3
+        assert stats.accepted_proposals == 2
+    
+    def test_missing_row_computed_without_commit(self, db_session, test_user):
+        """Une ligne absente est calculée sans commiter la session de la requête"""
+        db_session.add(BookProposal(title='Livre', author='Auteur', proposed_by=test_user.id))
+        db_session.commit()
+        db_session.delete(db_session.get(UserActivityStats, test_user.id))
+        db_session.commit()
+        user_id = test_user.id
+        
+        # Objet en cours de construction dans la session de la requête
+        db_session.add(Badge(name='Brouillon', description='Badge', icon='fas fa-star', category='reading'))
+        stats = UserActivityStats.for_user(user_id)
+        proposals = stats.proposals
+        db_session.rollback()
+        
+        assert proposals == 1
+        assert Badge.query.filter_by(name='Brouillon').count() == 0
+        assert db_session.get(UserActivityStats, user_id) is None
+
+
+class TestUnreadNotificationsCounter:
+    """Tests pour le compteur de notifications non lues"""
+    
+    def _notify(self, user_id, count=1):
+        return [Notification.create_notification(user_id, 'system', f'Titre {i}', 'Message')
+                for i in range(count)]
+    
+    def test_counter_follows_notifications(self, db_session, test_user):
+        """Le compteur suit la création, la lecture et la suppression"""
+        notifications = self._notify(test_user.id, 3)
+        assert Notification.get_unread_count(test_user.id) == 3
+        
+        notifications[0].mark_as_read()
+        db_session.commit()
+        assert Notification.get_unread_count(test_user.id) == 2
+        
+        db_session.delete(notifications[1])
+        db_session.delete(notifications[0])
+        db_session.commit()
+        assert Notification.get_unread_count(test_user.id) == 1
+        
+        assert notification_service.mark_all_as_read(test_user.id) == 1
+        assert Notification.get_unread_count(test_user.id) == 0
+        
+        UserActivityStats.rebuild()
+        assert Notification.get_unread_count(test_user.id) == 0
+    
+    def test_page_render_skips_notification_table(self, client, db_session, test_user):
+        """Le rendu d'une page ne lit pas la table notification"""
+        self._notify(test_user.id, 2)
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(test_user.id)
+        
+        statements = []
+        
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        db.event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = client.get('/')
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', record)
+        
+        assert response.status_code == 200
+        assert not [s for s in statements if 'FROM notification' in s]
+        assert sum('FROM user_activity_stats' in s for s in statements) == 1
+
+
 class TestReadingSessionModel:
     """Tests pour le modèle ReadingSession"""
     
@@ -182,3 +333,87 @@ class TestReadingSessionModel:
         
         readings = Reading.query.all()
         assert len(readings) >= 3
+
+
+class TestParticipantCounts:
+    """Nombre d'inscrits et inscription calculés en SQL (sans charger les participations)"""
+
+    @pytest.fixture
+    def readings(self, db_session, test_book, test_user, admin_user):
+        sessions = [
+            ReadingSession(book_id=test_book.id, start_date=datetime.utcnow(), end_date=datetime.utcnow(),
+                           status='upcoming', created_by=admin_user.id)
+            for _ in range(3)
+        ]
+        db_session.add_all(sessions)
+        db_session.commit()
+        db_session.add_all([
+            ReadingParticipation(user_id=user.id, reading_session_id=sessions[0].id) for user in (test_user, admin_user)
+        ])
+        db_session.add(ReadingParticipation(user_id=admin_user.id, reading_session_id=sessions[1].id))
+        db_session.commit()
+        return [session.id for session in sessions]
+
+    def test_count_without_loading_participants(self, db_session, readings):
+        """Test du COUNT SQL à la lecture de l'attribut"""
+        reading = db.session.get(ReadingSession, readings[0])
+
+        assert reading.get_participants_count() == 2
+        assert 'participants' not in reading.__dict__
+
+    def test_counts_loaded_with_listing(self, db_session, readings):
+        """Test des compteurs d'une liste chargés par la même requête (undefer)"""
+        db_session.expire_all()
+        with capture_queries() as stats:
+            sessions = ReadingSession.query.options(*READING_CARD).order_by(ReadingSession.id).all()
+            counts = [session.get_participants_count() for session in sessions]
+
+        assert counts == [2, 1, 0]
+        assert stats.count == 1
+
+    def test_count_follows_registrations(self, db_session, readings, test_user):
+        """Test que le compteur suit les inscriptions après commit"""
+        reading = db.session.get(ReadingSession, readings[2])
+        assert reading.participants_count == 0
+
+        db_session.add(ReadingParticipation(user_id=test_user.id, reading_session_id=reading.id))
+        db_session.commit()
+
+        assert reading.participants_count == 1
+
+    def test_is_user_registered(self, db_session, readings, test_user):
+        """Test de l'inscription par requête EXISTS"""
+        first, second, _ = [db.session.get(ReadingSession, reading_id) for reading_id in readings]
+
+        assert first.is_user_registered(test_user.id)
+        assert not second.is_user_registered(test_user.id)
+        assert 'participants' not in first.__dict__
+
+    def test_load_registrations_batch(self, db_session, readings, test_user, admin_user):
+        """Test du préchargement des inscriptions d'une liste en une requête"""
+        user_id = test_user.id
+        sessions = ReadingSession.query.order_by(ReadingSession.id).all()
+        with capture_queries() as stats:
+            ReadingSession.load_registrations(sessions + [None], user_id)
+            registered = [session.is_user_registered(user_id) for session in sessions]
+
+        assert registered == [True, False, False]
+        assert stats.count == 1
+        assert sessions[1].is_user_registered(admin_user.id)  # Autre utilisateur : requête EXISTS
+
+    def test_viewing_session(self, db_session, test_user, admin_user):
+        """Test des mêmes compteurs pour les séances du CinéClub"""
+        film = Film(title='Film', director='Réalisateur', proposed_by=admin_user.id)
+        db_session.add(film)
+        db_session.commit()
+        viewing = ViewingSession(film_id=film.id, scheduled_date=datetime.utcnow(), created_by=admin_user.id)
+        db_session.add(viewing)
+        db_session.commit()
+        db_session.add(ViewingParticipation(user_id=test_user.id, viewing_session_id=viewing.id))
+        db_session.commit()
+
+        assert viewing.get_participants_count() == 1
+        assert viewing.is_user_registered(test_user.id)
+        assert not viewing.is_user_registered(admin_user.id)
+        ViewingSession.load_registrations([viewing], admin_user.id)
+        assert viewing.is_user_registered(admin_user.id) is False
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Tests des diffusions de notifications
+"""
+
+import pytest
+from app.models import User, Notification
+from app.services import notifications
+from app.services.notifications import notification_service
+
+
+@pytest.fixture
+def members(db_session):
+    """Cinq membres de la communauté"""
+    users = [User(twitch_id=f'member-{i}', username=f'member_{i}', display_name=f'Membre {i}')
+             for i in range(5)]
+    db_session.add_all(users)
+    db_session.commit()
+    return users
+
+
+class TestBroadcast:
+    """Tests pour les diffusions en masse"""
+    
+    def test_broadcast_in_chunks(self, db_session, members, monkeypatch):
+        """La diffusion insère par lots et met à jour les compteurs de non lues"""
+        monkeypatch.setattr(notifications, 'BROADCAST_CHUNK_SIZE', 2)
+        excluded = members[0].id
+        
+        sent = notification_service.broadcast_notification(
+            'system', 'Annonce', 'Message à tous', exclude_user_ids=[excluded]
+        )
+        
+        assert sent == 4
+        assert Notification.query.filter_by(user_id=excluded).count() == 0
+        assert Notification.get_unread_count(excluded) == 0
+        for user in members[1:]:
+            notification = Notification.query.filter_by(user_id=user.id).one()
+            assert notification.icon == 'fa-bell'
+            assert Notification.get_unread_count(user.id) == 1
+    
+    def test_broadcast_async_progress(self, db_session, members):
+        """La diffusion en tâche de fond expose sa progression"""
+        job_id = notification_service.broadcast_vote_started('Vote de mars', 42)
+        
+        progress = notification_service.get_broadcast_progress(job_id)
+        assert progress == {'status': 'done', 'sent': 5, 'failed': 0, 'total': 5}
+        notification = Notification.query.filter_by(user_id=members[0].id).one()
+        assert notification.type == 'vote'
+        assert notification.link == '/vote/42'
+    
+    def test_viewing_reminder_targets_participants(self, db_session, members):
+        """Le rappel de séance n'est envoyé qu'aux participants"""
+        participants = [members[1].id, members[3].id]
+        
+        sent = notification_service.broadcast_viewing_reminder(
+            'Film', 7, 'ce soir', participants, background=False
+        )
+        
+        assert sent == 2
+        recipients = {n.user_id for n in Notification.query.all()}
+        assert recipients == set(participants)
+        assert notification_service.get_broadcast_progress('inconnu') is None
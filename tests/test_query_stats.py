@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Tests du comptage des requêtes SQL et des budgets de requêtes par page
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import (
+    User, BookProposal, BookReview, VotingSession, VoteOption, Vote,
+    ReadingSession, ReadingParticipation, Notification, CineClubSettings,
+    Film, FilmVotingSession, FilmVoteOption, FilmVote, ViewingSession, ViewingParticipation
+)
+from app.services.query_stats import QueryStats, capture_queries
+
+
+@pytest.fixture
+def community(db_session, test_user):
+    """Jeu de données suffisant pour faire apparaître les N+1 (8 membres, 8 livres...)"""
+    users = [User(twitch_id=f'member-{i}', username=f'member{i}', display_name=f'Membre {i}') for i in range(8)]
+    db_session.add_all(users)
+    db_session.commit()
+
+    books = [
+        BookProposal(title=f'Livre {i}', author='Auteur', genre='Roman', publication_year=2000 + i,
+                     proposed_by=users[i].id, status='pending' if i % 2 else 'approved')
+        for i in range(8)
+    ]
+    db_session.add_all(books)
+    db_session.commit()
+    db_session.add_all([
+        BookReview(user_id=user.id, book_id=book.id, rating=4) for book in books for user in users[:3]
+    ])
+
+    voting_session = VotingSession(title='Vote', end_date=datetime.now() + timedelta(days=3), created_by=test_user.id)
+    db_session.add(voting_session)
+    db_session.commit()
+    options = [VoteOption(voting_session_id=voting_session.id, book_id=book.id) for book in books[:6]]
+    db_session.add_all(options)
+    db_session.commit()
+    db_session.add_all([
+        Vote(user_id=user.id, voting_session_id=voting_session.id, vote_option_id=options[0].id)
+        for user in users + [test_user]
+    ])
+
+    for status in ('current', 'upcoming', 'completed', 'completed', 'completed', 'completed'):
+        reading = ReadingSession(book_id=books[0].id, start_date=datetime.now(),
+                                 end_date=datetime.now() + timedelta(days=30), status=status,
+                                 created_by=test_user.id)
+        db_session.add(reading)
+        db_session.commit()
+        db_session.add_all([ReadingParticipation(user_id=user.id, reading_session_id=reading.id) for user in users[:4]])
+
+    db_session.add_all([
+        Notification(user_id=test_user.id, type='system', title='Info', message='Message') for _ in range(10)
+    ])
+    db_session.commit()
+    return {'vote_id': voting_session.id, 'user_id': users[0].id}
+
+
+@pytest.fixture
+def member_client(client, test_user):
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(test_user.id)
+    return client
+
+
+class TestQueryStats:
+    """Comptage et détection des instructions répétées"""
+
+    def test_capture_counts_statements(self, app, test_user):
+        """Test du comptage et de la détection d'une instruction répétée"""
+        user_id = test_user.id
+        with capture_queries(repeat_threshold=3) as stats:
+            db.session.execute(db.text('SELECT 1'))
+            for _ in range(4):
+                db.session.execute(db.select(User.username).where(User.id == user_id))
+
+        assert stats.count == 5
+        assert stats.duration > 0
+        [(statement, count)] = stats.repeated()
+        assert count == 4
+        assert 'FROM user' in statement
+
+    def test_summary_fields(self):
+        """Test des champs des logs JSON (SQL compacté)"""
+        stats = QueryStats(repeat_threshold=2)
+        for _ in range(2):
+            stats.record('SELECT *\n    FROM vote\n    WHERE id = ?', 0.001)
+
+        summary = stats.summary()
+
+        assert summary['sql_queries'] == 2
+        assert summary['sql_time_ms'] == 2.0
+        assert summary['sql_repeated'] == [{'statement': 'SELECT * FROM vote WHERE id = ?', 'count': 2}]
+
+    def test_debug_headers(self, app, client, db_session):
+        """Test des en-têtes X-Query-Count et Server-Timing"""
+        app.config['QUERY_STATS_HEADERS'] = True
+        try:
+            response = client.get('/health')
+        finally:
+            app.config['QUERY_STATS_HEADERS'] = app.debug
+
+        assert response.headers['X-Query-Count'] == '1'
+        assert float(response.headers['X-Query-Time-Ms']) >= 0
+        assert response.headers['Server-Timing'].startswith('db;dur=')
+
+    def test_headers_disabled(self, app, client, db_session):
+        """Test qu'aucun en-tête n'est envoyé hors mode debug"""
+        app.config['QUERY_STATS_HEADERS'] = False
+        try:
+            response = client.get('/health')
+        finally:
+            app.config['QUERY_STATS_HEADERS'] = app.debug
+
+        assert 'X-Query-Count' not in response.headers
+
+    def test_repeated_statements_logged(self, app, member_client, community, caplog):
+        """Test du log WARNING avec les instructions répétées d'une page N+1"""
+        db.session.expire_all()
+        with caplog.at_level(logging.WARNING, logger=app.logger.name):
+            member_client.get(f"/user/{community['user_id']}")
+
+        [record] = [r for r in caplog.records if r.getMessage() == 'Repeated SQL statements (possible N+1)']
+        assert record.path == f"/user/{community['user_id']}"
+        assert record.sql_queries >= sum(item['count'] for item in record.sql_repeated)
+        assert any('FROM reading_session' in item['statement'] for item in record.sql_repeated)
+
+
+class TestQueryBudgets:
+    """Budgets de requêtes SQL des pages principales (à abaisser quand un N+1 est corrigé)"""
+
+    def measure(self, client, path, query_budget, budget, allow_repeated=False):
+        client.get(path)  # Caches chauds : on mesure le régime établi
+        with query_budget(budget, allow_repeated=allow_repeated):
+            response = client.get(path)
+        assert response.status_code == 200
+
+    def test_index(self, member_client, community, query_budget):
+        self.measure(member_client, '/', query_budget, 8)
+
+    def test_books(self, member_client, community, query_budget):
+        # N+1 connus : proposeur et ebook de chaque livre, compteurs par statut
+        self.measure(member_client, '/books', query_budget, 28, allow_repeated=True)
+
+    def test_vote_detail(self, member_client, community, query_budget):
+        # N+1 connu : livre de chaque option
+        self.measure(member_client, f"/vote/{community['vote_id']}", query_budget, 11, allow_repeated=True)
+
+    def test_stats(self, member_client, community, query_budget):
+        self.measure(member_client, '/stats', query_budget, 2)
+
+    def test_user_profile(self, member_client, community, query_budget):
+        # N+1 connus : lecture et livre de chaque participation
+        self.measure(member_client, f"/user/{community['user_id']}", query_budget, 19, allow_repeated=True)
+
+    def test_notifications_api(self, member_client, community, query_budget):
+        self.measure(member_client, '/api/notifications', query_budget, 3)
+
+
+@pytest.fixture
+def grow_listings(db_session, admin_user):
+    """Ajoute n éléments à chaque liste (chacun avec son livre, son film et ses membres)"""
+    CineClubSettings.get_settings().is_enabled = True
+    db_session.commit()
+    created = []
+
+    def grow(n):
+        for _ in range(n):
+            i = len(created)
+            created.append(i)
+            members = [User(twitch_id=f'listing-{i}-{j}', username=f'listing{i}_{j}', display_name=f'Membre {i}.{j}')
+                       for j in range(3)]
+            db_session.add_all(members)
+            db_session.flush()
+            book = BookProposal(title=f'Livre {i}', author='Auteur', proposed_by=members[0].id, status='pending')
+            film = Film(title=f'Film {i}', director='Réalisateur', proposed_by=members[0].id)
+            db_session.add_all([book, film])
+            db_session.flush()
+            film.book_proposal_id = book.id
+
+            for status in ('current', 'upcoming', 'completed', 'archived'):
+                reading = ReadingSession(book_id=book.id, start_date=datetime.now(), status=status,
+                                         end_date=datetime.now() + timedelta(days=30), created_by=members[1].id)
+                viewing = ViewingSession(film_id=film.id, scheduled_date=datetime.now(), created_by=members[1].id,
+                                         status='completed' if status == 'completed' else 'upcoming')
+                db_session.add_all([reading, viewing])
+                db_session.flush()
+                db_session.add_all([ReadingParticipation(user_id=m.id, reading_session_id=reading.id) for m in members])
+                db_session.add_all([ViewingParticipation(user_id=m.id, viewing_session_id=viewing.id) for m in members])
+
+            vote = VotingSession(title=f'Vote {i}', end_date=datetime.now() + timedelta(days=3),
+                                 status='active' if i % 2 else 'closed', created_by=admin_user.id)
+            film_vote = FilmVotingSession(title=f'Vote film {i}', end_date=datetime.now() + timedelta(days=3),
+                                          status='active' if i % 2 else 'closed', created_by=admin_user.id,
+                                          winner_film_id=film.id)
+            db_session.add_all([vote, film_vote])
+            db_session.flush()
+            option = VoteOption(voting_session_id=vote.id, book_id=book.id)
+            film_option = FilmVoteOption(voting_session_id=film_vote.id, film_id=film.id)
+            db_session.add_all([option, film_option])
+            db_session.flush()
+            db_session.add_all([Vote(user_id=m.id, voting_session_id=vote.id, vote_option_id=option.id) for m in members])
+            db_session.add_all([FilmVote(user_id=m.id, voting_session_id=film_vote.id, vote_option_id=film_option.id)
+                                for m in members])
+        db_session.commit()
+
+    return grow
+
+
+@pytest.fixture
+def admin_client(client, admin_user):
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(admin_user.id)
+    return client
+
+
+class TestListingQueries:
+    """Pages de liste : nombre de requêtes constant quelle que soit la longueur (profils de chargement)"""
+
+    def count_queries(self, client, path):
+        client.get(path)  # Caches chauds : on mesure le régime établi
+        db.session.expire_all()
+        with capture_queries() as stats:
+            response = client.get(path)
+        assert response.status_code == 200
+        assert stats.repeated() == []
+        return stats.count
+
+    @pytest.mark.parametrize('path', [
+        '/', '/readings', '/admin/', '/admin/readings', '/admin/votes',
+        '/cineclub/', '/cineclub/viewings', '/cineclub/votes',
+    ])
+    def test_constant_queries(self, admin_client, grow_listings, path):
+        grow_listings(2)
+        small = self.count_queries(admin_client, path)
+
+        grow_listings(6)
+
+        assert self.count_queries(admin_client, path) == small
+
+    def test_vote_counts(self, admin_client, grow_listings):
+        """Test des compteurs d'options et de bulletins calculés en SQL"""
+        grow_listings(1)
+
+        response = admin_client.get('/admin/votes')
+
+        assert '<td>1</td>' in response.get_data(as_text=True)
+        assert '<td>3</td>' in response.get_data(as_text=True)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la configuration du stockage des limites de requêtes
+"""
+
+from flask import Flask
+
+from app import limiter, setup_rate_limiting
+from app.services.redis_client import get_redis
+
+
+def make_app(monkeypatch, redis_url=None):
+    """Application Flask minimale, sans variables RATELIMIT_* de l'environnement"""
+    monkeypatch.delenv('RATELIMIT_STORAGE_URI', raising=False)
+    monkeypatch.delenv('RATELIMIT_STRATEGY', raising=False)
+    app = Flask('rate_limits')
+    app.config['REDIS_URL'] = redis_url
+    return app
+
+
+class TestRateLimitStorage:
+    """Stockage des compteurs de Flask-Limiter"""
+
+    def test_redis_storage_shares_connection_pool(self, monkeypatch):
+        """Test que Redis est utilisé avec le pool de connexions partagé"""
+        app = make_app(monkeypatch, 'redis://localhost:6379/0')
+
+        setup_rate_limiting(app)
+
+        assert app.config['RATELIMIT_STORAGE_URI'] == 'redis://localhost:6379/0'
+        assert app.config['RATELIMIT_STRATEGY'] == 'moving-window'
+        assert app.config['RATELIMIT_STORAGE_OPTIONS']['connection_pool'] is \
+            get_redis('redis://localhost:6379/0').connection_pool
+        assert app.config['RATELIMIT_IN_MEMORY_FALLBACK_ENABLED'] is True
+
+    def test_explicit_storage_uri(self, monkeypatch):
+        """Test que RATELIMIT_STORAGE_URI prime sur REDIS_URL"""
+        app = make_app(monkeypatch, 'redis://localhost:6379/0')
+        monkeypatch.setenv('RATELIMIT_STORAGE_URI', 'redis://ratelimit:6379/1')
+        monkeypatch.setenv('RATELIMIT_STRATEGY', 'fixed-window')
+
+        setup_rate_limiting(app)
+
+        assert app.config['RATELIMIT_STORAGE_URI'] == 'redis://ratelimit:6379/1'
+        assert app.config['RATELIMIT_STRATEGY'] == 'fixed-window'
+
+    def test_memory_fallback_warns(self, monkeypatch, caplog):
+        """Test que le stockage en mémoire est signalé"""
+        app = make_app(monkeypatch)
+
+        with caplog.at_level('WARNING'):
+            setup_rate_limiting(app)
+
+        assert app.config['RATELIMIT_STORAGE_URI'] == 'memory://'
+        assert 'RATELIMIT_STORAGE_OPTIONS' not in app.config
+        assert 'in-process memory storage' in caplog.text
+
+    def test_environment_cannot_disable_limits(self, monkeypatch):
+        """Test qu'aucune variable d'environnement ne désactive les limites"""
+        app = make_app(monkeypatch)
+        monkeypatch.setenv('RATELIMIT_ENABLED', 'False')
+
+        setup_rate_limiting(app)
+
+        assert 'RATELIMIT_ENABLED' not in app.config
+
+    def test_application_uses_moving_window(self, app):
+        """Test que l'application utilise la fenêtre glissante"""
+        assert app.config['RATELIMIT_STRATEGY'] == 'moving-window'
+        assert limiter._strategy == 'moving-window'
@@ -108,6 +108,25 @@ class TestBookRoutes:
         response = client.get(f'/book/{test_book.id}')
         assert response.status_code == 200
         assert test_book.title.encode() in response.data
+    
+    def test_books_sorted_by_rating(self, client, db_session, test_user):
+        """Test du tri « Mieux notés » sur les agrégats d'avis"""
+        from app.models import BookProposal, BookReview
+        
+        low = BookProposal(title='Livre moyen', author='A', proposed_by=test_user.id, status='approved')
+        high = BookProposal(title='Livre excellent', author='B', proposed_by=test_user.id, status='approved')
+        db_session.add_all([low, high])
+        db_session.commit()
+        db_session.add_all([
+            BookReview(user_id=test_user.id, book_id=low.id, rating=2),
+            BookReview(user_id=test_user.id, book_id=high.id, rating=5),
+        ])
+        db_session.commit()
+        
+        response = client.get('/books?sort=rating')
+        
+        assert response.status_code == 200
+        assert response.data.index(b'Livre excellent') < response.data.index(b'Livre moyen')
 
 
 class TestErrorHandling:
@@ -123,3 +142,46 @@ class TestErrorHandling:
         # GET sur une route POST-only (si existe)
         response = client.delete('/')
         assert response.status_code in [405, 404]
+
+
+class TestStatistics:
+    """Tests pour le service de statistiques partagé"""
+    
+    def test_stats_page(self, client, test_book):
+        """Test page /stats"""
+        response = client.get('/stats')
+        assert response.status_code == 200
+    
+    def test_overview_counts_and_invalidation(self, client, db_session, test_user):
+        """Les compteurs groupés sont corrects et le cache est invalidé à l'écriture"""
+        from app.models import BookProposal
+        
+        for status in ['pending', 'approved', 'approved']:
+            db_session.add(BookProposal(title='Livre', author='Auteur',
+                                        proposed_by=test_user.id, status=status))
+        db_session.commit()
+        
+        stats = client.get('/api/stats/overview').get_json()['stats']
+        assert stats['books'] == {'total': 3, 'approved': 2, 'pending': 1, 'completed': 0}
+        assert stats['users']['total'] == 1
+        
+        db_session.add(BookProposal(title='Livre', author='Auteur',
+                                    proposed_by=test_user.id, status='completed'))
+        db_session.commit()
+        
+        stats = client.get('/api/stats/overview').get_json()['stats']
+        assert stats['books']['total'] == 4
+        assert stats['books']['completed'] == 1
+    
+    def test_top_contributors_not_multiplied(self, db_session, test_user):
+        """Le score n'est pas multiplié par les jointures"""
+        from app.models import BookProposal
+        from app.services.statistics import statistics_service
+        
+        for _ in range(2):
+            db_session.add(BookProposal(title='Livre', author='Auteur', proposed_by=test_user.id))
+        db_session.commit()
+        
+        contributors = statistics_service._compute_top_contributors()
+        assert contributors[0]['id'] == test_user.id
+        assert contributors[0]['contribution_score'] == 20
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de l'index de recherche plein texte
+"""
+
+import logging
+
+import pytest
+from app import db
+from app.models import BookProposal, Ebook, Film
+from app.services.search import SearchIndex, SqliteFtsBackend, search_index
+
+
+def _book(user, **kwargs):
+    book = BookProposal(proposed_by=user.id, status='approved', **kwargs)
+    db.session.add(book)
+    db.session.commit()
+    return book
+
+
+class TestSearchIndex:
+    """Tests de l'index plein texte (FTS5 en développement)"""
+
+    def test_index_available(self, db_session):
+        """Test que SQLite dispose de FTS5"""
+        assert search_index.available
+
+    def test_startup_detects_without_creating(self, db_session, monkeypatch, caplog):
+        """Test qu'un index absent est signalé puis repris après la migration, sans DDL au démarrage"""
+        monkeypatch.setattr(SqliteFtsBackend, 'create_schema', lambda *args: pytest.fail('DDL au démarrage'))
+        monkeypatch.setattr(SqliteFtsBackend, 'detect', lambda self, connection: False)
+        index = SearchIndex()
+
+        with caplog.at_level(logging.ERROR, logger='app.services.search'):
+            assert index.detect() is None
+        assert 'Full-text index missing' in caplog.text
+
+        # Recherche ILIKE en attendant, pas de nouvelle vérification avant l'intervalle
+        query, hits = index.apply(BookProposal.query, 'book', 'dragon')
+        assert hits is None
+
+        monkeypatch.setattr(SqliteFtsBackend, 'detect', lambda self, connection: True)
+        assert not index.available
+        index._last_detection['sqlite'] -= 3600
+        assert index.available
+
+    def test_relevance_title_before_description(self, db_session, test_user):
+        """Test que le titre pèse plus que la description"""
+        in_description = _book(test_user, title='Chroniques', author='X',
+                               description='Une histoire de dragons et de chevaliers')
+        in_title = _book(test_user, title='Le dragon des glaces', author='Y',
+                         description='Roman')
+        _book(test_user, title='Sans rapport', author='Z', description='Rien ici')
+
+        query, hits = search_index.apply(BookProposal.query, 'book', 'dragon')
+        results = query.order_by(hits.c.score.desc()).all()
+
+        assert [b.id for b in results] == [in_title.id, in_description.id]
+
+    def test_accent_insensitive_and_prefix(self, db_session, test_user):
+        """Test que la recherche ignore les accents et couvre les préfixes"""
+        book = _book(test_user, title='Les Misérables', author='Victor Hugo')
+
+        query, _ = search_index.apply(BookProposal.query, 'book', 'miserable')
+        assert query.all() == [book]
+
+    def test_sync_on_edit_and_delete(self, db_session, test_user):
+        """Test que l'index suit les modifications et suppressions"""
+        book = _book(test_user, title='Ancien titre', author='Auteur')
+
+        book.title = 'Nouveau titre'
+        db.session.commit()
+        assert search_index.apply(BookProposal.query, 'book', 'ancien')[0].count() == 0
+        assert search_index.apply(BookProposal.query, 'book', 'nouveau')[0].count() == 1
+
+        db.session.delete(book)
+        db.session.commit()
+        assert search_index.apply(BookProposal.query, 'book', 'nouveau')[0].count() == 0
+
+    def test_query_syntax_is_neutralized(self, db_session, test_user):
+        """Test que la syntaxe FTS5 saisie par l'utilisateur ne provoque pas d'erreur"""
+        _book(test_user, title='Dune', author='Frank Herbert')
+
+        for text in ['dune"', 'NEAR(dune', 'title:dune OR', '*', '"']:
+            query, _ = search_index.apply(BookProposal.query, 'book', text)
+            query.all()
+
+    def test_snippets_are_escaped_and_highlighted(self, db_session, test_user):
+        """Test que les extraits sont échappés et surlignés"""
+        book = _book(test_user, title='Titre', author='Auteur',
+                     description='<script>alert(1)</script> un récit de voyage')
+
+        snippets = search_index.snippets('book', 'voyage', [book.id])
+
+        assert '<mark>voyage</mark>' in snippets[book.id]
+        assert '<script>' not in snippets[book.id]
+
+    def test_snippets_limited_to_page(self, db_session, test_user):
+        """Test que seuls les extraits des résultats de la page sont calculés"""
+        books = [_book(test_user, title=f'Voyage {i}', author='Auteur', description='Un voyage')
+                 for i in range(3)]
+
+        snippets = search_index.snippets('book', 'voyage', [books[0].id, books[2].id])
+
+        assert set(snippets) == {books[0].id, books[2].id}
+
+    def test_film_indexes_director_and_synopsis(self, db_session, test_user):
+        """Test que les films sont indexés sur le réalisateur et le synopsis"""
+        film = Film(title='Stalker', director='Andreï Tarkovski',
+                    synopsis='Une zone interdite', proposed_by=test_user.id)
+        db.session.add(film)
+        db.session.commit()
+
+        assert search_index.apply(Film.query, 'film', 'tarkovski')[0].all() == [film]
+        assert search_index.apply(Film.query, 'film', 'zone')[0].all() == [film]
+
+
+class TestSearchRoutes:
+    """Tests des pages utilisant la recherche"""
+
+    def test_books_search_with_snippet(self, client, db_session, test_user):
+        """Test de la recherche du catalogue avec extrait surligné"""
+        _book(test_user, title='Fondation', author='Isaac Asimov',
+              description='Un empire galactique en déclin')
+        _book(test_user, title='Dune', author='Frank Herbert', description='Désert')
+
+        response = client.get('/books?q=galactique')
+
+        assert response.status_code == 200
+        assert b'Fondation' in response.data
+        assert b'Dune' not in response.data
+        assert b'<mark>galactique</mark>' in response.data
+
+    def test_ebooks_search(self, client, db_session, test_user):
+        """Test de la recherche des ebooks"""
+        for title in ('Germinal', 'Nana'):
+            db.session.add(Ebook(title=title, author='Émile Zola', filename=f'{title}.epub',
+                                 original_filename=f'{title}.epub', uploaded_by=test_user.id))
+        db.session.commit()
+
+        response = client.get('/ebooks/?search=germinal')
+
+        assert response.status_code == 200
+        assert b'Germinal' in response.data
+        assert b'Nana' not in response.data
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Tests du dépouillement des votes
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from app import db
+from app.models import (
+    BookProposal, VotingSession, VoteOption, Vote, Badge, UserBadge, Notification,
+    UserActivityStats, CineClubSettings, Film, FilmVotingSession, FilmVoteOption, FilmVote
+)
+from app.services import votes
+from app.services.cache import MemoryCache
+from app.services.votes import vote_tally_service
+
+
+@pytest.fixture
+def voting_session(db_session, admin_user):
+    """Session de vote avec trois livres en lice"""
+    session = VotingSession(
+        title='Vote de test',
+        end_date=datetime.now() + timedelta(days=7),
+        created_by=admin_user.id
+    )
+    db_session.add(session)
+    db_session.flush()
+    for title in ('Livre A', 'Livre B', 'Livre C'):
+        book = BookProposal(title=title, author='Auteur', proposed_by=admin_user.id, status='approved')
+        db_session.add(book)
+        db_session.flush()
+        db_session.add(VoteOption(voting_session_id=session.id, book_id=book.id))
+    db_session.commit()
+    vote_tally_service.invalidate('book', session.id)
+    return session
+
+
+@pytest.fixture
+def film_voting_session(db_session, admin_user):
+    """Session de vote CinéClub avec deux films"""
+    session = FilmVotingSession(
+        title='Vote film',
+        end_date=datetime.now() + timedelta(days=7),
+        created_by=admin_user.id
+    )
+    db_session.add(session)
+    db_session.flush()
+    for title in ('Film A', 'Film B'):
+        film = Film(title=title, director='Réalisateur', proposed_by=admin_user.id)
+        db_session.add(film)
+        db_session.flush()
+        db_session.add(FilmVoteOption(voting_session_id=session.id, film_id=film.id))
+    db_session.commit()
+    return session
+
+
+def _vote(user, session, option):
+    db.session.add(Vote(user_id=user.id, voting_session_id=session.id, vote_option_id=option.id))
+    db.session.commit()
+
+
+class TestVoteTallyService:
+    """Tests du service de comptage"""
+
+    def test_counts_and_voters(self, voting_session, test_user, admin_user):
+        """Test du comptage groupé et de la liste des votants"""
+        first, second, third = voting_session.books
+        _vote(test_user, voting_session, first)
+        _vote(admin_user, voting_session, first)
+        _vote(admin_user, voting_session, second)
+
+        tally = vote_tally_service.tally('book', voting_session.id, with_voters=True)
+
+        assert tally.total == 3
+        assert (tally.count(first.id), tally.count(second.id), tally.count(third.id)) == (2, 1, 0)
+        assert round(tally.percentage(first.id)) == 67
+        assert [v['display_name'] for v in tally.voters_for(first.id)] == ['Test User', 'Admin User']
+        assert tally.voters_for(third.id) == []
+        assert tally.winners([first.id, second.id, third.id]) == [first.id]
+
+    def test_cached_until_invalidated(self, voting_session, test_user):
+        """Test que les résultats restent en cache jusqu'à l'invalidation"""
+        option = voting_session.books[0]
+        assert vote_tally_service.tally('book', voting_session.id).total == 0
+
+        _vote(test_user, voting_session, option)
+        assert vote_tally_service.tally('book', voting_session.id).total == 0
+
+        vote_tally_service.invalidate('book', voting_session.id)
+        assert vote_tally_service.tally('book', voting_session.id).count(option.id) == 1
+
+    def test_stale_refill_after_invalidate_ignored(self, voting_session, test_user, monkeypatch):
+        """Test qu'un dépouillement rangé après l'invalidation n'est jamais relu"""
+        option = voting_session.books[0]
+        compute_counts = vote_tally_service._compute_counts
+
+        def stale_compute(kind, session_id):
+            # Dépouillement lu avant le vote, rangé après son invalidation
+            stale = compute_counts(kind, session_id)
+            _vote(test_user, voting_session, option)
+            vote_tally_service.invalidate(kind, session_id)
+            return stale
+
+        monkeypatch.setattr(vote_tally_service, '_compute_counts', stale_compute)
+        assert vote_tally_service.tally('book', voting_session.id).total == 0
+        monkeypatch.setattr(vote_tally_service, '_compute_counts', compute_counts)
+
+        assert vote_tally_service.tally('book', voting_session.id).count(option.id) == 1
+
+    def test_generation_survives_cache_eviction(self, voting_session, test_user, monkeypatch):
+        """Test qu'une éviction dans le cache ne rend pas de nouveau lisible un ancien résultat"""
+        redis_client = pytest.importorskip('fakeredis').FakeRedis()
+        monkeypatch.setattr(votes, 'get_redis', lambda url=None: redis_client)
+        monkeypatch.setattr(vote_tally_service, '_cache', MemoryCache('votes-eviction'))
+        option = voting_session.books[0]
+        assert vote_tally_service.tally('book', voting_session.id).total == 0
+
+        _vote(test_user, voting_session, option)
+        vote_tally_service.invalidate('book', voting_session.id)
+        assert vote_tally_service.tally('book', voting_session.id).total == 1
+
+        # Éviction LRU de tout sauf l'ancien résultat
+        cache = vote_tally_service.cache
+        for key in [key for key in cache._data if not key.endswith(':counts:0')]:
+            cache.delete(key)
+        assert vote_tally_service.tally('book', voting_session.id).count(option.id) == 1
+
+    def test_unknown_kind(self, db_session):
+        """Test qu'un type de vote inconnu est refusé"""
+        with pytest.raises(ValueError):
+            vote_tally_service.tally('music', 1)
+
+    def test_submit_vote_invalidates_results(self, client, voting_session, test_user):
+        """Test que soumettre un vote rafraîchit les résultats affichés"""
+        option = voting_session.books[1]
+        vote_tally_service.tally('book', voting_session.id)
+
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(test_user.id)
+        response = client.post(f'/vote/{voting_session.id}/submit',
+                               data={'vote_option_ids': [option.id]})
+
+        assert response.status_code == 302
+        tally = vote_tally_service.tally('book', voting_session.id)
+        assert tally.count(option.id) == 1
+
+        response = client.get(f'/vote/{voting_session.id}')
+        assert b'1 vote(s) (100.0%)' in response.data
+
+    def test_vote_page_follows_live_results(self, client, voting_session, test_user):
+        """Test que la page de vote suit les résultats en direct une fois les résultats visibles"""
+        option = voting_session.books[0]
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(test_user.id)
+
+        assert b'data-stream-vote=""' in client.get(f'/vote/{voting_session.id}').data
+
+        _vote(test_user, voting_session, option)
+        page = client.get(f'/vote/{voting_session.id}').get_data(as_text=True)
+        assert f'data-stream-vote="book:{voting_session.id}"' in page
+        assert f'class="mb-3 vote-result" data-option-id="{option.id}"' in page
+        assert "addEventListener('biblioruche:tally'" in page
+
+    def test_admin_close_vote_selects_winner(self, client, voting_session, test_user, admin_user):
+        """Test que la clôture désigne le livre gagnant à partir du comptage"""
+        first, second, _ = voting_session.books
+        _vote(test_user, voting_session, second)
+        _vote(admin_user, voting_session, second)
+        _vote(admin_user, voting_session, first)
+
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin_user.id)
+        response = client.post(f'/admin/vote/{voting_session.id}/close')
+
+        assert response.status_code == 302
+        db.session.expire_all()
+        assert voting_session.status == 'closed'
+        assert voting_session.winner_book_id == second.book_id
+        assert second.book.status == 'selected'
+        assert first.book.status == 'approved'
+
+
+class TestVoteWritePath:
+    """Tests du chemin d'écriture des votes"""
+
+    def test_cast_book_votes_replaces_previous(self, voting_session, test_user):
+        """Test que les votes sont remplacés en bloc et les compteurs ajustés"""
+        first, second, third = voting_session.books
+
+        assert vote_tally_service.cast_book_votes(test_user.id, voting_session.id, [first.id, second.id]) == 2
+        assert vote_tally_service.cast_book_votes(test_user.id, voting_session.id, [third.id]) == 1
+
+        votes = Vote.query.filter_by(user_id=test_user.id).all()
+        assert [vote.vote_option_id for vote in votes] == [third.id]
+        assert UserActivityStats.for_user(test_user.id).votes == 1
+        assert vote_tally_service.tally('book', voting_session.id).count(third.id) == 1
+
+    def test_cast_book_votes_ignores_foreign_options(self, voting_session, db_session, test_user, admin_user):
+        """Test qu'une option d'une autre session n'est pas enregistrée"""
+        other = VotingSession(title='Autre', end_date=datetime.now() + timedelta(days=1),
+                              created_by=admin_user.id)
+        db_session.add(other)
+        db_session.flush()
+        foreign = VoteOption(voting_session_id=other.id, book_id=voting_session.books[0].book_id)
+        db_session.add(foreign)
+        db_session.commit()
+
+        inserted = vote_tally_service.cast_book_votes(
+            test_user.id, voting_session.id, [foreign.id, voting_session.books[0].id]
+        )
+
+        assert inserted == 1
+        assert Vote.query.filter_by(vote_option_id=foreign.id).count() == 0
+
+    def test_cast_film_vote_is_single_choice(self, film_voting_session, test_user):
+        """Test que le second vote CinéClub est ignoré (upsert)"""
+        first, second = film_voting_session.options
+
+        assert vote_tally_service.cast_film_vote(test_user.id, film_voting_session.id, first.id)
+        assert not vote_tally_service.cast_film_vote(test_user.id, film_voting_session.id, second.id)
+
+        assert FilmVote.query.filter_by(user_id=test_user.id).count() == 1
+        assert UserActivityStats.for_user(test_user.id).film_votes == 1
+        assert vote_tally_service.tally('film', film_voting_session.id).count(first.id) == 1
+
+    def test_submit_vote_awards_badge_with_notification(self, client, voting_session, db_session, test_user):
+        """Test que le badge est attribué après le commit et notifié"""
+        db_session.add(Badge(name='Premier vote', description='Premier vote exprimé',
+                             icon='fa-vote-yea', category='vote'))
+        db_session.commit()
+
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(test_user.id)
+        client.post(f'/vote/{voting_session.id}/submit',
+                    data={'vote_option_ids': [voting_session.books[0].id]})
+
+        assert UserBadge.query.filter_by(user_id=test_user.id).count() == 1
+        assert Notification.query.filter_by(user_id=test_user.id, type='badge').count() == 1
+
+    def test_cineclub_submit_vote_twice(self, client, film_voting_session, db_session, test_user):
+        """Test du message « déjà voté » sur le second vote CinéClub"""
+        db_session.add(CineClubSettings(is_enabled=True))
+        db_session.commit()
+        option = film_voting_session.options[0]
+
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(test_user.id)
+        url = f'/cineclub/vote/{film_voting_session.id}/submit'
+        client.post(url, data={'vote_option_id': option.id})
+        response = client.post(url, data={'vote_option_id': option.id}, follow_redirects=True)
+
+        assert 'déjà voté'.encode() in response.data
+        assert FilmVote.query.count() == 1